@@ -16,11 +16,13 @@ namespace WgDashboard.Api.Controllers
     {
         private readonly ISecurityService _security;
         private readonly IIdentityService _identity;
+        private readonly ICurrentUserAccessor _currentUser;
 
-        public AuthenticationController(ISecurityService securityService, IIdentityService identityService)
+        public AuthenticationController(ISecurityService securityService, IIdentityService identityService, ICurrentUserAccessor currentUserAccessor)
         {
             this._security = securityService;
             this._identity = identityService;
+            this._currentUser = currentUserAccessor;
         }
 
         /// <summary>
@@ -29,7 +31,7 @@ namespace WgDashboard.Api.Controllers
         /// <para>Creates a JWT token if the user is authenticated</para>
         /// </summary>
         /// <param name="credentials">The user's username and password</param>
-        /// <returns>An HTTP 200 or 400 response</returns>
+        /// <returns>An HTTP 200, 400, or 503 response</returns>
         [AllowAnonymous]
         [HttpPost("login")]
         [Produces("application/json")]
@@ -44,6 +46,11 @@ namespace WgDashboard.Api.Controllers
             }
             catch (BadRequestException bre)
                 { return BadRequest(bre.Message); }
+            catch (ServiceUnavailableException sue)
+            {
+                Response.Headers.RetryAfter = sue.RetryAfterSeconds.ToString();
+                return StatusCode(StatusCodes.Status503ServiceUnavailable, sue.Message);
+            }
             if(user is null)
                 return BadRequest("Incorrect username or password");
 
@@ -67,7 +74,7 @@ namespace WgDashboard.Api.Controllers
         /// <para>Creates a new user</para>
         /// </summary>
         /// <param name="details">The user's basic details</param>
-        /// <returns>An HTTP 201 or 400 response</returns>
+        /// <returns>An HTTP 201, 400, 500, or 503 response</returns>
         [AllowAnonymous]
         [HttpPost("signup")]
         [Produces("application/json")]
@@ -84,6 +91,11 @@ namespace WgDashboard.Api.Controllers
                 { return BadRequest(bre.Message); }
             catch(InternalServerErrorException isee)
                 { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
+            catch (ServiceUnavailableException sue)
+            {
+                Response.Headers.RetryAfter = sue.RetryAfterSeconds.ToString();
+                return StatusCode(StatusCodes.Status503ServiceUnavailable, sue.Message);
+            }
 
             var newUserProfile = new UserProfile()
             {
@@ -118,9 +130,7 @@ namespace WgDashboard.Api.Controllers
                 return BadRequest($"Conflicting IDs in URL and body. URL ID: {id}, Body ID: {passwordRequest.Id}");
 
             // guard against unauthorized (including requesing user not existing)
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(id, userId, userRole))
+            if (!_security.CheckUserAuthorized(id, _currentUser.User))
                 return NotFound($"User with ID {id} not found"); // return NotFound to hide the fact that there might be a user
 
             // attempt to update password
@@ -134,6 +144,11 @@ namespace WgDashboard.Api.Controllers
                 { return NotFound(rnfe.Message); }
             catch(InternalServerErrorException isee)
                 { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
+            catch (ServiceUnavailableException sue)
+            {
+                Response.Headers.RetryAfter = sue.RetryAfterSeconds.ToString();
+                return StatusCode(StatusCodes.Status503ServiceUnavailable, sue.Message);
+            }
 
             // success
             return NoContent();
@@ -0,0 +1,134 @@
+﻿using Microsoft.AspNetCore.Authorization;
+using Microsoft.AspNetCore.Http;
+using Microsoft.AspNetCore.Http.Features;
+using Microsoft.AspNetCore.Mvc;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+using WgDashboard.Api.Services;
+
+namespace WgDashboard.Api.Controllers
+{
+    [Route("api/events")]
+    [ApiController]
+    public class EventsController : ControllerBase
+    {
+        private readonly ICurrentUserAccessor _currentUser;
+        private readonly IChangeNotifier _notifier;
+        private readonly IChangeEventsSettings _settings;
+
+        /*
+         * Constructor for controller
+         */
+        public EventsController(ICurrentUserAccessor currentUserAccessor, IChangeNotifier changeNotifier, IChangeEventsSettings changeEventsSettings)
+        {
+            this._currentUser = currentUserAccessor;
+            this._notifier = changeNotifier;
+            this._settings = changeEventsSettings;
+        }
+
+        /// <summary>
+        /// <para>GET: /api/events</para>
+        ///
+        /// <para>Streams peer and user changes as server-sent events: "change" events with a ChangeEvent as data, and a "reset" event when
+        /// the client missed changes and has to read everything again. Admins receive every change, users the changes of their own peers and profile.</para>
+        ///
+        /// <para>Send the ID of the last event received as the Last-Event-ID header when reconnecting to receive the changes made in between.
+        /// The stream ends when the access token expires, so reconnect with a fresh one.</para>
+        /// </summary>
+        /// <returns>An HTTP 200 stream, or an HTTP 503 response if too many clients are connected</returns>
+        [HttpGet]
+        [Authorize(Roles = "admin,user")]
+        [Produces(ServerSentEvents.ContentType)]
+        public async Task<ActionResult> GetEvents([FromHeader(Name = "Last-Event-ID")] string? lastEventId = null)
+        {
+            CurrentUser currentUser = _currentUser.User;
+            ChangeSubscription subscription;
+            try
+            {
+                subscription = _notifier.Subscribe(currentUser.IsAdmin ? null : currentUser.Id, lastEventId);
+            }
+            catch (ServiceUnavailableException sue)
+            {
+                Response.Headers.RetryAfter = sue.RetryAfterSeconds.ToString();
+                return StatusCode(StatusCodes.Status503ServiceUnavailable, sue.Message);
+            }
+
+            using (subscription)
+            {
+                // not in the compressed MIME types, and never buffered, so each event reaches the client as soon as it is written
+                Response.ContentType = ServerSentEvents.ContentType;
+                Response.Headers.CacheControl = "no-cache";
+                Response.Headers["X-Accel-Buffering"] = "no"; // same for nginx in front of the API
+                HttpContext.Features.Get<IHttpResponseBodyFeature>()?.DisableBuffering();
+                await Response.Body.FlushAsync(HttpContext.RequestAborted);
+
+                using var streamEnd = CancellationTokenSource.CreateLinkedTokenSource(HttpContext.RequestAborted);
+                TimeSpan? untilExpiry = UntilTokenExpires();
+                if (untilExpiry is not null)
+                    streamEnd.CancelAfter(untilExpiry.Value);
+
+                try
+                {
+                    await WriteEvents(subscription, streamEnd.Token);
+                }
+                catch (OperationCanceledException) { } // the client went away or its token expired
+            }
+
+            return new EmptyResult();
+        }
+
+        /*
+         * Writes the queued events as they arrive, with a heartbeat whenever the stream has been quiet for a while
+         */
+        private async Task WriteEvents(ChangeSubscription subscription, CancellationToken cancellationToken)
+        {
+            Stream body = Response.Body;
+            while (true)
+            {
+                bool open;
+                using (var heartbeat = CancellationTokenSource.CreateLinkedTokenSource(cancellationToken))
+                {
+                    heartbeat.CancelAfter(TimeSpan.FromSeconds(_settings.HeartbeatSeconds));
+                    try
+                    {
+                        open = await subscription.Reader.WaitToReadAsync(heartbeat.Token);
+                    }
+                    catch (OperationCanceledException) when (!cancellationToken.IsCancellationRequested)
+                    {
+                        await body.WriteAsync(ServerSentEvents.Heartbeat, cancellationToken);
+                        await body.FlushAsync(cancellationToken);
+                        continue;
+                    }
+                }
+
+                if (!open)
+                    break;
+
+                // write everything that is queued before flushing, so a burst of changes goes out together
+                while (subscription.Reader.TryRead(out byte[]? frame))
+                    await body.WriteAsync(frame, cancellationToken);
+                await body.FlushAsync(cancellationToken);
+            }
+
+            if (subscription.Lagged)
+            {
+                await body.WriteAsync(ServerSentEvents.Reset, cancellationToken);
+                await body.FlushAsync(cancellationToken);
+            }
+        }
+
+        /*
+         * Reads how long the access token is still valid for, so that a stream doesn't outlive the token it was opened with
+         */
+        private TimeSpan? UntilTokenExpires()
+        {
+            string? expiry = User.FindFirst("exp")?.Value;
+            if (!long.TryParse(expiry, out long expiresAt))
+                return null;
+
+            TimeSpan remaining = DateTimeOffset.FromUnixTimeSeconds(expiresAt) - DateTimeOffset.UtcNow;
+            return remaining > TimeSpan.Zero ? remaining : TimeSpan.Zero;
+        }
+    }
+}
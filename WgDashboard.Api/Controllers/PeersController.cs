@@ -3,7 +3,9 @@ using Microsoft.AspNetCore.Http;
 using Microsoft.AspNetCore.Mvc;
 using Microsoft.Identity.Client;
 using System.Security.Cryptography.X509Certificates;
+using System.Text;
 using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
 using WgDashboard.Api.Models;
 using WgDashboard.Api.Services;
 
@@ -13,35 +15,117 @@ namespace WgDashboard.Api.Controllers
     [ApiController]
     public class PeersController : ControllerBase
     {
-        private readonly IIdentityService _identity;
+        private readonly ICurrentUserAccessor _currentUser;
         private readonly ISecurityService _security;
         private readonly IUserService _users;
         private readonly IPeerService _peers;
+        private readonly IPeerStatsStore _stats;
 
         /*
          * Constructor for controller
          */
-        public PeersController(IIdentityService identityService, ISecurityService securityService, IUserService userService, IPeerService peerService)
+        public PeersController(ICurrentUserAccessor currentUserAccessor, ISecurityService securityService, IUserService userService, IPeerService peerService,
+            IPeerStatsStore peerStatsStore)
         {
-            this._identity = identityService;
+            this._currentUser = currentUserAccessor;
             this._security = securityService;
             this._users = userService;
             this._peers = peerService;
+            this._stats = peerStatsStore;
         }
 
         /// <summary>
-        /// <para>GET: /api/peers</para>
+        /// <para>GET: /api/peers?limit=100&amp;after=5&amp;publickey=abc&amp;allowedips=10.8.0.0/24&amp;ownerusername=myuser</para>
         ///
-        /// <para>Retrieves all peers</para>
+        /// <para>Retrieves one page of peers, ordered by ID. To get the next page, pass the ID of the last peer as "after".</para>
         /// </summary>
-        /// <returns>An HTTP 200 response</returns>
+        /// <param name="query">The page to get and the filters to apply, taken from the query string</param>
+        /// <returns>An HTTP 200, 304, or 400 response</returns>
         [HttpGet]
         [Authorize(Roles = "admin")]
         [Produces("application/json")]
         [Consumes("application/json")]
-        public ActionResult<IEnumerable<PeerProfile>> GetAllPeers()
+        public async Task<ActionResult<IEnumerable<PeerProfile>>> GetAllPeers([FromQuery] PeerListRequest query)
+        {
+            IAsyncEnumerable<PeerProfile> peers;
+            try
+            {
+                peers = _peers.GetAllPeers(query);
+            }
+            catch (BadRequestException bre)
+                { return BadRequest(bre.Message); }
+
+            // success: the page (at most ListRequest.MaxLimit peers) is read in full so that it can be tagged
+            var page = new List<PeerProfile>(query.PageSize);
+            await foreach (PeerProfile peer in peers.WithCancellation(HttpContext.RequestAborted))
+                page.Add(peer);
+
+            return this.OkWithETag(page);
+        }
+
+        /// <summary>
+        /// <para>GET: /api/peers/search?ip=10.8.3.17 or /api/peers/search?cidr=10.8.0.0/20&amp;limit=100&amp;after=5</para>
+        ///
+        /// <para>Retrieves one page of peers, ordered by ID, whose allowed IPs contain the address or fall within the network. Only IPv4 is searchable.</para>
+        /// </summary>
+        /// <param name="query">The page to get and the address or network to search for, taken from the query string</param>
+        /// <returns>An HTTP 200, 304, or 400 response</returns>
+        [HttpGet("search")]
+        [Authorize(Roles = "admin")]
+        [Produces("application/json")]
+        public async Task<ActionResult<IEnumerable<PeerProfile>>> SearchPeers([FromQuery] PeerSearchRequest query)
         {
-            return Ok(_peers.GetAllPeers()); 
+            IAsyncEnumerable<PeerProfile> peers;
+            try
+            {
+                peers = _peers.SearchPeers(query);
+            }
+            catch (BadRequestException bre)
+                { return BadRequest(bre.Message); }
+
+            // success: the page is read in full so that it can be tagged
+            var page = new List<PeerProfile>();
+            await foreach (PeerProfile peer in peers.WithCancellation(HttpContext.RequestAborted))
+                page.Add(peer);
+
+            return this.OkWithETag(page);
+        }
+
+        /// <summary>
+        /// <para>GET: /api/peers/export?format=ndjson</para>
+        ///
+        /// <para>Streams every peer as NDJSON (the default) or CSV. An NDJSON export can be sent to POST /api/peers/bulk as-is.</para>
+        /// </summary>
+        /// <param name="format">Either "ndjson" or "csv", taken from the query string</param>
+        /// <returns>An HTTP 200 or 400 response</returns>
+        [HttpGet("export")]
+        [Authorize(Roles = "admin")]
+        [Produces(NdJson.ContentType, Csv.ContentType)]
+        public async Task<ActionResult> ExportPeers([FromQuery] string format = "ndjson")
+        {
+            // guard against bad input
+            bool csv = format == "csv";
+            if (!csv && format != "ndjson")
+                return BadRequest("Format must be ndjson or csv");
+
+            Response.ContentType = csv ? Csv.ContentType : NdJson.ContentType;
+            Response.Headers.ContentDisposition = $"attachment; filename=peers.{format}";
+
+            // write each peer as it is read instead of building the whole export in memory
+            await using var writer = new StreamWriter(Response.Body, new UTF8Encoding(false), 16 * 1024);
+            if (csv)
+                await Csv.WriteRowAsync(writer, "Id", "PublicKey", "AllowedIPs", "DeviceDescription", "OwnerId", "OwnerUsername", "DeviceType");
+
+            await foreach (PeerExport peer in _peers.ExportPeers().WithCancellation(HttpContext.RequestAborted))
+            {
+                if (csv)
+                    await Csv.WriteRowAsync(writer, peer.Id.ToString(), peer.PublicKey, peer.AllowedIPs, peer.DeviceDescription,
+                        peer.OwnerId.ToString(), peer.OwnerUsername, peer.DeviceType);
+                else
+                    await NdJson.WriteAsync(writer, peer);
+            }
+
+            return new EmptyResult();
         }
 
         /// <summary>
@@ -50,33 +134,75 @@ namespace WgDashboard.Api.Controllers
         /// <para>Retrieves the peer's profiles given the peer's ID</para>
         /// </summary>
         /// <param name="id">The peer's ID, taken from the URL</param>
-        /// <returns>An HTTP 200, 404, or 500 response</returns>
+        /// <returns>An HTTP 200, 304, or 404 response</returns>
         [HttpGet("{id}")]
         [Authorize(Roles = "admin,user")]
         [Produces("application/json")]
         [Consumes("application/json")]
         public async Task<ActionResult<Peer>> GetPeerById(int id)
         {
-            int requestingUserId = _identity.GetUserIdFromJwt(HttpContext);
-            string requestingUserRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(id, requestingUserId, requestingUserRole))
+            if (!_security.CheckUserAuthorized(id, _currentUser.User))
                 return NotFound($"Peer with ID {id} not found"); // return NotFound to hide that there might be a user
 
-            PeerProfile? peerProfile;
             // try to get the peer's profile
-            try
-            {
-                peerProfile = await _peers.GetPeerProfileById(id);
-            }
-            catch (BadDataIntegrityException bdie)
-                { return StatusCode(StatusCodes.Status500InternalServerError, bdie.Message); }
+            PeerProfile? peerProfile = await _peers.GetPeerProfileById(id);
 
             // guard against peer not found
             if (peerProfile is null)
                 return NotFound($"Peer with ID {id} not found");
 
             // success
-            return Ok(peerProfile);
+            return this.OkWithETag(peerProfile);
+        }
+
+        /// <summary>
+        /// <para>GET: /api/peers/5/stats</para>
+        ///
+        /// <para>Retrieves the peer's latest handshake and transfer counters, along with their recent history</para>
+        /// </summary>
+        /// <param name="id">The peer's ID, taken from the URL</param>
+        /// <returns>An HTTP 200 or 404 response</returns>
+        [HttpGet("{id}/stats")]
+        [Authorize(Roles = "admin,user")]
+        [Produces("application/json")]
+        public async Task<ActionResult<PeerStats>> GetPeerStats(int id)
+        {
+            // guard against peer not found or belonging to someone else
+            Peer? peer = await _peers.GetPeerById(id);
+            if (peer is null || !_security.CheckUserAuthorized(peer.OwnerId, _currentUser.User))
+                return NotFound($"Peer with ID {id} not found");
+
+            // guard against the peer not having been seen on the interface yet
+            PeerStats? stats = _stats.GetStats(id);
+            if (stats is null)
+                return NotFound($"No stats for peer with ID {id}");
+
+            // success
+            return Ok(stats);
+        }
+
+        /// <summary>
+        /// <para>GET: /api/peers/stats?ids=1&amp;ids=2</para>
+        ///
+        /// <para>Retrieves the latest handshake and transfer counters of many peers at once, without their history. Without IDs, an admin gets
+        /// every peer and a user gets their own peers. Peers that don't exist, belong to someone else, or haven't been seen on the interface are left out.</para>
+        /// </summary>
+        /// <param name="ids">The peers' IDs, taken from the query string</param>
+        /// <returns>An HTTP 200 response</returns>
+        [HttpGet("stats")]
+        [Authorize(Roles = "admin,user")]
+        [Produces("application/json")]
+        public async Task<ActionResult<IEnumerable<PeerStats>>> GetPeersStats([FromQuery] List<int>? ids)
+        {
+            CurrentUser currentUser = _currentUser.User;
+            if (currentUser.IsAdmin)
+                return Ok(_stats.GetLatestStats(ids is null || ids.Count == 0 ? null : ids));
+
+            // a user only gets their own peers
+            IEnumerable<int> ownPeerIds = (await _peers.GetPeerProfilesByOwnerId(currentUser.Id)).Select((peer) => peer.Id);
+            if (ids is not null && ids.Count > 0)
+                ownPeerIds = ownPeerIds.Intersect(ids);
+            return Ok(_stats.GetLatestStats(ownPeerIds));
         }
 
         /// <summary>
@@ -85,7 +211,7 @@ namespace WgDashboard.Api.Controllers
         /// <para>Searches for all peers whose owner's id is the given id</para>
         /// </summary>
         /// <param name="ownerId">The user's ID, taken from the URL</param>
-        /// <returns>An HTTP 200 or 404 response</returns>
+        /// <returns>An HTTP 200, 304, or 404 response</returns>
         [HttpGet("owner/{ownerId}")]
         [Authorize(Roles = "admin,user")]
         [Produces("application/json")]
@@ -93,9 +219,7 @@ namespace WgDashboard.Api.Controllers
         public async Task<ActionResult<IEnumerable<PeerProfile>>> GetPeersByOwnerId(int ownerId)
         {
             // guard against unauthorized user
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(ownerId, userId, userRole))
+            if (!_security.CheckUserAuthorized(ownerId, _currentUser.User))
                 return NotFound($"No peers attached to user with ID {ownerId}");
 
             // attempt to get peers
@@ -106,7 +230,7 @@ namespace WgDashboard.Api.Controllers
                 return NotFound($"No peers attached to user with ID {ownerId}");
 
             // success
-            return Ok(peers);
+            return this.OkWithETag(peers);
         }
 
         /// <summary>
@@ -128,9 +252,7 @@ namespace WgDashboard.Api.Controllers
                 return NotFound($"No peers attached to user with username {ownerUsername}");
 
             // guard against unauthorized user
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if(!_security.CheckUserAuthorized(owner.Id, userId, userRole))
+            if(!_security.CheckUserAuthorized(owner.Id, _currentUser.User))
                 return NotFound($"No peers attached to user with username {ownerUsername}");
 
             // attempt to get peers
@@ -157,9 +279,7 @@ namespace WgDashboard.Api.Controllers
         public async Task<ActionResult<PeerProfile>> AddPeer([FromBody] NewPeerRequest newPeer)
         {
             // guard against unauthorized user
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(newPeer.OwnerId, userId, userRole))
+            if (!_security.CheckUserAuthorized(newPeer.OwnerId, _currentUser.User))
                 return BadRequest("User's ID does not match peer's owner ID");
 
             // attempt to attach peer to user
@@ -182,14 +302,68 @@ namespace WgDashboard.Api.Controllers
             return CreatedAtAction(actionName, routeValue, createdPeer);
         }
 
+        /// <summary>
+        /// <para>POST: /api/peers/addresses?ownerid=5</para>
+        ///
+        /// <para>Leases the next free address for a while, so that it can go in the peer's config before the peer is added. Add the peer with
+        /// the leased address as its allowed IPs before the lease expires.</para>
+        /// </summary>
+        /// <param name="ownerId">The ID of the user who will add the peer, taken from the query string</param>
+        /// <returns>An HTTP 200, 400, or 500 response</returns>
+        [HttpPost("addresses")]
+        [Authorize(Roles = "admin,user")]
+        [Produces("application/json")]
+        public async Task<ActionResult<IpLease>> LeaseAddress([FromQuery] int ownerId)
+        {
+            // guard against unauthorized user
+            if (!_security.CheckUserAuthorized(ownerId, _currentUser.User))
+                return BadRequest("User's ID does not match peer's owner ID");
+
+            // attempt to lease an address
+            try
+            {
+                return Ok(await _peers.LeaseAddress(ownerId));
+            }
+            catch (BadRequestException bre)
+                { return BadRequest(bre.Message); }
+            catch (InternalServerErrorException isee)
+                { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
+        }
+
+        /// <summary>
+        /// <para>POST: /api/peers/bulk</para>
+        ///
+        /// <para>Attaches many new peers at once. The body is either a JSON array of new peers or NDJSON (application/x-ndjson) with one new peer per line.</para>
+        ///
+        /// <para>Peers are read, validated, and inserted in batches as the body arrives. The response has one result per peer, in the same order,
+        /// with either the ID of the created peer or the reason it was not created.</para>
+        /// </summary>
+        /// <returns>An HTTP 200 response</returns>
+        [HttpPost("bulk")]
+        [Authorize(Roles = "admin,user")]
+        [Produces("application/json")]
+        [Consumes("application/json", NdJson.ContentType)]
+        public ActionResult<IAsyncEnumerable<BulkPeerResult>> AddPeers()
+        {
+            CurrentUser currentUser = _currentUser.User; // read now, since the results are streamed after the action returns
+
+            // read the body lazily so that the whole import never has to be in memory
+            IAsyncEnumerable<NewPeerRequest?> newPeers = NdJson.IsNdJson(Request.ContentType)
+                ? NdJson.ReadAsync<NewPeerRequest>(Request.Body)
+                : NdJson.ReadArrayAsync<NewPeerRequest>(Request.Body);
+
+            // success: the results are streamed to the client as each batch is inserted
+            return Ok(_peers.AddPeers(newPeers, (ownerId) => _security.CheckUserAuthorized(ownerId, currentUser)));
+        }
+
         /// <summary>
         /// <para>PUT: /api/peers/5</para>
         /// 
-        /// <para>Updates the user profile</para>
+        /// <para>Updates the user profile. If an If-Match header is sent, the peer is only updated if it still matches the entity tag from GET /api/peers/5.</para>
         /// </summary>
         /// <param name="id">The ID of the peer, taken from the URL</param>
         /// <param name="updatedPeer">The peer to replace the one in the database</param>
-        /// <returns>An HTTP 204, 400, 404, or 500 response</returns>
+        /// <returns>An HTTP 204, 400, 404, 412, or 500 response</returns>
         [HttpPut("{id}")]
         [Authorize(Roles = "admin,user")]
         [Produces("application/json")]
@@ -197,9 +371,7 @@ namespace WgDashboard.Api.Controllers
         public async Task<ActionResult> UpdatePeer(int id, [FromBody] UpdatePeerRequest updatedPeer)
         {
             // guard against unauthorized user
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(updatedPeer.OwnerId, userId, userRole))
+            if (!_security.CheckUserAuthorized(updatedPeer.OwnerId, _currentUser.User))
                 return NotFound($"Peer with ID {id} not found"); // return not found to hide that there might be something there
 
             // guard against mismatching inputs
@@ -209,12 +381,14 @@ namespace WgDashboard.Api.Controllers
             // attempt to update peer
             try
             {
-                await _peers.UpdatePeer(updatedPeer);
+                await _peers.UpdatePeer(updatedPeer, Request.Headers.IfMatch.Count > 0 ? Request.Headers.IfMatch.ToString() : null);
             }
             catch (BadRequestException bre)
                 { return BadRequest(bre.Message); }
             catch(ResourceNotFoundException rnfe)
                 { return NotFound(rnfe.Message); }
+            catch(PreconditionFailedException pfe)
+                { return StatusCode(StatusCodes.Status412PreconditionFailed, pfe.Message); }
             catch(InternalServerErrorException isee)
                 { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
 
@@ -238,9 +412,7 @@ namespace WgDashboard.Api.Controllers
             if (peer is null)
                 return NotFound($"Peer with ID {id} not found");
 
-            int userId = _identity.GetUserIdFromJwt(HttpContext);
-            string userRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(peer.OwnerId, userId, userRole))
+            if (!_security.CheckUserAuthorized(peer.OwnerId, _currentUser.User))
                 return NotFound($"Peer with ID {id} not found"); // return not found to hide that there might be a peer
 
             try
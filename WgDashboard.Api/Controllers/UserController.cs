@@ -4,6 +4,7 @@ using Microsoft.AspNetCore.Mvc;
 using Microsoft.EntityFrameworkCore;
 using WgDashboard.Api.Data;
 using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
 using WgDashboard.Api.Models;
 using WgDashboard.Api.Services;
 
@@ -13,32 +14,46 @@ namespace WgDashboard.Api.Controllers
     [ApiController]
     public class UserController : ControllerBase
     {
-        private readonly IIdentityService _identity;
+        private readonly ICurrentUserAccessor _currentUser;
         private readonly ISecurityService _security;
         private readonly IUserService _users;
 
         /*
         * Contructor for controller
         */
-        public UserController(IIdentityService identityService, ISecurityService securityService, IUserService userServices)
+        public UserController(ICurrentUserAccessor currentUserAccessor, ISecurityService securityService, IUserService userServices)
         {
-            this._identity = identityService;
+            this._currentUser = currentUserAccessor;
             this._security = securityService;
             this._users = userServices;
         }
 
         /// <summary>
-        /// <para>GET: /api/users</para>
-        /// <para>Retrieves all users from the database</para>
+        /// <para>GET: /api/users?limit=100&amp;after=5&amp;username=myuser</para>
+        /// <para>Retrieves one page of users, ordered by ID. To get the next page, pass the ID of the last user as "after".</para>
         /// </summary>
-        /// <returns>An HTTP 200 response</returns>
+        /// <param name="query">The page to get and the filters to apply, taken from the query string</param>
+        /// <returns>An HTTP 200, 304, or 400 response</returns>
         [HttpGet]
         [Authorize(Roles = "admin")]
         [Produces("application/json")]
         [Consumes("application/json")]
-        public ActionResult<IEnumerable<UserProfile>> GetAllUsers()
+        public async Task<ActionResult<IEnumerable<UserProfile>>> GetAllUsers([FromQuery] UserListRequest query)
         {
-            return Ok(_users.GetAllUsers());
+            IAsyncEnumerable<UserProfile> users;
+            try
+            {
+                users = _users.GetAllUsers(query);
+            }
+            catch (BadRequestException bre)
+                { return BadRequest(bre.Message); }
+
+            // success: the page (at most ListRequest.MaxLimit users) is read in full so that it can be tagged
+            var page = new List<UserProfile>(query.PageSize);
+            await foreach (UserProfile user in users.WithCancellation(HttpContext.RequestAborted))
+                page.Add(user);
+
+            return this.OkWithETag(page);
         }
 
         /// <summary>
@@ -47,7 +62,7 @@ namespace WgDashboard.Api.Controllers
         /// <para>Gets a user by a specific ID</para>
         /// </summary>
         /// <param name="id">The ID of the user to retrieve, taken from the URL</param>
-        /// <returns>An HTTP 200 or 404 response</returns>
+        /// <returns>An HTTP 200, 304, or 404 response</returns>
         [HttpGet("{id}", Name = "GetUserById")]
         [Authorize(Roles = "admin,user")]
         [Produces("application/json")]
@@ -55,9 +70,7 @@ namespace WgDashboard.Api.Controllers
         public async Task<ActionResult<UserProfile>> GetUserById(int id)
         {
             // guard against unauthorized user
-            int requestingUserId = _identity.GetUserIdFromJwt(HttpContext);
-            string requestingUserRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(id, requestingUserId, requestingUserRole))
+            if (!_security.CheckUserAuthorized(id, _currentUser.User))
                 return NotFound($"User with ID {id} not found"); // return NotFound to hide that there might be a user
 
             // try to get the user's profile
@@ -66,17 +79,17 @@ namespace WgDashboard.Api.Controllers
                 return NotFound($"User with ID {id} not found");
 
             // success
-            return Ok(profile);
+            return this.OkWithETag(profile);
         }
 
         /// <summary>
         /// <para>PUT: /api/users/5</para>
         /// 
-        /// <para>Updates the user profile</para>
+        /// <para>Updates the user profile. If an If-Match header is sent, the user is only updated if it still matches the entity tag from GET /api/users/5.</para>
         /// </summary>
         /// <param name="id">The ID of the user to be updated, taken from the URL</param>
         /// <param name="updatedUserProfile">The updated user profile, taken from the body</param>
-        /// <returns>An HTTP 200, 400, or 500 response</returns>
+        /// <returns>An HTTP 200, 400, 412, or 500 response</returns>
         [HttpPut("{id}")]
         [Authorize(Roles = "admin,user")]
         [Produces("application/json")]
@@ -88,22 +101,23 @@ namespace WgDashboard.Api.Controllers
                 return BadRequest($"Conflicting IDs in URL and in body. URL ID: {id}, body ID: {updatedUserProfile.Id}");
 
             // guards against unauthorized users
-            int requestingUsersId = _identity.GetUserIdFromJwt(HttpContext);
-            string requestingUsersRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(id, requestingUsersId, requestingUsersRole)) 
+            if (!_security.CheckUserAuthorized(id, _currentUser.User)) 
                 return NotFound($"User with ID {id} not found"); // return NotFound to hide that there might be a user
-            if (requestingUsersRole != UserRoles.Admin && requestingUsersRole != updatedUserProfile.Role) // make sure the user isn't elevating their own privileges
+            if (!_currentUser.User.IsAdmin && _currentUser.User.Role != updatedUserProfile.Role) // make sure the user isn't elevating their own privileges
                 return BadRequest($"Insufficient priviliges to change user's role");
 
             // try to update the profile
             try
             {
-                await _users.UpdateUserProfile(id, updatedUserProfile.Username, updatedUserProfile.Name, updatedUserProfile.Role);
+                await _users.UpdateUserProfile(id, updatedUserProfile.Username, updatedUserProfile.Name, updatedUserProfile.Role,
+                    Request.Headers.IfMatch.Count > 0 ? Request.Headers.IfMatch.ToString() : null);
             }
             catch(BadRequestException bre)
                 { return BadRequest(bre.Message); }
             catch(ResourceNotFoundException rnfe)
                 { return NotFound(rnfe.Message); }
+            catch(PreconditionFailedException pfe)
+                { return StatusCode(StatusCodes.Status412PreconditionFailed, pfe.Message); }
             catch(InternalServerErrorException isee)
                 { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
 
@@ -123,9 +137,7 @@ namespace WgDashboard.Api.Controllers
         public async Task<ActionResult> DeleteUser(int id)
         {
             // guard against unauthorized user
-            int requestingUserId = _identity.GetUserIdFromJwt(HttpContext);
-            string requestingUserRole = _identity.GetUserRoleFromJwt(HttpContext);
-            if (!_security.CheckUserAuthorized(id, requestingUserId, requestingUserRole))
+            if (!_security.CheckUserAuthorized(id, _currentUser.User))
                 return NotFound($"User with ID {id} not found"); // return NotFound to hide that there might be a user
 
             // attempt to delete the user
@@ -141,5 +153,33 @@ namespace WgDashboard.Api.Controllers
             // success
             return NoContent();
         }
+
+        /// <summary>
+        /// <para>POST: /api/users/delete</para>
+        ///
+        /// <para>Deletes every user matching the given IDs and/or filters, along with their peers. The requesting admin is never deleted.</para>
+        /// </summary>
+        /// <param name="request">The IDs and filters of the users to delete</param>
+        /// <returns>An HTTP 200, 400, or 500 response with the number of users deleted</returns>
+        [HttpPost("delete")]
+        [Authorize(Roles = "admin")]
+        [Produces("application/json")]
+        [Consumes("application/json")]
+        public async Task<ActionResult> DeleteUsers([FromBody] DeleteUsersRequest request)
+        {
+            // attempt to delete the users
+            int deletedUsers;
+            try
+            {
+                deletedUsers = await _users.DeleteUsers(request, _currentUser.User.Id);
+            }
+            catch (BadRequestException bre)
+                { return BadRequest(bre.Message); }
+            catch (InternalServerErrorException isee)
+                { return StatusCode(StatusCodes.Status500InternalServerError, isee.Message); }
+
+            // success
+            return Ok(new { deleted = deletedUsers });
+        }
     }
 }
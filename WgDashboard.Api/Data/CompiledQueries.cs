@@ -0,0 +1,112 @@
+﻿using Microsoft.EntityFrameworkCore;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Data
+{
+    /// <summary>
+    /// <para>Queries on the hot paths, compiled once instead of translating a new expression tree on every request</para>
+    ///
+    /// <para>Reads that only return data to the client don't go through the change tracker. Queries for entities that are about to be modified are tracked.</para>
+    /// </summary>
+    public static class CompiledQueries
+    {
+        public static readonly Func<WireguardDbContext, int, Task<Peer?>> PeerById =
+            EF.CompileAsyncQuery((WireguardDbContext context, int id) =>
+                context.Peers.AsNoTracking().FirstOrDefault((peer) => peer.Id == id));
+
+        public static readonly Func<WireguardDbContext, int, Task<PeerProfile?>> PeerProfileById =
+            EF.CompileAsyncQuery((WireguardDbContext context, int id) =>
+                context.Peers.AsNoTracking()
+                    .Where((peer) => peer.Id == id)
+                    .Select((peer) => new PeerProfile()
+                    {
+                        Id = peer.Id,
+                        PublicKey = peer.PublicKey,
+                        AllowedIPs = peer.AllowedIPs,
+                        DeviceDescription = peer.DeviceDescription,
+                        OwnerName = peer.Owner.Name,
+                        OwnerUsername = peer.Owner.Username,
+                        DeviceType = peer.DeviceType,
+                    })
+                    .FirstOrDefault());
+
+        public static readonly Func<WireguardDbContext, int, string, Task<PeerOwnerSummary?>> OwnerSummaryForNewPeer =
+            EF.CompileAsyncQuery((WireguardDbContext context, int ownerId, string publicKey) =>
+                context.Users.AsNoTracking()
+                    .Where((user) => user.Id == ownerId)
+                    .Select((user) => new PeerOwnerSummary()
+                    {
+                        Name = user.Name,
+                        Username = user.Username,
+                        UsedSlots = context.Peers.Where((peer) => peer.OwnerId == user.Id).Select((peer) => peer.Slot).ToList(),
+                        PublicKeyTaken = context.Peers.Any((peer) => peer.PublicKey == publicKey),
+                    })
+                    .FirstOrDefault());
+
+        public static readonly Func<WireguardDbContext, int, IAsyncEnumerable<PeerProfile>> PeerProfilesByOwnerId =
+            EF.CompileAsyncQuery((WireguardDbContext context, int ownerId) =>
+                context.Peers.AsNoTracking()
+                    .Where((peer) => peer.OwnerId == ownerId)
+                    .OrderBy((peer) => peer.Id)
+                    .Select((peer) => new PeerProfile()
+                    {
+                        Id = peer.Id,
+                        PublicKey = peer.PublicKey,
+                        AllowedIPs = peer.AllowedIPs,
+                        DeviceDescription = peer.DeviceDescription,
+                        OwnerName = peer.Owner.Name,
+                        OwnerUsername = peer.Owner.Username,
+                        DeviceType = peer.DeviceType,
+                    }));
+
+        public static readonly Func<WireguardDbContext, int, Task<User?>> TrackedUserById =
+            EF.CompileAsyncQuery((WireguardDbContext context, int id) =>
+                context.Users.FirstOrDefault((user) => user.Id == id));
+
+        public static readonly Func<WireguardDbContext, string, Task<User?>> TrackedUserByUsername =
+            EF.CompileAsyncQuery((WireguardDbContext context, string username) =>
+                context.Users.FirstOrDefault((user) => user.Username == username));
+
+        public static readonly Func<WireguardDbContext, int, Task<UserProfile?>> UserProfileById =
+            EF.CompileAsyncQuery((WireguardDbContext context, int id) =>
+                context.Users.AsNoTracking()
+                    .Where((user) => user.Id == id)
+                    .Select((user) => new UserProfile()
+                    {
+                        Id = user.Id,
+                        Username = user.Username,
+                        Name = user.Name,
+                        Role = user.Role,
+                    })
+                    .FirstOrDefault());
+
+        public static readonly Func<WireguardDbContext, string, Task<UserProfile?>> UserProfileByUsername =
+            EF.CompileAsyncQuery((WireguardDbContext context, string username) =>
+                context.Users.AsNoTracking()
+                    .Where((user) => user.Username == username)
+                    .Select((user) => new UserProfile()
+                    {
+                        Id = user.Id,
+                        Username = user.Username,
+                        Name = user.Name,
+                        Role = user.Role,
+                    })
+                    .FirstOrDefault());
+
+        public static readonly Func<WireguardDbContext, string, Task<RefreshToken?>> TrackedRefreshTokenByHash =
+            EF.CompileAsyncQuery((WireguardDbContext context, string tokenHash) =>
+                context.RefreshTokens.Include((token) => token.User).FirstOrDefault((token) => token.TokenHash == tokenHash));
+
+        public static readonly Func<WireguardDbContext, int, Task<bool>> UserExists =
+            EF.CompileAsyncQuery((WireguardDbContext context, int id) =>
+                context.Users.Any((user) => user.Id == id));
+
+        public static readonly Func<WireguardDbContext, string, Task<bool>> UsernameTaken =
+            EF.CompileAsyncQuery((WireguardDbContext context, string username) =>
+                context.Users.Any((user) => user.Username == username));
+
+        public static readonly Func<WireguardDbContext, Task<bool>> AdminExists =
+            EF.CompileAsyncQuery((WireguardDbContext context) =>
+                context.Users.Any((user) => user.Role == UserRoles.Admin));
+    }
+}
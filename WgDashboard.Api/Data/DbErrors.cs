@@ -0,0 +1,32 @@
+﻿using Microsoft.Data.SqlClient;
+using Microsoft.EntityFrameworkCore;
+
+namespace WgDashboard.Api.Data
+{
+    /// <summary>
+    /// Helpers for telling which database constraint caused an update to fail
+    /// </summary>
+    public static class DbErrors
+    {
+        private const int UNIQUE_CONSTRAINT_VIOLATION = 2627;
+        private const int UNIQUE_INDEX_VIOLATION = 2601;
+        private const int CHECK_CONSTRAINT_VIOLATION = 547;
+
+        /// <summary>
+        /// Checks whether the update failed because it violated the given unique index or check constraint
+        /// </summary>
+        /// <param name="exception">The exception thrown by SaveChanges</param>
+        /// <param name="constraintName">The name of the index or constraint, e.g. IX_Peer_PublicKey</param>
+        /// <returns>True if the constraint was violated; otherwise false</returns>
+        public static bool IsConstraintViolation(DbUpdateException exception, string constraintName)
+        {
+            if (exception.InnerException is not SqlException sqlException)
+                return false;
+
+            bool isConstraintError = sqlException.Number == UNIQUE_CONSTRAINT_VIOLATION
+                || sqlException.Number == UNIQUE_INDEX_VIOLATION
+                || sqlException.Number == CHECK_CONSTRAINT_VIOLATION;
+            return isConstraintError && sqlException.Message.Contains(constraintName);
+        }
+    }
+}
@@ -0,0 +1,215 @@
+﻿using Microsoft.EntityFrameworkCore.Diagnostics;
+using System.Data.Common;
+using System.Diagnostics;
+using System.Diagnostics.Metrics;
+
+namespace WgDashboard.Api.Data
+{
+    /// <summary>
+    /// <para>Times every SQL command and connection open that EF Core makes, and records each command as a span of the request's trace</para>
+    ///
+    /// <para>Commands are also added up per request, so that a slow request can be told apart as waiting on SQL or busy elsewhere, e.g. hashing a password.
+    /// Wrap the request in BeginRequest() for that. The in-memory database used in development runs no commands, so it records nothing</para>
+    /// </summary>
+    public sealed class DbMetricsInterceptor : DbCommandInterceptor, IDbConnectionInterceptor
+    {
+        public const string MeterName = "WgDashboard.Api.Database";
+        public const string ActivitySourceName = "WgDashboard.Api.Database";
+
+        private static readonly ActivitySource ActivitySource = new ActivitySource(ActivitySourceName);
+
+        // the totals of the request on this async flow, if it was wrapped in BeginRequest()
+        private static readonly AsyncLocal<RequestTotals?> CurrentRequest = new AsyncLocal<RequestTotals?>();
+
+        private readonly Histogram<double> _commandDuration;
+        private readonly Histogram<double> _connectionOpenDuration;
+        private readonly UpDownCounter<long> _connectionsInUse;
+        private readonly Histogram<long> _requestCommands;
+        private readonly Histogram<double> _requestCommandDuration;
+
+        internal sealed class RequestTotals
+        {
+            public long Commands;
+            public long DurationTicks;
+        }
+
+        /// <summary>
+        /// Records the request's totals when disposed
+        /// </summary>
+        public readonly struct RequestScope : IDisposable
+        {
+            private readonly DbMetricsInterceptor _interceptor;
+            private readonly RequestTotals _totals;
+            private readonly HttpContext _httpContext;
+
+            internal RequestScope(DbMetricsInterceptor interceptor, RequestTotals totals, HttpContext httpContext)
+            {
+                this._interceptor = interceptor;
+                this._totals = totals;
+                this._httpContext = httpContext;
+            }
+
+            public void Dispose()
+            {
+                CurrentRequest.Value = null;
+                _interceptor.RecordRequest(_totals, _httpContext);
+            }
+        }
+
+        public DbMetricsInterceptor(IMeterFactory meterFactory)
+        {
+            Meter meter = meterFactory.Create(MeterName);
+            this._commandDuration = meter.CreateHistogram<double>("wgdashboard.db.command.duration", unit: "ms",
+                description: "Time until a SQL command returned its first results, or failed");
+            this._connectionOpenDuration = meter.CreateHistogram<double>("wgdashboard.db.connection.open_duration", unit: "ms",
+                description: "Time spent opening a connection, including waiting for one to come free in the pool");
+            this._connectionsInUse = meter.CreateUpDownCounter<long>("wgdashboard.db.connection.in_use",
+                description: "Number of connections taken from the pool and not yet returned");
+            this._requestCommands = meter.CreateHistogram<long>("wgdashboard.db.request.commands",
+                description: "Number of SQL commands run by one HTTP request");
+            this._requestCommandDuration = meter.CreateHistogram<double>("wgdashboard.db.request.duration", unit: "ms",
+                description: "Total time one HTTP request spent running SQL commands");
+        }
+
+        /// <summary>
+        /// Starts adding up the commands run on this async flow, until the returned scope is disposed
+        /// </summary>
+        /// <param name="httpContext">The request, to tag the totals with its route</param>
+        /// <returns>The scope to dispose once the request is done</returns>
+        public RequestScope BeginRequest(HttpContext httpContext)
+        {
+            var totals = new RequestTotals();
+            CurrentRequest.Value = totals;
+            return new RequestScope(this, totals, httpContext);
+        }
+
+        private void RecordRequest(RequestTotals totals, HttpContext httpContext)
+        {
+            // the route template, not the path, so that /api/peers/1 and /api/peers/2 are one series
+            string route = (httpContext.GetEndpoint() as RouteEndpoint)?.RoutePattern.RawText ?? "unmatched";
+            var routeTag = new KeyValuePair<string, object?>("http.route", route);
+            double milliseconds = TimeSpan.FromTicks(totals.DurationTicks).TotalMilliseconds;
+            _requestCommands.Record(totals.Commands, routeTag);
+            _requestCommandDuration.Record(milliseconds, routeTag);
+
+            // the request's own span, so a trace shows the totals without adding up the command spans
+            Activity.Current?.SetTag("wgdashboard.db.commands", totals.Commands);
+            Activity.Current?.SetTag("wgdashboard.db.duration_ms", milliseconds);
+        }
+
+        private void RecordCommand(DbCommand command, CommandEndEventData eventData, Exception? exception)
+        {
+            string operation = eventData.ExecuteMethod switch
+            {
+                DbCommandMethod.ExecuteReader => "reader",
+                DbCommandMethod.ExecuteScalar => "scalar",
+                _ => "non_query",
+            };
+            var tags = new TagList() { { "db.operation", operation } };
+            if (exception is not null)
+                tags.Add("error.type", exception.GetType().Name);
+            _commandDuration.Record(eventData.Duration.TotalMilliseconds, tags);
+
+            RequestTotals? totals = CurrentRequest.Value;
+            if (totals is not null)
+            {
+                Interlocked.Increment(ref totals.Commands);
+                Interlocked.Add(ref totals.DurationTicks, eventData.Duration.Ticks);
+            }
+
+            // the command already ran, so the span is backdated to when it started
+            if (ActivitySource.HasListeners())
+            {
+                using Activity? activity = ActivitySource.StartActivity("db " + operation, ActivityKind.Client, default(ActivityContext),
+                    startTime: eventData.StartTime);
+                if (activity is not null)
+                {
+                    activity.SetTag("db.system", eventData.Context?.Database.ProviderName);
+                    activity.SetTag("db.statement", command.CommandText); // parameterized, so it holds no values
+                    if (exception is not null)
+                        activity.SetStatus(ActivityStatusCode.Error, exception.Message);
+                    activity.SetEndTime((eventData.StartTime + eventData.Duration).UtcDateTime);
+                }
+            }
+        }
+
+        public override DbDataReader ReaderExecuted(DbCommand command, CommandExecutedEventData eventData, DbDataReader result)
+        {
+            RecordCommand(command, eventData, null);
+            return result;
+        }
+
+        public override ValueTask<DbDataReader> ReaderExecutedAsync(DbCommand command, CommandExecutedEventData eventData, DbDataReader result,
+            CancellationToken cancellationToken = default)
+        {
+            RecordCommand(command, eventData, null);
+            return ValueTask.FromResult(result);
+        }
+
+        public override int NonQueryExecuted(DbCommand command, CommandExecutedEventData eventData, int result)
+        {
+            RecordCommand(command, eventData, null);
+            return result;
+        }
+
+        public override ValueTask<int> NonQueryExecutedAsync(DbCommand command, CommandExecutedEventData eventData, int result,
+            CancellationToken cancellationToken = default)
+        {
+            RecordCommand(command, eventData, null);
+            return ValueTask.FromResult(result);
+        }
+
+        public override object? ScalarExecuted(DbCommand command, CommandExecutedEventData eventData, object? result)
+        {
+            RecordCommand(command, eventData, null);
+            return result;
+        }
+
+        public override ValueTask<object?> ScalarExecutedAsync(DbCommand command, CommandExecutedEventData eventData, object? result,
+            CancellationToken cancellationToken = default)
+        {
+            RecordCommand(command, eventData, null);
+            return ValueTask.FromResult(result);
+        }
+
+        public override void CommandFailed(DbCommand command, CommandErrorEventData eventData) =>
+            RecordCommand(command, eventData, eventData.Exception);
+
+        public override Task CommandFailedAsync(DbCommand command, CommandErrorEventData eventData, CancellationToken cancellationToken = default)
+        {
+            RecordCommand(command, eventData, eventData.Exception);
+            return Task.CompletedTask;
+        }
+
+        public void ConnectionOpened(DbConnection connection, ConnectionEndEventData eventData) => RecordOpened(eventData);
+
+        public Task ConnectionOpenedAsync(DbConnection connection, ConnectionEndEventData eventData, CancellationToken cancellationToken = default)
+        {
+            RecordOpened(eventData);
+            return Task.CompletedTask;
+        }
+
+        public void ConnectionClosed(DbConnection connection, ConnectionEndEventData eventData) => _connectionsInUse.Add(-1);
+
+        public Task ConnectionClosedAsync(DbConnection connection, ConnectionEndEventData eventData)
+        {
+            _connectionsInUse.Add(-1);
+            return Task.CompletedTask;
+        }
+
+        public void ConnectionFailed(DbConnection connection, ConnectionErrorEventData eventData) =>
+            _connectionOpenDuration.Record(eventData.Duration.TotalMilliseconds, new KeyValuePair<string, object?>("error.type", eventData.Exception.GetType().Name));
+
+        public Task ConnectionFailedAsync(DbConnection connection, ConnectionErrorEventData eventData, CancellationToken cancellationToken = default)
+        {
+            ConnectionFailed(connection, eventData);
+            return Task.CompletedTask;
+        }
+
+        private void RecordOpened(ConnectionEndEventData eventData)
+        {
+            _connectionOpenDuration.Record(eventData.Duration.TotalMilliseconds);
+            _connectionsInUse.Add(1);
+        }
+    }
+}
@@ -9,11 +9,40 @@ namespace WgDashboard.Api.Data
 
         public DbSet<User> Users { get; set; }
         public DbSet<Peer> Peers { get; set; }
+        public DbSet<RefreshToken> RefreshTokens { get; set; }
+        public DbSet<IpAllocation> IpAllocations { get; set; }
 
         protected override void OnModelCreating(ModelBuilder modelBuilder)
         {
             modelBuilder.Entity<User>().ToTable("User", "dbo");
-            modelBuilder.Entity<Peer>().ToTable("Peer", "dbo");
+            modelBuilder.Entity<RefreshToken>().ToTable("RefreshToken", "dbo");
+            modelBuilder.Entity<IpAllocation>().ToTable("IpAllocation", "dbo");
+            modelBuilder.Entity<Peer>().ToTable("Peer", "dbo", (table) =>
+                table.HasCheckConstraint("CK_Peer_Slot", $"[Slot] >= 0 AND [Slot] < {Peer.MAX_PEERS_PER_USER}"));
+
+            // lookups done on every login, refresh, and new peer
+            modelBuilder.Entity<User>().HasIndex((user) => user.Username).IsUnique();
+            modelBuilder.Entity<RefreshToken>().HasIndex((token) => token.TokenHash).IsUnique();
+            modelBuilder.Entity<Peer>().HasIndex((peer) => peer.PublicKey).IsUnique();
+
+            // each owner has a fixed number of slots, so concurrent inserts can't go over the per-user limit
+            modelBuilder.Entity<Peer>().HasIndex((peer) => new { peer.OwnerId, peer.Slot }).IsUnique();
+
+            // searches by address or network are range seeks on the numeric form of AllowedIPs
+            modelBuilder.Entity<Peer>().HasIndex((peer) => new { peer.NetworkAddress, peer.PrefixLength });
+
+            // revoking a login deletes its whole family, and the sweeper deletes expired tokens
+            modelBuilder.Entity<RefreshToken>().HasIndex((token) => token.FamilyId);
+            modelBuilder.Entity<RefreshToken>().HasIndex((token) => token.ExpiresAt);
+
+            // an address can only be handed out once, across every API instance. deleting a peer frees its address
+            modelBuilder.Entity<IpAllocation>().HasIndex((allocation) => allocation.Address).IsUnique();
+            modelBuilder.Entity<IpAllocation>().HasIndex((allocation) => allocation.ExpiresAt);
+            modelBuilder.Entity<IpAllocation>()
+                .HasOne((allocation) => allocation.Peer)
+                .WithOne((peer) => peer.IpAllocation)
+                .HasForeignKey<IpAllocation>((allocation) => allocation.PeerId)
+                .OnDelete(DeleteBehavior.Cascade);
         }
     }
 }
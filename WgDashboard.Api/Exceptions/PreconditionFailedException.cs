@@ -0,0 +1,12 @@
+﻿namespace WgDashboard.Api.Exceptions
+{
+    /// <summary>
+    /// Represents an update whose If-Match header no longer matches the resource, i.e. someone else changed it since the client last read it
+    /// </summary>
+    public class PreconditionFailedException : Exception
+    {
+        public PreconditionFailedException() : base() { }
+
+        public PreconditionFailedException(string message) : base(message) { }
+    }
+}
@@ -0,0 +1,17 @@
+﻿namespace WgDashboard.Api.Exceptions
+{
+    /// <summary>
+    /// Represents a request that cannot be processed right now because the server is overloaded. The client should try again after RetryAfterSeconds.
+    /// </summary>
+    public class ServiceUnavailableException : Exception
+    {
+        public int RetryAfterSeconds { get; } = 1;
+
+        public ServiceUnavailableException() : base() { }
+        public ServiceUnavailableException(string message) : base(message) { }
+        public ServiceUnavailableException(string message, int retryAfterSeconds) : base(message)
+        {
+            this.RetryAfterSeconds = retryAfterSeconds;
+        }
+    }
+}
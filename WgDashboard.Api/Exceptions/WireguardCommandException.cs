@@ -0,0 +1,18 @@
+﻿namespace WgDashboard.Api.Exceptions
+{
+    /// <summary>
+    /// Represents a wg command that failed or couldn't be run, e.g. because the interface doesn't exist or the API lacks the rights to change it
+    /// </summary>
+    public class WireguardCommandException : Exception
+    {
+        public int? ExitCode { get; }
+
+        public WireguardCommandException() : base() { }
+        public WireguardCommandException(string message) : base(message) { }
+        public WireguardCommandException(string message, Exception innerException) : base(message, innerException) { }
+        public WireguardCommandException(string message, int exitCode) : base(message)
+        {
+            this.ExitCode = exitCode;
+        }
+    }
+}
@@ -0,0 +1,34 @@
+﻿using System.Text.Json;
+using System.Text.Json.Serialization;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// <para>Serializers for every model the API reads or writes, generated at compile time instead of built with reflection on first use</para>
+    ///
+    /// <para>Same naming and casing rules as the controllers. Anything not listed here (e.g. anonymous error objects) still falls back to reflection.</para>
+    /// </summary>
+    [JsonSourceGenerationOptions(JsonSerializerDefaults.Web)]
+    [JsonSerializable(typeof(PeerProfile))]
+    [JsonSerializable(typeof(List<PeerProfile>))]
+    [JsonSerializable(typeof(IEnumerable<PeerProfile>))]
+    [JsonSerializable(typeof(UserProfile))]
+    [JsonSerializable(typeof(List<UserProfile>))]
+    [JsonSerializable(typeof(PeerExport))]
+    [JsonSerializable(typeof(BulkPeerResult))]
+    [JsonSerializable(typeof(PeerStats))]
+    [JsonSerializable(typeof(List<PeerStats>))]
+    [JsonSerializable(typeof(IpLease))]
+    [JsonSerializable(typeof(ChangeEvent))]
+    [JsonSerializable(typeof(NewPeerRequest))]
+    [JsonSerializable(typeof(UpdatePeerRequest))]
+    [JsonSerializable(typeof(UpdateUserRequest))]
+    [JsonSerializable(typeof(DeleteUsersRequest))]
+    [JsonSerializable(typeof(LoginRequest))]
+    [JsonSerializable(typeof(SignupRequest))]
+    [JsonSerializable(typeof(ChangePasswordRequest))]
+    public partial class ApiJsonContext : JsonSerializerContext
+    {
+    }
+}
@@ -0,0 +1,48 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IChangeEventsSettings
+    {
+        public int MaxSubscribers { get; }
+        public int SubscriberBufferSize { get; }
+        public int ReplayEvents { get; }
+        public int HeartbeatSeconds { get; }
+    }
+
+    /// <summary>
+    /// Settings for pushing peer and user changes to the dashboards, read from the optional "ChangeEvents" section of appsettings.json
+    /// </summary>
+    public sealed class ChangeEventsSettings : IChangeEventsSettings
+    {
+        public int MaxSubscribers { get; private set; } = 1000; // open streams per API instance. more are turned away with a 503
+        public int SubscriberBufferSize { get; private set; } = 256; // events queued for a slow client before it is told to reload instead
+        public int ReplayEvents { get; private set; } = 1024; // recent events kept for clients that reconnect with Last-Event-ID
+        public int HeartbeatSeconds { get; private set; } = 15;
+
+
+        public ChangeEventsSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("ChangeEvents");
+
+            int? maxSubscribers = section.GetValue<int?>("MaxSubscribers");
+            int? subscriberBufferSize = section.GetValue<int?>("SubscriberBufferSize");
+            int? replayEvents = section.GetValue<int?>("ReplayEvents");
+            int? heartbeatSeconds = section.GetValue<int?>("HeartbeatSeconds");
+
+            if (maxSubscribers is not null && maxSubscribers < 0)
+                throw new InvalidConfigurationException("ChangeEvents:MaxSubscribers must not be negative");
+            if (subscriberBufferSize is not null && subscriberBufferSize < 1)
+                throw new InvalidConfigurationException("ChangeEvents:SubscriberBufferSize must be at least 1");
+            if (replayEvents is not null && replayEvents < 0)
+                throw new InvalidConfigurationException("ChangeEvents:ReplayEvents must not be negative");
+            if (heartbeatSeconds is not null && heartbeatSeconds < 1)
+                throw new InvalidConfigurationException("ChangeEvents:HeartbeatSeconds must be at least 1");
+
+            MaxSubscribers = maxSubscribers ?? MaxSubscribers;
+            SubscriberBufferSize = subscriberBufferSize ?? SubscriberBufferSize;
+            ReplayEvents = replayEvents ?? ReplayEvents;
+            HeartbeatSeconds = heartbeatSeconds ?? HeartbeatSeconds;
+        }
+    }
+}
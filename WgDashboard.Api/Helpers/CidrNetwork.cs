@@ -0,0 +1,154 @@
+﻿using System.Net;
+using System.Net.Sockets;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// Represents a network in CIDR notation, e.g. 10.8.0.0/24. A bare address is treated as a single host network (/32 or /128).
+    /// </summary>
+    public readonly struct CidrNetwork
+    {
+        public IPAddress Address { get; }
+        public int PrefixLength { get; }
+
+        private CidrNetwork(IPAddress address, int prefixLength)
+        {
+            this.Address = address;
+            this.PrefixLength = prefixLength;
+        }
+
+        /// <summary>
+        /// Parses a network in CIDR notation. Host bits are allowed (e.g. a peer's 10.8.0.2/24) and are kept as-is.
+        /// </summary>
+        /// <param name="cidr">The network, e.g. 10.8.0.0/24 or 10.8.0.2</param>
+        /// <param name="network">The parsed network</param>
+        /// <returns>True if the network was parsed; otherwise false</returns>
+        public static bool TryParse(string? cidr, out CidrNetwork network)
+        {
+            network = default;
+            if (string.IsNullOrWhiteSpace(cidr))
+                return false;
+
+            string[] parts = cidr.Trim().Split('/');
+            if (parts.Length > 2)
+                return false;
+
+            IPAddress? address;
+            if (!IPAddress.TryParse(parts[0], out address))
+                return false;
+
+            int maxPrefixLength = address.AddressFamily == AddressFamily.InterNetwork ? 32 : 128;
+            int prefixLength = maxPrefixLength;
+            if (parts.Length == 2 && (!int.TryParse(parts[1], out prefixLength) || prefixLength < 0 || prefixLength > maxPrefixLength))
+                return false;
+
+            network = new CidrNetwork(address, prefixLength);
+            return true;
+        }
+
+        /// <summary>
+        /// Checks whether the address falls within this network
+        /// </summary>
+        /// <param name="address">The address to check</param>
+        /// <returns>True if the address is inside the network; otherwise false</returns>
+        public bool Contains(IPAddress address)
+        {
+            if (address.AddressFamily != Address.AddressFamily)
+                return false;
+
+            byte[] networkBytes = Address.GetAddressBytes();
+            byte[] addressBytes = address.GetAddressBytes();
+
+            int fullBytes = PrefixLength / 8;
+            for (int i = 0; i < fullBytes; i++)
+            {
+                if (networkBytes[i] != addressBytes[i])
+                    return false;
+            }
+
+            int remainingBits = PrefixLength % 8;
+            if (remainingBits == 0)
+                return true;
+
+            int mask = 0xFF << (8 - remainingBits) & 0xFF;
+            return (networkBytes[fullBytes] & mask) == (addressBytes[fullBytes] & mask);
+        }
+
+        /// <summary>
+        /// Checks whether a peer's allowed IPs (e.g. 10.8.0.2/32) fall entirely within this network
+        /// </summary>
+        /// <param name="allowedIPs">The peer's allowed IPs</param>
+        /// <returns>True if the allowed IPs are inside the network; otherwise false</returns>
+        public bool Contains(string? allowedIPs)
+        {
+            CidrNetwork peerNetwork;
+            if (!TryParse(allowedIPs, out peerNetwork))
+                return false;
+
+            return peerNetwork.PrefixLength >= PrefixLength && Contains(peerNetwork.Address);
+        }
+
+        /// <summary>
+        /// Formats the network the way wg prints allowed IPs: host bits cleared and the prefix length always present, e.g. 10.8.0.0/24 for 10.8.0.2/24
+        /// </summary>
+        /// <returns>The network in canonical CIDR notation</returns>
+        public string ToCanonicalString()
+        {
+            byte[] bytes = Address.GetAddressBytes();
+            for (int bit = PrefixLength; bit < bytes.Length * 8; bit++)
+                bytes[bit / 8] &= (byte)~(0x80 >> (bit % 8));
+            return new IPAddress(bytes) + "/" + PrefixLength;
+        }
+
+        public bool IsIPv4 { get => Address.AddressFamily == AddressFamily.InterNetwork; }
+
+        /// <summary>
+        /// The first address of an IPv4 network as a number, e.g. 168296448 for 10.8.0.2/24 (10.8.0.0)
+        /// </summary>
+        /// <exception cref="InvalidOperationException">The network isn't IPv4</exception>
+        public long FirstAddress
+        {
+            get
+            {
+                if (!IsIPv4)
+                    throw new InvalidOperationException("Only IPv4 networks have a numeric address");
+
+                byte[] bytes = Address.GetAddressBytes();
+                long address = ((long)bytes[0] << 24) | ((long)bytes[1] << 16) | ((long)bytes[2] << 8) | bytes[3];
+                return address & ~(Size - 1);
+            }
+        }
+
+        /// <summary>
+        /// The last address of an IPv4 network as a number, e.g. 168296703 for 10.8.0.2/24 (10.8.0.255)
+        /// </summary>
+        /// <exception cref="InvalidOperationException">The network isn't IPv4</exception>
+        public long LastAddress { get => FirstAddress + Size - 1; }
+
+        private long Size { get => 1L << (32 - PrefixLength); } // number of addresses in an IPv4 network
+
+        /// <summary>
+        /// <para>The textual prefix that every IPv4 address inside this network starts with, e.g. "10.8." for 10.8.0.0/20</para>
+        ///
+        /// <para>Used to narrow a string column down with an index-friendly LIKE 'prefix%' before checking containment exactly</para>
+        /// </summary>
+        public string LiteralPrefix
+        {
+            get
+            {
+                if (Address.AddressFamily != AddressFamily.InterNetwork)
+                    return "";
+
+                byte[] bytes = Address.GetAddressBytes();
+                int fixedOctets = PrefixLength / 8;
+                if (fixedOctets == 4)
+                    return Address.ToString();
+
+                string prefix = "";
+                for (int i = 0; i < fixedOctets; i++)
+                    prefix += bytes[i] + ".";
+                return prefix;
+            }
+        }
+    }
+}
@@ -0,0 +1,35 @@
+﻿namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// Writes comma-separated values as described by RFC 4180
+    /// </summary>
+    public static class Csv
+    {
+        public const string ContentType = "text/csv";
+
+        /// <summary>
+        /// Writes one row. Fields containing commas, quotes, or line breaks are quoted.
+        /// </summary>
+        /// <param name="writer">The writer, e.g. over the response body</param>
+        /// <param name="fields">The fields of the row. Null is written as an empty field</param>
+        public static async Task WriteRowAsync(TextWriter writer, params string?[] fields)
+        {
+            for (int i = 0; i < fields.Length; i++)
+            {
+                if (i > 0)
+                    await writer.WriteAsync(',');
+                await writer.WriteAsync(Escape(fields[i]));
+            }
+            await writer.WriteAsync("\r\n");
+        }
+
+        private static string Escape(string? field)
+        {
+            if (string.IsNullOrEmpty(field))
+                return "";
+            if (field.IndexOfAny(new[] { ',', '"', '\r', '\n' }) == -1)
+                return field;
+            return "\"" + field.Replace("\"", "\"\"") + "\"";
+        }
+    }
+}
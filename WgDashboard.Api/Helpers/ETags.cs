@@ -0,0 +1,73 @@
+﻿using Microsoft.AspNetCore.Mvc;
+using Microsoft.Extensions.Primitives;
+using Microsoft.Net.Http.Headers;
+using System.Security.Cryptography;
+using System.Text.Json;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// <para>Strong entity tags for the JSON responses, so clients can revalidate with If-None-Match and update with If-Match</para>
+    ///
+    /// <para>The tag is a hash of the serialized response. A peer's profile includes its owner's name, so a row version on the peer alone
+    /// would not change when the owner is renamed; hashing what is actually sent always does.</para>
+    /// </summary>
+    public static class ETags
+    {
+        public static byte[] Serialize<T>(T value) => JsonSerializer.SerializeToUtf8Bytes(value, NdJson.SerializerOptions);
+
+        /// <summary>
+        /// Computes the entity tag of a serialized response
+        /// </summary>
+        /// <param name="json">The response body</param>
+        /// <returns>The quoted entity tag, e.g. "0123456789abcdef0123456789abcdef"</returns>
+        public static string Compute(byte[] json)
+        {
+            Span<byte> hash = stackalloc byte[SHA256.HashSizeInBytes];
+            SHA256.HashData(json, hash);
+            return $"\"{Convert.ToHexString(hash[..16]).ToLowerInvariant()}\"";
+        }
+
+        /// <summary>
+        /// Computes the entity tag that the value would be sent with
+        /// </summary>
+        public static string Compute<T>(T value) => Compute(Serialize(value));
+
+        /// <summary>
+        /// Checks an If-Match header against the current entity tag. Uses the strong comparison, so weak tags never match.
+        /// </summary>
+        /// <param name="ifMatch">The values of the If-Match header</param>
+        /// <param name="etag">The current entity tag</param>
+        /// <returns>True if the header is "*" or lists the entity tag; otherwise false</returns>
+        public static bool IfMatch(StringValues ifMatch, string etag)
+        {
+            foreach (string? value in ifMatch)
+            {
+                if (value is null)
+                    continue;
+
+                foreach (string tag in value.Split(',', StringSplitOptions.TrimEntries | StringSplitOptions.RemoveEmptyEntries))
+                {
+                    if (tag == "*" || tag == etag)
+                        return true;
+                }
+            }
+
+            return false;
+        }
+
+        /// <summary>
+        /// <para>Sends the value as JSON with its entity tag. Conditional GETs are answered by the framework: a matching If-None-Match gets a 304 with no body.</para>
+        ///
+        /// <para>The value is serialized once, both to hash it and to send it.</para>
+        /// </summary>
+        /// <param name="controller">The controller handling the request</param>
+        /// <param name="value">The response body</param>
+        /// <returns>An HTTP 200 or 304 response</returns>
+        public static ActionResult OkWithETag<T>(this ControllerBase controller, T value)
+        {
+            byte[] json = Serialize(value);
+            return controller.File(json, "application/json", null, new EntityTagHeaderValue(Compute(json)));
+        }
+    }
+}
@@ -0,0 +1,75 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+using System.Net;
+using System.Net.Sockets;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IIpAllocationSettings
+    {
+        public bool Enabled { get; }
+        public IReadOnlyList<CidrNetwork> Subnets { get; }
+        public IReadOnlyList<IPAddress> Reserved { get; }
+        public int LeaseMinutes { get; }
+        public int SweepIntervalMinutes { get; }
+    }
+
+    /// <summary>
+    /// <para>Settings for handing out peers' addresses, read from the optional "IpAllocation" section of appsettings.json</para>
+    ///
+    /// <para>Without any subnets, peers' allowed IPs are taken as given, as before. With subnets, a new peer without allowed IPs gets the next free
+    /// address, and a new peer with allowed IPs must ask for a single free address in one of the subnets.</para>
+    /// </summary>
+    public sealed class IpAllocationSettings : IIpAllocationSettings
+    {
+        private const int MAX_HOST_BITS = 24; // a /8 at most, so every subnet's index stays under 2 MB
+
+        public bool Enabled { get => Subnets.Count > 0; }
+        public IReadOnlyList<CidrNetwork> Subnets { get; private set; }
+        public IReadOnlyList<IPAddress> Reserved { get; private set; } // never handed out, e.g. the interface's own address
+        public int LeaseMinutes { get; private set; } = 10; // how long an address leased ahead of adding the peer is held
+        public int SweepIntervalMinutes { get; private set; } = 5;
+
+
+        public IpAllocationSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("IpAllocation");
+
+            var subnets = new List<CidrNetwork>();
+            foreach (string? subnet in section.GetSection("Subnets").Get<string?[]>() ?? Array.Empty<string?>())
+            {
+                CidrNetwork network;
+                if (!CidrNetwork.TryParse(subnet, out network))
+                    throw new InvalidConfigurationException($"IpAllocation:Subnets has an invalid subnet: {subnet}");
+                // a peer's allowed IPs hold at most 19 characters, which is too short for an IPv6 address
+                if (network.Address.AddressFamily != AddressFamily.InterNetwork)
+                    throw new InvalidConfigurationException($"IpAllocation:Subnets only supports IPv4 subnets: {subnet}");
+                if (32 - network.PrefixLength > MAX_HOST_BITS || network.PrefixLength > 30)
+                    throw new InvalidConfigurationException($"IpAllocation:Subnets must be between /{32 - MAX_HOST_BITS} and /30: {subnet}");
+                if (subnets.Any((other) => other.Contains(network.Address) || network.Contains(other.Address)))
+                    throw new InvalidConfigurationException($"IpAllocation:Subnets must not overlap: {subnet}");
+                subnets.Add(network);
+            }
+
+            var reserved = new List<IPAddress>();
+            foreach (string? address in section.GetSection("Reserved").Get<string?[]>() ?? Array.Empty<string?>())
+            {
+                IPAddress? parsedAddress;
+                if (!IPAddress.TryParse(address, out parsedAddress))
+                    throw new InvalidConfigurationException($"IpAllocation:Reserved has an invalid address: {address}");
+                reserved.Add(parsedAddress);
+            }
+
+            int? leaseMinutes = section.GetValue<int?>("LeaseMinutes");
+            int? sweepIntervalMinutes = section.GetValue<int?>("SweepIntervalMinutes");
+            if (leaseMinutes is not null && leaseMinutes < 1)
+                throw new InvalidConfigurationException("IpAllocation:LeaseMinutes must be at least 1");
+            if (sweepIntervalMinutes is not null && sweepIntervalMinutes < 1)
+                throw new InvalidConfigurationException("IpAllocation:SweepIntervalMinutes must be at least 1");
+
+            Subnets = subnets;
+            Reserved = reserved;
+            LeaseMinutes = leaseMinutes ?? LeaseMinutes;
+            SweepIntervalMinutes = sweepIntervalMinutes ?? SweepIntervalMinutes;
+        }
+    }
+}
@@ -0,0 +1,98 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+using System.Security.Cryptography;
+using System.Text;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IJwtSettings
+    {
+        public string? Issuer { get; }
+        public string? Audience { get; }
+        public int AccessTokenMinutes { get; }
+        public IReadOnlyList<JwtSigningKey> SigningKeys { get; }
+    }
+
+    /// <summary>
+    /// A key that signs and validates access tokens between NotBefore and Expires. Either bound can be left out.
+    /// </summary>
+    public sealed class JwtSigningKey
+    {
+        public string Id { get; init; } = ""; // sent as the token's "kid" header, so validation can pick the key without trying each one
+        public byte[] Key { get; init; } = Array.Empty<byte>();
+        public DateTime? NotBefore { get; init; } // UTC
+        public DateTime? Expires { get; init; } // UTC
+
+        public bool IsActiveAt(DateTime now) => (NotBefore is null || NotBefore <= now) && (Expires is null || now < Expires);
+    }
+
+    /// <summary>
+    /// <para>Settings for access tokens, read from the "JwtSettings" section of appsettings.json</para>
+    ///
+    /// <para>"Key" is a single signing key. To rotate keys without logging everyone out, list them under "Keys" instead, each with a "Key" and
+    /// optionally an "Id", "NotBefore", and "Expires". The newest key that is active signs new tokens, and every key that hasn't expired
+    /// validates them, so a new key can be added ahead of time and the old one kept until the last token it signed has expired.</para>
+    /// </summary>
+    public sealed class JwtSettings : IJwtSettings
+    {
+        private const int MIN_KEY_BYTES = 32; // HMAC-SHA256 needs a key of at least 256 bits
+
+        public string? Issuer { get; private set; }
+        public string? Audience { get; private set; }
+        public int AccessTokenMinutes { get; private set; } = 15;
+        public IReadOnlyList<JwtSigningKey> SigningKeys { get; private set; }
+
+
+        public JwtSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("JwtSettings");
+
+            Issuer = section.GetValue<string?>("Issuer");
+            Audience = section.GetValue<string?>("Audience");
+            int? accessTokenMinutes = section.GetValue<int?>("AccessTokenMinutes");
+            if (accessTokenMinutes is not null && accessTokenMinutes < 1)
+                throw new InvalidConfigurationException("JwtSettings:AccessTokenMinutes must be at least 1");
+            AccessTokenMinutes = accessTokenMinutes ?? AccessTokenMinutes;
+
+            var signingKeys = new List<JwtSigningKey>();
+            string? key = section.GetValue<string?>("Key");
+            if (!string.IsNullOrEmpty(key))
+                signingKeys.Add(CreateKey("JwtSettings:Key", null, key, null, null));
+
+            foreach (IConfigurationSection keySection in section.GetSection("Keys").GetChildren())
+            {
+                string? ringKey = keySection.GetValue<string?>("Key");
+                if (string.IsNullOrEmpty(ringKey))
+                    throw new InvalidConfigurationException($"JwtSettings:Keys:{keySection.Key}:Key is a required setting");
+                signingKeys.Add(CreateKey($"JwtSettings:Keys:{keySection.Key}", keySection.GetValue<string?>("Id"), ringKey,
+                    keySection.GetValue<DateTime?>("NotBefore"), keySection.GetValue<DateTime?>("Expires")));
+            }
+
+            if (signingKeys.Count == 0)
+                throw new InvalidConfigurationException("JWT signing key is a required setting");
+            if (signingKeys.Select((signingKey) => signingKey.Id).Distinct().Count() != signingKeys.Count)
+                throw new InvalidConfigurationException("JwtSettings:Keys must have unique IDs");
+            if (!signingKeys.Any((signingKey) => signingKey.IsActiveAt(DateTime.UtcNow)))
+                throw new InvalidConfigurationException("At least one JWT signing key must be active now");
+
+            SigningKeys = signingKeys;
+        }
+
+        private static JwtSigningKey CreateKey(string setting, string? id, string key, DateTime? notBefore, DateTime? expires)
+        {
+            byte[] keyBytes = Encoding.UTF8.GetBytes(key);
+            if (keyBytes.Length < MIN_KEY_BYTES)
+                throw new InvalidConfigurationException($"{setting} must be at least {MIN_KEY_BYTES} bytes long");
+            if (notBefore is not null && expires is not null && expires <= notBefore)
+                throw new InvalidConfigurationException($"{setting}:Expires must be after NotBefore");
+
+            return new JwtSigningKey()
+            {
+                // without an ID, derive one from the key so that every API node agrees on it
+                Id = string.IsNullOrEmpty(id) ? Convert.ToHexString(SHA256.HashData(keyBytes), 0, 8).ToLowerInvariant() : id,
+                Key = keyBytes,
+                NotBefore = notBefore?.ToUniversalTime(),
+                Expires = expires?.ToUniversalTime(),
+            };
+        }
+    }
+}
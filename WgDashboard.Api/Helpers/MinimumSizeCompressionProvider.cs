@@ -0,0 +1,30 @@
+﻿using Microsoft.AspNetCore.ResponseCompression;
+using Microsoft.Extensions.Options;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// <para>Compresses responses like the default provider, except ones whose length is known up front and is below the minimum size</para>
+    ///
+    /// <para>Streamed responses (e.g. exports and bulk imports) have no length up front and are always compressed</para>
+    /// </summary>
+    public sealed class MinimumSizeCompressionProvider : ResponseCompressionProvider
+    {
+        private readonly int _minimumSizeBytes;
+
+        public MinimumSizeCompressionProvider(IServiceProvider services, IOptions<ResponseCompressionOptions> options, IResponseCompressionSettings settings)
+            : base(services, options)
+        {
+            this._minimumSizeBytes = settings.MinimumSizeBytes;
+        }
+
+        public override bool ShouldCompressResponse(HttpContext context)
+        {
+            long? length = context.Response.ContentLength;
+            if (length is not null && length < _minimumSizeBytes)
+                return false;
+
+            return base.ShouldCompressResponse(context);
+        }
+    }
+}
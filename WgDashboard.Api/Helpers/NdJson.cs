@@ -0,0 +1,107 @@
+﻿using System.Runtime.CompilerServices;
+using System.Text.Json;
+using System.Text.Json.Serialization.Metadata;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// Reads and writes newline-delimited JSON, i.e. one JSON object per line. Also reads JSON arrays item by item with the same tolerance for bad items
+    /// </summary>
+    public static class NdJson
+    {
+        public const string ContentType = "application/x-ndjson";
+
+        // same naming and casing rules and the same source-generated serializers as the controllers
+        public static readonly JsonSerializerOptions SerializerOptions = new JsonSerializerOptions(JsonSerializerDefaults.Web)
+        {
+            TypeInfoResolver = JsonTypeInfoResolver.Combine(ApiJsonContext.Default, new DefaultJsonTypeInfoResolver()),
+        };
+
+        public static bool IsNdJson(string? contentType) => contentType is not null && contentType.StartsWith(ContentType, StringComparison.OrdinalIgnoreCase);
+
+        /// <summary>
+        /// Reads one item per line as the lines arrive. A line that is not a valid item is read as null, so the remaining lines can still be read.
+        /// </summary>
+        /// <typeparam name="T">The type of the items</typeparam>
+        /// <param name="stream">The stream to read, e.g. the request body</param>
+        /// <param name="cancellationToken">Stops reading when cancelled</param>
+        /// <returns>An async enumerable of the items</returns>
+        public static async IAsyncEnumerable<T?> ReadAsync<T>(Stream stream, [EnumeratorCancellation] CancellationToken cancellationToken = default) where T : class
+        {
+            using var reader = new StreamReader(stream);
+            string? line;
+            while ((line = await reader.ReadLineAsync(cancellationToken)) is not null)
+            {
+                if (string.IsNullOrWhiteSpace(line))
+                    continue;
+
+                T? item;
+                try
+                {
+                    item = JsonSerializer.Deserialize<T>(line, SerializerOptions);
+                }
+                catch (JsonException)
+                    { item = null; }
+
+                yield return item;
+            }
+        }
+
+        /// <summary>
+        /// <para>Reads the items of a JSON array as they arrive. An item that is not a valid T, e.g. one with a field of the wrong type, is read as null,
+        /// so the remaining items can still be read</para>
+        ///
+        /// <para>If the array itself is broken, e.g. it is cut off or isn't an array, one null is read in place of whatever could not be read
+        /// and reading stops. Items are read in chunks, so complete items in the same chunk as the break are dropped with it, never half-read</para>
+        /// </summary>
+        /// <typeparam name="T">The type of the items</typeparam>
+        /// <param name="stream">The stream to read, e.g. the request body</param>
+        /// <param name="cancellationToken">Stops reading when cancelled</param>
+        /// <returns>An async enumerable of the items</returns>
+        public static async IAsyncEnumerable<T?> ReadArrayAsync<T>(Stream stream, [EnumeratorCancellation] CancellationToken cancellationToken = default) where T : class
+        {
+            // each item is first read as a JsonElement, which only fails on broken JSON, and then converted on its own
+            await using IAsyncEnumerator<JsonElement> elements = JsonSerializer.DeserializeAsyncEnumerable<JsonElement>(stream, SerializerOptions, cancellationToken)
+                .GetAsyncEnumerator(cancellationToken);
+            while (true)
+            {
+                bool broken = false;
+                try
+                {
+                    if (!await elements.MoveNextAsync())
+                        yield break;
+                }
+                catch (JsonException)
+                    { broken = true; }
+
+                if (broken)
+                {
+                    yield return null;
+                    yield break;
+                }
+
+                T? item;
+                try
+                {
+                    item = elements.Current.Deserialize<T>(SerializerOptions);
+                }
+                catch (JsonException)
+                    { item = null; }
+
+                yield return item;
+            }
+        }
+
+        /// <summary>
+        /// Writes an item as one line
+        /// </summary>
+        /// <typeparam name="T">The type of the item</typeparam>
+        /// <param name="writer">The writer, e.g. over the response body</param>
+        /// <param name="item">The item to write</param>
+        public static async Task WriteAsync<T>(TextWriter writer, T item)
+        {
+            await writer.WriteAsync(JsonSerializer.Serialize(item, SerializerOptions));
+            await writer.WriteAsync('\n');
+        }
+    }
+}
@@ -0,0 +1,62 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IPasswordHashingSettings
+    {
+        public int WorkerCount { get; }
+        public int QueueCapacity { get; }
+        public int RetryAfterSeconds { get; }
+        public int WorkFactor { get; }
+        public bool BenchmarkOnStartup { get; }
+        public int LoginLatencyBudgetMs { get; }
+    }
+
+    /// <summary>
+    /// Settings for the password hashing workers, read from the optional "PasswordHashing" section of appsettings.json
+    /// </summary>
+    public sealed class PasswordHashingSettings : IPasswordHashingSettings
+    {
+        // leave half of the cores to request processing so that a burst of logins can't starve the rest of the API
+        public int WorkerCount { get; private set; } = Math.Max(1, Environment.ProcessorCount / 2);
+        public int QueueCapacity { get; private set; } = 64;
+        public int RetryAfterSeconds { get; private set; } = 2;
+        public int WorkFactor { get; private set; } = 12;
+        public bool BenchmarkOnStartup { get; private set; } = false;
+        public int LoginLatencyBudgetMs { get; private set; } = 250; // only used to recommend a work factor after the benchmark
+
+        public const int MinWorkFactor = 4; // limits of BCrypt itself
+        public const int MaxWorkFactor = 31;
+
+
+        public PasswordHashingSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("PasswordHashing");
+
+            int? workerCount = section.GetValue<int?>("WorkerCount");
+            int? queueCapacity = section.GetValue<int?>("QueueCapacity");
+            int? retryAfterSeconds = section.GetValue<int?>("RetryAfterSeconds");
+            int? workFactor = section.GetValue<int?>("WorkFactor");
+            bool? benchmarkOnStartup = section.GetValue<bool?>("BenchmarkOnStartup");
+            int? loginLatencyBudgetMs = section.GetValue<int?>("LoginLatencyBudgetMs");
+
+            if (workerCount is not null && (workerCount < 1 || workerCount > Environment.ProcessorCount))
+                throw new InvalidConfigurationException($"PasswordHashing:WorkerCount must be between 1 and {Environment.ProcessorCount}");
+            if (queueCapacity is not null && queueCapacity < 1)
+                throw new InvalidConfigurationException("PasswordHashing:QueueCapacity must be at least 1");
+            if (retryAfterSeconds is not null && retryAfterSeconds < 1)
+                throw new InvalidConfigurationException("PasswordHashing:RetryAfterSeconds must be at least 1");
+            if (workFactor is not null && (workFactor < MinWorkFactor || workFactor > MaxWorkFactor))
+                throw new InvalidConfigurationException($"PasswordHashing:WorkFactor must be between {MinWorkFactor} and {MaxWorkFactor}");
+            if (loginLatencyBudgetMs is not null && loginLatencyBudgetMs < 1)
+                throw new InvalidConfigurationException("PasswordHashing:LoginLatencyBudgetMs must be at least 1");
+
+            WorkerCount = workerCount ?? WorkerCount;
+            QueueCapacity = queueCapacity ?? QueueCapacity;
+            RetryAfterSeconds = retryAfterSeconds ?? RetryAfterSeconds;
+            WorkFactor = workFactor ?? WorkFactor;
+            BenchmarkOnStartup = benchmarkOnStartup ?? BenchmarkOnStartup;
+            LoginLatencyBudgetMs = loginLatencyBudgetMs ?? LoginLatencyBudgetMs;
+        }
+    }
+}
@@ -0,0 +1,65 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IPeerTelemetrySettings
+    {
+        public bool Enabled { get; }
+        public int PollSeconds { get; }
+        public int RawSamples { get; }
+        public int DownsampleSeconds { get; }
+        public int DownsampledSamples { get; }
+        public int PeerMapRefreshSeconds { get; }
+        public string? DumpFile { get; }
+    }
+
+    /// <summary>
+    /// <para>Settings for collecting handshakes and transfer counters from the WireGuard interface, read from the optional "PeerTelemetry" section of appsettings.json</para>
+    ///
+    /// <para>Every peer keeps the last RawSamples polls, plus one sample per DownsampleSeconds for the last DownsampledSamples of those periods.
+    /// Each sample takes 20 bytes, so the defaults cost about 4 KB per peer, or 40 MB for 10,000 peers.</para>
+    /// </summary>
+    public sealed class PeerTelemetrySettings : IPeerTelemetrySettings
+    {
+        public bool Enabled { get; private set; } = false;
+        public int PollSeconds { get; private set; } = 10;
+        public int RawSamples { get; private set; } = 60; // 10 minutes at the default poll interval
+        public int DownsampleSeconds { get; private set; } = 600;
+        public int DownsampledSamples { get; private set; } = 144; // 24 hours at the default downsample period
+        public int PeerMapRefreshSeconds { get; private set; } = 60; // how soon a new peer's stats show up
+        public string? DumpFile { get; private set; } // read the output of "wg show <interface> dump" from this file instead of running wg, e.g. for testing
+
+
+        public PeerTelemetrySettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("PeerTelemetry");
+
+            bool? enabled = section.GetValue<bool?>("Enabled");
+            int? pollSeconds = section.GetValue<int?>("PollSeconds");
+            int? rawSamples = section.GetValue<int?>("RawSamples");
+            int? downsampleSeconds = section.GetValue<int?>("DownsampleSeconds");
+            int? downsampledSamples = section.GetValue<int?>("DownsampledSamples");
+            int? peerMapRefreshSeconds = section.GetValue<int?>("PeerMapRefreshSeconds");
+            string? dumpFile = section.GetValue<string?>("DumpFile");
+
+            if (pollSeconds is not null && pollSeconds < 1)
+                throw new InvalidConfigurationException("PeerTelemetry:PollSeconds must be at least 1");
+            if (rawSamples is not null && rawSamples < 1)
+                throw new InvalidConfigurationException("PeerTelemetry:RawSamples must be at least 1");
+            if (downsampleSeconds is not null && downsampleSeconds < (pollSeconds ?? PollSeconds))
+                throw new InvalidConfigurationException("PeerTelemetry:DownsampleSeconds must be at least PollSeconds");
+            if (downsampledSamples is not null && downsampledSamples < 0)
+                throw new InvalidConfigurationException("PeerTelemetry:DownsampledSamples must not be negative");
+            if (peerMapRefreshSeconds is not null && peerMapRefreshSeconds < 1)
+                throw new InvalidConfigurationException("PeerTelemetry:PeerMapRefreshSeconds must be at least 1");
+
+            Enabled = enabled ?? Enabled;
+            PollSeconds = pollSeconds ?? PollSeconds;
+            RawSamples = rawSamples ?? RawSamples;
+            DownsampleSeconds = downsampleSeconds ?? Math.Max(DownsampleSeconds, PollSeconds);
+            DownsampledSamples = downsampledSamples ?? DownsampledSamples;
+            PeerMapRefreshSeconds = peerMapRefreshSeconds ?? PeerMapRefreshSeconds;
+            DumpFile = string.IsNullOrWhiteSpace(dumpFile) ? null : dumpFile;
+        }
+    }
+}
@@ -0,0 +1,52 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IProfileCacheSettings
+    {
+        public bool Enabled { get; }
+        public int SizeLimit { get; }
+        public int TtlSeconds { get; }
+        public bool Distributed { get; }
+        public int LocalTtlSecondsWhenDistributed { get; }
+    }
+
+    /// <summary>
+    /// Settings for the peer and user profile cache, read from the optional "ProfileCache" section of appsettings.json
+    /// </summary>
+    public sealed class ProfileCacheSettings : IProfileCacheSettings
+    {
+        public bool Enabled { get; private set; } = true;
+        public int SizeLimit { get; private set; } = 10000; // number of profiles kept in memory
+        public int TtlSeconds { get; private set; } = 300;
+        public bool Distributed { get; private set; } = false; // share the cache between API nodes through IDistributedCache
+
+        // other nodes can't evict this node's in-memory entries, so keep them briefly when the cache is shared
+        public int LocalTtlSecondsWhenDistributed { get; private set; } = 5;
+
+
+        public ProfileCacheSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("ProfileCache");
+
+            bool? enabled = section.GetValue<bool?>("Enabled");
+            int? sizeLimit = section.GetValue<int?>("SizeLimit");
+            int? ttlSeconds = section.GetValue<int?>("TtlSeconds");
+            bool? distributed = section.GetValue<bool?>("Distributed");
+            int? localTtlSeconds = section.GetValue<int?>("LocalTtlSecondsWhenDistributed");
+
+            if (sizeLimit is not null && sizeLimit < 1)
+                throw new InvalidConfigurationException("ProfileCache:SizeLimit must be at least 1");
+            if (ttlSeconds is not null && ttlSeconds < 1)
+                throw new InvalidConfigurationException("ProfileCache:TtlSeconds must be at least 1");
+            if (localTtlSeconds is not null && localTtlSeconds < 1)
+                throw new InvalidConfigurationException("ProfileCache:LocalTtlSecondsWhenDistributed must be at least 1");
+
+            Enabled = enabled ?? Enabled;
+            SizeLimit = sizeLimit ?? SizeLimit;
+            TtlSeconds = ttlSeconds ?? TtlSeconds;
+            Distributed = distributed ?? Distributed;
+            LocalTtlSecondsWhenDistributed = localTtlSeconds ?? LocalTtlSecondsWhenDistributed;
+        }
+    }
+}
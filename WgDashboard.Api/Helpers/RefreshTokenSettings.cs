@@ -0,0 +1,42 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IRefreshTokenSettings
+    {
+        public double LifetimeDays { get; }
+        public int SweepIntervalMinutes { get; }
+        public int SweepBatchSize { get; }
+    }
+
+    /// <summary>
+    /// Settings for refresh tokens and for sweeping expired ones out of the database, read from the optional "RefreshTokens" section of appsettings.json
+    /// </summary>
+    public sealed class RefreshTokenSettings : IRefreshTokenSettings
+    {
+        public double LifetimeDays { get; private set; } = 2.0;
+        public int SweepIntervalMinutes { get; private set; } = 60;
+        public int SweepBatchSize { get; private set; } = 1000; // rows deleted per statement, so a large sweep doesn't hold locks for long
+
+
+        public RefreshTokenSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("RefreshTokens");
+
+            double? lifetimeDays = section.GetValue<double?>("LifetimeDays");
+            int? sweepIntervalMinutes = section.GetValue<int?>("SweepIntervalMinutes");
+            int? sweepBatchSize = section.GetValue<int?>("SweepBatchSize");
+
+            if (lifetimeDays is not null && lifetimeDays <= 0)
+                throw new InvalidConfigurationException("RefreshTokens:LifetimeDays must be greater than 0");
+            if (sweepIntervalMinutes is not null && sweepIntervalMinutes < 1)
+                throw new InvalidConfigurationException("RefreshTokens:SweepIntervalMinutes must be at least 1");
+            if (sweepBatchSize is not null && sweepBatchSize < 1)
+                throw new InvalidConfigurationException("RefreshTokens:SweepBatchSize must be at least 1");
+
+            LifetimeDays = lifetimeDays ?? LifetimeDays;
+            SweepIntervalMinutes = sweepIntervalMinutes ?? SweepIntervalMinutes;
+            SweepBatchSize = sweepBatchSize ?? SweepBatchSize;
+        }
+    }
+}
@@ -0,0 +1,65 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+using System.IO.Compression;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IResponseCompressionSettings
+    {
+        public bool Enabled { get; }
+        public int MinimumSizeBytes { get; }
+        public CompressionLevel Level { get; }
+    }
+
+    /// <summary>
+    /// Settings for Brotli/gzip response compression, read from the optional "ResponseCompression" section of appsettings.json
+    /// </summary>
+    public sealed class ResponseCompressionSettings : IResponseCompressionSettings
+    {
+        // only the bulk lists and exports are compressed. they are where the size is, and they hold no secrets. compressing a secret, e.g. a JWT
+        // from /api/auth, next to anything an attacker can influence leaks it through the compressed size (BREACH), even over HTTPS
+        public static readonly string[] CompressedPaths =
+        {
+            "/api/peers",
+            "/api/peers/search",
+            "/api/peers/export",
+            "/api/peers/stats",
+            "/api/peers/bulk",
+            "/api/users",
+        };
+
+        public bool Enabled { get; private set; } = true;
+
+        // below about one packet, compressing costs CPU without saving a round trip
+        public int MinimumSizeBytes { get; private set; } = 1024;
+        public CompressionLevel Level { get; private set; } = CompressionLevel.Fastest;
+
+
+        /// <summary>
+        /// Checks whether the response to a request for the path may be compressed
+        /// </summary>
+        /// <param name="path">The request's path</param>
+        /// <returns>True if the path is one of CompressedPaths; otherwise false</returns>
+        public static bool IsCompressedPath(PathString path) =>
+            CompressedPaths.Any((compressed) => path.Equals(compressed, StringComparison.OrdinalIgnoreCase) || path.Equals(compressed + "/", StringComparison.OrdinalIgnoreCase));
+
+
+        public ResponseCompressionSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("ResponseCompression");
+
+            bool? enabled = section.GetValue<bool?>("Enabled");
+            int? minimumSizeBytes = section.GetValue<int?>("MinimumSizeBytes");
+            string? level = section.GetValue<string?>("Level");
+
+            if (minimumSizeBytes is not null && minimumSizeBytes < 0)
+                throw new InvalidConfigurationException("ResponseCompression:MinimumSizeBytes must not be negative");
+            CompressionLevel parsedLevel = Level;
+            if (level is not null && (!Enum.TryParse(level, true, out parsedLevel) || parsedLevel == CompressionLevel.NoCompression))
+                throw new InvalidConfigurationException("ResponseCompression:Level must be Fastest, Optimal, or SmallestSize");
+
+            Enabled = enabled ?? Enabled;
+            MinimumSizeBytes = minimumSizeBytes ?? MinimumSizeBytes;
+            Level = parsedLevel;
+        }
+    }
+}
@@ -0,0 +1,35 @@
+﻿using System.Text;
+
+namespace WgDashboard.Api.Helpers
+{
+    /// <summary>
+    /// Formats server-sent events (text/event-stream). A frame is encoded once and the same bytes are written to every client
+    /// </summary>
+    public static class ServerSentEvents
+    {
+        public const string ContentType = "text/event-stream";
+
+        // tells the client to drop what it has and read everything again
+        public static readonly byte[] Reset = Frame(null, "reset", "{}");
+
+        // a comment line. keeps proxies from closing a quiet stream and lets the server notice clients that went away
+        public static readonly byte[] Heartbeat = Encoding.UTF8.GetBytes(": heartbeat\n\n");
+
+        /// <summary>
+        /// Encodes one event
+        /// </summary>
+        /// <param name="id">The event's ID, sent back by the client as Last-Event-ID when it reconnects</param>
+        /// <param name="eventName">The event's type</param>
+        /// <param name="data">The event's data. Must not contain line breaks, e.g. JSON without indentation</param>
+        /// <returns>The UTF-8 encoded frame</returns>
+        public static byte[] Frame(string? id, string eventName, string data)
+        {
+            var frame = new StringBuilder();
+            if (id is not null)
+                frame.Append("id: ").Append(id).Append('\n');
+            frame.Append("event: ").Append(eventName).Append('\n');
+            frame.Append("data: ").Append(data).Append("\n\n");
+            return Encoding.UTF8.GetBytes(frame.ToString());
+        }
+    }
+}
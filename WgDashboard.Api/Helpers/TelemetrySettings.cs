@@ -0,0 +1,69 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface ITelemetrySettings
+    {
+        public bool Enabled { get; }
+        public string ServiceName { get; }
+        public string? MetricsPath { get; }
+        public int? MetricsPort { get; }
+        public Uri? OtlpEndpoint { get; }
+        public string OtlpProtocol { get; }
+    }
+
+    /// <summary>
+    /// Settings for metrics and tracing, read from the optional "Telemetry" section of appsettings.json
+    /// </summary>
+    public sealed class TelemetrySettings : ITelemetrySettings
+    {
+        public const string GrpcProtocol = "grpc";
+        public const string HttpProtobufProtocol = "http/protobuf";
+
+        public bool Enabled { get; private set; } = true;
+        public string ServiceName { get; private set; } = "wgdashboard-api";
+
+        // where Prometheus scrapes the metrics from. null or empty turns the endpoint off
+        public string? MetricsPath { get; private set; } = "/metrics";
+
+        // a separate port that serves the metrics without a token, and nothing else. keep it off the reverse proxy.
+        // when null, the metrics are served on the API's port to admins only, since they show routes, traffic, and token activity
+        public int? MetricsPort { get; private set; } = null;
+
+        // where to push metrics and traces to, e.g. http://localhost:4317 for an OpenTelemetry collector. traces are only recorded when this is set
+        public Uri? OtlpEndpoint { get; private set; } = null;
+        public string OtlpProtocol { get; private set; } = GrpcProtocol;
+
+
+        public TelemetrySettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("Telemetry");
+
+            bool? enabled = section.GetValue<bool?>("Enabled");
+            string? serviceName = section.GetValue<string?>("ServiceName");
+            string? metricsPath = section.GetValue<string?>("MetricsPath");
+            int? metricsPort = section.GetValue<int?>("MetricsPort");
+            string? otlpEndpoint = section.GetValue<string?>("OtlpEndpoint");
+            string? otlpProtocol = section.GetValue<string?>("OtlpProtocol");
+
+            if (serviceName is not null && serviceName.Trim() == "")
+                throw new InvalidConfigurationException("Telemetry:ServiceName must not be empty");
+            if (!string.IsNullOrEmpty(metricsPath) && !metricsPath.StartsWith('/'))
+                throw new InvalidConfigurationException("Telemetry:MetricsPath must start with '/'");
+            if (metricsPort is not null && (metricsPort < 1 || metricsPort > 65535))
+                throw new InvalidConfigurationException("Telemetry:MetricsPort must be between 1 and 65535");
+            Uri? parsedEndpoint = null;
+            if (!string.IsNullOrEmpty(otlpEndpoint) && !Uri.TryCreate(otlpEndpoint, UriKind.Absolute, out parsedEndpoint))
+                throw new InvalidConfigurationException("Telemetry:OtlpEndpoint must be an absolute URL");
+            if (otlpProtocol is not null && otlpProtocol != GrpcProtocol && otlpProtocol != HttpProtobufProtocol)
+                throw new InvalidConfigurationException($"Telemetry:OtlpProtocol must be {GrpcProtocol} or {HttpProtobufProtocol}");
+
+            Enabled = enabled ?? Enabled;
+            ServiceName = serviceName ?? ServiceName;
+            MetricsPath = metricsPath is null ? MetricsPath : metricsPath == "" ? null : metricsPath;
+            MetricsPort = metricsPort;
+            OtlpEndpoint = parsedEndpoint;
+            OtlpProtocol = otlpProtocol ?? OtlpProtocol;
+        }
+    }
+}
@@ -0,0 +1,72 @@
+﻿using Microsoft.IdentityModel.Protocols.Configuration;
+
+namespace WgDashboard.Api.Helpers
+{
+    public interface IWireguardSyncSettings
+    {
+        public bool Enabled { get; }
+        public string Interface { get; }
+        public string WgPath { get; }
+        public int DebounceMilliseconds { get; }
+        public int MaxDelayMilliseconds { get; }
+        public int ResyncMinutes { get; }
+        public int MaxPeersPerCommand { get; }
+        public int CommandTimeoutSeconds { get; }
+    }
+
+    /// <summary>
+    /// Settings for pushing the peers in the database to the WireGuard interface, read from the optional "WireguardSync" section of appsettings.json
+    /// </summary>
+    public sealed class WireguardSyncSettings : IWireguardSyncSettings
+    {
+        public bool Enabled { get; private set; } = false; // off unless the API runs next to the interface with the rights to change it
+        public string Interface { get; private set; } = "wg0";
+        public string WgPath { get; private set; } = "wg"; // point this at a fake for testing
+        public int DebounceMilliseconds { get; private set; } = 500; // how long the API has to be quiet before changes are applied
+        public int MaxDelayMilliseconds { get; private set; } = 5000; // apply anyway after this long, so constant writes can't hold changes back forever
+        public int ResyncMinutes { get; private set; } = 5; // also sync this often, to undo changes made to the interface outside of the API
+        public int MaxPeersPerCommand { get; private set; } = 1000; // keeps each "wg set" well under the OS limit on argument length
+        public int CommandTimeoutSeconds { get; private set; } = 30;
+
+
+        public WireguardSyncSettings(IConfiguration config)
+        {
+            IConfigurationSection section = config.GetSection("WireguardSync");
+
+            bool? enabled = section.GetValue<bool?>("Enabled");
+            string? wireguardInterface = section.GetValue<string?>("Interface");
+            string? wgPath = section.GetValue<string?>("WgPath");
+            int? debounceMilliseconds = section.GetValue<int?>("DebounceMilliseconds");
+            int? maxDelayMilliseconds = section.GetValue<int?>("MaxDelayMilliseconds");
+            int? resyncMinutes = section.GetValue<int?>("ResyncMinutes");
+            int? maxPeersPerCommand = section.GetValue<int?>("MaxPeersPerCommand");
+            int? commandTimeoutSeconds = section.GetValue<int?>("CommandTimeoutSeconds");
+
+            // the interface name is passed to wg as an argument, so only allow what Linux allows for interface names
+            if (wireguardInterface is not null && (wireguardInterface.Length < 1 || wireguardInterface.Length > 15 || wireguardInterface.StartsWith('-')
+                    || wireguardInterface.Any((c) => char.IsWhiteSpace(c) || c == '/')))
+                throw new InvalidConfigurationException("WireguardSync:Interface must be a valid interface name");
+            if (wgPath is not null && wgPath.Trim() == "")
+                throw new InvalidConfigurationException("WireguardSync:WgPath must not be empty");
+            if (debounceMilliseconds is not null && debounceMilliseconds < 0)
+                throw new InvalidConfigurationException("WireguardSync:DebounceMilliseconds must not be negative");
+            if (maxDelayMilliseconds is not null && maxDelayMilliseconds < (debounceMilliseconds ?? DebounceMilliseconds))
+                throw new InvalidConfigurationException("WireguardSync:MaxDelayMilliseconds must be at least DebounceMilliseconds");
+            if (resyncMinutes is not null && resyncMinutes < 1)
+                throw new InvalidConfigurationException("WireguardSync:ResyncMinutes must be at least 1");
+            if (maxPeersPerCommand is not null && maxPeersPerCommand < 1)
+                throw new InvalidConfigurationException("WireguardSync:MaxPeersPerCommand must be at least 1");
+            if (commandTimeoutSeconds is not null && commandTimeoutSeconds < 1)
+                throw new InvalidConfigurationException("WireguardSync:CommandTimeoutSeconds must be at least 1");
+
+            Enabled = enabled ?? Enabled;
+            Interface = wireguardInterface ?? Interface;
+            WgPath = wgPath ?? WgPath;
+            DebounceMilliseconds = debounceMilliseconds ?? DebounceMilliseconds;
+            MaxDelayMilliseconds = Math.Max(maxDelayMilliseconds ?? MaxDelayMilliseconds, DebounceMilliseconds);
+            ResyncMinutes = resyncMinutes ?? ResyncMinutes;
+            MaxPeersPerCommand = maxPeersPerCommand ?? MaxPeersPerCommand;
+            CommandTimeoutSeconds = commandTimeoutSeconds ?? CommandTimeoutSeconds;
+        }
+    }
+}
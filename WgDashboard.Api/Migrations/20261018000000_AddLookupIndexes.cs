@@ -0,0 +1,81 @@
+﻿using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddLookupIndexes : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // raw refresh tokens are replaced by their hashes, so everyone has to log in again
+            migrationBuilder.DropColumn(
+                name: "RefreshToken",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.AddColumn<string>(
+                name: "RefreshTokenHash",
+                schema: "dbo",
+                table: "User",
+                type: "nvarchar(64)",
+                maxLength: 64,
+                nullable: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_User_RefreshTokenHash",
+                schema: "dbo",
+                table: "User",
+                column: "RefreshTokenHash",
+                unique: true,
+                filter: "[RefreshTokenHash] IS NOT NULL");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_User_Username",
+                schema: "dbo",
+                table: "User",
+                column: "Username",
+                unique: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_Peer_PublicKey",
+                schema: "dbo",
+                table: "Peer",
+                column: "PublicKey",
+                unique: true);
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropIndex(
+                name: "IX_User_RefreshTokenHash",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.DropIndex(
+                name: "IX_User_Username",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.DropIndex(
+                name: "IX_Peer_PublicKey",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.DropColumn(
+                name: "RefreshTokenHash",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.AddColumn<string>(
+                name: "RefreshToken",
+                schema: "dbo",
+                table: "User",
+                type: "nvarchar(max)",
+                nullable: true);
+        }
+    }
+}
@@ -0,0 +1,88 @@
+﻿using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddPeerSlot : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // the check constraint allows 5 peers per owner. stop before changing anything if an owner already has more,
+            // and name the owners so their extra peers can be deleted before running the migration again
+            migrationBuilder.Sql(@"
+                IF EXISTS (SELECT 1 FROM [dbo].[Peer] GROUP BY [OwnerId] HAVING COUNT(*) > 5)
+                BEGIN
+                    DECLARE @Owners NVARCHAR(MAX) = (
+                        SELECT STRING_AGG(CAST([OwnerId] AS NVARCHAR(MAX)), ', ')
+                        FROM (SELECT [OwnerId] FROM [dbo].[Peer] GROUP BY [OwnerId] HAVING COUNT(*) > 5) AS OverLimit
+                    );
+                    DECLARE @Message NVARCHAR(2048) = LEFT(CONCAT(
+                        N'Cannot add peer slots: users with these IDs own more than 5 peers: ', @Owners,
+                        N'. Delete peers until each user owns at most 5, then run the migration again.'), 2048);
+                    THROW 50000, @Message, 1;
+                END");
+
+            migrationBuilder.AddColumn<int>(
+                name: "Slot",
+                schema: "dbo",
+                table: "Peer",
+                type: "int",
+                nullable: false,
+                defaultValue: 0);
+
+            // number each owner's existing peers 0, 1, 2, ... so the unique index can be created
+            migrationBuilder.Sql(@"
+                WITH NumberedPeers AS (
+                    SELECT [Slot], ROW_NUMBER() OVER (PARTITION BY [OwnerId] ORDER BY [Id]) - 1 AS [NewSlot]
+                    FROM [dbo].[Peer]
+                )
+                UPDATE NumberedPeers SET [Slot] = [NewSlot];");
+
+            migrationBuilder.DropIndex(
+                name: "IX_Peer_OwnerId",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_Peer_OwnerId_Slot",
+                schema: "dbo",
+                table: "Peer",
+                columns: new[] { "OwnerId", "Slot" },
+                unique: true);
+
+            migrationBuilder.AddCheckConstraint(
+                name: "CK_Peer_Slot",
+                schema: "dbo",
+                table: "Peer",
+                sql: "[Slot] >= 0 AND [Slot] < 5");
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropCheckConstraint(
+                name: "CK_Peer_Slot",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.DropIndex(
+                name: "IX_Peer_OwnerId_Slot",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.DropColumn(
+                name: "Slot",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_Peer_OwnerId",
+                schema: "dbo",
+                table: "Peer",
+                column: "OwnerId");
+        }
+    }
+}
@@ -0,0 +1,46 @@
+﻿using System;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddConcurrencyStamps : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // existing rows each get their own stamp
+            migrationBuilder.AddColumn<Guid>(
+                name: "ConcurrencyStamp",
+                schema: "dbo",
+                table: "User",
+                type: "uniqueidentifier",
+                nullable: false,
+                defaultValueSql: "NEWID()");
+
+            migrationBuilder.AddColumn<Guid>(
+                name: "ConcurrencyStamp",
+                schema: "dbo",
+                table: "Peer",
+                type: "uniqueidentifier",
+                nullable: false,
+                defaultValueSql: "NEWID()");
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropColumn(
+                name: "ConcurrencyStamp",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.DropColumn(
+                name: "ConcurrencyStamp",
+                schema: "dbo",
+                table: "Peer");
+        }
+    }
+}
@@ -0,0 +1,113 @@
+﻿using System;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddRefreshTokenTable : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // refresh tokens move to their own table, one row per login, so everyone has to log in again
+            migrationBuilder.DropIndex(
+                name: "IX_User_RefreshTokenHash",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.DropColumn(
+                name: "RefreshTokenExpiry",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.DropColumn(
+                name: "RefreshTokenHash",
+                schema: "dbo",
+                table: "User");
+
+            migrationBuilder.CreateTable(
+                name: "RefreshToken",
+                schema: "dbo",
+                columns: table => new
+                {
+                    Id = table.Column<int>(type: "int", nullable: false)
+                        .Annotation("SqlServer:Identity", "1, 1"),
+                    TokenHash = table.Column<string>(type: "nvarchar(64)", maxLength: 64, nullable: false),
+                    FamilyId = table.Column<Guid>(type: "uniqueidentifier", nullable: false),
+                    UserId = table.Column<int>(type: "int", nullable: false),
+                    ExpiresAt = table.Column<DateTime>(type: "datetime2", nullable: false),
+                    UsedAt = table.Column<DateTime>(type: "datetime2", nullable: true)
+                },
+                constraints: table =>
+                {
+                    table.PrimaryKey("PK_RefreshToken", x => x.Id);
+                    table.ForeignKey(
+                        name: "FK_RefreshToken_User_UserId",
+                        column: x => x.UserId,
+                        principalSchema: "dbo",
+                        principalTable: "User",
+                        principalColumn: "Id",
+                        onDelete: ReferentialAction.Cascade);
+                });
+
+            migrationBuilder.CreateIndex(
+                name: "IX_RefreshToken_ExpiresAt",
+                schema: "dbo",
+                table: "RefreshToken",
+                column: "ExpiresAt");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_RefreshToken_FamilyId",
+                schema: "dbo",
+                table: "RefreshToken",
+                column: "FamilyId");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_RefreshToken_TokenHash",
+                schema: "dbo",
+                table: "RefreshToken",
+                column: "TokenHash",
+                unique: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_RefreshToken_UserId",
+                schema: "dbo",
+                table: "RefreshToken",
+                column: "UserId");
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropTable(
+                name: "RefreshToken",
+                schema: "dbo");
+
+            migrationBuilder.AddColumn<DateTime>(
+                name: "RefreshTokenExpiry",
+                schema: "dbo",
+                table: "User",
+                type: "datetime2",
+                nullable: false,
+                defaultValue: new DateTime(1, 1, 1, 0, 0, 0, 0, DateTimeKind.Unspecified));
+
+            migrationBuilder.AddColumn<string>(
+                name: "RefreshTokenHash",
+                schema: "dbo",
+                table: "User",
+                type: "nvarchar(64)",
+                maxLength: 64,
+                nullable: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_User_RefreshTokenHash",
+                schema: "dbo",
+                table: "User",
+                column: "RefreshTokenHash",
+                unique: true,
+                filter: "[RefreshTokenHash] IS NOT NULL");
+        }
+    }
+}
@@ -0,0 +1,69 @@
+﻿using System;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddIpAllocationTable : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // existing peers get their rows on the next start, once the API knows which subnets are configured
+            migrationBuilder.CreateTable(
+                name: "IpAllocation",
+                schema: "dbo",
+                columns: table => new
+                {
+                    Id = table.Column<int>(type: "int", nullable: false)
+                        .Annotation("SqlServer:Identity", "1, 1"),
+                    Address = table.Column<string>(type: "nvarchar(15)", maxLength: 15, nullable: false),
+                    PeerId = table.Column<int>(type: "int", nullable: true),
+                    LeasedById = table.Column<int>(type: "int", nullable: true),
+                    ExpiresAt = table.Column<DateTime>(type: "datetime2", nullable: true)
+                },
+                constraints: table =>
+                {
+                    table.PrimaryKey("PK_IpAllocation", x => x.Id);
+                    table.ForeignKey(
+                        name: "FK_IpAllocation_Peer_PeerId",
+                        column: x => x.PeerId,
+                        principalSchema: "dbo",
+                        principalTable: "Peer",
+                        principalColumn: "Id",
+                        onDelete: ReferentialAction.Cascade);
+                });
+
+            migrationBuilder.CreateIndex(
+                name: "IX_IpAllocation_Address",
+                schema: "dbo",
+                table: "IpAllocation",
+                column: "Address",
+                unique: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_IpAllocation_ExpiresAt",
+                schema: "dbo",
+                table: "IpAllocation",
+                column: "ExpiresAt");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_IpAllocation_PeerId",
+                schema: "dbo",
+                table: "IpAllocation",
+                column: "PeerId",
+                unique: true,
+                filter: "[PeerId] IS NOT NULL");
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropTable(
+                name: "IpAllocation",
+                schema: "dbo");
+        }
+    }
+}
@@ -0,0 +1,73 @@
+﻿using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace WgDashboard.Api.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddPeerNetworkColumns : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.AddColumn<long>(
+                name: "NetworkAddress",
+                schema: "dbo",
+                table: "Peer",
+                type: "bigint",
+                nullable: true);
+
+            migrationBuilder.AddColumn<byte>(
+                name: "PrefixLength",
+                schema: "dbo",
+                table: "Peer",
+                type: "tinyint",
+                nullable: true);
+
+            // parse the existing IPv4 allowed IPs (10.8.0.2/32 or a bare 10.8.0.2) the same way the API does, with host bits cleared.
+            // anything else, such as IPv6, is left null just like the API leaves it
+            migrationBuilder.Sql(@"
+                UPDATE [p]
+                SET [NetworkAddress] = [n].[Address] - [n].[Address] % POWER(CAST(2 AS bigint), 32 - [n].[PrefixLength]),
+                    [PrefixLength] = [n].[PrefixLength]
+                FROM [dbo].[Peer] AS [p]
+                CROSS APPLY (SELECT CHARINDEX('/', [p].[AllowedIPs]) AS [Slash]) AS [s]
+                CROSS APPLY (SELECT
+                    CASE WHEN [s].[Slash] > 0 THEN LEFT([p].[AllowedIPs], [s].[Slash] - 1) ELSE [p].[AllowedIPs] END AS [Ip],
+                    CASE WHEN [s].[Slash] > 0 THEN TRY_CAST(SUBSTRING([p].[AllowedIPs], [s].[Slash] + 1, 3) AS int) ELSE 32 END AS [PrefixLength]) AS [c]
+                CROSS APPLY (SELECT
+                    TRY_CAST(PARSENAME([c].[Ip], 4) AS bigint) AS [A],
+                    TRY_CAST(PARSENAME([c].[Ip], 3) AS bigint) AS [B],
+                    TRY_CAST(PARSENAME([c].[Ip], 2) AS bigint) AS [C],
+                    TRY_CAST(PARSENAME([c].[Ip], 1) AS bigint) AS [D]) AS [o]
+                CROSS APPLY (SELECT [o].[A] * 16777216 + [o].[B] * 65536 + [o].[C] * 256 + [o].[D] AS [Address], [c].[PrefixLength]) AS [n]
+                WHERE [o].[A] BETWEEN 0 AND 255 AND [o].[B] BETWEEN 0 AND 255 AND [o].[C] BETWEEN 0 AND 255 AND [o].[D] BETWEEN 0 AND 255
+                    AND [n].[PrefixLength] BETWEEN 0 AND 32;");
+
+            migrationBuilder.CreateIndex(
+                name: "IX_Peer_NetworkAddress_PrefixLength",
+                schema: "dbo",
+                table: "Peer",
+                columns: new[] { "NetworkAddress", "PrefixLength" });
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropIndex(
+                name: "IX_Peer_NetworkAddress_PrefixLength",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.DropColumn(
+                name: "NetworkAddress",
+                schema: "dbo",
+                table: "Peer");
+
+            migrationBuilder.DropColumn(
+                name: "PrefixLength",
+                schema: "dbo",
+                table: "Peer");
+        }
+    }
+}
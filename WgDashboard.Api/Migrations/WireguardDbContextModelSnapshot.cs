@@ -22,6 +22,42 @@ namespace WgDashboard.Api.Migrations
 
             SqlServerModelBuilderExtensions.UseIdentityColumns(modelBuilder);
 
+            modelBuilder.Entity("WgDashboard.Api.Models.IpAllocation", b =>
+                {
+                    b.Property<int>("Id")
+                        .ValueGeneratedOnAdd()
+                        .HasColumnType("int");
+
+                    SqlServerPropertyBuilderExtensions.UseIdentityColumn(b.Property<int>("Id"));
+
+                    b.Property<string>("Address")
+                        .IsRequired()
+                        .HasMaxLength(15)
+                        .HasColumnType("nvarchar(15)");
+
+                    b.Property<DateTime?>("ExpiresAt")
+                        .HasColumnType("datetime2");
+
+                    b.Property<int?>("LeasedById")
+                        .HasColumnType("int");
+
+                    b.Property<int?>("PeerId")
+                        .HasColumnType("int");
+
+                    b.HasKey("Id");
+
+                    b.HasIndex("Address")
+                        .IsUnique();
+
+                    b.HasIndex("ExpiresAt");
+
+                    b.HasIndex("PeerId")
+                        .IsUnique()
+                        .HasFilter("[PeerId] IS NOT NULL");
+
+                    b.ToTable("IpAllocation", "dbo");
+                });
+
             modelBuilder.Entity("WgDashboard.Api.Models.Peer", b =>
                 {
                     b.Property<int>("Id")
@@ -35,6 +71,10 @@ namespace WgDashboard.Api.Migrations
                         .HasMaxLength(19)
                         .HasColumnType("nvarchar(19)");
 
+                    b.Property<Guid>("ConcurrencyStamp")
+                        .IsConcurrencyToken()
+                        .HasColumnType("uniqueidentifier");
+
                     b.Property<string>("DeviceDescription")
                         .HasMaxLength(100)
                         .HasColumnType("nvarchar(100)");
@@ -43,19 +83,77 @@ namespace WgDashboard.Api.Migrations
                         .HasMaxLength(20)
                         .HasColumnType("nvarchar(20)");
 
+                    b.Property<long?>("NetworkAddress")
+                        .HasColumnType("bigint");
+
                     b.Property<int>("OwnerId")
                         .HasColumnType("int");
 
+                    b.Property<byte?>("PrefixLength")
+                        .HasColumnType("tinyint");
+
                     b.Property<string>("PublicKey")
                         .IsRequired()
                         .HasMaxLength(75)
                         .HasColumnType("nvarchar(75)");
 
+                    b.Property<int>("Slot")
+                        .HasColumnType("int");
+
                     b.HasKey("Id");
 
-                    b.HasIndex("OwnerId");
+                    b.HasIndex("PublicKey")
+                        .IsUnique();
+
+                    b.HasIndex("NetworkAddress", "PrefixLength");
 
-                    b.ToTable("Peer", "dbo");
+                    b.HasIndex("OwnerId", "Slot")
+                        .IsUnique();
+
+                    b.ToTable("Peer", "dbo", t =>
+                        {
+                            t.HasCheckConstraint("CK_Peer_Slot", "[Slot] >= 0 AND [Slot] < 5");
+                        });
+                });
+
+            modelBuilder.Entity("WgDashboard.Api.Models.RefreshToken", b =>
+                {
+                    b.Property<int>("Id")
+                        .ValueGeneratedOnAdd()
+                        .HasColumnType("int");
+
+                    SqlServerPropertyBuilderExtensions.UseIdentityColumn(b.Property<int>("Id"));
+
+                    b.Property<DateTime>("ExpiresAt")
+                        .HasColumnType("datetime2");
+
+                    b.Property<Guid>("FamilyId")
+                        .HasColumnType("uniqueidentifier");
+
+                    b.Property<string>("TokenHash")
+                        .IsRequired()
+                        .HasMaxLength(64)
+                        .HasColumnType("nvarchar(64)");
+
+                    b.Property<DateTime?>("UsedAt")
+                        .IsConcurrencyToken()
+                        .HasColumnType("datetime2");
+
+                    b.Property<int>("UserId")
+                        .HasColumnType("int");
+
+                    b.HasKey("Id");
+
+                    b.HasIndex("ExpiresAt");
+
+                    b.HasIndex("FamilyId");
+
+                    b.HasIndex("TokenHash")
+                        .IsUnique();
+
+                    b.HasIndex("UserId");
+
+                    b.ToTable("RefreshToken", "dbo");
                 });
 
             modelBuilder.Entity("WgDashboard.Api.Models.User", b =>
@@ -66,6 +164,10 @@ namespace WgDashboard.Api.Migrations
 
                     SqlServerPropertyBuilderExtensions.UseIdentityColumn(b.Property<int>("Id"));
 
+                    b.Property<Guid>("ConcurrencyStamp")
+                        .IsConcurrencyToken()
+                        .HasColumnType("uniqueidentifier");
+
                     b.Property<string>("Name")
                         .HasMaxLength(255)
                         .HasColumnType("nvarchar(255)");
@@ -75,12 +177,6 @@ namespace WgDashboard.Api.Migrations
                         .HasMaxLength(100)
                         .HasColumnType("nvarchar(100)");
 
-                    b.Property<string>("RefreshToken")
-                        .HasColumnType("nvarchar(max)");
-
-                    b.Property<DateTime>("RefreshTokenExpiry")
-                        .HasColumnType("datetime2");
-
                     b.Property<string>("Role")
                         .IsRequired()
                         .HasMaxLength(9)
@@ -93,9 +189,22 @@ namespace WgDashboard.Api.Migrations
 
                     b.HasKey("Id");
 
+                    b.HasIndex("Username")
+                        .IsUnique();
+
                     b.ToTable("User", "dbo");
                 });
 
+            modelBuilder.Entity("WgDashboard.Api.Models.IpAllocation", b =>
+                {
+                    b.HasOne("WgDashboard.Api.Models.Peer", "Peer")
+                        .WithOne("IpAllocation")
+                        .HasForeignKey("WgDashboard.Api.Models.IpAllocation", "PeerId")
+                        .OnDelete(DeleteBehavior.Cascade);
+
+                    b.Navigation("Peer");
+                });
+
             modelBuilder.Entity("WgDashboard.Api.Models.Peer", b =>
                 {
                     b.HasOne("WgDashboard.Api.Models.User", "Owner")
@@ -106,6 +215,22 @@ namespace WgDashboard.Api.Migrations
 
                     b.Navigation("Owner");
                 });
+
+            modelBuilder.Entity("WgDashboard.Api.Models.RefreshToken", b =>
+                {
+                    b.HasOne("WgDashboard.Api.Models.User", "User")
+                        .WithMany()
+                        .HasForeignKey("UserId")
+                        .OnDelete(DeleteBehavior.Cascade)
+                        .IsRequired();
+
+                    b.Navigation("User");
+                });
+
+            modelBuilder.Entity("WgDashboard.Api.Models.Peer", b =>
+                {
+                    b.Navigation("IpAllocation");
+                });
 #pragma warning restore 612, 618
         }
     }
@@ -0,0 +1,13 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the outcome of adding one peer in a bulk import
+    /// </summary>
+    public class BulkPeerResult
+    {
+        public int Index { get; set; } = 0; // position of the peer in the request
+        public int? Id { get; set; } // ID of the created peer
+        public string? Error { get; set; }
+        public bool Succeeded { get => Error is null; }
+    }
+}
@@ -0,0 +1,40 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents a peer or user that was created, updated, or deleted, as pushed to the dashboards watching GET /api/events
+    /// </summary>
+    public class ChangeEvent
+    {
+        public string Entity { get; set; } = ""; // one of ChangeEntities
+        public string Action { get; set; } = ""; // one of ChangeActions
+        public int Id { get; set; } = 0; // ID of the peer or user
+        public int OwnerId { get; set; } = 0; // the peer's owner, or the user itself. only admins and this user receive the event
+        public PeerProfile? Peer { get; set; } // the peer as it is now. null when deleted
+        public UserProfile? User { get; set; } // the user as it is now. null when deleted
+
+        public static ChangeEvent ForPeer(string action, int ownerId, PeerProfile peer) =>
+            new ChangeEvent() { Entity = ChangeEntities.Peer, Action = action, Id = peer.Id, OwnerId = ownerId, Peer = peer };
+
+        public static ChangeEvent PeerDeleted(int id, int ownerId) =>
+            new ChangeEvent() { Entity = ChangeEntities.Peer, Action = ChangeActions.Deleted, Id = id, OwnerId = ownerId };
+
+        public static ChangeEvent ForUser(string action, UserProfile user) =>
+            new ChangeEvent() { Entity = ChangeEntities.User, Action = action, Id = user.Id, OwnerId = user.Id, User = user };
+
+        public static ChangeEvent UserDeleted(int id) =>
+            new ChangeEvent() { Entity = ChangeEntities.User, Action = ChangeActions.Deleted, Id = id, OwnerId = id };
+    }
+
+    public static class ChangeEntities
+    {
+        public static readonly string Peer = "peer";
+        public static readonly string User = "user";
+    }
+
+    public static class ChangeActions
+    {
+        public static readonly string Created = "created";
+        public static readonly string Updated = "updated";
+        public static readonly string Deleted = "deleted";
+    }
+}
@@ -0,0 +1,42 @@
+﻿using System.Security.Claims;
+
+namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the user making the request, read from the JWT's claims once per request
+    /// </summary>
+    public sealed class CurrentUser
+    {
+        public int Id { get; private set; } = 0; // 0 if the token has no valid ID
+        public string? Username { get; private set; }
+        public string Role { get; private set; } = UserRoles.Anonymous;
+        public bool IsAdmin { get; private set; } = false;
+
+        private CurrentUser() { }
+
+        /// <summary>
+        /// Reads the user's ID, username, and role from the claims in one pass
+        /// </summary>
+        /// <param name="principal">The authenticated principal, e.g. HttpContext.User</param>
+        /// <returns>The current user. Anonymous if there is no principal</returns>
+        public static CurrentUser FromPrincipal(ClaimsPrincipal? principal)
+        {
+            var currentUser = new CurrentUser();
+            if (principal?.Identity is not ClaimsIdentity identity)
+                return currentUser;
+
+            foreach (Claim claim in identity.Claims)
+            {
+                if (claim.Type == ClaimTypes.Sid)
+                    currentUser.Id = int.TryParse(claim.Value, out int id) ? id : 0;
+                else if (claim.Type == ClaimTypes.NameIdentifier)
+                    currentUser.Username = claim.Value;
+                else if (claim.Type == ClaimTypes.Role)
+                    currentUser.Role = claim.Value;
+            }
+
+            currentUser.IsAdmin = currentUser.Role == UserRoles.Admin;
+            return currentUser;
+        }
+    }
+}
@@ -0,0 +1,14 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the users to delete in one call. Users must match every filter given.
+    /// </summary>
+    public class DeleteUsersRequest
+    {
+        public List<int>? Ids { get; set; }
+        public string? Username { get; set; } // prefix
+        public string? Role { get; set; }
+
+        public bool HasFilter() => (Ids is not null && Ids.Count > 0) || !string.IsNullOrEmpty(Username) || !string.IsNullOrEmpty(Role);
+    }
+}
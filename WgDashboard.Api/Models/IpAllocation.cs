@@ -0,0 +1,29 @@
+﻿using System.ComponentModel.DataAnnotations;
+
+namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// <para>An address handed out from one of the configured subnets. The unique index on the address is what keeps two API instances
+    /// from handing out the same one.</para>
+    ///
+    /// <para>An address either belongs to a peer, and is freed when the peer is deleted, or is leased to a user ahead of adding a peer,
+    /// and is freed when the lease expires.</para>
+    /// </summary>
+    public class IpAllocation
+    {
+        [Key]
+        public int Id { get; set; } = 0;
+
+        [Required]
+        [MaxLength(15)]
+        public string Address { get; set; } = ""; // without the prefix length, e.g. 10.8.0.5
+
+        public int? PeerId { get; set; } // null while the address is only leased
+
+        public int? LeasedById { get; set; } // the user the lease is for
+
+        public DateTime? ExpiresAt { get; set; } // UTC. null once the address belongs to a peer
+
+        public Peer? Peer { get; set; }
+    }
+}
@@ -0,0 +1,8 @@
+﻿namespace WgDashboard.Api.Models
+{
+    public class IpLease
+    {
+        public string AllowedIPs { get; set; } = ""; // pass as the new peer's allowed IPs before the lease expires
+        public DateTime ExpiresAt { get; set; }
+    }
+}
@@ -0,0 +1,19 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the keyset pagination parameters of a list request. Pages are ordered by ID, so the next page
+    /// starts after the ID of the last item on the current page.
+    /// </summary>
+    public class ListRequest
+    {
+        public static readonly int DefaultLimit = 100;
+        public static readonly int MaxLimit = 1000;
+
+        public int? Limit { get; set; } // defaults to DefaultLimit
+        public int After { get; set; } = 0; // ID of the last item on the previous page
+
+        public int PageSize { get => Limit ?? DefaultLimit; }
+
+        public bool IsValid() => (Limit is null || (1 <= Limit && Limit <= MaxLimit)) && After >= 0;
+    }
+}
@@ -7,8 +7,7 @@ namespace WgDashboard.Api.Models
         [Required]
         public string PublicKey { get; set; } = "";
 
-        [Required]
-        public string AllowedIPs { get; set; } = "";
+        public string? AllowedIPs { get; set; } // handed out from the configured subnets if left out
 
         public string? DeviceDescription { get; set; }
 
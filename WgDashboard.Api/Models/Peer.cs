@@ -2,11 +2,14 @@
 using System.ComponentModel.DataAnnotations.Schema;
 using System.Diagnostics.CodeAnalysis;
 using System.Text.Json.Serialization;
+using WgDashboard.Api.Helpers;
 
 namespace WgDashboard.Api.Models
 {
     public class Peer
     {
+        public const int MAX_PEERS_PER_USER = 5; // enforced by the database through Slot
+
         [Key]
         public int Id { get; set; } = 0;
 
@@ -14,9 +17,29 @@ namespace WgDashboard.Api.Models
         [MaxLength(75)]
         public string PublicKey { get; set; } = "";
 
+        private string _allowedIPs = "";
+
         [Required]
         [MaxLength(19)]
-        public string AllowedIPs { get; set; } = "";
+        public string AllowedIPs
+        {
+            get => _allowedIPs;
+            set
+            {
+                // keep the numeric columns in step, so that searches by address can seek an index instead of matching strings
+                _allowedIPs = value;
+                CidrNetwork network;
+                bool isIPv4 = CidrNetwork.TryParse(value, out network) && network.IsIPv4;
+                NetworkAddress = isIPv4 ? network.FirstAddress : null;
+                PrefixLength = isIPv4 ? (byte)network.PrefixLength : null;
+            }
+        }
+
+        [JsonIgnore]
+        public long? NetworkAddress { get; private set; } // first address of AllowedIPs as a number. null unless AllowedIPs is IPv4
+
+        [JsonIgnore]
+        public byte? PrefixLength { get; private set; }
 
         [MaxLength(100)]
         public string? DeviceDescription { get; set; }
@@ -27,8 +50,17 @@ namespace WgDashboard.Api.Models
         [MaxLength(20)]
         public string? DeviceType { get; set; }
 
+        [Required]
+        public int Slot { get; set; } = 0; // 0 to MAX_PEERS_PER_USER - 1. unique per owner, so the database enforces the limit
+
+        [ConcurrencyCheck]
+        public Guid ConcurrencyStamp { get; set; } = Guid.NewGuid(); // replaced on every update, so an update based on a stale read fails instead of overwriting
+
         [NotNull]
         public User? Owner { get; set; }
+
+        [JsonIgnore]
+        public IpAllocation? IpAllocation { get; set; } // only when the address was handed out from a configured subnet
     }
 
     public static class DeviceTypes
@@ -0,0 +1,16 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents a peer in an export. Has the same fields as a new peer request, so an export can be imported again.
+    /// </summary>
+    public class PeerExport
+    {
+        public int Id { get; set; } = 0;
+        public string PublicKey { get; set; } = "";
+        public string AllowedIPs { get; set; } = "";
+        public string? DeviceDescription { get; set; }
+        public int OwnerId { get; set; } = 0;
+        public string OwnerUsername { get; set; } = "";
+        public string? DeviceType { get; set; }
+    }
+}
@@ -0,0 +1,13 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the filters that can be applied when listing peers
+    /// </summary>
+    public class PeerListRequest : ListRequest
+    {
+        public int? Id { get; set; }
+        public string? PublicKey { get; set; } // prefix
+        public string? AllowedIPs { get; set; } // prefix, or CIDR containment if it contains a '/'
+        public string? OwnerUsername { get; set; }
+    }
+}
@@ -0,0 +1,13 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Everything needed to validate a new peer for an owner, read in a single query
+    /// </summary>
+    public class PeerOwnerSummary
+    {
+        public string? Name { get; set; }
+        public string Username { get; set; } = "";
+        public List<int> UsedSlots { get; set; } = new List<int>(); // slots of the peers the owner already has
+        public bool PublicKeyTaken { get; set; }
+    }
+}
@@ -0,0 +1,11 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents a search for peers by IPv4 address. Exactly one of Ip and Cidr is given.
+    /// </summary>
+    public class PeerSearchRequest : ListRequest
+    {
+        public string? Ip { get; set; } // peers whose allowed IPs contain this address
+        public string? Cidr { get; set; } // peers whose allowed IPs fall entirely within this network
+    }
+}
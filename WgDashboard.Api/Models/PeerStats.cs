@@ -0,0 +1,29 @@
+﻿using System.Text.Json.Serialization;
+
+namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// A peer's handshake and transfer counters as last read from the WireGuard interface
+    /// </summary>
+    public class PeerStats
+    {
+        public int PeerId { get; set; } = 0;
+        public DateTime? LatestHandshake { get; set; }
+        public long ReceivedBytes { get; set; } = 0; // cumulative since the interface came up, so it drops back to 0 if the interface restarts
+        public long SentBytes { get; set; } = 0;
+        public DateTime UpdatedAt { get; set; }
+
+        [JsonIgnore(Condition = JsonIgnoreCondition.WhenWritingNull)]
+        public List<PeerStatsSample>? Samples { get; set; } // oldest first. only sent for a single peer
+    }
+
+    /// <summary>
+    /// The transfer counters at one point in time
+    /// </summary>
+    public class PeerStatsSample
+    {
+        public DateTime Time { get; set; }
+        public long ReceivedBytes { get; set; } = 0;
+        public long SentBytes { get; set; } = 0;
+    }
+}
@@ -0,0 +1,35 @@
+﻿using System.ComponentModel.DataAnnotations;
+using System.Diagnostics.CodeAnalysis;
+
+namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// <para>A refresh token issued to one login on one device. Only the hash of the token is stored; the raw token is only ever in the cookie.</para>
+    ///
+    /// <para>Each refresh replaces the token with a new one in the same family. The old token is kept, marked as used, until it expires,
+    /// so that replaying it can be detected.</para>
+    /// </summary>
+    public class RefreshToken
+    {
+        [Key]
+        public int Id { get; set; } = 0;
+
+        [Required]
+        [MaxLength(64)]
+        public string TokenHash { get; set; } = ""; // SHA-256 of the refresh token, as hex
+
+        [Required]
+        public Guid FamilyId { get; set; } // shared by every token rotated from the same login
+
+        [Required]
+        public int UserId { get; set; } = 0;
+
+        public DateTime ExpiresAt { get; set; } // UTC
+
+        [ConcurrencyCheck]
+        public DateTime? UsedAt { get; set; } // UTC. set when the token is rotated, so two requests can't both rotate it
+
+        [NotNull]
+        public User? User { get; set; }
+    }
+}
@@ -23,9 +23,10 @@ namespace WgDashboard.Api.Models
 
         [MaxLength(255)]
         public string? Name { get; set; }
-        public string? RefreshToken { get; set; }
 
-        public DateTime RefreshTokenExpiry { get; set; }
+        [JsonIgnore]
+        [ConcurrencyCheck]
+        public Guid ConcurrencyStamp { get; set; } = Guid.NewGuid(); // replaced on every profile update, so an update based on a stale read fails instead of overwriting
     }
 
     /// <summary>
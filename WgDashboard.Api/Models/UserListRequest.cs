@@ -0,0 +1,11 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// Represents the filters that can be applied when listing users
+    /// </summary>
+    public class UserListRequest : ListRequest
+    {
+        public int? Id { get; set; }
+        public string? Username { get; set; } // prefix
+    }
+}
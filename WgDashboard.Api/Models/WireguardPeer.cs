@@ -0,0 +1,24 @@
+﻿namespace WgDashboard.Api.Models
+{
+    /// <summary>
+    /// A peer as the WireGuard interface sees it
+    /// </summary>
+    public class WireguardPeer
+    {
+        public string PublicKey { get; set; } = "";
+        public string AllowedIPs { get; set; } = ""; // canonical and comma-separated, e.g. 10.8.0.2/32
+        public DateTime? LatestHandshake { get; set; } // UTC. null if the peer has never completed a handshake
+        public long ReceivedBytes { get; set; } = 0; // since the interface came up
+        public long SentBytes { get; set; } = 0;
+    }
+
+    /// <summary>
+    /// A change to apply to the WireGuard interface: add or update a peer's allowed IPs, or remove the peer
+    /// </summary>
+    public class WireguardPeerChange
+    {
+        public string PublicKey { get; set; } = "";
+        public string? AllowedIPs { get; set; }
+        public bool Remove { get; set; } = false;
+    }
+}
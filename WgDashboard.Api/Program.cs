@@ -1,10 +1,16 @@
 using Microsoft.AspNetCore.Authentication.JwtBearer;
+using Microsoft.AspNetCore.Authorization;
+using Microsoft.AspNetCore.ResponseCompression;
 using Microsoft.EntityFrameworkCore;
 using Microsoft.IdentityModel.Protocols.Configuration;
 using Microsoft.IdentityModel.Tokens;
-using System.Text;
+using OpenTelemetry.Exporter;
+using OpenTelemetry.Metrics;
+using OpenTelemetry.Resources;
+using OpenTelemetry.Trace;
 using WgDashboard.Api.Data;
 using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
 using WgDashboard.Api.Services;
 
 
@@ -24,8 +30,17 @@ int listenPort = 0;
 if (!int.TryParse(config["ListenSettings:Port"], out listenPort))
     listenPort = 3000;
 
+// read now, since a separate metrics port is listened on too
+var telemetrySettings = new TelemetrySettings(builder.Configuration);
+
 Console.WriteLine($"API URL: {listenProtocol}://{listenAddress}:{listenPort}");
-builder.WebHost.UseUrls($"{listenProtocol}://{listenAddress}:{listenPort}");
+if (telemetrySettings.Enabled && telemetrySettings.MetricsPath is not null && telemetrySettings.MetricsPort is not null)
+{
+    Console.WriteLine($"Metrics URL: {listenProtocol}://{listenAddress}:{telemetrySettings.MetricsPort}{telemetrySettings.MetricsPath}");
+    builder.WebHost.UseUrls($"{listenProtocol}://{listenAddress}:{listenPort}", $"{listenProtocol}://{listenAddress}:{telemetrySettings.MetricsPort}");
+}
+else
+    builder.WebHost.UseUrls($"{listenProtocol}://{listenAddress}:{listenPort}");
 
 // Add services to the container.
 // CORS
@@ -38,14 +53,16 @@ builder.Services.AddCors(opts =>
         .AllowCredentials() // TODO: figure out why this doesnt allow the browser to store the cookie
         .AllowAnyMethod()
         .AllowAnyHeader()
+        .WithExposedHeaders("ETag", "Retry-After") // read by the website to revalidate GETs and to back off
         .SetIsOriginAllowed(origin => true);
     });
 });
 
-// JWT-based authentication and authorization
-string? jwtSigningKey = config["JwtSettings:Key"];
-if (jwtSigningKey is null)
-    throw new InvalidConfigurationException("JWT signing key is a required setting");
+// JWT-based authentication and authorization. the keys are built once and shared by the token issuer and JwtBearer
+var jwtSettings = new JwtSettings(config);
+var tokenIssuer = new TokenIssuer(jwtSettings);
+builder.Services.AddSingleton<IJwtSettings>(jwtSettings);
+builder.Services.AddSingleton<ITokenIssuer>(tokenIssuer);
 builder.Services.AddAuthentication(opts =>
 {
     opts.DefaultAuthenticateScheme = JwtBearerDefaults.AuthenticationScheme;
@@ -55,9 +72,9 @@ builder.Services.AddAuthentication(opts =>
 {
     opts.TokenValidationParameters = new TokenValidationParameters()
     {
-        ValidIssuer = config["JwtSettings:Issuer"],
-        ValidAudience = config["JwtSettings:Audience"],
-        IssuerSigningKey = new SymmetricSecurityKey(Encoding.UTF8.GetBytes(jwtSigningKey)),
+        ValidIssuer = jwtSettings.Issuer,
+        ValidAudience = jwtSettings.Audience,
+        IssuerSigningKeyResolver = (token, securityToken, keyId, parameters) => tokenIssuer.GetValidationKeys(keyId), // picks the key by its "kid"
         ValidateIssuer = builder.Environment.IsProduction(),
         ValidateAudience = builder.Environment.IsProduction(),
         ValidateLifetime = true,
@@ -66,19 +83,22 @@ builder.Services.AddAuthentication(opts =>
 });
 builder.Services.AddAuthentication();
 
-// DB for entity framework
+// DB for entity framework. every command goes through the metrics interceptor
+builder.Services.AddSingleton<DbMetricsInterceptor>();
 if(builder.Environment.IsDevelopment())
 {
-    builder.Services.AddDbContext<WireguardDbContext>(opts => opts.UseInMemoryDatabase("TestDb"));
+    builder.Services.AddDbContext<WireguardDbContext>((sp, opts) => opts.UseInMemoryDatabase("TestDb")
+        .AddInterceptors(sp.GetRequiredService<DbMetricsInterceptor>()));
 }
 else
 {
     string? connectionString = builder.Configuration.GetConnectionString("WireguardDb");
     if (connectionString is null)
         throw new InvalidConfigurationException("Connection string is a required setting");
-    builder.Services.AddDbContext<WireguardDbContext>(opts =>
+    builder.Services.AddDbContext<WireguardDbContext>((sp, opts) =>
     {
         opts.UseSqlServer(connectionString);
+        opts.AddInterceptors(sp.GetRequiredService<DbMetricsInterceptor>());
     });
 }
 
@@ -87,9 +107,101 @@ builder.Services.AddScoped<ISecurityService, SecurityService>();
 builder.Services.AddScoped<IIdentityService, IdentityService>();
 builder.Services.AddScoped<IUserService, UserService>();
 builder.Services.AddScoped<IPeerService, PeerService>();
+builder.Services.AddSingleton<IProfileCacheSettings, ProfileCacheSettings>();
+builder.Services.AddSingleton<IProfileCache, ProfileCache>();
+if (builder.Configuration.GetValue<bool>("ProfileCache:Distributed"))
+    builder.Services.AddDistributedMemoryCache(); // single-node stand-in. register a shared IDistributedCache (e.g. Redis) here for several API nodes
+builder.Services.AddHttpContextAccessor();
+builder.Services.AddScoped<ICurrentUserAccessor, CurrentUserAccessor>();
 builder.Services.AddSingleton<ISecurityInitialSettings, SecurityInitialSettings>();
+builder.Services.AddSingleton<IPasswordHashingSettings, PasswordHashingSettings>();
+builder.Services.AddSingleton<IPasswordHasher, PasswordHasher>();
+builder.Services.AddHostedService<AdminBootstrapService>();
+builder.Services.AddHostedService<PasswordHashBenchmarkService>();
+builder.Services.AddSingleton<IRefreshTokenSettings, RefreshTokenSettings>();
+builder.Services.AddSingleton<IRefreshTokenRevocations, RefreshTokenRevocations>();
+builder.Services.AddSingleton<ITokenMetrics, TokenMetrics>();
+builder.Services.AddHostedService<RefreshTokenSweeperService>();
+
+// push the peers in the database to the WireGuard interface. the trigger is always registered, since the peer and user services request syncs
+var wireguardSyncSettings = new WireguardSyncSettings(builder.Configuration);
+builder.Services.AddSingleton<IWireguardSyncSettings>(wireguardSyncSettings);
+builder.Services.AddSingleton<IWireguardSyncTrigger, WireguardSyncTrigger>();
+builder.Services.AddSingleton<IWireguardClient, WireguardClient>();
+if (wireguardSyncSettings.Enabled)
+    builder.Services.AddHostedService<WireguardSyncService>();
+
+// read handshakes and transfer counters from the WireGuard interface into memory. the store is always registered, since the peers controller reads it
+var peerTelemetrySettings = new PeerTelemetrySettings(builder.Configuration);
+builder.Services.AddSingleton<IPeerTelemetrySettings>(peerTelemetrySettings);
+builder.Services.AddSingleton<IPeerStatsStore, PeerStatsStore>();
+if (peerTelemetrySettings.DumpFile is not null)
+    builder.Services.AddSingleton<IWireguardDumpSource, FileDumpSource>();
+else
+    builder.Services.AddSingleton<IWireguardDumpSource, WgDumpSource>();
+if (peerTelemetrySettings.Enabled)
+    builder.Services.AddHostedService<PeerTelemetryCollectorService>();
+
+// hand out peers' addresses from the configured subnets. the allocator is always registered, since the peer and user services use it
+var ipAllocationSettings = new IpAllocationSettings(builder.Configuration);
+builder.Services.AddSingleton<IIpAllocationSettings>(ipAllocationSettings);
+builder.Services.AddSingleton<IIpAllocator, IpAllocator>();
+if (ipAllocationSettings.Enabled)
+    builder.Services.AddHostedService<IpAllocationService>();
+
+// push peer and user changes to the dashboards over server-sent events. one notifier fans each change out to every open stream
+builder.Services.AddSingleton<IChangeEventsSettings, ChangeEventsSettings>();
+builder.Services.AddSingleton<IChangeNotifier, ChangeNotifier>();
+
+// compress everything but small responses. the level and the minimum size can be set in appsettings.json
+var compressionSettings = new ResponseCompressionSettings(builder.Configuration);
+builder.Services.AddSingleton<IResponseCompressionSettings>(compressionSettings);
+if (compressionSettings.Enabled)
+{
+    builder.Services.AddResponseCompression(opts =>
+    {
+        opts.EnableForHttps = true; // only the paths in CompressedPaths reach the middleware, and they carry no secrets
+        opts.Providers.Add<BrotliCompressionProvider>();
+        opts.Providers.Add<GzipCompressionProvider>();
+        opts.MimeTypes = ResponseCompressionDefaults.MimeTypes.Concat(new[] { NdJson.ContentType, Csv.ContentType });
+    });
+    builder.Services.Configure<BrotliCompressionProviderOptions>(opts => opts.Level = compressionSettings.Level);
+    builder.Services.Configure<GzipCompressionProviderOptions>(opts => opts.Level = compressionSettings.Level);
+    builder.Services.AddSingleton<IResponseCompressionProvider, MinimumSizeCompressionProvider>();
+}
 
-builder.Services.AddControllers();
+// metrics for Prometheus to scrape, and optionally metrics and traces pushed to an OpenTelemetry collector
+builder.Services.AddSingleton<ITelemetrySettings>(telemetrySettings);
+if (telemetrySettings.Enabled)
+{
+    void ConfigureOtlp(OtlpExporterOptions opts)
+    {
+        opts.Endpoint = telemetrySettings.OtlpEndpoint!;
+        opts.Protocol = telemetrySettings.OtlpProtocol == TelemetrySettings.HttpProtobufProtocol ? OtlpExportProtocol.HttpProtobuf : OtlpExportProtocol.Grpc;
+    }
+
+    var telemetry = builder.Services.AddOpenTelemetry()
+        .ConfigureResource(resource => resource.AddService(telemetrySettings.ServiceName))
+        .WithMetrics(metrics =>
+        {
+            metrics.AddAspNetCoreInstrumentation() // http.server.request.duration per route, method, and status code
+                .AddMeter(PasswordHasher.MeterName, ProfileCache.MeterName, DbMetricsInterceptor.MeterName, TokenMetrics.MeterName);
+            if (telemetrySettings.MetricsPath is not null)
+                metrics.AddPrometheusExporter();
+            if (telemetrySettings.OtlpEndpoint is not null)
+                metrics.AddOtlpExporter(ConfigureOtlp);
+        });
+    if (telemetrySettings.OtlpEndpoint is not null)
+    {
+        telemetry.WithTracing(tracing => tracing
+            .AddAspNetCoreInstrumentation(opts => opts.RecordException = true)
+            .AddSource(DbMetricsInterceptor.ActivitySourceName, PasswordHasher.MeterName)
+            .AddOtlpExporter(ConfigureOtlp));
+    }
+}
+
+builder.Services.AddControllers()
+    .AddJsonOptions(opts => opts.JsonSerializerOptions.TypeInfoResolverChain.Insert(0, ApiJsonContext.Default)); // reflection is still the fallback
 // Learn more about configuring Swagger/OpenAPI at https://aka.ms/aspnetcore/swashbuckle
 builder.Services.AddEndpointsApiExplorer();
 builder.Services.AddSwaggerGen();
@@ -110,8 +222,45 @@ else
     context.Database.Migrate();
 }
 
+// only around the bulk lists and exports, so that responses with tokens or profiles are never compressed. see CompressedPaths
+if (compressionSettings.Enabled)
+    app.UseWhen((context) => ResponseCompressionSettings.IsCompressedPath(context.Request.Path), (branch) => branch.UseResponseCompression());
+
 app.UseCors("DefaultCorsPolicy");
 
+if (telemetrySettings.Enabled)
+{
+    // add up the SQL commands each request runs
+    var dbMetrics = app.Services.GetRequiredService<DbMetricsInterceptor>();
+    app.Use(async (context, next) =>
+    {
+        using (dbMetrics.BeginRequest(context))
+            await next(context);
+    });
+    if (telemetrySettings.MetricsPath is not null)
+    {
+        IEndpointConventionBuilder metricsEndpoint = app.MapPrometheusScrapingEndpoint(telemetrySettings.MetricsPath);
+        if (telemetrySettings.MetricsPort is int metricsPort)
+        {
+            // checked against the port the connection came in on, not the Host header, which the client picks
+            string metricsPath = telemetrySettings.MetricsPath;
+            app.Use(async (context, next) =>
+            {
+                bool onMetricsPort = context.Connection.LocalPort == metricsPort;
+                bool forMetrics = context.Request.Path.Equals(metricsPath, StringComparison.OrdinalIgnoreCase);
+                if (onMetricsPort != forMetrics)
+                {
+                    context.Response.StatusCode = StatusCodes.Status404NotFound;
+                    return;
+                }
+                await next(context);
+            });
+        }
+        else
+            metricsEndpoint.RequireAuthorization(new AuthorizeAttribute() { Roles = UserRoles.Admin });
+    }
+}
+
 app.UseAuthentication();
 app.UseAuthorization();
 
@@ -0,0 +1,60 @@
+﻿using WgDashboard.Api.Data;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Adds a default admin once on API startup to prevent lockouts by deleting all admins or forgetting all admin passwords</para>
+    ///
+    /// <para>Hosted services start when the app runs, so this happens after the migrations in Program.cs</para>
+    /// </summary>
+    public class AdminBootstrapService : IHostedService
+    {
+        private readonly IServiceScopeFactory _scopeFactory;
+        private readonly ISecurityInitialSettings _securitySettings;
+        private readonly IPasswordHasher _hasher;
+        private readonly ILogger<AdminBootstrapService> _logger;
+
+        public AdminBootstrapService(IServiceScopeFactory scopeFactory, ISecurityInitialSettings securitySettings, IPasswordHasher passwordHasher,
+            ILogger<AdminBootstrapService> logger)
+        {
+            this._scopeFactory = scopeFactory;
+            this._securitySettings = securitySettings;
+            this._hasher = passwordHasher;
+            this._logger = logger;
+        }
+
+        public async Task StartAsync(CancellationToken cancellationToken)
+        {
+            // the DB context is scoped, so it needs its own scope outside of a request
+            using IServiceScope scope = _scopeFactory.CreateScope();
+            var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+            // only create the admin if the settings ask for it, to prevent arbitrarily creating a user with a possibly weak password
+            if (!_securitySettings.CreateAdmin)
+            {
+                if (!await CompiledQueries.AdminExists(context))
+                    _logger.LogWarning("No admins found, but settings specify not to initialize any admin");
+                return;
+            }
+
+            if (await CompiledQueries.UsernameTaken(context, _securitySettings.InitialUsername))
+            {
+                _logger.LogWarning("Cannot create admin because username '{Username}' already exists", _securitySettings.InitialUsername);
+                return;
+            }
+
+            context.Users.Add(new User()
+            {
+                Username = _securitySettings.InitialUsername,
+                Password = await _hasher.HashAsync(_securitySettings.InitialPassword),
+                Name = _securitySettings.InitialName,
+                Role = UserRoles.Admin,
+            });
+            await context.SaveChangesAsync(cancellationToken);
+        }
+
+        public Task StopAsync(CancellationToken cancellationToken) => Task.CompletedTask;
+    }
+}
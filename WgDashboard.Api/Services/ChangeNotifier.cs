@@ -0,0 +1,175 @@
+﻿using System.Text.Json;
+using System.Threading.Channels;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for pushing peer and user changes to the dashboards that are watching
+    /// </summary>
+    public interface IChangeNotifier
+    {
+        /// <summary>
+        /// Sends the change to every subscriber that may see it. Never blocks on a slow subscriber
+        /// </summary>
+        /// <param name="change">The change that was saved</param>
+        public void Publish(ChangeEvent change);
+
+
+        /// <summary>
+        /// Starts receiving changes
+        /// </summary>
+        /// <param name="ownerId">Only receive the changes of this user's peers and profile. Null receives every change</param>
+        /// <param name="lastEventId">The ID of the last event the client received before it reconnected, if any. The events after it are replayed</param>
+        /// <returns>The subscription. Dispose it to stop receiving changes</returns>
+        /// <exception cref="ServiceUnavailableException"></exception>
+        public ChangeSubscription Subscribe(int? ownerId, string? lastEventId);
+    }
+
+    /// <summary>
+    /// One client's queue of encoded events
+    /// </summary>
+    public sealed class ChangeSubscription : IDisposable
+    {
+        private readonly ChangeNotifier _notifier;
+        private readonly Channel<byte[]> _frames;
+
+        public int? OwnerId { get; }
+        public ChannelReader<byte[]> Reader { get => _frames.Reader; }
+
+        // set when the client fell behind or asked for events that are no longer kept. the queue is closed and the client has to reload
+        public bool Lagged { get; private set; } = false;
+
+        internal ChangeSubscription(ChangeNotifier notifier, int? ownerId, int bufferSize)
+        {
+            this._notifier = notifier;
+            this.OwnerId = ownerId;
+            this._frames = Channel.CreateBounded<byte[]>(new BoundedChannelOptions(bufferSize)
+            {
+                SingleReader = true,
+                SingleWriter = true, // only written while holding the notifier's lock
+            });
+        }
+
+        internal void Write(byte[] frame)
+        {
+            if (!Lagged && !_frames.Writer.TryWrite(frame))
+                MarkLagged();
+        }
+
+        internal void MarkLagged()
+        {
+            Lagged = true;
+            _frames.Writer.TryComplete();
+        }
+
+        internal void Complete() => _frames.Writer.TryComplete();
+
+        public void Dispose() => _notifier.Unsubscribe(this);
+    }
+
+    /// <summary>
+    /// <para>Fans changes out to the subscribers of this API instance. Each change is serialized and framed once, and the same bytes
+    /// are queued for every subscriber that may see it, so the cost of a change doesn't depend on how its JSON is written per client.</para>
+    ///
+    /// <para>Event IDs start with an ID for this process, so a client that reconnects after a restart is told to reload instead of
+    /// missing the changes made in between.</para>
+    /// </summary>
+    public class ChangeNotifier : IChangeNotifier
+    {
+        private readonly IChangeEventsSettings _settings;
+        private readonly string _instanceId = Guid.NewGuid().ToString("N")[..8];
+        private readonly object _lock = new object();
+        private readonly Queue<(long Sequence, int OwnerId, byte[] Frame)> _recent = new();
+        private ChangeSubscription[] _subscribers = Array.Empty<ChangeSubscription>(); // replaced instead of modified, so it can be read without copying
+        private long _sequence = 0;
+
+        public ChangeNotifier(IChangeEventsSettings settings)
+        {
+            this._settings = settings;
+        }
+
+        public void Publish(ChangeEvent change)
+        {
+            // nobody to send it to or to replay it for, so skip serializing it
+            if (_settings.ReplayEvents == 0 && Volatile.Read(ref _subscribers).Length == 0)
+                return;
+
+            string json = JsonSerializer.Serialize(change, NdJson.SerializerOptions); // same casing and serializers as the controllers
+
+            // sequence and fan-out under one lock, so that every subscriber sees the events in the order of their IDs
+            lock (_lock)
+            {
+                long sequence = ++_sequence;
+                byte[] frame = ServerSentEvents.Frame(_instanceId + ":" + sequence, "change", json);
+
+                if (_settings.ReplayEvents > 0)
+                {
+                    if (_recent.Count == _settings.ReplayEvents)
+                        _recent.Dequeue();
+                    _recent.Enqueue((sequence, change.OwnerId, frame));
+                }
+
+                foreach (ChangeSubscription subscriber in _subscribers)
+                {
+                    if (subscriber.OwnerId is null || subscriber.OwnerId == change.OwnerId)
+                        subscriber.Write(frame);
+                }
+            }
+        }
+
+        public ChangeSubscription Subscribe(int? ownerId, string? lastEventId)
+        {
+            lock (_lock)
+            {
+                if (_subscribers.Length >= _settings.MaxSubscribers)
+                    throw new ServiceUnavailableException("Too many clients are watching for changes", _settings.HeartbeatSeconds);
+
+                var subscription = new ChangeSubscription(this, ownerId, _settings.SubscriberBufferSize);
+                if (lastEventId is not null)
+                    Replay(subscription, lastEventId);
+
+                _subscribers = _subscribers.Append(subscription).ToArray();
+                return subscription;
+            }
+        }
+
+        /*
+         * Queues the events the client missed while it was disconnected, or marks it lagged if they aren't all kept any more. Called while holding the lock
+         */
+        private void Replay(ChangeSubscription subscription, string lastEventId)
+        {
+            string[] parts = lastEventId.Split(':');
+            long lastSequence;
+            if (parts.Length != 2 || parts[0] != _instanceId || !long.TryParse(parts[1], out lastSequence) || lastSequence > _sequence)
+            {
+                subscription.MarkLagged(); // from another process, e.g. before a restart
+                return;
+            }
+
+            long oldestKept = _recent.Count > 0 ? _recent.Peek().Sequence : _sequence + 1;
+            if (lastSequence + 1 < oldestKept)
+            {
+                subscription.MarkLagged();
+                return;
+            }
+
+            foreach (var (sequence, ownerId, frame) in _recent)
+            {
+                if (sequence > lastSequence && (subscription.OwnerId is null || subscription.OwnerId == ownerId))
+                    subscription.Write(frame);
+            }
+        }
+
+        internal void Unsubscribe(ChangeSubscription subscription)
+        {
+            lock (_lock)
+            {
+                _subscribers = _subscribers.Where((subscriber) => subscriber != subscription).ToArray();
+            }
+            subscription.Complete();
+        }
+    }
+}
@@ -0,0 +1,30 @@
+﻿using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the current user accessor
+    /// </summary>
+    public interface ICurrentUserAccessor
+    {
+        /// <summary>
+        /// The user making the current request. Read from the JWT the first time it is used, then reused for the rest of the request
+        /// </summary>
+        public CurrentUser User { get; }
+    }
+
+    /// <summary>
+    /// Implementation for the current user accessor. Registered as scoped, so there is one per request
+    /// </summary>
+    public class CurrentUserAccessor : ICurrentUserAccessor
+    {
+        private readonly Lazy<CurrentUser> _user;
+
+        public CurrentUserAccessor(IHttpContextAccessor httpContextAccessor)
+        {
+            this._user = new Lazy<CurrentUser>(() => CurrentUser.FromPrincipal(httpContextAccessor.HttpContext?.User), LazyThreadSafetyMode.None);
+        }
+
+        public CurrentUser User => _user.Value;
+    }
+}
@@ -1,11 +1,9 @@
 ﻿using Microsoft.EntityFrameworkCore;
-using Microsoft.IdentityModel.Tokens;
-using System.IdentityModel.Tokens.Jwt;
-using System.Security.Claims;
 using System.Security.Cryptography;
 using System.Text;
 using WgDashboard.Api.Data;
 using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
 using WgDashboard.Api.Models;
 
 namespace WgDashboard.Api.Services
@@ -32,46 +30,7 @@ namespace WgDashboard.Api.Services
 
 
         /// <summary>
-        /// Retrieves the user from the database via the user's ID in the JWT token
-        /// </summary>
-        /// <param name="httpContext">The HTTP context containing the JWT token</param>
-        /// <returns>The user that matches the user's ID if the user is found; otherwise null</returns>
-        public User? GetUserFromJwt(HttpContext httpContext);
-
-
-        /// <summary>
-        /// Retrieves the user from the database via the user's ID in the JWT token
-        /// </summary>
-        /// <param name="httpContext">The HTTP context containing the JWT token</param>
-        /// <returns>A task that resolves to the user that matches the ID if the user is found; otherwise a task that resolves to null</returns>
-        public Task<User?> GetUserFromJwtAsync(HttpContext httpContext);
-
-
-        /// <summary>
-        /// Retrieves the user's ID from the JWT token
-        /// </summary>
-        /// <param name="httpContext">The HTTP context containing the JWT token</param>
-        /// <returns>The user's ID if the ID is found in the token; otherwise 0</returns>
-        public int GetUserIdFromJwt(HttpContext httpContext);
-
-
-        /// <summary>
-        /// Retrieves the user's username from the JWT token
-        /// </summary>
-        /// <param name="httpContext">The HTTP context containing the JWT token</param>
-        /// <returns>The user's username if the username is found in the token; otherwise null</returns>
-        public string? GetUsernameFromJwt(HttpContext httpContext);
-
-
-        /// <summary>
-        /// Retrieves the user's role from the JWT token
-        /// </summary>
-        /// <param name="httpContext">The HTTP context containing the JWT token</param>
-        /// <returns>The user's role if the role is found in the token; otherwise an anonymous role</returns>
-        public string GetUserRoleFromJwt(HttpContext httpContext);
-
-        /// <summary>
-        /// Mutates the HttpContext such that the refresh token is added as a cookie
+        /// Mutates the HttpContext such that a new refresh token is added as a cookie. Each login gets its own token family.
         /// </summary>
         /// <param name="user"></param>
         /// <param name="httpContext"></param>
@@ -79,12 +38,18 @@ namespace WgDashboard.Api.Services
         public Task SetRefreshToken(User user, HttpContext httpContext);
 
         /// <summary>
-        /// Generates a new JWT token. Also mutates the HttpContext to rotate the refresh token.
+        /// Generates a new JWT token. Also mutates the HttpContext to rotate the refresh token. Replaying a token that was already rotated revokes its family.
         /// </summary>
         /// <param name="httpContext"></param>
         /// <returns>A JWT token</returns>
+        /// <exception cref="NotAuthorizedException"></exception>
         public Task<string> RefreshToken(HttpContext httpContext);
-        
+
+        /// <summary>
+        /// Revokes the refresh token in the cookie along with every token rotated from the same login
+        /// </summary>
+        /// <param name="httpContext"></param>
+        /// <exception cref="NotAuthorizedException"></exception>
         public Task RevokeRefreshToken(HttpContext httpContext);
     }
 
@@ -94,112 +59,30 @@ namespace WgDashboard.Api.Services
     /// </summary>
     public class IdentityService : IIdentityService
     {
-        private readonly IConfiguration _config;
+        private readonly ITokenIssuer _tokenIssuer;
         private readonly WireguardDbContext _context;
         private readonly IWebHostEnvironment _env;
-        private const double refreshTokenExpiry = 2.0;
+        private readonly IRefreshTokenSettings _refreshTokenSettings;
+        private readonly IRefreshTokenRevocations _revocations;
+        private readonly ITokenMetrics _metrics;
 
-        public IdentityService(IConfiguration apiConfig, WireguardDbContext dbContext, IWebHostEnvironment environment)
+        public IdentityService(ITokenIssuer tokenIssuer, WireguardDbContext dbContext, IWebHostEnvironment environment,
+            IRefreshTokenSettings refreshTokenSettings, IRefreshTokenRevocations revocations, ITokenMetrics tokenMetrics)
         {
-            this._config = apiConfig;
+            this._tokenIssuer = tokenIssuer;
             this._context = dbContext;
             this._env = environment;
+            this._refreshTokenSettings = refreshTokenSettings;
+            this._revocations = revocations;
+            this._metrics = tokenMetrics;
         }
 
-        public async Task<bool> CheckUserExistsAsync(int id)
-        {
-            User? existingUser = await _context.Users.Where((user) => user.Id == id).FirstOrDefaultAsync();
-            return existingUser != null;
-        }
+        public Task<bool> CheckUserExistsAsync(int id) => CompiledQueries.UserExists(_context, id);
 
         public string GenerateToken(UserProfile userProfile)
         {
-            var securityKey = new SymmetricSecurityKey(Encoding.UTF8.GetBytes(_config["JwtSettings:Key"]!)); // key validated to be not null by Program.cs
-            var credentials = new SigningCredentials(securityKey, SecurityAlgorithms.HmacSha256);
-            var claims = new Claim[]
-            {
-                new Claim(ClaimTypes.Sid, userProfile.Id.ToString()),
-                new Claim(ClaimTypes.NameIdentifier, userProfile.Username),
-                new Claim(ClaimTypes.Name, userProfile.Name ?? ""),
-                new Claim(ClaimTypes.Role, userProfile.Role),
-            };
-
-            var token = new JwtSecurityToken(
-                    _config["JwtSettings:Issuer"],
-                    _config["JwtSettings:Audience"],
-                    claims,
-                    expires: DateTime.Now.AddMinutes(15),
-                    signingCredentials: credentials
-                );
-
-            return new JwtSecurityTokenHandler().WriteToken(token);
-        }
-
-        public User? GetUserFromJwt(HttpContext httpContext)
-        {
-            // get the user's ID from the token
-            var identity = httpContext.User.Identity as ClaimsIdentity;
-            if (identity == null)
-                return null;
-
-            var identityClaims = identity.Claims;
-            int userId;
-            if (!int.TryParse(identityClaims.FirstOrDefault(claim => claim.Type == ClaimTypes.Sid)?.Value, out userId))
-                return null;
-
-            return _context.Users.Where((user) => user.Id == userId).FirstOrDefault();
-        }
-
-        public Task<User?> GetUserFromJwtAsync(HttpContext httpContext)
-        {
-            // get the user's ID from the token
-            var identity = httpContext.User.Identity as ClaimsIdentity;
-            if (identity is null)
-                return Task.FromResult<User?>(null);
-
-            var identityClaims = identity.Claims;
-            int userId;
-            // guard against user not found from token
-            if (!int.TryParse(identityClaims.FirstOrDefault(claim => claim.Type == ClaimTypes.Sid)?.Value, out userId))
-                return Task.FromResult<User?>(null);
-
-            return _context.Users.Where((user) => user.Id == userId).FirstOrDefaultAsync();
-        }
-
-        public int GetUserIdFromJwt(HttpContext httpContext)
-        {
-            var identity = httpContext.User.Identity as ClaimsIdentity;
-            if (identity is null)
-                return 0;
-
-            IEnumerable<Claim> identityClaims = identity.Claims;
-
-            int userId;
-            if (!int.TryParse(identityClaims.FirstOrDefault((claim) => claim.Type == ClaimTypes.Sid)?.Value, out userId))
-                return 0;
-            else
-                return userId;
-
-        }
-
-        public string? GetUsernameFromJwt(HttpContext httpContext)
-        {
-            var identity = httpContext.User.Identity as ClaimsIdentity;
-            if (identity is null)
-                return null;
-
-            IEnumerable<Claim> identityClaims = identity.Claims;
-            return identityClaims.FirstOrDefault((claim) => claim.Type == ClaimTypes.NameIdentifier)?.Value;
-        }
-
-        public string GetUserRoleFromJwt(HttpContext httpContext)
-        {
-            var identity = httpContext.User.Identity as ClaimsIdentity;
-            if (identity is null)
-                return UserRoles.Anonymous;
-
-            IEnumerable<Claim> identityClaims = identity.Claims;
-            return identityClaims.FirstOrDefault((claim) => claim.Type == ClaimTypes.Role)?.Value ?? UserRoles.Anonymous;
+            _metrics.AccessTokenIssued(TokenMetrics.Login);
+            return _tokenIssuer.IssueAccessToken(userProfile);
         }
 
         private string GenerateRandomRefreshToken()
@@ -211,69 +94,121 @@ namespace WgDashboard.Api.Services
 
         }
 
-        public async Task SetRefreshToken(User user, HttpContext httpContext)
+        /*
+         * Only the hash of a refresh token is stored. It has a fixed length, so it can be indexed
+         */
+        private static string HashRefreshToken(string refreshToken) => Convert.ToHexString(SHA256.HashData(Encoding.UTF8.GetBytes(refreshToken)));
+
+        /*
+         * Finds the refresh token in the cookie, along with its user, with one lookup on the unique index
+         */
+        private Task<RefreshToken?> FindRefreshToken(HttpContext httpContext)
         {
-            string refreshToken = GenerateRandomRefreshToken();
+            string? refreshToken = httpContext.Request.Cookies["RefreshToken"];
+            if (string.IsNullOrEmpty(refreshToken))
+                return Task.FromResult<RefreshToken?>(null);
 
-            DateTime expirationDate = DateTime.Now.AddDays(refreshTokenExpiry);
+            return CompiledQueries.TrackedRefreshTokenByHash(_context, HashRefreshToken(refreshToken));
+        }
+
+        /*
+         * Adds a new token to the family and sets it as the cookie. Saved along with any other pending changes
+         */
+        private async Task IssueRefreshToken(int userId, Guid familyId, HttpContext httpContext)
+        {
+            string refreshToken = GenerateRandomRefreshToken();
+            DateTime expiresAt = DateTime.UtcNow.AddDays(_refreshTokenSettings.LifetimeDays);
 
-            user.RefreshToken = refreshToken;
-            user.RefreshTokenExpiry = expirationDate;
+            _context.RefreshTokens.Add(new RefreshToken()
+            {
+                TokenHash = HashRefreshToken(refreshToken),
+                FamilyId = familyId,
+                UserId = userId,
+                ExpiresAt = expiresAt,
+            });
             await _context.SaveChangesAsync();
 
             httpContext.Response.Cookies.Append("RefreshToken", refreshToken, new CookieOptions()
             {
-                Expires = expirationDate,
+                Expires = expiresAt,
                 HttpOnly = true,
                 Secure = true,
                 SameSite = SameSiteMode.None,
             });
         }
 
+        /*
+         * Logs out every device that got its token from the same login
+         */
+        private async Task RevokeFamily(Guid familyId, string reason)
+        {
+            _metrics.FamilyRevoked(reason);
+
+            // the newest token in the family can't outlive this
+            _revocations.Revoke(familyId, DateTime.UtcNow.AddDays(_refreshTokenSettings.LifetimeDays));
+
+            IQueryable<RefreshToken> family = _context.RefreshTokens.Where((token) => token.FamilyId == familyId);
+            // the in-memory database used in development can't run set-based deletes
+            if (_context.Database.IsRelational())
+                await family.ExecuteDeleteAsync();
+            else
+            {
+                _context.RefreshTokens.RemoveRange(await family.ToListAsync());
+                await _context.SaveChangesAsync();
+            }
+        }
+
+        public Task SetRefreshToken(User user, HttpContext httpContext) =>
+            IssueRefreshToken(user.Id, Guid.NewGuid(), httpContext); // each login is its own family, so logging in on another device doesn't log out this one
+
         public async Task<string> RefreshToken(HttpContext httpContext)
         {
-            User? user = await _context.Users.Where((u) => u.RefreshToken == httpContext.Request.Cookies["RefreshToken"]).FirstOrDefaultAsync();
-            if (user is null || user.RefreshToken is null)
+            RefreshToken? token = await FindRefreshToken(httpContext);
+            if (token is null || DateTime.UtcNow > token.ExpiresAt || _revocations.IsRevoked(token.FamilyId))
+            {
+                _metrics.RefreshRejected(TokenMetrics.Invalid);
                 throw new NotAuthorizedException("Bad refresh token");
+            }
 
-            if (DateTime.Now > user.RefreshTokenExpiry)
+            // the token was already rotated, so it is being replayed. either it or its replacement may have been stolen, so log out both
+            if (token.UsedAt is not null)
+            {
+                _metrics.RefreshRejected(TokenMetrics.Replayed);
+                await RevokeFamily(token.FamilyId, TokenMetrics.Replayed);
                 throw new NotAuthorizedException("Bad refresh token");
+            }
 
-            string refreshToken = GenerateRandomRefreshToken();
-            user.RefreshToken = refreshToken;
-            user.RefreshTokenExpiry = DateTime.Now.AddDays(refreshTokenExpiry);
-            await _context.SaveChangesAsync();
-
-            httpContext.Response.Cookies.Append("RefreshToken", refreshToken, new CookieOptions()
+            // rotate: the used token is marked in the same save that adds its replacement
+            token.UsedAt = DateTime.UtcNow;
+            try
             {
-                Expires = user.RefreshTokenExpiry,
-                HttpOnly = true,
-                Secure = true,
-                SameSite = SameSiteMode.None,
-            });
+                await IssueRefreshToken(token.UserId, token.FamilyId, httpContext);
+            }
+            catch (DbUpdateConcurrencyException)
+            {
+                _metrics.RefreshRejected(TokenMetrics.Raced);
+                throw new NotAuthorizedException("Bad refresh token"); // another request rotated the same token first
+            }
 
             // do this last since jwt is short-lived
-            string jwt = GenerateToken(new UserProfile()
+            _metrics.AccessTokenIssued(TokenMetrics.Refresh);
+            string jwt = _tokenIssuer.IssueAccessToken(new UserProfile()
             {
-                Id = user.Id,
-                Username = user.Username,
-                Name = user.Name,
-                Role = user.Role,
+                Id = token.User.Id,
+                Username = token.User.Username,
+                Name = token.User.Name,
+                Role = token.User.Role,
             });
             return jwt;
         }
 
         public async Task RevokeRefreshToken(HttpContext httpContext)
         {
-            User? user = await _context.Users.Where((u) => u.RefreshToken == httpContext.Request.Cookies["RefreshToken"]).FirstOrDefaultAsync();
-            if (user is null || user.RefreshToken is null)
+            RefreshToken? token = await FindRefreshToken(httpContext);
+            if (token is null || DateTime.UtcNow > token.ExpiresAt)
                 throw new NotAuthorizedException("Bad refresh token");
 
-            if (DateTime.Now > user.RefreshTokenExpiry)
-                throw new NotAuthorizedException("Bad refresh token");
-
-            user.RefreshTokenExpiry = new DateTime();
-            await _context.SaveChangesAsync();
+            await RevokeFamily(token.FamilyId, TokenMetrics.Logout);
         }
     }
 }
@@ -0,0 +1,134 @@
+﻿using Microsoft.EntityFrameworkCore;
+using System.Data.Common;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Builds the address index on startup and keeps it in line with the database</para>
+    ///
+    /// <para>On startup, peers added before their subnet was configured get an IpAllocation row for their address, so that it can't be handed out again.
+    /// Every IpAllocation:SweepIntervalMinutes, expired leases are deleted and the index is rebuilt to pick up addresses taken or freed by other API instances.</para>
+    /// </summary>
+    public class IpAllocationService : BackgroundService
+    {
+        private const int BACKFILL_BATCH_SIZE = 1000;
+
+        private readonly IServiceScopeFactory _scopeFactory;
+        private readonly IIpAllocationSettings _settings;
+        private readonly IIpAllocator _allocator;
+        private readonly ILogger<IpAllocationService> _logger;
+
+        public IpAllocationService(IServiceScopeFactory scopeFactory, IIpAllocationSettings settings, IIpAllocator allocator, ILogger<IpAllocationService> logger)
+        {
+            this._scopeFactory = scopeFactory;
+            this._settings = settings;
+            this._allocator = allocator;
+            this._logger = logger;
+        }
+
+        protected override async Task ExecuteAsync(CancellationToken stoppingToken)
+        {
+            try
+            {
+                int backfilled = await BackfillPeers(stoppingToken);
+                if (backfilled > 0)
+                    _logger.LogInformation("Recorded the addresses of {Backfilled} existing peers", backfilled);
+            }
+            catch (Exception e) when (e is DbException or DbUpdateException)
+                { _logger.LogWarning(e, "Could not record the addresses of existing peers"); }
+
+            using var timer = new PeriodicTimer(TimeSpan.FromMinutes(_settings.SweepIntervalMinutes));
+            do
+            {
+                try
+                {
+                    // the DB context is scoped, so it needs its own scope outside of a request
+                    using IServiceScope scope = _scopeFactory.CreateScope();
+                    var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+                    int expired = await DeleteExpiredLeases(context, stoppingToken);
+                    await _allocator.Rebuild(context, stoppingToken);
+                    if (expired > 0)
+                        _logger.LogInformation("Freed {Expired} addresses whose leases expired", expired);
+                }
+                catch (Exception e) when (e is DbException or DbUpdateException)
+                    { _logger.LogWarning(e, "Could not rebuild the address index. Trying again in {Minutes} minutes", _settings.SweepIntervalMinutes); }
+            }
+            while (await timer.WaitForNextTickAsync(stoppingToken));
+        }
+
+        private static async Task<int> DeleteExpiredLeases(WireguardDbContext context, CancellationToken stoppingToken)
+        {
+            DateTime now = DateTime.UtcNow;
+            IQueryable<IpAllocation> expired = context.IpAllocations.Where((allocation) => allocation.PeerId == null && allocation.ExpiresAt < now);
+
+            // the in-memory database used in development can't run set-based deletes
+            if (context.Database.IsRelational())
+                return await expired.ExecuteDeleteAsync(stoppingToken);
+
+            List<IpAllocation> leases = await expired.ToListAsync(stoppingToken);
+            context.IpAllocations.RemoveRange(leases);
+            await context.SaveChangesAsync(stoppingToken);
+            return leases.Count;
+        }
+
+        /*
+         * Records the addresses of peers that don't have an IpAllocation yet, a batch at a time. A peer whose address is already taken is left out
+         * and logged, since two peers with the same address were allowed before addresses were checked
+         */
+        private async Task<int> BackfillPeers(CancellationToken stoppingToken)
+        {
+            int backfilled = 0;
+            int afterId = 0;
+            while (true)
+            {
+                using IServiceScope scope = _scopeFactory.CreateScope();
+                var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+                var peers = await context.Peers.AsNoTracking()
+                    .Where((peer) => peer.Id > afterId && peer.IpAllocation == null)
+                    .OrderBy((peer) => peer.Id)
+                    .Select((peer) => new { peer.Id, peer.AllowedIPs })
+                    .Take(BACKFILL_BATCH_SIZE)
+                    .ToListAsync(stoppingToken);
+                if (peers.Count == 0)
+                    return backfilled;
+                afterId = peers[^1].Id;
+
+                var addresses = new Dictionary<string, int>();
+                foreach (var peer in peers)
+                {
+                    CidrNetwork network;
+                    if (!CidrNetwork.TryParse(peer.AllowedIPs, out network) || network.PrefixLength != 32)
+                        continue;
+                    string address = network.Address.ToString();
+                    if (_allocator.IsAllocatable(address) && !addresses.TryAdd(address, peer.Id))
+                        _logger.LogWarning("Peer with ID {Id} has the same address as peer with ID {OtherId}: {Address}", peer.Id, addresses[address], address);
+                }
+
+                List<string> candidates = addresses.Keys.ToList();
+                var taken = new HashSet<string>(await context.IpAllocations.AsNoTracking()
+                    .Where((allocation) => candidates.Contains(allocation.Address))
+                    .Select((allocation) => allocation.Address)
+                    .ToListAsync(stoppingToken));
+                foreach (var (address, peerId) in addresses)
+                {
+                    if (taken.Contains(address))
+                        _logger.LogWarning("Peer with ID {Id} has an address that is already taken: {Address}", peerId, address);
+                    else
+                        context.IpAllocations.Add(new IpAllocation() { Address = address, PeerId = peerId });
+                }
+
+                try
+                {
+                    backfilled += await context.SaveChangesAsync(stoppingToken);
+                }
+                catch (DbUpdateException e) when (DbErrors.IsConstraintViolation(e, "IX_IpAllocation_Address") || DbErrors.IsConstraintViolation(e, "IX_IpAllocation_PeerId"))
+                    { _logger.LogWarning("Another API instance recorded some of the same addresses. They'll be picked up on the next start"); }
+            }
+        }
+    }
+}
@@ -0,0 +1,304 @@
+﻿using Microsoft.EntityFrameworkCore;
+using System.Buffers.Binary;
+using System.Net;
+using System.Numerics;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Helpers;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the index of free addresses in the configured subnets
+    /// </summary>
+    public interface IIpAllocator
+    {
+        /// <summary>
+        /// Whether any subnets are configured. If not, peers' allowed IPs are taken as given
+        /// </summary>
+        public bool Enabled { get; }
+
+
+        /// <summary>
+        /// Builds the index from the database if it hasn't been built yet
+        /// </summary>
+        /// <param name="context">The database to read the addresses in use from</param>
+        /// <param name="cancellationToken">Cancels the read</param>
+        /// <returns>A task that resolves once the index is built</returns>
+        public Task EnsureLoaded(WireguardDbContext context, CancellationToken cancellationToken = default);
+
+
+        /// <summary>
+        /// Rebuilds the index from the database, picking up addresses taken or freed by other API instances
+        /// </summary>
+        /// <param name="context">The database to read the addresses in use from</param>
+        /// <param name="cancellationToken">Cancels the read</param>
+        /// <returns>A task that resolves once the index is rebuilt</returns>
+        public Task Rebuild(WireguardDbContext context, CancellationToken cancellationToken = default);
+
+
+        /// <summary>
+        /// Marks the next free address as taken
+        /// </summary>
+        /// <returns>The address, e.g. 10.8.0.5, or null if every subnet is full</returns>
+        public string? TakeNext();
+
+
+        /// <summary>
+        /// Marks the given address as taken
+        /// </summary>
+        /// <param name="address">The address, e.g. 10.8.0.5</param>
+        /// <returns>True if the address is in a subnet and was free; otherwise false</returns>
+        public bool TryTake(string address);
+
+
+        /// <summary>
+        /// Checks whether the address is in one of the subnets and isn't reserved
+        /// </summary>
+        /// <param name="address">The address, e.g. 10.8.0.5</param>
+        /// <returns>True if the address could be handed out; otherwise false</returns>
+        public bool IsAllocatable(string address);
+
+
+        /// <summary>
+        /// Marks the address as free again, e.g. after the peer using it was deleted
+        /// </summary>
+        /// <param name="address">The address, e.g. 10.8.0.5</param>
+        public void Release(string address);
+    }
+
+    /// <summary>
+    /// <para>Keeps one bitmap per configured subnet, with one bit per address, plus a cursor to the last address handed out.
+    /// Handing out addresses in order only looks at the next few bits, and a full word of 64 taken addresses is skipped in one step.</para>
+    ///
+    /// <para>The index only makes collisions unlikely. The database has the final say: the unique index on IpAllocation.Address rejects an address
+    /// that another API instance took since the index was built, and the caller takes the next one.</para>
+    /// </summary>
+    public class IpAllocator : IIpAllocator
+    {
+        private readonly IIpAllocationSettings _settings;
+        private readonly SubnetIndex[] _subnets;
+        private readonly SemaphoreSlim _loadLock = new SemaphoreSlim(1, 1);
+        private readonly object _lock = new object();
+        private bool _loaded = false;
+
+        public bool Enabled { get => _settings.Enabled; }
+
+        public IpAllocator(IIpAllocationSettings settings)
+        {
+            this._settings = settings;
+            this._subnets = settings.Subnets.Select((subnet) => new SubnetIndex(subnet)).ToArray();
+            Clear();
+        }
+
+        public async Task EnsureLoaded(WireguardDbContext context, CancellationToken cancellationToken = default)
+        {
+            if (_loaded || !Enabled)
+                return;
+
+            await _loadLock.WaitAsync(cancellationToken);
+            try
+            {
+                if (!_loaded)
+                    await Rebuild(context, cancellationToken);
+            }
+            finally
+                { _loadLock.Release(); }
+        }
+
+        public async Task Rebuild(WireguardDbContext context, CancellationToken cancellationToken = default)
+        {
+            if (!Enabled)
+                return;
+
+            // every allocation except leases that have run out, plus peers added before their subnet was configured
+            DateTime now = DateTime.UtcNow;
+            List<string> allocated = await context.IpAllocations.AsNoTracking()
+                .Where((allocation) => allocation.PeerId != null || allocation.ExpiresAt > now)
+                .Select((allocation) => allocation.Address)
+                .ToListAsync(cancellationToken);
+            List<string> unallocatedPeers = await context.Peers.AsNoTracking()
+                .Where((peer) => peer.IpAllocation == null)
+                .Select((peer) => peer.AllowedIPs)
+                .ToListAsync(cancellationToken);
+
+            lock (_lock)
+            {
+                Clear();
+                foreach (string address in allocated)
+                    Mark(address, true);
+                foreach (string allowedIPs in unallocatedPeers)
+                {
+                    CidrNetwork network;
+                    if (CidrNetwork.TryParse(allowedIPs, out network) && network.PrefixLength == 32)
+                        Mark(network.Address.ToString(), true);
+                }
+                _loaded = true;
+            }
+        }
+
+        public string? TakeNext()
+        {
+            lock (_lock)
+            {
+                foreach (SubnetIndex subnet in _subnets)
+                {
+                    int offset = subnet.TakeNext();
+                    if (offset >= 0)
+                        return subnet.AddressAt(offset);
+                }
+                return null;
+            }
+        }
+
+        public bool TryTake(string address)
+        {
+            lock (_lock)
+            {
+                if (!IsAllocatable(address))
+                    return false;
+                return Mark(address, true);
+            }
+        }
+
+        public bool IsAllocatable(string address)
+        {
+            IPAddress? parsedAddress;
+            if (!IPAddress.TryParse(address, out parsedAddress))
+                return false;
+
+            foreach (SubnetIndex subnet in _subnets)
+            {
+                if (subnet.Network.Contains(parsedAddress))
+                    return !subnet.IsReserved(subnet.OffsetOf(parsedAddress)) && !_settings.Reserved.Contains(parsedAddress);
+            }
+            return false;
+        }
+
+        public void Release(string address)
+        {
+            lock (_lock)
+            {
+                if (IsAllocatable(address))
+                    Mark(address, false);
+            }
+        }
+
+        /*
+         * Empties every bitmap, then marks the addresses that are never handed out
+         */
+        private void Clear()
+        {
+            foreach (SubnetIndex subnet in _subnets)
+                subnet.Clear();
+            foreach (IPAddress reserved in _settings.Reserved)
+                Mark(reserved.ToString(), true);
+        }
+
+        /*
+         * Sets the address's bit. Returns true if the bit changed
+         */
+        private bool Mark(string address, bool taken)
+        {
+            IPAddress? parsedAddress;
+            if (!IPAddress.TryParse(address, out parsedAddress))
+                return false;
+
+            foreach (SubnetIndex subnet in _subnets)
+            {
+                if (subnet.Network.Contains(parsedAddress))
+                    return subnet.Set(subnet.OffsetOf(parsedAddress), taken);
+            }
+            return false;
+        }
+
+        /*
+         * The bitmap of one subnet. Bit N is the Nth address of the subnet, set if the address is taken. Not thread-safe on its own
+         */
+        private sealed class SubnetIndex
+        {
+            public CidrNetwork Network { get; }
+            private readonly uint _first;
+            private readonly int _size;
+            private readonly ulong[] _bits;
+            private int _free;
+            private int _cursor = 0;
+
+            public SubnetIndex(CidrNetwork network)
+            {
+                this.Network = network;
+                this._size = 1 << (32 - network.PrefixLength);
+                this._first = BinaryPrimitives.ReadUInt32BigEndian(network.Address.GetAddressBytes()) & ~(uint)(_size - 1);
+                this._bits = new ulong[(_size + 63) / 64];
+            }
+
+            // the network and broadcast addresses
+            public bool IsReserved(int offset) => offset == 0 || offset == _size - 1;
+
+            public int OffsetOf(IPAddress address) => (int)(BinaryPrimitives.ReadUInt32BigEndian(address.GetAddressBytes()) - _first);
+
+            public string AddressAt(int offset)
+            {
+                var bytes = new byte[4];
+                BinaryPrimitives.WriteUInt32BigEndian(bytes, _first + (uint)offset);
+                return new IPAddress(bytes).ToString();
+            }
+
+            public void Clear()
+            {
+                Array.Clear(_bits);
+                // the bits past the end of the subnet count as taken, so a search never returns them
+                for (int offset = _size; offset < _bits.Length * 64; offset++)
+                    _bits[offset / 64] |= 1UL << (offset % 64);
+                _free = _size;
+                Set(0, true);
+                Set(_size - 1, true);
+            }
+
+            public bool Set(int offset, bool taken)
+            {
+                ulong mask = 1UL << (offset % 64);
+                bool wasTaken = (_bits[offset / 64] & mask) != 0;
+                if (wasTaken == taken)
+                    return false;
+
+                if (taken)
+                {
+                    _bits[offset / 64] |= mask;
+                    _free--;
+                }
+                else
+                {
+                    _bits[offset / 64] &= ~mask;
+                    _free++;
+                }
+                return true;
+            }
+
+            /*
+             * Takes the first free address at or after the cursor, wrapping around. Returns its offset, or -1 if the subnet is full
+             */
+            public int TakeNext()
+            {
+                if (_free == 0)
+                    return -1;
+
+                int startWord = _cursor / 64;
+                for (int i = 0; i <= _bits.Length; i++)
+                {
+                    int word = (startWord + i) % _bits.Length;
+                    ulong freeBits = ~_bits[word];
+                    if (i == 0)
+                        freeBits &= ulong.MaxValue << (_cursor % 64); // only addresses after the cursor in the first word
+                    if (freeBits == 0)
+                        continue;
+
+                    int offset = word * 64 + BitOperations.TrailingZeroCount(freeBits);
+                    Set(offset, true);
+                    _cursor = (offset + 1) % _size;
+                    return offset;
+                }
+                return -1;
+            }
+        }
+    }
+}
@@ -0,0 +1,77 @@
+﻿using System.Diagnostics;
+using WgDashboard.Api.Helpers;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Measures how long BCrypt takes on this host for work factors around the configured one and logs the results once on startup</para>
+    ///
+    /// <para>Used to pick PasswordHashing:WorkFactor so that logins stay within PasswordHashing:LoginLatencyBudgetMs. Runs only when
+    /// PasswordHashing:BenchmarkOnStartup is true.</para>
+    /// </summary>
+    public class PasswordHashBenchmarkService : BackgroundService
+    {
+        private const int SAMPLES_PER_FACTOR = 3;
+        private const int FACTORS_AROUND_CONFIGURED = 2;
+
+        private readonly IPasswordHashingSettings _settings;
+        private readonly ILogger<PasswordHashBenchmarkService> _logger;
+
+        public PasswordHashBenchmarkService(IPasswordHashingSettings settings, ILogger<PasswordHashBenchmarkService> logger)
+        {
+            this._settings = settings;
+            this._logger = logger;
+        }
+
+        protected override Task ExecuteAsync(CancellationToken stoppingToken)
+        {
+            if (!_settings.BenchmarkOnStartup)
+                return Task.CompletedTask;
+
+            // hashing blocks for up to seconds at a time, so keep it off the thread pool
+            return Task.Factory.StartNew(() => RunBenchmark(stoppingToken), stoppingToken, TaskCreationOptions.LongRunning, TaskScheduler.Default);
+        }
+
+        private void RunBenchmark(CancellationToken stoppingToken)
+        {
+            int lowestFactor = Math.Max(PasswordHashingSettings.MinWorkFactor, _settings.WorkFactor - FACTORS_AROUND_CONFIGURED);
+            int highestFactor = Math.Min(PasswordHashingSettings.MaxWorkFactor, _settings.WorkFactor + FACTORS_AROUND_CONFIGURED);
+            int? recommendedFactor = null;
+
+            for (int workFactor = lowestFactor; workFactor <= highestFactor && !stoppingToken.IsCancellationRequested; workFactor++)
+            {
+                double medianMs = MeasureHashMs(workFactor);
+                _logger.LogInformation("BCrypt work factor {WorkFactor}: {MedianMs:F0} ms per hash (median of {Samples}){Configured}",
+                    workFactor, medianMs, SAMPLES_PER_FACTOR, workFactor == _settings.WorkFactor ? ", configured" : "");
+
+                if (medianMs <= _settings.LoginLatencyBudgetMs)
+                    recommendedFactor = workFactor;
+                else
+                    break; // every higher factor takes twice as long
+            }
+
+            if (stoppingToken.IsCancellationRequested)
+                return;
+
+            if (recommendedFactor is null)
+                _logger.LogWarning("No BCrypt work factor from {Lowest} fits the login latency budget of {BudgetMs} ms", lowestFactor, _settings.LoginLatencyBudgetMs);
+            else
+                _logger.LogInformation("Highest BCrypt work factor within the login latency budget of {BudgetMs} ms: {WorkFactor}",
+                    _settings.LoginLatencyBudgetMs, recommendedFactor);
+        }
+
+        private static double MeasureHashMs(int workFactor)
+        {
+            var samples = new double[SAMPLES_PER_FACTOR];
+            for (int i = 0; i < samples.Length; i++)
+            {
+                long startTimestamp = Stopwatch.GetTimestamp();
+                BCrypt.Net.BCrypt.EnhancedHashPassword("benchmark-password", workFactor);
+                samples[i] = Stopwatch.GetElapsedTime(startTimestamp).TotalMilliseconds;
+            }
+
+            Array.Sort(samples);
+            return samples[samples.Length / 2];
+        }
+    }
+}
@@ -0,0 +1,181 @@
+﻿using System.Diagnostics;
+using System.Diagnostics.Metrics;
+using System.Threading.Channels;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the password hasher
+    /// </summary>
+    public interface IPasswordHasher
+    {
+        /// <summary>
+        /// The configured BCrypt work factor that new hashes are created with
+        /// </summary>
+        public int WorkFactor { get; }
+
+
+        /// <summary>
+        /// Hashes the password with BCrypt at the configured work factor on one of the hashing workers
+        /// </summary>
+        /// <param name="password">The unhashed password</param>
+        /// <returns>The hashed password</returns>
+        /// <exception cref="ServiceUnavailableException"></exception>
+        public Task<string> HashAsync(string password);
+
+
+        /// <summary>
+        /// Checks the password against a BCrypt hash on one of the hashing workers
+        /// </summary>
+        /// <param name="password">The unhashed password</param>
+        /// <param name="hashedPassword">The hash to check against</param>
+        /// <returns>True if the password matches the hash; otherwise false</returns>
+        /// <exception cref="ServiceUnavailableException"></exception>
+        public Task<bool> VerifyAsync(string password, string hashedPassword);
+
+
+        /// <summary>
+        /// Checks whether a stored hash was created with a different work factor than the configured one, either higher or lower
+        /// </summary>
+        /// <param name="hashedPassword">The stored hash</param>
+        /// <returns>True if the password should be hashed again; otherwise false</returns>
+        public bool NeedsRehash(string hashedPassword);
+    }
+
+    /// <summary>
+    /// <para>Runs BCrypt on a fixed number of dedicated threads instead of the thread pool, so that a burst of logins can't starve request processing</para>
+    ///
+    /// <para>Work waits in a bounded queue. When the queue is full, the request is rejected right away instead of waiting behind everyone else.</para>
+    /// </summary>
+    public sealed class PasswordHasher : IPasswordHasher, IDisposable
+    {
+        public const string MeterName = "WgDashboard.Api.PasswordHashing";
+
+        private static readonly ActivitySource ActivitySource = new ActivitySource(MeterName);
+
+        private readonly Channel<Action> _queue;
+        private readonly Thread[] _workers;
+        private readonly int _retryAfterSeconds;
+        public int WorkFactor { get; }
+        private readonly Histogram<double> _duration;
+        private readonly Histogram<double> _queueTime;
+        private readonly Counter<long> _rejected;
+
+        public PasswordHasher(IPasswordHashingSettings settings, IMeterFactory meterFactory)
+        {
+            this._retryAfterSeconds = settings.RetryAfterSeconds;
+            this.WorkFactor = settings.WorkFactor;
+            this._queue = Channel.CreateBounded<Action>(new BoundedChannelOptions(settings.QueueCapacity)
+            {
+                SingleWriter = false,
+                SingleReader = false,
+            });
+
+            Meter meter = meterFactory.Create(MeterName);
+            meter.CreateObservableGauge("wgdashboard.password_hashing.queue_depth", () => _queue.Reader.Count,
+                description: "Number of hashes waiting for a worker");
+            this._duration = meter.CreateHistogram<double>("wgdashboard.password_hashing.duration", unit: "ms",
+                description: "Time spent hashing or verifying a password, excluding time in the queue");
+            this._queueTime = meter.CreateHistogram<double>("wgdashboard.password_hashing.queue_time", unit: "ms",
+                description: "Time a hash waited in the queue for a worker");
+            this._rejected = meter.CreateCounter<long>("wgdashboard.password_hashing.rejected",
+                description: "Number of hashes rejected because the queue was full");
+
+            this._workers = new Thread[settings.WorkerCount];
+            for (int i = 0; i < _workers.Length; i++)
+            {
+                _workers[i] = new Thread(RunWorker)
+                {
+                    IsBackground = true,
+                    Name = $"password-hasher-{i}",
+                };
+                _workers[i].Start();
+            }
+        }
+
+        public Task<string> HashAsync(string password) =>
+            Run("hash", () => BCrypt.Net.BCrypt.EnhancedHashPassword(password, WorkFactor));
+
+        public Task<bool> VerifyAsync(string password, string hashedPassword) =>
+            Run("verify", () => BCrypt.Net.BCrypt.EnhancedVerify(password, hashedPassword));
+
+        public bool NeedsRehash(string hashedPassword)
+        {
+            int? workFactor = GetWorkFactor(hashedPassword);
+            return workFactor is not null && workFactor != WorkFactor;
+        }
+
+        /// <summary>
+        /// Reads the work factor from a BCrypt hash, e.g. 12 from "$2a$12$..."
+        /// </summary>
+        /// <param name="hashedPassword">The BCrypt hash</param>
+        /// <returns>The work factor, or null if the hash isn't a BCrypt hash</returns>
+        public static int? GetWorkFactor(string hashedPassword)
+        {
+            string[] parts = hashedPassword.Split('$');
+            if (parts.Length < 4 || !int.TryParse(parts[2], out int workFactor))
+                return null;
+            return workFactor;
+        }
+
+        /*
+         * Wraps the queued work in a span of the request's trace, covering both the wait in the queue and the hashing.
+         * Async so that the span stops being Activity.Current once it ends, instead of leaking into the caller
+         */
+        private async Task<T> Run<T>(string operation, Func<T> work)
+        {
+            using Activity? activity = ActivitySource.StartActivity("password_hashing " + operation);
+            return await Enqueue(operation, work);
+        }
+
+        private Task<T> Enqueue<T>(string operation, Func<T> work)
+        {
+            // continuations run on the thread pool, not on the hashing worker
+            var completion = new TaskCompletionSource<T>(TaskCreationOptions.RunContinuationsAsynchronously);
+            long enqueueTimestamp = Stopwatch.GetTimestamp();
+            var job = () =>
+            {
+                _queueTime.Record(Stopwatch.GetElapsedTime(enqueueTimestamp).TotalMilliseconds, new KeyValuePair<string, object?>("operation", operation));
+                long startTimestamp = Stopwatch.GetTimestamp();
+                try
+                {
+                    completion.SetResult(work());
+                }
+                catch (Exception e)
+                    { completion.SetException(e); }
+                finally
+                    { _duration.Record(Stopwatch.GetElapsedTime(startTimestamp).TotalMilliseconds, new KeyValuePair<string, object?>("operation", operation)); }
+            };
+
+            // guard against a full queue: fail fast so the client can back off
+            if (!_queue.Writer.TryWrite(job))
+            {
+                _rejected.Add(1, new KeyValuePair<string, object?>("operation", operation));
+                throw new ServiceUnavailableException("Too many logins in progress. Try again later", _retryAfterSeconds);
+            }
+
+            return completion.Task;
+        }
+
+        private void RunWorker()
+        {
+            ChannelReader<Action> reader = _queue.Reader;
+
+            // blocking is fine here since the thread does nothing else
+            while (reader.WaitToReadAsync().AsTask().GetAwaiter().GetResult())
+            {
+                while (reader.TryRead(out Action? job))
+                    job();
+            }
+        }
+
+        public void Dispose()
+        {
+            _queue.Writer.TryComplete();
+            foreach (Thread worker in _workers)
+                worker.Join();
+        }
+    }
+}
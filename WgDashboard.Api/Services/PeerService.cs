@@ -1,7 +1,9 @@
 ﻿using Microsoft.EntityFrameworkCore;
 using System.ComponentModel;
+using System.Runtime.CompilerServices;
 using WgDashboard.Api.Data;
 using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
 using WgDashboard.Api.Models;
 
 namespace WgDashboard.Api.Services
@@ -10,10 +12,21 @@ namespace WgDashboard.Api.Services
     {
         
         /// <summary>
-        /// Gets all peers
+        /// Gets one page of peers, ordered by ID, that match the given filters. The peers are streamed from the database.
         /// </summary>
-        /// <returns>An enumerable of peers</returns>
-        public IEnumerable<PeerProfile> GetAllPeers();
+        /// <param name="query">The page to get and the filters to apply</param>
+        /// <returns>An async enumerable of peer profiles</returns>
+        /// <exception cref="BadRequestException"></exception>
+        public IAsyncEnumerable<PeerProfile> GetAllPeers(PeerListRequest query);
+
+
+        /// <summary>
+        /// Gets one page of peers, ordered by ID, whose allowed IPs contain an IPv4 address or fall within an IPv4 network
+        /// </summary>
+        /// <param name="query">The page to get and the address or network to search for</param>
+        /// <returns>An async enumerable of peer profiles</returns>
+        /// <exception cref="BadRequestException"></exception>
+        public IAsyncEnumerable<PeerProfile> SearchPeers(PeerSearchRequest query);
 
 
         /// <summary>
@@ -51,14 +64,32 @@ namespace WgDashboard.Api.Services
         public Task<PeerProfile> AddPeer(NewPeerRequest peer);
 
 
+        /// <summary>
+        /// Adds many peers at once. Each batch of peers is validated with set-based queries and inserted in one transaction.
+        /// </summary>
+        /// <param name="peers">The peers to be added, e.g. streamed from the request body. A null peer is one that could not be read</param>
+        /// <param name="canAddPeerFor">Checks whether the requesting user may attach a peer to the given owner ID</param>
+        /// <returns>An async enumerable with one result per peer, in the same order as the peers</returns>
+        public IAsyncEnumerable<BulkPeerResult> AddPeers(IAsyncEnumerable<NewPeerRequest?> peers, Func<int, bool> canAddPeerFor);
+
+
+        /// <summary>
+        /// Gets every peer, ordered by ID, in a form that can be imported again. The peers are streamed from the database.
+        /// </summary>
+        /// <returns>An async enumerable of exported peers</returns>
+        public IAsyncEnumerable<PeerExport> ExportPeers();
+
+
         /// <summary>
         /// Updates the peer in-place
         /// </summary>
         /// <param name="updatedPeer">The updated peer</param>
+        /// <param name="ifMatch">The request's If-Match header, if any. The update is only made if it matches the peer profile's current entity tag</param>
         /// <exception cref="InternalServerErrorException"></exception>
         /// <exception cref="BadRequestException"></exception>
         /// <exception cref="ResourceNotFoundException"></exception>
-        public Task UpdatePeer(UpdatePeerRequest updatedPeer);
+        /// <exception cref="PreconditionFailedException"></exception>
+        public Task UpdatePeer(UpdatePeerRequest updatedPeer, string? ifMatch = null);
 
 
         /// <summary>
@@ -68,86 +99,167 @@ namespace WgDashboard.Api.Services
         /// <exception cref="InternalServerErrorException"></exception>
         /// <exception cref="ResourceNotFoundException"></exception>
         public Task DeletePeer(Peer peerToDelete);
+
+
+        /// <summary>
+        /// Holds the next free address for IpAllocation:LeaseMinutes, so that the user can put it in the peer's config before adding the peer
+        /// </summary>
+        /// <param name="ownerId">The ID of the user who will add the peer</param>
+        /// <returns>The leased address and when the lease expires</returns>
+        /// <exception cref="InternalServerErrorException"></exception>
+        /// <exception cref="BadRequestException"></exception>
+        public Task<IpLease> LeaseAddress(int ownerId);
     }
 
     public class PeerService : IPeerService
     {
         private readonly WireguardDbContext _context;
-        private static int MAX_PEERS_PER_USER = 5;
+        private readonly IProfileCache _cache;
+        private readonly IWireguardSyncTrigger _syncTrigger;
+        private readonly IIpAllocator _allocator;
+        private readonly IIpAllocationSettings _allocationSettings;
+        private readonly IChangeNotifier _notifier;
+        private const int BULK_BATCH_SIZE = 500;
+        private const int MAX_ALLOCATION_ATTEMPTS = 5;
 
         /*
          * Service constructor
          */
-        public PeerService(WireguardDbContext dbContext)
+        public PeerService(WireguardDbContext dbContext, IProfileCache profileCache, IWireguardSyncTrigger syncTrigger, IIpAllocator ipAllocator,
+            IIpAllocationSettings ipAllocationSettings, IChangeNotifier changeNotifier)
         {
             this._context = dbContext;
+            this._cache = profileCache;
+            this._syncTrigger = syncTrigger;
+            this._allocator = ipAllocator;
+            this._allocationSettings = ipAllocationSettings;
+            this._notifier = changeNotifier;
+        }
+
+        public IAsyncEnumerable<PeerProfile> GetAllPeers(PeerListRequest query)
+        {
+            // guards against bad input. validate here since the enumerable itself is lazy
+            if (!query.IsValid())
+                throw new BadRequestException($"Limit must be between 1 and {ListRequest.MaxLimit} and after must not be negative");
+
+            CidrNetwork network = default;
+            bool filterByNetwork = query.AllowedIPs is not null && query.AllowedIPs.Contains('/');
+            if (filterByNetwork && !CidrNetwork.TryParse(query.AllowedIPs, out network))
+                throw new BadRequestException($"'{query.AllowedIPs}' is not a valid network");
+
+            IQueryable<Peer> peers = _context.Peers.AsNoTracking().Where((peer) => peer.Id > query.After);
+            if (query.Id is not null)
+                peers = peers.Where((peer) => peer.Id == query.Id);
+            if (!string.IsNullOrEmpty(query.PublicKey))
+                peers = peers.Where((peer) => peer.PublicKey.StartsWith(query.PublicKey));
+            if (!string.IsNullOrEmpty(query.OwnerUsername))
+                peers = peers.Where((peer) => peer.Owner.Username == query.OwnerUsername);
+
+            // an IPv4 network is a range seek on the numeric columns. any other network is narrowed down by its literal prefix and checked while streaming
+            if (filterByNetwork && network.IsIPv4)
+                peers = WithinNetwork(peers, network);
+            else
+            {
+                string? allowedIPsPrefix = filterByNetwork ? network.LiteralPrefix : query.AllowedIPs;
+                if (!string.IsNullOrEmpty(allowedIPsPrefix))
+                    peers = peers.Where((peer) => peer.AllowedIPs.StartsWith(allowedIPsPrefix));
+            }
+
+            IQueryable<PeerProfile> profiles = ToProfiles(peers);
+            if (!filterByNetwork || network.IsIPv4)
+                return profiles.Take(query.PageSize).AsAsyncEnumerable();
+
+            return StreamMatchingPeers(profiles, (profile) => network.Contains(profile.AllowedIPs), query.PageSize);
         }
 
-        public IEnumerable<PeerProfile> GetAllPeers()
+        public IAsyncEnumerable<PeerProfile> SearchPeers(PeerSearchRequest query)
         {
-            IQueryable<PeerProfile> peers = _context.Users.Join(_context.Peers, (user) => user.Id, (peer) => peer.OwnerId,
-                (user, peer) => new PeerProfile()
+            // guards against bad input. validate here since the enumerable itself is lazy
+            if (!query.IsValid())
+                throw new BadRequestException($"Limit must be between 1 and {ListRequest.MaxLimit} and after must not be negative");
+            if (string.IsNullOrEmpty(query.Ip) == string.IsNullOrEmpty(query.Cidr))
+                throw new BadRequestException("Exactly one of ip and cidr is required");
+
+            IQueryable<Peer> peers = _context.Peers.AsNoTracking().Where((peer) => peer.Id > query.After);
+
+            CidrNetwork network;
+            if (!string.IsNullOrEmpty(query.Cidr))
+            {
+                if (!CidrNetwork.TryParse(query.Cidr, out network) || !network.IsIPv4)
+                    throw new BadRequestException($"'{query.Cidr}' is not a valid IPv4 network");
+
+                return ToProfiles(WithinNetwork(peers, network)).Take(query.PageSize).AsAsyncEnumerable();
+            }
+
+            if (query.Ip!.Contains('/') || !CidrNetwork.TryParse(query.Ip, out network) || !network.IsIPv4)
+                throw new BadRequestException($"'{query.Ip}' is not a valid IPv4 address");
+
+            // a network contains the address if clearing the network's host bits from the address gives the network's first address.
+            // that leaves one candidate per prefix length, and each candidate is a seek on the index
+            long address = network.FirstAddress;
+            List<long?> candidates = Enumerable.Range(0, 33).Select((prefixLength) => (long?)(address >> (32 - prefixLength) << (32 - prefixLength))).Distinct().ToList();
+            peers = peers.Where((peer) => candidates.Contains(peer.NetworkAddress));
+
+            // a peer can match the candidate of a shorter prefix than its own, e.g. 10.8.0.0/24 matches the /16 candidate of 10.8.1.0 without containing it
+            return StreamMatchingPeers(ToProfiles(peers), (profile) => CidrNetwork.TryParse(profile.AllowedIPs, out CidrNetwork peerNetwork) && peerNetwork.Contains(network.Address), query.PageSize);
+        }
+
+        /*
+         * Narrows the peers down to those whose allowed IPs fall within an IPv4 network, by seeking the index on the numeric columns
+         */
+        private static IQueryable<Peer> WithinNetwork(IQueryable<Peer> peers, CidrNetwork network)
+        {
+            long firstAddress = network.FirstAddress;
+            long lastAddress = network.LastAddress;
+            byte prefixLength = (byte)network.PrefixLength;
+            return peers.Where((peer) => peer.NetworkAddress >= firstAddress && peer.NetworkAddress <= lastAddress && peer.PrefixLength >= prefixLength);
+        }
+
+        private static IQueryable<PeerProfile> ToProfiles(IQueryable<Peer> peers) =>
+            peers.OrderBy((peer) => peer.Id)
+                .Select((peer) => new PeerProfile()
                 {
                     Id = peer.Id,
                     PublicKey = peer.PublicKey,
                     AllowedIPs = peer.AllowedIPs,
                     DeviceDescription = peer.DeviceDescription,
-                    OwnerName = user.Name,
-                    OwnerUsername = user.Username,
+                    OwnerName = peer.Owner.Name,
+                    OwnerUsername = peer.Owner.Username,
                     DeviceType = peer.DeviceType,
-                }
-            );
+                });
+
+        private static async IAsyncEnumerable<PeerProfile> StreamMatchingPeers(IQueryable<PeerProfile> profiles, Func<PeerProfile, bool> matches, int limit,
+            [EnumeratorCancellation] CancellationToken cancellationToken = default)
+        {
+            int count = 0;
+            await foreach (PeerProfile profile in profiles.AsAsyncEnumerable().WithCancellation(cancellationToken))
+            {
+                if (!matches(profile))
+                    continue;
 
-            return peers;
+                yield return profile;
+                count++;
+                if (count >= limit)
+                    yield break;
+            }
         }
 
 
-        public async Task<PeerProfile?> GetPeerProfileById(int id)
-        {
-            Peer? peer = await _context.Peers.FindAsync(id);
-            if (peer is null)
-                return null;
+        public Task<PeerProfile?> GetPeerProfileById(int id) =>
+            _cache.GetPeerProfile(id, () => CompiledQueries.PeerProfileById(_context, id)); // peer and owner in one join
 
-            User? user = await _context.Users.FindAsync(peer.OwnerId);
-            if (user is null)
-                throw new BadDataIntegrityException($"Peer with ID {id} does not have an owner");
 
-            return new PeerProfile()
-            {
-                Id = peer.Id,
-                PublicKey = peer.PublicKey,
-                AllowedIPs = peer.AllowedIPs,
-                DeviceDescription = peer.DeviceDescription,
-                OwnerName = user.Name,
-                OwnerUsername = user.Username,
-                DeviceType = peer.DeviceType,
-            };
-        }
+        public Task<Peer?> GetPeerById(int id) => CompiledQueries.PeerById(_context, id);
 
 
-        public Task<Peer?> GetPeerById(int id) => _context.Peers.Where((peer) => peer.Id == id).FirstOrDefaultAsync();
+        public async Task<IEnumerable<PeerProfile>> GetPeerProfilesByOwnerId(int ownerId) =>
+            await _cache.GetPeerProfilesByOwner(ownerId, () => ReadPeerProfilesByOwnerId(ownerId));
 
-
-        public async Task<IEnumerable<PeerProfile>> GetPeerProfilesByOwnerId(int ownerId)
+        private async Task<List<PeerProfile>> ReadPeerProfilesByOwnerId(int ownerId)
         {
-            User? owner = await _context.Users.FindAsync(ownerId);
-            if(owner is null)
-                return new List<PeerProfile>();
-
-            IQueryable<PeerProfile> peerProfiles = _context.Users.Join(
-                _context.Peers, (user) => user.Id, (peer) => peer.OwnerId,
-                    (user, peer) => new PeerProfile()
-                    {
-                        Id = peer.Id,
-                        PublicKey = peer.PublicKey,
-                        AllowedIPs = peer.AllowedIPs,
-                        DeviceDescription = peer.DeviceDescription,
-                        OwnerName = user.Name,
-                        OwnerUsername = user.Username,
-                        DeviceType = peer.DeviceType,
-                    }
-                )
-                .Where((profile) => profile.OwnerUsername == owner.Username); // profile doesn't contain owner ID
+            var peerProfiles = new List<PeerProfile>();
+            await foreach (PeerProfile profile in CompiledQueries.PeerProfilesByOwnerId(_context, ownerId))
+                peerProfiles.Add(profile);
 
             return peerProfiles;
         }
@@ -157,49 +269,67 @@ namespace WgDashboard.Api.Services
             // guards against bad inputs
             if (peer.PublicKey is null)
                 throw new BadRequestException("Public key expected but not found");
-            if (peer.AllowedIPs is null)
+            if (string.IsNullOrEmpty(peer.AllowedIPs) && !_allocator.Enabled)
                 throw new BadRequestException("Allowed IPs expected but not found");
             if (peer.OwnerId <= 0)
                 throw new BadRequestException("Owner ID not valid");
             if (!DeviceTypes.IsValidDeviceType(peer.DeviceType))
                 throw new BadRequestException("Device type is not valid");
 
-            // more guards against bad input
-            var existingPk = _context.Peers.Where((p) => p.PublicKey == peer.PublicKey);
-            var existingOwner = _context.Users.Where((user) => user.Id == peer.OwnerId);
-            int numberOfPeers = _context.Peers.Where((p) => p.OwnerId == peer.OwnerId).Count();
-            if (existingPk.Any())
-                throw new BadRequestException("Public key already exists");
-            if (!existingOwner.Any())
+            // more guards against bad input, all read in one query
+            PeerOwnerSummary? owner = await CompiledQueries.OwnerSummaryForNewPeer(_context, peer.OwnerId, peer.PublicKey);
+            if (owner is null)
                 throw new BadRequestException($"Owner with ID {peer.OwnerId} does not exist");
-            if (numberOfPeers >= MAX_PEERS_PER_USER)
+            if (owner.PublicKeyTaken)
+                throw new BadRequestException("Public key already exists");
+            int? freeSlot = FindFreeSlot(owner.UsedSlots);
+            if (freeSlot is null)
                 throw new BadRequestException($"Too many peers attached to user with ID {peer.OwnerId}");
 
-            // attempt to add new peer
-            Peer? newPeer;
-            try
+            // attempt to add new peer. the unique indexes catch anything that changed since the guards above
+            Peer? newPeer = null;
+            for (int attempt = 1; newPeer is null; attempt++)
             {
-                var createdPeer = await _context.Peers.AddAsync(new Peer()
+                IpAllocation? allocation = await AllocateAddress(peer.AllowedIPs, peer.OwnerId);
+                bool releaseOnFailure = allocation is not null && allocation.Id == 0; // a claimed lease stays leased if the peer can't be added
+                try
                 {
-                    PublicKey = peer.PublicKey,
-                    AllowedIPs = peer.AllowedIPs,
-                    OwnerId = peer.OwnerId,
-                    DeviceDescription = peer.DeviceDescription,
-                    DeviceType = peer.DeviceType,
-                });
-                await _context.SaveChangesAsync();
-                newPeer = createdPeer.Entity;
+                    var createdPeer = await _context.Peers.AddAsync(new Peer()
+                    {
+                        PublicKey = peer.PublicKey,
+                        AllowedIPs = allocation is null ? peer.AllowedIPs! : allocation.Address + "/32", // validated not empty above if not allocated
+                        OwnerId = peer.OwnerId,
+                        DeviceDescription = peer.DeviceDescription,
+                        DeviceType = peer.DeviceType,
+                        Slot = freeSlot.Value,
+                        IpAllocation = allocation,
+                    });
+                    await _context.SaveChangesAsync();
+                    newPeer = createdPeer.Entity;
+                }
+                catch(DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_IpAllocation_Address"))
+                {
+                    // another API instance took the address first. it stays marked as taken here, so the next attempt gets a different one
+                    _context.ChangeTracker.Clear();
+                    if (!string.IsNullOrEmpty(peer.AllowedIPs) || attempt == MAX_ALLOCATION_ATTEMPTS)
+                        throw new BadRequestException("Address already in use");
+                }
+                catch(DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_Peer_PublicKey"))
+                    { ReleaseAddress(allocation, releaseOnFailure); throw new BadRequestException("Public key already exists"); }
+                catch(DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_Peer_OwnerId_Slot") || DbErrors.IsConstraintViolation(due, "CK_Peer_Slot"))
+                    { ReleaseAddress(allocation, releaseOnFailure); throw new BadRequestException($"Too many peers attached to user with ID {peer.OwnerId}"); }
+                catch(DbUpdateException)
+                    { ReleaseAddress(allocation, releaseOnFailure); throw new InternalServerErrorException("Could not update database due to an error!"); }
+                catch(OperationCanceledException)
+                    { ReleaseAddress(allocation, releaseOnFailure); throw new InternalServerErrorException("Update the the database cancelled!"); }
             }
-            catch(DbUpdateException)
-                { throw new InternalServerErrorException("Could not update database due to an error!"); }
-            catch(OperationCanceledException)
-                { throw new InternalServerErrorException("Update the the database cancelled!"); }
 
             if (newPeer is null)
                 throw new InternalServerErrorException("Could not update the database!");
+            await _cache.InvalidatePeer(newPeer.Id, newPeer.OwnerId);
+            _syncTrigger.RequestSync();
 
-            User owner = (await existingOwner.FirstOrDefaultAsync())!; // verified not null by guard clauses 
-            return new PeerProfile()
+            var profile = new PeerProfile()
             {
                 Id = newPeer.Id,
                 PublicKey = newPeer.PublicKey,
@@ -209,9 +339,11 @@ namespace WgDashboard.Api.Services
                 OwnerUsername = owner.Username,
                 DeviceType = newPeer.DeviceType,
             };
+            _notifier.Publish(ChangeEvent.ForPeer(ChangeActions.Created, newPeer.OwnerId, profile));
+            return profile;
         }
 
-        public async Task UpdatePeer(UpdatePeerRequest updatedPeer)
+        public async Task UpdatePeer(UpdatePeerRequest updatedPeer, string? ifMatch = null)
         {
             // guards against bad input
             if (updatedPeer.PublicKey is null)
@@ -221,36 +353,422 @@ namespace WgDashboard.Api.Services
             if (!DeviceTypes.IsValidDeviceType(updatedPeer.DeviceType))
                 throw new BadRequestException("Device type is not valid");
 
-            // find peer in DB
-            Peer? existingPeer = await _context.Peers.Where((p) => p.Id == updatedPeer.Id).FirstOrDefaultAsync();
+            // find peer in DB. the owner is read too, to rebuild the profile for the If-Match header and for the change event
+            Peer? existingPeer = await _context.Peers.Include((p) => p.Owner).FirstOrDefaultAsync((p) => p.Id == updatedPeer.Id);
             if (existingPeer is null)
                 throw new ResourceNotFoundException($"Peer with ID {updatedPeer.Id} not found");
 
+            // guard against overwriting a change the client hasn't seen
+            if (ifMatch is not null && !ETags.IfMatch(ifMatch, ETags.Compute(ToProfile(existingPeer))))
+                throw new PreconditionFailedException($"Peer with ID {updatedPeer.Id} has been modified since it was read");
+
             try
             {
                 existingPeer.PublicKey = updatedPeer.PublicKey;
                 existingPeer.DeviceDescription = updatedPeer.DeviceDescription;
                 existingPeer.DeviceType = updatedPeer.DeviceType;
+                existingPeer.ConcurrencyStamp = Guid.NewGuid(); // the save fails if another update got in since the peer was read
                 await _context.SaveChangesAsync();
+                await _cache.InvalidatePeer(existingPeer.Id, existingPeer.OwnerId);
+                _syncTrigger.RequestSync();
+                _notifier.Publish(ChangeEvent.ForPeer(ChangeActions.Updated, existingPeer.OwnerId, ToProfile(existingPeer)));
             }
+            catch (DbUpdateConcurrencyException)
+                { throw new PreconditionFailedException($"Peer with ID {updatedPeer.Id} has been modified since it was read"); }
+            catch (DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_Peer_PublicKey"))
+                { throw new BadRequestException("Public key already exists"); }
             catch (DbUpdateException)
                 { throw new InternalServerErrorException("Could not update the database due to an error!"); }
             catch (OperationCanceledException)
                 { throw new InternalServerErrorException("Could not update the database: operation was cancelled"); }
         }
 
+        public IAsyncEnumerable<BulkPeerResult> AddPeers(IAsyncEnumerable<NewPeerRequest?> peers, Func<int, bool> canAddPeerFor)
+            => StreamAddPeers(peers, canAddPeerFor);
 
-        public async Task DeletePeer(Peer peerToDelete)
+        private async IAsyncEnumerable<BulkPeerResult> StreamAddPeers(IAsyncEnumerable<NewPeerRequest?> peers, Func<int, bool> canAddPeerFor,
+            [EnumeratorCancellation] CancellationToken cancellationToken = default)
         {
-            Peer? existingPeer = await _context.Peers.FindAsync(peerToDelete.Id);
-            if (existingPeer is null)
-                throw new ResourceNotFoundException($"Peer with ID {peerToDelete.Id} not found");
+            // owners and public keys seen earlier in the import, so that later batches see the slots and keys taken by earlier ones
+            var owners = new Dictionary<int, PeerOwnerSummary?>();
+            var importedPublicKeys = new HashSet<string>();
+
+            var batch = new List<NewPeerRequest?>(BULK_BATCH_SIZE);
+            int firstIndex = 0;
+            await foreach (NewPeerRequest? peer in peers.WithCancellation(cancellationToken))
+            {
+                batch.Add(peer);
+                if (batch.Count < BULK_BATCH_SIZE)
+                    continue;
+
+                foreach (BulkPeerResult result in await AddPeerBatch(batch, firstIndex, owners, importedPublicKeys, canAddPeerFor))
+                    yield return result;
+                firstIndex += batch.Count;
+                batch.Clear();
+            }
+
+            if (batch.Count > 0)
+            {
+                foreach (BulkPeerResult result in await AddPeerBatch(batch, firstIndex, owners, importedPublicKeys, canAddPeerFor))
+                    yield return result;
+            }
+        }
+
+        /*
+         * Validates and inserts one batch of a bulk import. Uses one query for the public keys and one for the owners of the whole batch,
+         * then a single SaveChanges (and therefore a single transaction) for every valid peer
+         */
+        private async Task<BulkPeerResult[]> AddPeerBatch(List<NewPeerRequest?> batch, int firstIndex, Dictionary<int, PeerOwnerSummary?> owners,
+            HashSet<string> importedPublicKeys, Func<int, bool> canAddPeerFor)
+        {
+            await _allocator.EnsureLoaded(_context);
+            List<string> publicKeys = batch.Where((peer) => peer?.PublicKey is not null).Select((peer) => peer!.PublicKey).Distinct().ToList();
+            var takenPublicKeys = new HashSet<string>(await _context.Peers.AsNoTracking()
+                .Where((peer) => publicKeys.Contains(peer.PublicKey))
+                .Select((peer) => peer.PublicKey)
+                .ToListAsync());
+
+            List<int> newOwnerIds = batch.Where((peer) => peer is not null && peer.OwnerId > 0 && !owners.ContainsKey(peer.OwnerId))
+                .Select((peer) => peer!.OwnerId)
+                .Distinct()
+                .ToList();
+            var newOwners = await _context.Users.AsNoTracking()
+                .Where((user) => newOwnerIds.Contains(user.Id))
+                .Select((user) => new
+                {
+                    user.Id,
+                    Summary = new PeerOwnerSummary()
+                    {
+                        Name = user.Name,
+                        Username = user.Username,
+                        UsedSlots = _context.Peers.Where((peer) => peer.OwnerId == user.Id).Select((peer) => peer.Slot).ToList(),
+                    },
+                })
+                .ToListAsync();
+            foreach (int ownerId in newOwnerIds)
+                owners[ownerId] = null;
+            foreach (var owner in newOwners)
+                owners[owner.Id] = owner.Summary;
+
+            // same guards as adding a single peer, checked against the sets read above
+            var results = new BulkPeerResult[batch.Count];
+            var newPeers = new List<(int Position, Peer Peer)>();
+            for (int i = 0; i < batch.Count; i++)
+            {
+                NewPeerRequest? peer = batch[i];
+                results[i] = new BulkPeerResult() { Index = firstIndex + i };
+
+                int? freeSlot = null;
+                if (peer is null)
+                    results[i].Error = "Peer could not be read";
+                else if (peer.PublicKey is null)
+                    results[i].Error = "Public key expected but not found";
+                else if (string.IsNullOrEmpty(peer.AllowedIPs) && !_allocator.Enabled)
+                    results[i].Error = "Allowed IPs expected but not found";
+                else if (peer.OwnerId <= 0)
+                    results[i].Error = "Owner ID not valid";
+                else if (!DeviceTypes.IsValidDeviceType(peer.DeviceType))
+                    results[i].Error = "Device type is not valid";
+                else if (!canAddPeerFor(peer.OwnerId))
+                    results[i].Error = "User's ID does not match peer's owner ID";
+                else if (owners[peer.OwnerId] is null)
+                    results[i].Error = $"Owner with ID {peer.OwnerId} does not exist";
+                else if (takenPublicKeys.Contains(peer.PublicKey) || importedPublicKeys.Contains(peer.PublicKey))
+                    results[i].Error = "Public key already exists";
+                else if ((freeSlot = FindFreeSlot(owners[peer.OwnerId]!.UsedSlots)) is null)
+                    results[i].Error = $"Too many peers attached to user with ID {peer.OwnerId}";
+
+                if (results[i].Error is not null)
+                    continue;
+
+                // take the address last, so that a peer that failed a guard doesn't hold one
+                string? address = null;
+                if (_allocator.Enabled && (address = TakeBulkAddress(peer!.AllowedIPs, results[i])) is null)
+                    continue;
+
+                // reserve the slot and key for the rest of the import
+                owners[peer!.OwnerId]!.UsedSlots.Add(freeSlot!.Value);
+                importedPublicKeys.Add(peer.PublicKey);
+                newPeers.Add((i, new Peer()
+                {
+                    PublicKey = peer.PublicKey,
+                    AllowedIPs = address is null ? peer.AllowedIPs! : address + "/32",
+                    OwnerId = peer.OwnerId,
+                    DeviceDescription = peer.DeviceDescription,
+                    DeviceType = peer.DeviceType,
+                    Slot = freeSlot.Value,
+                    IpAllocation = address is null ? null : new IpAllocation() { Address = address },
+                }));
+            }
+
+            if (newPeers.Count == 0)
+                return results;
 
             try
             {
-                _context.Peers.Remove(existingPeer);
+                _context.Peers.AddRange(newPeers.Select((newPeer) => newPeer.Peer));
+                await _context.SaveChangesAsync();
+                foreach (var newPeer in newPeers)
+                    results[newPeer.Position].Id = newPeer.Peer.Id;
+                await _cache.InvalidatePeersByOwners(newPeers.Select((newPeer) => newPeer.Peer.OwnerId).Distinct());
+                _syncTrigger.RequestSync();
+            }
+            catch (DbUpdateException)
+            {
+                // something changed since the guards above, e.g. a peer added concurrently. the batch was rolled back as a whole,
+                // so add the peers one at a time to find out which ones still succeed
+                _context.ChangeTracker.Clear();
+                foreach (var newPeer in newPeers)
+                    results[newPeer.Position].Error = await AddBulkPeer(newPeer.Peer, results[newPeer.Position]);
+            }
+            finally
+            {
+                // keep the change tracker from growing with the import
+                _context.ChangeTracker.Clear();
+            }
+
+            foreach (var (position, peer) in newPeers)
+            {
+                if (results[position].Id is null)
+                    continue;
+                PeerOwnerSummary owner = owners[peer.OwnerId]!;
+                _notifier.Publish(ChangeEvent.ForPeer(ChangeActions.Created, peer.OwnerId, new PeerProfile()
+                {
+                    Id = peer.Id,
+                    PublicKey = peer.PublicKey,
+                    AllowedIPs = peer.AllowedIPs,
+                    DeviceDescription = peer.DeviceDescription,
+                    OwnerName = owner.Name,
+                    OwnerUsername = owner.Username,
+                    DeviceType = peer.DeviceType,
+                }));
+            }
+
+            return results;
+        }
+
+        /*
+         * Adds a single peer of a bulk import. Returns the error, or null if the peer was added
+         */
+        private async Task<string?> AddBulkPeer(Peer peer, BulkPeerResult result)
+        {
+            string error;
+            try
+            {
+                _context.Peers.Add(peer);
+                await _context.SaveChangesAsync();
+                await _cache.InvalidatePeer(peer.Id, peer.OwnerId);
+                _syncTrigger.RequestSync();
+                result.Id = peer.Id;
+                return null;
+            }
+            catch (DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_IpAllocation_Address"))
+                { return "Address already in use"; } // taken by another API instance, so it stays marked as taken
+            catch (DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_Peer_PublicKey"))
+                { error = "Public key already exists"; }
+            catch (DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_Peer_OwnerId_Slot") || DbErrors.IsConstraintViolation(due, "CK_Peer_Slot"))
+                { error = $"Too many peers attached to user with ID {peer.OwnerId}"; }
+            catch (DbUpdateException)
+                { error = "Could not update database due to an error!"; }
+            finally
+                { _context.ChangeTracker.Clear(); }
+
+            ReleaseAddress(peer.IpAllocation, true);
+            return error;
+        }
+
+        /*
+         * Takes the address for a peer of a bulk import: the next free one, or the one asked for if it's free. Leases can't be claimed in a bulk import.
+         * Returns null and sets the result's error if there is no address to take
+         */
+        private string? TakeBulkAddress(string? allowedIPs, BulkPeerResult result)
+        {
+            if (string.IsNullOrEmpty(allowedIPs))
+            {
+                string? next = _allocator.TakeNext();
+                if (next is null)
+                    result.Error = "No free addresses left";
+                return next;
+            }
+
+            string? address = ParseAllocatableAddress(allowedIPs);
+            if (address is null)
+                result.Error = "Allowed IPs must be a single address in one of the configured subnets";
+            else if (!_allocator.TryTake(address))
+                result.Error = "Address already in use";
+            return result.Error is null ? address : null;
+        }
+
+
+        public IAsyncEnumerable<PeerExport> ExportPeers()
+        {
+            return _context.Peers.AsNoTracking()
+                .OrderBy((peer) => peer.Id)
+                .Select((peer) => new PeerExport()
+                {
+                    Id = peer.Id,
+                    PublicKey = peer.PublicKey,
+                    AllowedIPs = peer.AllowedIPs,
+                    DeviceDescription = peer.DeviceDescription,
+                    OwnerId = peer.OwnerId,
+                    OwnerUsername = peer.Owner.Username,
+                    DeviceType = peer.DeviceType,
+                })
+                .AsAsyncEnumerable();
+        }
+
+        /*
+         * Gets the lowest slot that none of the owner's peers use, or null if every slot is used
+         */
+        private static int? FindFreeSlot(List<int> usedSlots)
+        {
+            for (int slot = 0; slot < Peer.MAX_PEERS_PER_USER; slot++)
+            {
+                if (!usedSlots.Contains(slot))
+                    return slot;
+            }
+            return null;
+        }
+
+        /*
+         * Picks the address for a new peer when subnets are configured: the next free one, or the one asked for if it's free or leased to the owner.
+         * Returns null if no subnets are configured. A new allocation has an ID of 0, while a claimed lease keeps its ID
+         */
+        private async Task<IpAllocation?> AllocateAddress(string? allowedIPs, int ownerId)
+        {
+            if (!_allocator.Enabled)
+                return null;
+            await _allocator.EnsureLoaded(_context);
+
+            if (string.IsNullOrEmpty(allowedIPs))
+            {
+                string? next = _allocator.TakeNext();
+                if (next is null)
+                    throw new BadRequestException("No free addresses left");
+                return new IpAllocation() { Address = next };
+            }
+
+            string? address = ParseAllocatableAddress(allowedIPs);
+            if (address is null)
+                throw new BadRequestException("Allowed IPs must be a single address in one of the configured subnets");
+
+            // the owner may have leased the address ahead of time
+            IpAllocation? existing = await _context.IpAllocations.FirstOrDefaultAsync((allocation) => allocation.Address == address);
+            if (existing is not null)
+            {
+                if (existing.PeerId is not null || existing.LeasedById != ownerId || existing.ExpiresAt <= DateTime.UtcNow)
+                    throw new BadRequestException("Address already in use");
+                existing.LeasedById = null;
+                existing.ExpiresAt = null; // the address belongs to the peer from now on
+                return existing;
+            }
+
+            if (!_allocator.TryTake(address))
+                throw new BadRequestException("Address already in use");
+            return new IpAllocation() { Address = address };
+        }
+
+        /*
+         * Gets the address out of allowed IPs such as 10.8.0.5 or 10.8.0.5/32, or null if it isn't a single address that could be handed out
+         */
+        private string? ParseAllocatableAddress(string allowedIPs)
+        {
+            CidrNetwork network;
+            if (!CidrNetwork.TryParse(allowedIPs, out network) || network.PrefixLength != 32)
+                return null;
+
+            string address = network.Address.ToString();
+            return _allocator.IsAllocatable(address) ? address : null;
+        }
+
+        /*
+         * Frees an address that was taken for a peer that couldn't be added
+         */
+        private void ReleaseAddress(IpAllocation? allocation, bool releaseOnFailure)
+        {
+            if (allocation is not null && releaseOnFailure)
+                _allocator.Release(allocation.Address);
+        }
+
+        public async Task<IpLease> LeaseAddress(int ownerId)
+        {
+            // guards against bad input
+            if (!_allocator.Enabled)
+                throw new BadRequestException("No subnets are configured to hand out addresses from");
+            if (!await CompiledQueries.UserExists(_context, ownerId))
+                throw new BadRequestException($"Owner with ID {ownerId} does not exist");
+            await _allocator.EnsureLoaded(_context);
+
+            for (int attempt = 1; ; attempt++)
+            {
+                string? address = _allocator.TakeNext();
+                if (address is null)
+                    throw new BadRequestException("No free addresses left");
+
+                var lease = new IpAllocation()
+                {
+                    Address = address,
+                    LeasedById = ownerId,
+                    ExpiresAt = DateTime.UtcNow.AddMinutes(_allocationSettings.LeaseMinutes),
+                };
+                try
+                {
+                    _context.IpAllocations.Add(lease);
+                    await _context.SaveChangesAsync();
+                    return new IpLease() { AllowedIPs = address + "/32", ExpiresAt = lease.ExpiresAt.Value };
+                }
+                catch (DbUpdateException due) when (DbErrors.IsConstraintViolation(due, "IX_IpAllocation_Address"))
+                {
+                    // another API instance took the address first. try the next one
+                    _context.ChangeTracker.Clear();
+                    if (attempt == MAX_ALLOCATION_ATTEMPTS)
+                        throw new InternalServerErrorException("Could not find a free address!");
+                }
+                catch (DbUpdateException)
+                    { _allocator.Release(address); throw new InternalServerErrorException("Could not update the database!"); }
+                catch (OperationCanceledException)
+                    { _allocator.Release(address); throw new InternalServerErrorException("Could not update the database: operation was cancelled"); }
+            }
+        }
+
+        /*
+         * Builds the profile of a peer that was read along with its owner, exactly as GET /api/peers/{id} would return it
+         */
+        private static PeerProfile ToProfile(Peer peer) => new PeerProfile()
+        {
+            Id = peer.Id,
+            PublicKey = peer.PublicKey,
+            AllowedIPs = peer.AllowedIPs,
+            DeviceDescription = peer.DeviceDescription,
+            OwnerName = peer.Owner.Name,
+            OwnerUsername = peer.Owner.Username,
+            DeviceType = peer.DeviceType,
+        };
+
+
+        public async Task DeletePeer(Peer peerToDelete)
+        {
+            // the peer was read without tracking, so delete it by its key instead of reading it again
+            IpAllocation? allocation = null;
+            try
+            {
+                // the database deletes the address along with the peer. it's read first so that it can be freed in the index too
+                if (_allocator.Enabled)
+                {
+                    allocation = await _context.IpAllocations.FirstOrDefaultAsync((ipAllocation) => ipAllocation.PeerId == peerToDelete.Id);
+                    if (allocation is not null)
+                        _context.IpAllocations.Remove(allocation);
+                }
+                _context.Peers.Remove(peerToDelete);
                 await _context.SaveChangesAsync();
+                if (allocation is not null)
+                    _allocator.Release(allocation.Address);
+                await _cache.InvalidatePeer(peerToDelete.Id, peerToDelete.OwnerId);
+                _syncTrigger.RequestSync();
+                _notifier.Publish(ChangeEvent.PeerDeleted(peerToDelete.Id, peerToDelete.OwnerId));
             }
+            catch(DbUpdateConcurrencyException)
+                { throw new ResourceNotFoundException($"Peer with ID {peerToDelete.Id} not found"); }
             catch(DbUpdateException)
             {
                 { throw new InternalServerErrorException("Could not update the database due to an error!"); }
@@ -0,0 +1,227 @@
+﻿using System.Collections.Concurrent;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the in-memory store of peer telemetry
+    /// </summary>
+    public interface IPeerStatsStore
+    {
+        /// <summary>
+        /// Records a poll of a peer's counters
+        /// </summary>
+        /// <param name="peerId">The peer's ID</param>
+        /// <param name="peer">The peer as read from the interface</param>
+        /// <param name="now">When the interface was read, in UTC</param>
+        public void Record(int peerId, WireguardPeer peer, DateTime now);
+
+
+        /// <summary>
+        /// Forgets every peer that isn't in the given set, e.g. because it was deleted
+        /// </summary>
+        /// <param name="peerIds">The IDs of the peers to keep</param>
+        /// <returns>The number of peers forgotten</returns>
+        public int RetainOnly(IReadOnlySet<int> peerIds);
+
+
+        /// <summary>
+        /// Gets a peer's latest counters along with their history
+        /// </summary>
+        /// <param name="peerId">The peer's ID</param>
+        /// <returns>The peer's stats if the peer has been seen on the interface; otherwise null</returns>
+        public PeerStats? GetStats(int peerId);
+
+
+        /// <summary>
+        /// Gets the latest counters of many peers, without their history
+        /// </summary>
+        /// <param name="peerIds">The IDs of the peers, or null for every peer</param>
+        /// <returns>The stats of the peers that have been seen on the interface, ordered by ID</returns>
+        public List<PeerStats> GetLatestStats(IEnumerable<int>? peerIds);
+    }
+
+    /// <summary>
+    /// <para>Keeps each peer's recent counters in fixed-size ring buffers in memory, instead of writing a row per peer per poll to the database</para>
+    ///
+    /// <para>Every poll goes into a raw ring. When a poll starts a new downsample period, the last poll of the previous period is copied into
+    /// a second, coarser ring. The counters are cumulative, so one sample per period is enough to get the traffic in every period.
+    /// Both rings are allocated once per peer, so memory stays flat no matter how long the API runs.</para>
+    /// </summary>
+    public class PeerStatsStore : IPeerStatsStore
+    {
+        private readonly IPeerTelemetrySettings _settings;
+        private readonly ConcurrentDictionary<int, PeerSeries> _series = new ConcurrentDictionary<int, PeerSeries>();
+
+        public PeerStatsStore(IPeerTelemetrySettings settings)
+        {
+            this._settings = settings;
+        }
+
+        public void Record(int peerId, WireguardPeer peer, DateTime now)
+        {
+            PeerSeries series = _series.GetOrAdd(peerId, (_) => new PeerSeries(_settings.RawSamples, _settings.DownsampledSamples));
+            series.Record(peer, now, _settings.DownsampleSeconds);
+        }
+
+        public int RetainOnly(IReadOnlySet<int> peerIds)
+        {
+            int forgotten = 0;
+            foreach (int peerId in _series.Keys)
+            {
+                if (!peerIds.Contains(peerId) && _series.TryRemove(peerId, out _))
+                    forgotten++;
+            }
+            return forgotten;
+        }
+
+        public PeerStats? GetStats(int peerId)
+        {
+            PeerSeries? series;
+            if (!_series.TryGetValue(peerId, out series))
+                return null;
+            return series.ToStats(peerId, true);
+        }
+
+        public List<PeerStats> GetLatestStats(IEnumerable<int>? peerIds)
+        {
+            var stats = new List<PeerStats>();
+            if (peerIds is null)
+            {
+                foreach (var (peerId, series) in _series)
+                    stats.Add(series.ToStats(peerId, false));
+            }
+            else
+            {
+                foreach (int peerId in peerIds.Distinct())
+                {
+                    PeerSeries? series;
+                    if (_series.TryGetValue(peerId, out series))
+                        stats.Add(series.ToStats(peerId, false));
+                }
+            }
+
+            stats.Sort((a, b) => a.PeerId.CompareTo(b.PeerId));
+            return stats;
+        }
+
+        /*
+         * One peer's counters. Written by the collector and read by requests, so every access takes the lock. It is only ever contended for
+         * the time it takes to copy a few hundred numbers
+         */
+        private sealed class PeerSeries
+        {
+            private readonly CounterRing _raw;
+            private readonly CounterRing _downsampled;
+            private readonly object _lock = new object();
+            private long _currentPeriod = -1;
+            private DateTime? _latestHandshake;
+
+            public PeerSeries(int rawSamples, int downsampledSamples)
+            {
+                this._raw = new CounterRing(rawSamples);
+                this._downsampled = new CounterRing(downsampledSamples);
+            }
+
+            public void Record(WireguardPeer peer, DateTime now, int downsampleSeconds)
+            {
+                uint seconds = (uint)(now - DateTime.UnixEpoch).TotalSeconds;
+                long period = seconds / downsampleSeconds;
+                lock (_lock)
+                {
+                    // the last poll of the previous period stands in for the whole period
+                    if (period != _currentPeriod && _raw.Count > 0)
+                        _downsampled.Add(_raw.LastSeconds, _raw.LastReceived, _raw.LastSent);
+                    _currentPeriod = period;
+
+                    _raw.Add(seconds, peer.ReceivedBytes, peer.SentBytes);
+                    _latestHandshake = peer.LatestHandshake;
+                }
+            }
+
+            public PeerStats ToStats(int peerId, bool includeSamples)
+            {
+                lock (_lock)
+                {
+                    var stats = new PeerStats()
+                    {
+                        PeerId = peerId,
+                        LatestHandshake = _latestHandshake,
+                        ReceivedBytes = _raw.LastReceived,
+                        SentBytes = _raw.LastSent,
+                        UpdatedAt = DateTime.UnixEpoch.AddSeconds(_raw.LastSeconds),
+                    };
+                    if (includeSamples)
+                    {
+                        // the coarse history up to where the raw polls start, then the raw polls
+                        stats.Samples = new List<PeerStatsSample>(_downsampled.Count + _raw.Count);
+                        _downsampled.CopyTo(stats.Samples, _raw.FirstSeconds);
+                        _raw.CopyTo(stats.Samples, uint.MaxValue);
+                    }
+                    return stats;
+                }
+            }
+        }
+
+        /*
+         * A fixed-size ring of (time, received, sent), stored as three parallel arrays. Times are seconds since the Unix epoch
+         */
+        private sealed class CounterRing
+        {
+            private readonly uint[] _seconds;
+            private readonly long[] _received;
+            private readonly long[] _sent;
+            private int _next = 0;
+
+            public int Count { get; private set; } = 0;
+
+            public CounterRing(int capacity)
+            {
+                this._seconds = new uint[capacity];
+                this._received = new long[capacity];
+                this._sent = new long[capacity];
+            }
+
+            private int LastIndex => (_next - 1 + _seconds.Length) % _seconds.Length;
+            private int FirstIndex => (_next - Count + _seconds.Length) % _seconds.Length;
+
+            public uint LastSeconds => Count == 0 ? 0 : _seconds[LastIndex];
+            public long LastReceived => Count == 0 ? 0 : _received[LastIndex];
+            public long LastSent => Count == 0 ? 0 : _sent[LastIndex];
+            public uint FirstSeconds => Count == 0 ? uint.MaxValue : _seconds[FirstIndex];
+
+            public void Add(uint seconds, long received, long sent)
+            {
+                if (_seconds.Length == 0)
+                    return;
+
+                _seconds[_next] = seconds;
+                _received[_next] = received;
+                _sent[_next] = sent;
+                _next = (_next + 1) % _seconds.Length;
+                Count = Math.Min(Count + 1, _seconds.Length);
+            }
+
+            /*
+             * Appends the samples older than the given time, oldest first
+             */
+            public void CopyTo(List<PeerStatsSample> samples, uint before)
+            {
+                for (int i = 0; i < Count; i++)
+                {
+                    int index = (FirstIndex + i) % _seconds.Length;
+                    if (_seconds[index] >= before)
+                        return;
+
+                    samples.Add(new PeerStatsSample()
+                    {
+                        Time = DateTime.UnixEpoch.AddSeconds(_seconds[index]),
+                        ReceivedBytes = _received[index],
+                        SentBytes = _sent[index],
+                    });
+                }
+            }
+        }
+    }
+}
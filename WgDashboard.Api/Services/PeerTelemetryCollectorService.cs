@@ -0,0 +1,84 @@
+﻿using Microsoft.EntityFrameworkCore;
+using System.Data.Common;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Reads every peer's handshake and transfer counters from the WireGuard interface every PeerTelemetry:PollSeconds into the stats store</para>
+    ///
+    /// <para>Nothing is written to the database. The only query is for the peers' IDs by public key, every PeerTelemetry:PeerMapRefreshSeconds</para>
+    /// </summary>
+    public class PeerTelemetryCollectorService : BackgroundService
+    {
+        private readonly IServiceScopeFactory _scopeFactory;
+        private readonly IPeerTelemetrySettings _settings;
+        private readonly IWireguardDumpSource _source;
+        private readonly IPeerStatsStore _store;
+        private readonly ILogger<PeerTelemetryCollectorService> _logger;
+
+        private Dictionary<string, int> _peerIdsByPublicKey = new Dictionary<string, int>();
+        private DateTime _peerIdsReadAt = DateTime.MinValue;
+
+        public PeerTelemetryCollectorService(IServiceScopeFactory scopeFactory, IPeerTelemetrySettings settings, IWireguardDumpSource source,
+            IPeerStatsStore store, ILogger<PeerTelemetryCollectorService> logger)
+        {
+            this._scopeFactory = scopeFactory;
+            this._settings = settings;
+            this._source = source;
+            this._store = store;
+            this._logger = logger;
+        }
+
+        protected override async Task ExecuteAsync(CancellationToken stoppingToken)
+        {
+            using var timer = new PeriodicTimer(TimeSpan.FromSeconds(_settings.PollSeconds));
+            do
+            {
+                try
+                {
+                    await Collect(stoppingToken);
+                }
+                catch (WireguardCommandException e)
+                    { _logger.LogWarning(e, "Could not read peer telemetry. Trying again in {Seconds} seconds", _settings.PollSeconds); }
+                catch (Exception e) when (e is DbException or DbUpdateException)
+                    { _logger.LogWarning(e, "Could not read the peers' IDs. Trying again in {Seconds} seconds", _settings.PollSeconds); }
+            }
+            while (await timer.WaitForNextTickAsync(stoppingToken));
+        }
+
+        private async Task Collect(CancellationToken stoppingToken)
+        {
+            DateTime now = DateTime.UtcNow;
+            if (now - _peerIdsReadAt >= TimeSpan.FromSeconds(_settings.PeerMapRefreshSeconds))
+            {
+                _peerIdsByPublicKey = await ReadPeerIds(stoppingToken);
+                _peerIdsReadAt = now;
+                _store.RetainOnly(_peerIdsByPublicKey.Values.ToHashSet()); // forget deleted peers
+            }
+
+            List<WireguardPeer> peers = await _source.ReadPeers(stoppingToken);
+            now = DateTime.UtcNow;
+            foreach (WireguardPeer peer in peers)
+            {
+                // peers on the interface that the API doesn't know about are skipped
+                if (_peerIdsByPublicKey.TryGetValue(peer.PublicKey, out int peerId))
+                    _store.Record(peerId, peer, now);
+            }
+        }
+
+        private async Task<Dictionary<string, int>> ReadPeerIds(CancellationToken stoppingToken)
+        {
+            // the DB context is scoped, so it needs its own scope outside of a request
+            using IServiceScope scope = _scopeFactory.CreateScope();
+            var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+            return await context.Peers.AsNoTracking()
+                .Select((peer) => new { peer.Id, peer.PublicKey })
+                .ToDictionaryAsync((peer) => peer.PublicKey, (peer) => peer.Id, stoppingToken);
+        }
+    }
+}
@@ -0,0 +1,233 @@
+﻿using Microsoft.Extensions.Caching.Distributed;
+using Microsoft.Extensions.Caching.Memory;
+using System.Diagnostics.Metrics;
+using System.Text.Json;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the profile cache
+    /// </summary>
+    public interface IProfileCache
+    {
+        /// <summary>
+        /// Gets the peer's profile from the cache, or loads and caches it
+        /// </summary>
+        /// <param name="id">The ID of the peer</param>
+        /// <param name="load">Reads the profile from the database on a miss</param>
+        /// <returns>The peer's profile if found; otherwise null</returns>
+        public Task<PeerProfile?> GetPeerProfile(int id, Func<Task<PeerProfile?>> load);
+
+
+        /// <summary>
+        /// Gets the profiles of all peers attached to a user from the cache, or loads and caches them
+        /// </summary>
+        /// <param name="ownerId">The ID of the user that owns the peers</param>
+        /// <param name="load">Reads the profiles from the database on a miss</param>
+        /// <returns>A list of peer profiles that share the same owner</returns>
+        public Task<List<PeerProfile>> GetPeerProfilesByOwner(int ownerId, Func<Task<List<PeerProfile>>> load);
+
+
+        /// <summary>
+        /// Gets the user's profile from the cache, or loads and caches it
+        /// </summary>
+        /// <param name="id">The ID of the user</param>
+        /// <param name="load">Reads the profile from the database on a miss</param>
+        /// <returns>The user's profile if found; otherwise null</returns>
+        public Task<UserProfile?> GetUserProfile(int id, Func<Task<UserProfile?>> load);
+
+
+        /// <summary>
+        /// Removes a peer that was added, updated, or deleted, along with its owner's list of peers
+        /// </summary>
+        /// <param name="peerId">The ID of the peer</param>
+        /// <param name="ownerId">The ID of the user that owns the peer</param>
+        public Task InvalidatePeer(int peerId, int ownerId);
+
+
+        /// <summary>
+        /// Removes the lists of peers of users that had peers added, e.g. by a bulk import
+        /// </summary>
+        /// <param name="ownerIds">The IDs of the users that own the new peers</param>
+        public Task InvalidatePeersByOwners(IEnumerable<int> ownerIds);
+
+
+        /// <summary>
+        /// Removes a user that was updated or deleted, along with the profiles of its peers, which contain the owner's name and username
+        /// </summary>
+        /// <param name="userId">The ID of the user</param>
+        /// <param name="peerIds">The IDs of the peers attached to the user</param>
+        public Task InvalidateUser(int userId, IEnumerable<int> peerIds);
+    }
+
+    /// <summary>
+    /// <para>Caches peer and user profiles in a size-limited in-memory cache with a TTL. Entries are evicted when they expire
+    /// or, once the size limit is reached, least recently used first.</para>
+    ///
+    /// <para>If an IDistributedCache is registered and ProfileCache:Distributed is set, it is used as a second tier shared by every API node.
+    /// Invalidations remove from both tiers, and the in-memory tier keeps entries only briefly, so other nodes see changes quickly.</para>
+    ///
+    /// <para>IDistributedCache can't compare and set, so a node may write back a profile it read before another node changed it. To keep that
+    /// from being served, every key has a generation in the distributed tier that invalidations replace. Entries are stamped with the generation
+    /// read before their load, and an entry whose stamp doesn't match the current generation is treated as a miss. What remains is the in-memory
+    /// tier: another node may serve a changed profile for up to ProfileCache:LocalTtlSecondsWhenDistributed.</para>
+    /// </summary>
+    public sealed class ProfileCache : IProfileCache, IDisposable
+    {
+        public const string MeterName = "WgDashboard.Api.ProfileCache";
+
+        private readonly MemoryCache _local;
+        private readonly IDistributedCache? _distributed;
+        private readonly bool _enabled;
+        private readonly TimeSpan _localTtl;
+        private readonly TimeSpan _distributedTtl;
+        private readonly Counter<long> _hits;
+        private readonly Counter<long> _misses;
+        private readonly Counter<long> _evictions;
+
+        // bumped on every invalidation. a load that started before an invalidation must not put what it read into the cache
+        private long _invalidations = 0;
+
+        public ProfileCache(IProfileCacheSettings settings, IMeterFactory meterFactory, IDistributedCache? distributedCache = null)
+        {
+            this._enabled = settings.Enabled;
+            this._local = new MemoryCache(new MemoryCacheOptions() { SizeLimit = settings.SizeLimit, TrackStatistics = true });
+            this._distributed = settings.Distributed ? distributedCache : null;
+            this._distributedTtl = TimeSpan.FromSeconds(settings.TtlSeconds);
+            this._localTtl = TimeSpan.FromSeconds(_distributed is null ? settings.TtlSeconds : Math.Min(settings.TtlSeconds, settings.LocalTtlSecondsWhenDistributed));
+
+            Meter meter = meterFactory.Create(MeterName);
+            this._hits = meter.CreateCounter<long>("wgdashboard.profile_cache.hits", description: "Profiles served from the cache");
+            this._misses = meter.CreateCounter<long>("wgdashboard.profile_cache.misses", description: "Profiles read from the database");
+            this._evictions = meter.CreateCounter<long>("wgdashboard.profile_cache.evictions",
+                description: "Profiles removed from the in-memory cache because they expired or the cache was full");
+            meter.CreateObservableGauge("wgdashboard.profile_cache.entries", () => _local.GetCurrentStatistics()?.CurrentEntryCount ?? 0,
+                description: "Entries in the in-memory cache");
+            meter.CreateObservableGauge("wgdashboard.profile_cache.size", () => _local.GetCurrentStatistics()?.CurrentEstimatedSize ?? 0,
+                description: "Size of the in-memory cache, in the units of ProfileCache:SizeLimit");
+        }
+
+        public Task<PeerProfile?> GetPeerProfile(int id, Func<Task<PeerProfile?>> load) => GetOrLoad(PeerKey(id), "peer", load, (_) => 1);
+
+        public async Task<List<PeerProfile>> GetPeerProfilesByOwner(int ownerId, Func<Task<List<PeerProfile>>> load) =>
+            (await GetOrLoad<List<PeerProfile>>(PeersByOwnerKey(ownerId), "peers_by_owner", async () => await load(), (profiles) => Math.Max(1, profiles.Count)))!;
+
+        public Task<UserProfile?> GetUserProfile(int id, Func<Task<UserProfile?>> load) => GetOrLoad(UserKey(id), "user", load, (_) => 1);
+
+        public Task InvalidatePeer(int peerId, int ownerId) => Invalidate(PeerKey(peerId), PeersByOwnerKey(ownerId));
+
+        public Task InvalidatePeersByOwners(IEnumerable<int> ownerIds) => Invalidate(ownerIds.Select(PeersByOwnerKey).ToArray());
+
+        public Task InvalidateUser(int userId, IEnumerable<int> peerIds) =>
+            Invalidate(peerIds.Select(PeerKey).Append(UserKey(userId)).Append(PeersByOwnerKey(userId)).ToArray());
+
+        private static string PeerKey(int id) => $"wgdashboard:peer:{id}";
+        private static string PeersByOwnerKey(int ownerId) => $"wgdashboard:peers-by-owner:{ownerId}";
+        private static string UserKey(int id) => $"wgdashboard:user:{id}";
+
+        private async Task<T?> GetOrLoad<T>(string key, string kind, Func<Task<T?>> load, Func<T, int> size) where T : class
+        {
+            if (!_enabled)
+                return await load();
+
+            var kindTag = new KeyValuePair<string, object?>("kind", kind);
+            if (_local.TryGetValue(key, out T? cached))
+            {
+                _hits.Add(1, kindTag, new KeyValuePair<string, object?>("tier", "local"));
+                return cached;
+            }
+
+            long invalidationsBeforeLoad = Interlocked.Read(ref _invalidations);
+            Guid generation = Guid.Empty;
+            if (_distributed is not null)
+            {
+                // read before the load, so an invalidation by any node from here on changes it
+                generation = await GetGeneration(key);
+                byte[]? bytes = await _distributed.GetAsync(key);
+                if (bytes is not null && bytes.Length > GenerationLength && new Guid(bytes.AsSpan(0, GenerationLength)) == generation)
+                {
+                    T? shared = JsonSerializer.Deserialize<T>(bytes.AsSpan(GenerationLength));
+                    if (shared is not null)
+                    {
+                        _hits.Add(1, kindTag, new KeyValuePair<string, object?>("tier", "distributed"));
+                        SetLocal(key, shared, size(shared), invalidationsBeforeLoad);
+                        return shared;
+                    }
+                }
+            }
+
+            _misses.Add(1, kindTag);
+            T? loaded = await load();
+            if (loaded is null)
+                return null; // don't cache what doesn't exist, or creating it would have to invalidate it too
+
+            SetLocal(key, loaded, size(loaded), invalidationsBeforeLoad);
+            if (_distributed is not null && Interlocked.Read(ref _invalidations) == invalidationsBeforeLoad)
+            {
+                // stamped with the generation from before the load. if another node invalidated since, readers see the stamp is old and skip it
+                byte[] bytes = new byte[GenerationLength];
+                generation.TryWriteBytes(bytes);
+                await _distributed.SetAsync(key, bytes.Concat(JsonSerializer.SerializeToUtf8Bytes(loaded)).ToArray(),
+                    new DistributedCacheEntryOptions() { AbsoluteExpirationRelativeToNow = _distributedTtl });
+            }
+
+            return loaded;
+        }
+
+        private const int GenerationLength = 16; // a Guid
+
+        private static string GenerationKey(string key) => key + ":generation";
+
+        /*
+         * Reads the key's current generation from the distributed tier. Guid.Empty if it was never invalidated or its generation expired
+         */
+        private async Task<Guid> GetGeneration(string key)
+        {
+            byte[]? bytes = await _distributed!.GetAsync(GenerationKey(key));
+            return bytes is not null && bytes.Length == GenerationLength ? new Guid(bytes) : Guid.Empty;
+        }
+
+        private void SetLocal<T>(string key, T value, int size, long invalidationsBeforeLoad)
+        {
+            // guard against caching something that was changed while it was being read
+            if (Interlocked.Read(ref _invalidations) != invalidationsBeforeLoad)
+                return;
+
+            var options = new MemoryCacheEntryOptions()
+            {
+                Size = size,
+                AbsoluteExpirationRelativeToNow = _localTtl,
+            };
+            options.RegisterPostEvictionCallback((_, _, reason, _) =>
+            {
+                if (reason == EvictionReason.Expired || reason == EvictionReason.Capacity)
+                    _evictions.Add(1, new KeyValuePair<string, object?>("reason", reason == EvictionReason.Expired ? "expired" : "capacity"));
+            });
+            _local.Set(key, value, options);
+        }
+
+        private async Task Invalidate(params string[] keys)
+        {
+            if (!_enabled)
+                return;
+
+            Interlocked.Increment(ref _invalidations);
+            foreach (string key in keys)
+            {
+                _local.Remove(key);
+                if (_distributed is not null)
+                {
+                    // a new generation first, so an entry written back by a load that started before it is never served.
+                    // it outlives any entry stamped with the previous one, unless the load that wrote the entry took longer than the TTL
+                    await _distributed.SetAsync(GenerationKey(key), Guid.NewGuid().ToByteArray(),
+                        new DistributedCacheEntryOptions() { AbsoluteExpirationRelativeToNow = _distributedTtl * 2 });
+                    await _distributed.RemoveAsync(key);
+                }
+            }
+        }
+
+        public void Dispose() => _local.Dispose();
+    }
+}
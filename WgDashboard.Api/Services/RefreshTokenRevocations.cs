@@ -0,0 +1,59 @@
+﻿using System.Collections.Concurrent;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the index of revoked refresh token families
+    /// </summary>
+    public interface IRefreshTokenRevocations
+    {
+        /// <summary>
+        /// Blocks every token in the family until the given time, after which all of them have expired anyway
+        /// </summary>
+        /// <param name="familyId">The ID of the family</param>
+        /// <param name="until">When the last token of the family expires, in UTC</param>
+        public void Revoke(Guid familyId, DateTime until);
+
+
+        /// <summary>
+        /// Checks whether the family has been revoked
+        /// </summary>
+        /// <param name="familyId">The ID of the family</param>
+        /// <returns>True if the family has been revoked; otherwise false</returns>
+        public bool IsRevoked(Guid familyId);
+
+
+        /// <summary>
+        /// Forgets families whose tokens have all expired
+        /// </summary>
+        /// <param name="now">The current time, in UTC</param>
+        /// <returns>The number of families forgotten</returns>
+        public int Prune(DateTime now);
+    }
+
+    /// <summary>
+    /// <para>Revoked refresh token families, kept in memory so that a refresh is checked against them without another query</para>
+    ///
+    /// <para>The families' rows are deleted when they are revoked, which is what other API nodes see. This index also blocks a refresh on this
+    /// node that read its token just before the rows were deleted.</para>
+    /// </summary>
+    public sealed class RefreshTokenRevocations : IRefreshTokenRevocations
+    {
+        private readonly ConcurrentDictionary<Guid, DateTime> _revokedUntil = new();
+
+        public void Revoke(Guid familyId, DateTime until) => _revokedUntil[familyId] = until;
+
+        public bool IsRevoked(Guid familyId) => _revokedUntil.ContainsKey(familyId);
+
+        public int Prune(DateTime now)
+        {
+            int pruned = 0;
+            foreach (var (familyId, until) in _revokedUntil)
+            {
+                if (until < now && _revokedUntil.TryRemove(familyId, out _))
+                    pruned++;
+            }
+            return pruned;
+        }
+    }
+}
@@ -0,0 +1,78 @@
+﻿using Microsoft.EntityFrameworkCore;
+using System.Data.Common;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Deletes expired refresh tokens every RefreshTokens:SweepIntervalMinutes so the table doesn't grow forever</para>
+    ///
+    /// <para>Rows are deleted RefreshTokens:SweepBatchSize at a time, so a large backlog never holds locks on the table for long</para>
+    /// </summary>
+    public class RefreshTokenSweeperService : BackgroundService
+    {
+        private readonly IServiceScopeFactory _scopeFactory;
+        private readonly IRefreshTokenSettings _settings;
+        private readonly IRefreshTokenRevocations _revocations;
+        private readonly ILogger<RefreshTokenSweeperService> _logger;
+
+        public RefreshTokenSweeperService(IServiceScopeFactory scopeFactory, IRefreshTokenSettings settings, IRefreshTokenRevocations revocations,
+            ILogger<RefreshTokenSweeperService> logger)
+        {
+            this._scopeFactory = scopeFactory;
+            this._settings = settings;
+            this._revocations = revocations;
+            this._logger = logger;
+        }
+
+        protected override async Task ExecuteAsync(CancellationToken stoppingToken)
+        {
+            using var timer = new PeriodicTimer(TimeSpan.FromMinutes(_settings.SweepIntervalMinutes));
+            do
+            {
+                try
+                {
+                    int deleted = await SweepExpiredTokens(stoppingToken);
+                    int forgotten = _revocations.Prune(DateTime.UtcNow);
+                    if (deleted > 0 || forgotten > 0)
+                        _logger.LogInformation("Deleted {Deleted} expired refresh tokens and forgot {Forgotten} revoked families", deleted, forgotten);
+                }
+                catch (Exception e) when (e is DbException or DbUpdateException)
+                    { _logger.LogWarning(e, "Could not delete expired refresh tokens. Trying again in {Minutes} minutes", _settings.SweepIntervalMinutes); }
+            }
+            while (await timer.WaitForNextTickAsync(stoppingToken));
+        }
+
+        private async Task<int> SweepExpiredTokens(CancellationToken stoppingToken)
+        {
+            int totalDeleted = 0;
+            while (true)
+            {
+                // the DB context is scoped, so it needs its own scope outside of a request. a new one per batch keeps the change tracker empty
+                using IServiceScope scope = _scopeFactory.CreateScope();
+                var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+                DateTime now = DateTime.UtcNow;
+                IQueryable<RefreshToken> expired = context.RefreshTokens.Where((token) => token.ExpiresAt < now).Take(_settings.SweepBatchSize);
+
+                int deleted;
+                // the in-memory database used in development can't run set-based deletes
+                if (context.Database.IsRelational())
+                    deleted = await expired.ExecuteDeleteAsync(stoppingToken);
+                else
+                {
+                    List<RefreshToken> tokens = await expired.ToListAsync(stoppingToken);
+                    context.RefreshTokens.RemoveRange(tokens);
+                    await context.SaveChangesAsync(stoppingToken);
+                    deleted = tokens.Count;
+                }
+
+                totalDeleted += deleted;
+                if (deleted < _settings.SweepBatchSize)
+                    return totalDeleted;
+            }
+        }
+    }
+}
@@ -23,6 +23,8 @@ namespace WgDashboard.Api.Services
         /// <param name="username">The user's username</param>
         /// <param name="password">The user's password</param>
         /// <returns>The user that is associated with the credentials if given a valid username and password; otherwise null</returns>
+        /// <exception cref="BadRequestException"></exception>
+        /// <exception cref="ServiceUnavailableException"></exception>
         public Task<User?> Authenticate(string? username, string? password);
 
 
@@ -34,17 +36,17 @@ namespace WgDashboard.Api.Services
         /// <param name="name">The new user's name</param>
         /// <exception cref="BadRequestException"></exception>
         /// <exception cref="InternalServerErrorException"></exception>
+        /// <exception cref="ServiceUnavailableException"></exception>
         public Task<User> AddUser(string? username, string? password, string? name);
 
 
         /// <summary>
-        /// Checks whether it's ok to proceed with the user's request to access a user's profile
+        /// Checks whether it's ok to proceed with the current user's request to access a user's profile
         /// </summary>
-        /// <param name="userIdToCheckAgainst">The id of the user to be accessed</param>
-        /// <param name="usersActualId">The user's actual role</param>
-        /// <param name="usersActualRole">The user's actual role</param>
+        /// <param name="idToCheckAgainst">The id of the user to be accessed</param>
+        /// <param name="currentUser">The user making the request</param>
         /// <returns>True if the user is authorized; otherwise false</returns>
-        public bool CheckUserAuthorized(int idToCheckAgainst, int usersActualId, string usersActualRole);
+        public bool CheckUserAuthorized(int idToCheckAgainst, CurrentUser currentUser);
 
 
         /// <summary>
@@ -57,6 +59,7 @@ namespace WgDashboard.Api.Services
         /// <exception cref="InternalServerErrorException"></exception>
         /// <exception cref="BadRequestException"></exception>
         /// <exception cref="ResourceNotFoundException"></exception>
+        /// <exception cref="ServiceUnavailableException"></exception>
         public Task UpdateUserPassword(int userId, string newPassword);
     }
 
@@ -67,35 +70,15 @@ namespace WgDashboard.Api.Services
     {
         private readonly WireguardDbContext _context;
         private readonly IConfiguration _config;
-        private static readonly int BCRYPT_WORK_FACTOR = 12;
+        private readonly IPasswordHasher _hasher;
+        private readonly IChangeNotifier _notifier;
 
-        public SecurityService(WireguardDbContext dbContext, IConfiguration config, IWebHostEnvironment environment, ISecurityInitialSettings securitySettings)
+        public SecurityService(WireguardDbContext dbContext, IConfiguration config, IPasswordHasher passwordHasher, IChangeNotifier changeNotifier)
         {
             this._context = dbContext;
             this._config = config;
-
-            // add a default admin on API startup to prevent lockouts by deleting all admins or forgetting all admin passwords
-            // a new security service is created every time this service is called. keep track of the first time API was initialized 
-            // to prevent arbitrarily creating a user with a possibly weak password
-            if (!_context.Users.Where((user) => user.Role == UserRoles.Admin).Any() && !securitySettings.CreateAdmin)
-                Console.WriteLine("WARNING: No admins found, but settings specify not to initialize any admin.");
-            else if (securitySettings.CreateAdmin)
-            {
-                var newUser = new User()
-                {
-                    Username = securitySettings.InitialUsername,
-                    Password = GenerateHashedPassword(securitySettings.InitialPassword),
-                    Name = securitySettings.InitialName,
-                    Role = UserRoles.Admin,
-                };
-                if (_context.Users.Where((user) => user.Username == securitySettings.InitialUsername).Any())
-                    Console.WriteLine($"WARNING: Cannot create admin because username '{securitySettings.InitialUsername}' already exists");
-                else
-                {
-                    _context.Users.Add(newUser);
-                    _context.SaveChanges();
-                }
-            }
+            this._hasher = passwordHasher;
+            this._notifier = changeNotifier;
         }
 
         public async Task<User?> Authenticate(string? username, string? password)
@@ -103,8 +86,7 @@ namespace WgDashboard.Api.Services
             if (username is null || password is null)
                 throw new BadRequestException("Username and password expected but not found");
 
-            User? user = await _context.Users.Where((user) => user.Username == username)
-                .FirstOrDefaultAsync();
+            User? user = await CompiledQueries.TrackedUserByUsername(_context, username); // tracked since logging in sets the refresh token
 
             if (user is null)
                 return null;
@@ -112,8 +94,30 @@ namespace WgDashboard.Api.Services
             bool passwordOk = await VerifyPasswordAsync(password, user.Password);
             if (!passwordOk)
                 return null;
-            else
-                return user;
+
+            // the plaintext password is only available here, so bring the hash to the configured work factor while it is
+            if (_hasher.NeedsRehash(user.Password))
+                await RehashPassword(user, password);
+
+            return user;
+        }
+
+        /*
+         * Replaces the user's hash with one at the configured work factor. The login has already succeeded,
+         * so a failure here only means the hash is upgraded on a later login instead
+         */
+        private async Task RehashPassword(User user, string password)
+        {
+            string oldHash = user.Password;
+            try
+            {
+                user.Password = await GenerateHashedPasswordAsync(password);
+                await _context.SaveChangesAsync();
+            }
+            catch(ServiceUnavailableException)
+                { user.Password = oldHash; }
+            catch(DbUpdateException)
+                { user.Password = oldHash; }
         }
 
         public async Task<User> AddUser(string? username, string? password, string? name)
@@ -123,8 +127,7 @@ namespace WgDashboard.Api.Services
                 throw new BadRequestException("Username and password expected but not found");
 
             // guard against username exists already
-            var existingUsers = _context.Users.Where((user) => user.Username == username);
-            if (existingUsers.Any())
+            if (await CompiledQueries.UsernameTaken(_context, username))
                 throw new BadRequestException($"'{username}' already taken");
 
             var newUser = new User()
@@ -153,18 +156,25 @@ namespace WgDashboard.Api.Services
                 { throw new InternalServerErrorException("Could not update the database: operation was cancelled"); }
             }
 
+            _notifier.Publish(ChangeEvent.ForUser(ChangeActions.Created, new UserProfile()
+            {
+                Id = createdEntry.Id,
+                Username = createdEntry.Username,
+                Name = createdEntry.Name,
+                Role = createdEntry.Role,
+            }));
             return createdEntry;
         }
 
-        public bool CheckUserAuthorized(int idToCheckAgainst, int usersActualId, string usersActualRole) => 
-            usersActualRole == UserRoles.Admin || usersActualId == idToCheckAgainst; // if admin, don't care what the user's ID is
+        public bool CheckUserAuthorized(int idToCheckAgainst, CurrentUser currentUser) =>
+            currentUser.IsAdmin || currentUser.Id == idToCheckAgainst; // if admin, don't care what the user's ID is
 
         public async Task UpdateUserPassword(int userId, string password)
         {
             // guard against bad input
             if (password is null || password == "")
                 throw new BadRequestException("Password expected but not found");
-            User? existingUser = (await _context.Users.Where((user) => user.Id == userId).FirstOrDefaultAsync()); 
+            User? existingUser = await CompiledQueries.TrackedUserById(_context, userId);
             if (existingUser is null)
                 throw new ResourceNotFoundException($"User with ID {userId} not found");
 
@@ -184,28 +194,8 @@ namespace WgDashboard.Api.Services
             }
         }
 
-        private string GenerateHashedPassword(string password)
-        {
-            string hashedPassword = BCrypt.Net.BCrypt.EnhancedHashPassword(password, BCRYPT_WORK_FACTOR);
-            return hashedPassword;
-        }
-
-        private bool VerifyPassword(string unhashedPassword, string usersHashedPassword)
-        {
-            bool verified = BCrypt.Net.BCrypt.EnhancedVerify(unhashedPassword, usersHashedPassword);
-            return verified;
-        }
-
-        private Task<string> GenerateHashedPasswordAsync(string password)
-        {
-            Task<string> passwordHashTask = Task.Run(() => BCrypt.Net.BCrypt.EnhancedHashPassword(password, BCRYPT_WORK_FACTOR));
-            return passwordHashTask;
-        }
+        private Task<string> GenerateHashedPasswordAsync(string password) => _hasher.HashAsync(password);
 
-        private Task<bool> VerifyPasswordAsync(string unhashedPassword, string usersHashedPassword)
-        {
-            Task<bool> verifyTask = Task.Run(() => BCrypt.Net.BCrypt.EnhancedVerify(unhashedPassword, usersHashedPassword));
-            return verifyTask;
-        }
+        private Task<bool> VerifyPasswordAsync(string unhashedPassword, string usersHashedPassword) => _hasher.VerifyAsync(unhashedPassword, usersHashedPassword);
     }
 }
@@ -0,0 +1,108 @@
+﻿using Microsoft.IdentityModel.JsonWebTokens;
+using Microsoft.IdentityModel.Tokens;
+using System.Security.Claims;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the token issuer
+    /// </summary>
+    public interface ITokenIssuer
+    {
+        /// <summary>
+        /// Creates a signed access token for an authenticated user
+        /// </summary>
+        /// <param name="profile">The authenticated user's profile</param>
+        /// <returns>The access token as a compact JWT</returns>
+        public string IssueAccessToken(UserProfile profile);
+
+
+        /// <summary>
+        /// Gets the keys that may have signed a token, for JwtBearer's IssuerSigningKeyResolver
+        /// </summary>
+        /// <param name="keyId">The token's "kid" header, if any</param>
+        /// <returns>The key with that ID if it hasn't expired; otherwise every key that hasn't expired</returns>
+        public IEnumerable<SecurityKey> GetValidationKeys(string? keyId);
+    }
+
+    /// <summary>
+    /// <para>Issues access tokens with keys and signing credentials built once on startup instead of for every token</para>
+    ///
+    /// <para>Reusing the same key objects also lets the JWT library reuse its cached HMAC signature providers, for both issuing and validating</para>
+    /// </summary>
+    public sealed class TokenIssuer : ITokenIssuer
+    {
+        private sealed record RingKey(JwtSigningKey Settings, SymmetricSecurityKey Key, SigningCredentials Credentials);
+
+        private readonly IJwtSettings _settings;
+        private readonly JsonWebTokenHandler _handler = new JsonWebTokenHandler(); // thread-safe
+        private readonly RingKey[] _ring; // newest first
+
+        public TokenIssuer(IJwtSettings settings)
+        {
+            this._settings = settings;
+            this._ring = settings.SigningKeys
+                .OrderByDescending((signingKey) => signingKey.NotBefore ?? DateTime.MinValue)
+                .Select((signingKey) =>
+                {
+                    var key = new SymmetricSecurityKey(signingKey.Key) { KeyId = signingKey.Id };
+                    return new RingKey(signingKey, key, new SigningCredentials(key, SecurityAlgorithms.HmacSha256));
+                })
+                .ToArray();
+        }
+
+        public string IssueAccessToken(UserProfile profile)
+        {
+            DateTime now = DateTime.UtcNow;
+            var descriptor = new SecurityTokenDescriptor()
+            {
+                Issuer = _settings.Issuer,
+                Audience = _settings.Audience,
+                IssuedAt = now,
+                NotBefore = now,
+                Expires = now.AddMinutes(_settings.AccessTokenMinutes),
+                SigningCredentials = SigningKeyAt(now).Credentials,
+                // the full claim type URIs, as JwtBearer and the website read them
+                Claims = new Dictionary<string, object>(4)
+                {
+                    [ClaimTypes.Sid] = profile.Id.ToString(),
+                    [ClaimTypes.NameIdentifier] = profile.Username,
+                    [ClaimTypes.Name] = profile.Name ?? "",
+                    [ClaimTypes.Role] = profile.Role,
+                },
+            };
+
+            return _handler.CreateToken(descriptor);
+        }
+
+        public IEnumerable<SecurityKey> GetValidationKeys(string? keyId)
+        {
+            DateTime now = DateTime.UtcNow;
+            foreach (RingKey ringKey in _ring)
+            {
+                if (ringKey.Settings.Id == keyId && !IsExpired(ringKey, now))
+                    return new SecurityKey[] { ringKey.Key };
+            }
+
+            // tokens issued before keys had IDs don't have a "kid"
+            return _ring.Where((ringKey) => !IsExpired(ringKey, now)).Select((ringKey) => (SecurityKey)ringKey.Key).ToArray();
+        }
+
+        /*
+         * The newest key that is active. If every key has expired since startup, keep signing with the newest one rather than failing every login
+         */
+        private RingKey SigningKeyAt(DateTime now)
+        {
+            foreach (RingKey ringKey in _ring)
+            {
+                if (ringKey.Settings.IsActiveAt(now))
+                    return ringKey;
+            }
+            return _ring[0];
+        }
+
+        private static bool IsExpired(RingKey ringKey, DateTime now) => ringKey.Settings.Expires is not null && ringKey.Settings.Expires <= now;
+    }
+}
@@ -0,0 +1,65 @@
+﻿using System.Diagnostics.Metrics;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for the token metrics
+    /// </summary>
+    public interface ITokenMetrics
+    {
+        /// <summary>
+        /// Counts an access token handed out
+        /// </summary>
+        /// <param name="reason">Why it was issued: TokenMetrics.Login or TokenMetrics.Refresh</param>
+        public void AccessTokenIssued(string reason);
+
+
+        /// <summary>
+        /// Counts a refresh that was turned down
+        /// </summary>
+        /// <param name="reason">Why it was turned down, e.g. TokenMetrics.Replayed</param>
+        public void RefreshRejected(string reason);
+
+
+        /// <summary>
+        /// Counts a refresh token family revoked, logging out every device that got its token from the same login
+        /// </summary>
+        /// <param name="reason">Why it was revoked: TokenMetrics.Logout or TokenMetrics.Replayed</param>
+        public void FamilyRevoked(string reason);
+    }
+
+    /// <summary>
+    /// Counts the access tokens issued and the refreshes turned down, e.g. to tell a burst of logins from clients refreshing in a loop
+    /// </summary>
+    public sealed class TokenMetrics : ITokenMetrics
+    {
+        public const string MeterName = "WgDashboard.Api.Tokens";
+
+        public const string Login = "login";
+        public const string Refresh = "refresh";
+        public const string Logout = "logout";
+        public const string Invalid = "invalid";
+        public const string Replayed = "replayed";
+        public const string Raced = "raced";
+
+        private readonly Counter<long> _issued;
+        private readonly Counter<long> _refreshRejected;
+        private readonly Counter<long> _familiesRevoked;
+
+        public TokenMetrics(IMeterFactory meterFactory)
+        {
+            Meter meter = meterFactory.Create(MeterName);
+            this._issued = meter.CreateCounter<long>("wgdashboard.jwt.issued", description: "Access tokens issued on login or refresh");
+            this._refreshRejected = meter.CreateCounter<long>("wgdashboard.jwt.refresh_rejected",
+                description: "Refreshes turned down because the refresh token was missing, expired, revoked, replayed, or rotated by a concurrent refresh");
+            this._familiesRevoked = meter.CreateCounter<long>("wgdashboard.refresh_token.families_revoked",
+                description: "Refresh token families revoked on logout or because a rotated token was replayed");
+        }
+
+        public void AccessTokenIssued(string reason) => _issued.Add(1, new KeyValuePair<string, object?>("reason", reason));
+
+        public void RefreshRejected(string reason) => _refreshRejected.Add(1, new KeyValuePair<string, object?>("reason", reason));
+
+        public void FamilyRevoked(string reason) => _familiesRevoked.Add(1, new KeyValuePair<string, object?>("reason", reason));
+    }
+}
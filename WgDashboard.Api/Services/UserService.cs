@@ -1,73 +1,71 @@
 ﻿using Microsoft.Data.SqlClient;
 using Microsoft.EntityFrameworkCore;
+using System.Data.Common;
 using WgDashboard.Api.Data;
 using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
 using WgDashboard.Api.Models;
 
 namespace WgDashboard.Api.Services
 {
     public interface IUserService
     {
-        public IEnumerable<UserProfile> GetAllUsers();
+        public IAsyncEnumerable<UserProfile> GetAllUsers(UserListRequest query);
         public Task<UserProfile?> GetUserProfileById(int id);
         public Task<UserProfile?> GetUserProfileByUsername(string username);
-        public Task UpdateUserProfile(int id, string? newUsername, string? newName, string? newRole);
+        public Task UpdateUserProfile(int id, string? newUsername, string? newName, string? newRole, string? ifMatch = null);
         public Task DeleteUserById(int id);
+        public Task<int> DeleteUsers(DeleteUsersRequest request, int requestingUserId);
     }
 
     public class UserService : IUserService
     {
         private readonly WireguardDbContext _context;
+        private readonly IProfileCache _cache;
+        private readonly IWireguardSyncTrigger _syncTrigger;
+        private readonly IIpAllocator _allocator;
+        private readonly IChangeNotifier _notifier;
 
-        public UserService(WireguardDbContext dbContext)
+        public UserService(WireguardDbContext dbContext, IProfileCache profileCache, IWireguardSyncTrigger syncTrigger, IIpAllocator ipAllocator,
+            IChangeNotifier changeNotifier)
         {
             this._context = dbContext;
+            this._cache = profileCache;
+            this._syncTrigger = syncTrigger;
+            this._allocator = ipAllocator;
+            this._notifier = changeNotifier;
         }
 
-        public IEnumerable<UserProfile> GetAllUsers()
+        public IAsyncEnumerable<UserProfile> GetAllUsers(UserListRequest query)
         {
-            IQueryable<UserProfile> profiles = _context.Users.Select((user) => new UserProfile()
-            {
-                Id = user.Id,
-                Username = user.Username,
-                Name = user.Name,
-                Role = user.Role,
-            });
-
-            return profiles;
-        }
-
-        public async Task<UserProfile?> GetUserProfileById(int id)
-        {
-            User? user = await _context.Users.FindAsync(id);
-            if (user is null)
-                return null;
+            // guard against bad input. validate here since the enumerable itself is lazy
+            if (!query.IsValid())
+                throw new BadRequestException($"Limit must be between 1 and {ListRequest.MaxLimit} and after must not be negative");
+
+            IQueryable<User> users = _context.Users.AsNoTracking().Where((user) => user.Id > query.After);
+            if (query.Id is not null)
+                users = users.Where((user) => user.Id == query.Id);
+            if (!string.IsNullOrEmpty(query.Username))
+                users = users.Where((user) => user.Username.StartsWith(query.Username));
+
+            IQueryable<UserProfile> profiles = users.OrderBy((user) => user.Id)
+                .Take(query.PageSize)
+                .Select((user) => new UserProfile()
+                {
+                    Id = user.Id,
+                    Username = user.Username,
+                    Name = user.Name,
+                    Role = user.Role,
+                });
 
-            return new UserProfile()
-            {
-                Id = user.Id,
-                Username = user.Username,
-                Name = user.Name,
-                Role = user.Role,
-            };
+            return profiles.AsAsyncEnumerable();
         }
-        public async Task<UserProfile?> GetUserProfileByUsername(string username)
-        {
-            User? user = await _context.Users.Where((user) => user.Username == username).FirstOrDefaultAsync();
-            if (user is null)
-                return null;
 
-            return new UserProfile()
-            {
-                Id = user.Id,
-                Username = user.Username,
-                Name = user.Name,
-                Role = user.Role,
-            };
+        public Task<UserProfile?> GetUserProfileById(int id) => _cache.GetUserProfile(id, () => CompiledQueries.UserProfileById(_context, id));
 
-        }
+        public Task<UserProfile?> GetUserProfileByUsername(string username) => CompiledQueries.UserProfileByUsername(_context, username);
 
-        public async Task UpdateUserProfile(int id, string? newUsername, string? newName, string? newRole)
+        public async Task UpdateUserProfile(int id, string? newUsername, string? newName, string? newRole, string? ifMatch = null)
         {
             // guards against bad input
             if (newUsername is null || newUsername == "")
@@ -82,44 +80,171 @@ namespace WgDashboard.Api.Services
             if (existingUser is null)
                 throw new ResourceNotFoundException($"User with ID {id} not found");
 
+            // guard against overwriting a change the client hasn't seen
+            if (ifMatch is not null && !ETags.IfMatch(ifMatch, ETags.Compute(ToProfile(existingUser))))
+                throw new PreconditionFailedException($"User with ID {id} has been modified since it was read");
+
             try
             {
                 existingUser.Username = newUsername;
                 existingUser.Name = newName;
                 existingUser.Role = newRole!; // validated not null by UserRoles.IsValidRole()
+                existingUser.ConcurrencyStamp = Guid.NewGuid(); // the save fails if another update got in since the user was read
                 await _context.SaveChangesAsync();
+
+                // the peers' profiles contain the owner's name and username
+                string ownerUsername = existingUser.Username;
+                string? ownerName = existingUser.Name;
+                List<PeerProfile> peers = await _context.Peers.AsNoTracking()
+                    .Where((peer) => peer.OwnerId == id)
+                    .Select((peer) => new PeerProfile()
+                    {
+                        Id = peer.Id,
+                        PublicKey = peer.PublicKey,
+                        AllowedIPs = peer.AllowedIPs,
+                        DeviceDescription = peer.DeviceDescription,
+                        OwnerName = ownerName,
+                        OwnerUsername = ownerUsername,
+                        DeviceType = peer.DeviceType,
+                    })
+                    .ToListAsync();
+                await _cache.InvalidateUser(id, peers.Select((peer) => peer.Id));
+
+                _notifier.Publish(ChangeEvent.ForUser(ChangeActions.Updated, ToProfile(existingUser)));
+                foreach (PeerProfile peer in peers)
+                    _notifier.Publish(ChangeEvent.ForPeer(ChangeActions.Updated, id, peer));
             }
+            catch(DbUpdateConcurrencyException)
+                { throw new PreconditionFailedException($"User with ID {id} has been modified since it was read"); }
             catch(DbUpdateException)
                 { throw new InternalServerErrorException("Could not update the database!"); }
             catch(OperationCanceledException)
                 { throw new InternalServerErrorException("Could not update the database: operation cancelled"); }
         }
 
+        /*
+         * Builds the profile of a user exactly as GET /api/users/{id} would return it
+         */
+        private static UserProfile ToProfile(User user) => new UserProfile()
+        {
+            Id = user.Id,
+            Username = user.Username,
+            Name = user.Name,
+            Role = user.Role,
+        };
+
         public async Task DeleteUserById(int id)
         {
-            User? existingUser = await _context.Users.FindAsync(id);
+            int deletedUsers = await DeleteUsers(_context.Users.Where((user) => user.Id == id));
 
-            if (existingUser is null)
+            if (deletedUsers == 0)
                 throw new ResourceNotFoundException($"Could not find user with ID {id}");
+        }
 
+        public async Task<int> DeleteUsers(DeleteUsersRequest request, int requestingUserId)
+        {
+            // guard against deleting every user by accident
+            if (!request.HasFilter())
+                throw new BadRequestException("At least one of ids, username, or role is required");
+            if (!string.IsNullOrEmpty(request.Role) && !UserRoles.IsValidRole(request.Role))
+                throw new BadRequestException("Role is not valid");
+
+            // never delete the requesting user, or they would lock themselves out halfway through deprovisioning
+            IQueryable<User> users = _context.Users.Where((user) => user.Id != requestingUserId);
+            if (request.Ids is not null && request.Ids.Count > 0)
+                users = users.Where((user) => request.Ids.Contains(user.Id));
+            if (!string.IsNullOrEmpty(request.Username))
+                users = users.Where((user) => user.Username.StartsWith(request.Username));
+            if (!string.IsNullOrEmpty(request.Role))
+                users = users.Where((user) => user.Role == request.Role);
+
+            return await DeleteUsers(users);
+        }
+
+        /*
+         * Deletes the users and their peers with one DELETE statement each, inside a transaction. Returns the number of users deleted
+         */
+        private async Task<int> DeleteUsers(IQueryable<User> users)
+        {
+            Dictionary<int, List<int>> deletedPeerIdsByUser;
+            List<string> freedAddresses;
             try
             {
-                // detach all peers attached to user
-                var peers = _context.Peers.Where((peer) => peer.OwnerId == id);
-                foreach(Peer peer in peers)
+                // the in-memory database used in development can't run set-based deletes
+                if (!_context.Database.IsRelational())
+                    (deletedPeerIdsByUser, freedAddresses) = await DeleteUsersTracked(users);
+                else
                 {
-                    _context.Peers.Remove(peer);
+                    await using var transaction = await _context.Database.BeginTransactionAsync();
+                    deletedPeerIdsByUser = await ReadPeerIdsByUser(users);
+                    List<int> userIds = deletedPeerIdsByUser.Keys.ToList();
+                    freedAddresses = await ReadAllocatedAddresses(userIds);
+                    await _context.Peers.Where((peer) => userIds.Contains(peer.OwnerId)).ExecuteDeleteAsync(); // their addresses go with them
+                    await _context.Users.Where((user) => userIds.Contains(user.Id)).ExecuteDeleteAsync();
+                    await transaction.CommitAsync();
                 }
-                // delete the user
-                _context.Users.Remove(existingUser);
-
-                // attempt to save the DB
-                await _context.SaveChangesAsync();
             }
+            catch(DbException)
+                { throw new InternalServerErrorException("Could not update the database!"); }
             catch(DbUpdateException)
                 { throw new InternalServerErrorException("Could not update the database!"); }
             catch(OperationCanceledException)
-                { throw new InternalServerErrorException("Coul dnot update the database: operation cancelled"); }
+                { throw new InternalServerErrorException("Could not update the database: operation cancelled"); }
+
+            foreach (string address in freedAddresses)
+                _allocator.Release(address);
+            foreach (var (userId, peerIds) in deletedPeerIdsByUser)
+            {
+                await _cache.InvalidateUser(userId, peerIds);
+                foreach (int peerId in peerIds)
+                    _notifier.Publish(ChangeEvent.PeerDeleted(peerId, userId));
+                _notifier.Publish(ChangeEvent.UserDeleted(userId));
+            }
+            if (deletedPeerIdsByUser.Values.Any((peerIds) => peerIds.Count > 0))
+                _syncTrigger.RequestSync(); // the users' peers are gone too
+
+            return deletedPeerIdsByUser.Count;
+        }
+
+        private async Task<(Dictionary<int, List<int>>, List<string>)> DeleteUsersTracked(IQueryable<User> users)
+        {
+            Dictionary<int, List<int>> peerIdsByUser = await ReadPeerIdsByUser(users);
+            List<int> userIds = peerIdsByUser.Keys.ToList();
+            List<IpAllocation> allocations = await _context.IpAllocations
+                .Where((allocation) => allocation.PeerId != null && userIds.Contains(allocation.Peer!.OwnerId))
+                .ToListAsync();
+            _context.IpAllocations.RemoveRange(allocations);
+            _context.Peers.RemoveRange(await _context.Peers.Where((peer) => userIds.Contains(peer.OwnerId)).ToListAsync());
+            _context.Users.RemoveRange(await _context.Users.Where((user) => userIds.Contains(user.Id)).ToListAsync());
+            await _context.SaveChangesAsync();
+
+            return (peerIdsByUser, allocations.Select((allocation) => allocation.Address).ToList());
+        }
+
+        /*
+         * Reads the addresses of the users' peers, so that they can be freed in the index once the peers are deleted
+         */
+        private Task<List<string>> ReadAllocatedAddresses(List<int> userIds) =>
+            _context.IpAllocations.AsNoTracking()
+                .Where((allocation) => allocation.PeerId != null && userIds.Contains(allocation.Peer!.OwnerId))
+                .Select((allocation) => allocation.Address)
+                .ToListAsync();
+
+        /*
+         * Reads the IDs of the users and of their peers, so that the cache can be invalidated once they are deleted
+         */
+        private async Task<Dictionary<int, List<int>>> ReadPeerIdsByUser(IQueryable<User> users)
+        {
+            List<int> userIds = await users.Select((user) => user.Id).ToListAsync();
+            var peers = await _context.Peers.AsNoTracking()
+                .Where((peer) => userIds.Contains(peer.OwnerId))
+                .Select((peer) => new { peer.Id, peer.OwnerId })
+                .ToListAsync();
+
+            Dictionary<int, List<int>> peerIdsByUser = userIds.ToDictionary((userId) => userId, (_) => new List<int>());
+            foreach (var peer in peers)
+                peerIdsByUser[peer.OwnerId].Add(peer.Id);
+            return peerIdsByUser;
         }
     }
 }
@@ -0,0 +1,155 @@
+﻿using System.ComponentModel;
+using System.Diagnostics;
+using System.Text;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for reading and changing the peers of a WireGuard interface
+    /// </summary>
+    public interface IWireguardClient
+    {
+        /// <summary>
+        /// Reads the peers currently on the interface
+        /// </summary>
+        /// <param name="cancellationToken">Cancels the command</param>
+        /// <returns>A task that resolves to the peers on the interface</returns>
+        /// <exception cref="WireguardCommandException">Thrown if the command failed</exception>
+        public Task<List<WireguardPeer>> GetPeers(CancellationToken cancellationToken);
+
+
+        /// <summary>
+        /// Applies the changes to the interface, as few commands as possible
+        /// </summary>
+        /// <param name="changes">The peers to add, update, or remove</param>
+        /// <param name="cancellationToken">Cancels the command</param>
+        /// <returns>A task that resolves once every change has been applied</returns>
+        /// <exception cref="WireguardCommandException">Thrown if a command failed</exception>
+        public Task ApplyChanges(IReadOnlyList<WireguardPeerChange> changes, CancellationToken cancellationToken);
+    }
+
+    /// <summary>
+    /// <para>Runs the wg executable set in WireguardSync:WgPath against the interface in WireguardSync:Interface</para>
+    ///
+    /// <para>Peers are read with "wg show &lt;interface&gt; dump" and changed with "wg set", one command for up to WireguardSync:MaxPeersPerCommand
+    /// peers. Arguments are passed to the process directly rather than through a shell, so nothing in a peer can be interpreted as a command.</para>
+    /// </summary>
+    public class WireguardClient : IWireguardClient
+    {
+        private readonly IWireguardSyncSettings _settings;
+
+        public WireguardClient(IWireguardSyncSettings settings)
+        {
+            this._settings = settings;
+        }
+
+        public async Task<List<WireguardPeer>> GetPeers(CancellationToken cancellationToken)
+        {
+            string dump = await RunWg(new[] { "show", _settings.Interface, "dump" }, cancellationToken);
+            return ParseDump(dump);
+        }
+
+        public async Task ApplyChanges(IReadOnlyList<WireguardPeerChange> changes, CancellationToken cancellationToken)
+        {
+            for (int start = 0; start < changes.Count; start += _settings.MaxPeersPerCommand)
+            {
+                var arguments = new List<string>() { "set", _settings.Interface };
+                foreach (WireguardPeerChange change in changes.Skip(start).Take(_settings.MaxPeersPerCommand))
+                {
+                    arguments.Add("peer");
+                    arguments.Add(change.PublicKey);
+                    if (change.Remove)
+                        arguments.Add("remove");
+                    else
+                    {
+                        arguments.Add("allowed-ips");
+                        arguments.Add(change.AllowedIPs ?? "");
+                    }
+                }
+                await RunWg(arguments, cancellationToken);
+            }
+        }
+
+        /*
+         * Parses the output of "wg show <interface> dump". The first line is the interface itself. Every other line is a peer, tab-separated:
+         * public key, preshared key, endpoint, allowed IPs, latest handshake, bytes received, bytes sent, persistent keepalive
+         */
+        public static List<WireguardPeer> ParseDump(string dump)
+        {
+            var peers = new List<WireguardPeer>();
+            string[] lines = dump.Split('\n', StringSplitOptions.RemoveEmptyEntries);
+            for (int i = 1; i < lines.Length; i++)
+            {
+                string[] fields = lines[i].TrimEnd('\r').Split('\t');
+                if (fields.Length < 4)
+                    continue;
+
+                var peer = new WireguardPeer()
+                {
+                    PublicKey = fields[0],
+                    AllowedIPs = fields[3] == "(none)" ? "" : fields[3],
+                };
+                if (fields.Length >= 7)
+                {
+                    // a handshake time of 0 means there hasn't been one
+                    if (long.TryParse(fields[4], out long latestHandshake) && latestHandshake > 0)
+                        peer.LatestHandshake = DateTime.UnixEpoch.AddSeconds(latestHandshake);
+                    peer.ReceivedBytes = long.TryParse(fields[5], out long receivedBytes) ? receivedBytes : 0;
+                    peer.SentBytes = long.TryParse(fields[6], out long sentBytes) ? sentBytes : 0;
+                }
+                peers.Add(peer);
+            }
+            return peers;
+        }
+
+        private async Task<string> RunWg(IEnumerable<string> arguments, CancellationToken cancellationToken)
+        {
+            var startInfo = new ProcessStartInfo(_settings.WgPath)
+            {
+                RedirectStandardOutput = true,
+                RedirectStandardError = true,
+                UseShellExecute = false,
+                CreateNoWindow = true,
+                StandardOutputEncoding = Encoding.UTF8,
+            };
+            foreach (string argument in arguments)
+                startInfo.ArgumentList.Add(argument);
+
+            using var timeout = CancellationTokenSource.CreateLinkedTokenSource(cancellationToken);
+            timeout.CancelAfter(TimeSpan.FromSeconds(_settings.CommandTimeoutSeconds));
+
+            using var process = new Process() { StartInfo = startInfo };
+            try
+            {
+                process.Start();
+            }
+            catch (Exception e) when (e is Win32Exception or InvalidOperationException)
+                { throw new WireguardCommandException($"Could not run {_settings.WgPath}", e); }
+
+            try
+            {
+                // read both streams while waiting, or a full pipe would block the process forever
+                Task<string> output = process.StandardOutput.ReadToEndAsync(timeout.Token);
+                Task<string> error = process.StandardError.ReadToEndAsync(timeout.Token);
+                await process.WaitForExitAsync(timeout.Token);
+
+                if (process.ExitCode != 0)
+                    throw new WireguardCommandException($"{_settings.WgPath} {startInfo.ArgumentList[0]} exited with code {process.ExitCode}: {(await error).Trim()}", process.ExitCode);
+                return await output;
+            }
+            catch (OperationCanceledException) when (!cancellationToken.IsCancellationRequested)
+            {
+                process.Kill(true);
+                throw new WireguardCommandException($"{_settings.WgPath} {startInfo.ArgumentList[0]} timed out after {_settings.CommandTimeoutSeconds} seconds");
+            }
+            catch (OperationCanceledException)
+            {
+                process.Kill(true);
+                throw;
+            }
+        }
+    }
+}
@@ -0,0 +1,60 @@
+﻿using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for where the peer telemetry collector reads the interface's peers from
+    /// </summary>
+    public interface IWireguardDumpSource
+    {
+        /// <summary>
+        /// Reads the peers on the interface, with their handshakes and transfer counters
+        /// </summary>
+        /// <param name="cancellationToken">Cancels the read</param>
+        /// <returns>A task that resolves to the peers on the interface</returns>
+        /// <exception cref="WireguardCommandException">Thrown if the peers could not be read</exception>
+        public Task<List<WireguardPeer>> ReadPeers(CancellationToken cancellationToken);
+    }
+
+    /// <summary>
+    /// Reads the peers by running "wg show &lt;interface&gt; dump"
+    /// </summary>
+    public class WgDumpSource : IWireguardDumpSource
+    {
+        private readonly IWireguardClient _client;
+
+        public WgDumpSource(IWireguardClient client)
+        {
+            this._client = client;
+        }
+
+        public Task<List<WireguardPeer>> ReadPeers(CancellationToken cancellationToken) => _client.GetPeers(cancellationToken);
+    }
+
+    /// <summary>
+    /// Reads the peers from a file holding the output of "wg show &lt;interface&gt; dump", set in PeerTelemetry:DumpFile. Stands in for wg in tests
+    /// </summary>
+    public class FileDumpSource : IWireguardDumpSource
+    {
+        private readonly IPeerTelemetrySettings _settings;
+
+        public FileDumpSource(IPeerTelemetrySettings settings)
+        {
+            this._settings = settings;
+        }
+
+        public async Task<List<WireguardPeer>> ReadPeers(CancellationToken cancellationToken)
+        {
+            try
+            {
+                return WireguardClient.ParseDump(await File.ReadAllTextAsync(_settings.DumpFile!, cancellationToken)); // only registered when the file is set
+            }
+            catch (IOException e)
+                { throw new WireguardCommandException($"Could not read {_settings.DumpFile}", e); }
+            catch (UnauthorizedAccessException e)
+                { throw new WireguardCommandException($"Could not read {_settings.DumpFile}", e); }
+        }
+    }
+}
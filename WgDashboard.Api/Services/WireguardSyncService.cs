@@ -0,0 +1,167 @@
+﻿using Microsoft.EntityFrameworkCore;
+using System.Data.Common;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Exceptions;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// <para>Keeps the peers on the WireGuard interface in line with the peers in the database</para>
+    ///
+    /// <para>A sync reads both sides, diffs them by public key, and only adds, updates, or removes the peers that differ, so a change to one
+    /// peer costs one small "wg set" no matter how many peers there are. Syncs run after the API changes peers, once it has been quiet for
+    /// WireguardSync:DebounceMilliseconds, and every WireguardSync:ResyncMinutes to undo changes made outside of the API.</para>
+    /// </summary>
+    public class WireguardSyncService : BackgroundService
+    {
+        private readonly IServiceScopeFactory _scopeFactory;
+        private readonly IWireguardSyncSettings _settings;
+        private readonly IWireguardSyncTrigger _trigger;
+        private readonly IWireguardClient _client;
+        private readonly ILogger<WireguardSyncService> _logger;
+
+        public WireguardSyncService(IServiceScopeFactory scopeFactory, IWireguardSyncSettings settings, IWireguardSyncTrigger trigger,
+            IWireguardClient client, ILogger<WireguardSyncService> logger)
+        {
+            this._scopeFactory = scopeFactory;
+            this._settings = settings;
+            this._trigger = trigger;
+            this._client = client;
+            this._logger = logger;
+        }
+
+        protected override async Task ExecuteAsync(CancellationToken stoppingToken)
+        {
+            while (!stoppingToken.IsCancellationRequested)
+            {
+                try
+                {
+                    List<WireguardPeerChange> changes = await Sync(stoppingToken);
+                    if (changes.Count > 0)
+                        _logger.LogInformation("Applied {Changes} peer changes to {Interface}", changes.Count, _settings.Interface);
+                }
+                catch (WireguardCommandException e)
+                    { _logger.LogWarning(e, "Could not sync peers to {Interface}", _settings.Interface); }
+                catch (Exception e) when (e is DbException or DbUpdateException)
+                    { _logger.LogWarning(e, "Could not read peers to sync to {Interface}", _settings.Interface); }
+
+                if (await WaitForRequest(TimeSpan.FromMinutes(_settings.ResyncMinutes), stoppingToken))
+                    await Debounce(stoppingToken);
+            }
+        }
+
+        /// <summary>
+        /// Brings the interface in line with the database
+        /// </summary>
+        /// <param name="cancellationToken">Cancels the sync</param>
+        /// <returns>A task that resolves to the changes that were applied</returns>
+        public async Task<List<WireguardPeerChange>> Sync(CancellationToken cancellationToken)
+        {
+            Dictionary<string, string> desired = await ReadDesiredPeers(cancellationToken);
+            List<WireguardPeer> live = await _client.GetPeers(cancellationToken);
+
+            List<WireguardPeerChange> changes = Diff(desired, live);
+            if (changes.Count > 0)
+                await _client.ApplyChanges(changes, cancellationToken);
+            return changes;
+        }
+
+        /// <summary>
+        /// Finds the changes that turn the live peers into the desired ones. Removals come first, so that allowed IPs moving from a removed peer
+        /// to another one are free by the time they are assigned
+        /// </summary>
+        /// <param name="desired">The allowed IPs of every peer that should be on the interface, in canonical form, by public key</param>
+        /// <param name="live">The peers on the interface</param>
+        /// <returns>The changes to apply</returns>
+        public static List<WireguardPeerChange> Diff(Dictionary<string, string> desired, List<WireguardPeer> live)
+        {
+            var changes = new List<WireguardPeerChange>();
+            var livePeers = new Dictionary<string, string>(live.Count);
+            foreach (WireguardPeer peer in live)
+            {
+                livePeers[peer.PublicKey] = peer.AllowedIPs;
+                if (!desired.ContainsKey(peer.PublicKey))
+                    changes.Add(new WireguardPeerChange() { PublicKey = peer.PublicKey, Remove = true });
+            }
+
+            foreach (var (publicKey, allowedIPs) in desired)
+            {
+                string? liveAllowedIPs;
+                if (!livePeers.TryGetValue(publicKey, out liveAllowedIPs) || liveAllowedIPs != allowedIPs)
+                    changes.Add(new WireguardPeerChange() { PublicKey = publicKey, AllowedIPs = allowedIPs });
+            }
+            return changes;
+        }
+
+        /*
+         * Reads every peer in the database, in the form wg prints them. Peers that wg would reject are skipped, so one bad row can't block the rest
+         */
+        private async Task<Dictionary<string, string>> ReadDesiredPeers(CancellationToken cancellationToken)
+        {
+            // the DB context is scoped, so it needs its own scope outside of a request
+            using IServiceScope scope = _scopeFactory.CreateScope();
+            var context = scope.ServiceProvider.GetRequiredService<WireguardDbContext>();
+
+            var desired = new Dictionary<string, string>();
+            var peers = context.Peers.AsNoTracking()
+                .Select((peer) => new { peer.Id, peer.PublicKey, peer.AllowedIPs })
+                .AsAsyncEnumerable();
+            await foreach (var peer in peers.WithCancellation(cancellationToken))
+            {
+                CidrNetwork network;
+                if (!IsValidPublicKey(peer.PublicKey) || !CidrNetwork.TryParse(peer.AllowedIPs, out network))
+                {
+                    _logger.LogWarning("Skipping peer with ID {Id}: its public key or allowed IPs are not valid for WireGuard", peer.Id);
+                    continue;
+                }
+                desired[peer.PublicKey] = network.ToCanonicalString();
+            }
+            return desired;
+        }
+
+        /*
+         * A WireGuard public key is 32 bytes in base64
+         */
+        private static bool IsValidPublicKey(string publicKey)
+        {
+            Span<byte> key = stackalloc byte[32];
+            return publicKey.Length == 44 && Convert.TryFromBase64String(publicKey, key, out int written) && written == 32;
+        }
+
+        /*
+         * Waits for a sync request or for the timeout. Returns true if a sync was requested
+         */
+        private async Task<bool> WaitForRequest(TimeSpan timeout, CancellationToken stoppingToken)
+        {
+            using var wait = CancellationTokenSource.CreateLinkedTokenSource(stoppingToken);
+            wait.CancelAfter(timeout);
+            try
+            {
+                await _trigger.WaitForRequest(wait.Token);
+                return true;
+            }
+            catch (OperationCanceledException)
+                { return false; } // timed out, or shutting down
+        }
+
+        /*
+         * Waits until no sync has been requested for DebounceMilliseconds, but no longer than MaxDelayMilliseconds in total
+         */
+        private async Task Debounce(CancellationToken stoppingToken)
+        {
+            DateTime deadline = DateTime.UtcNow.AddMilliseconds(_settings.MaxDelayMilliseconds);
+            while (!stoppingToken.IsCancellationRequested)
+            {
+                TimeSpan quietPeriod = TimeSpan.FromMilliseconds(_settings.DebounceMilliseconds);
+                TimeSpan remaining = deadline - DateTime.UtcNow;
+                if (remaining <= TimeSpan.Zero)
+                    return;
+
+                if (!await WaitForRequest(remaining < quietPeriod ? remaining : quietPeriod, stoppingToken))
+                    return; // quiet for the whole period
+            }
+        }
+    }
+}
@@ -0,0 +1,39 @@
+﻿using System.Threading.Channels;
+
+namespace WgDashboard.Api.Services
+{
+    /// <summary>
+    /// Interface for asking the WireGuard sync service to push the peers to the interface
+    /// </summary>
+    public interface IWireguardSyncTrigger
+    {
+        /// <summary>
+        /// Asks for a sync soon. Requests made while one is already pending are merged into it
+        /// </summary>
+        public void RequestSync();
+
+
+        /// <summary>
+        /// Waits until a sync has been requested
+        /// </summary>
+        /// <param name="cancellationToken">Stops waiting</param>
+        /// <returns>A task that resolves once a sync has been requested</returns>
+        public Task WaitForRequest(CancellationToken cancellationToken);
+    }
+
+    /// <summary>
+    /// Holds at most one pending request, so a burst of writes to the peers costs one sync instead of one per write
+    /// </summary>
+    public class WireguardSyncTrigger : IWireguardSyncTrigger
+    {
+        private readonly Channel<bool> _requests = Channel.CreateBounded<bool>(new BoundedChannelOptions(1)
+        {
+            FullMode = BoundedChannelFullMode.DropWrite,
+            SingleReader = true,
+        });
+
+        public void RequestSync() => _requests.Writer.TryWrite(true);
+
+        public async Task WaitForRequest(CancellationToken cancellationToken) => await _requests.Reader.ReadAsync(cancellationToken);
+    }
+}
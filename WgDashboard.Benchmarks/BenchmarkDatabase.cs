@@ -0,0 +1,47 @@
+﻿using Microsoft.EntityFrameworkCore;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Benchmarks
+{
+    /// <summary>
+    /// Creates an in-memory database seeded with users and peers, so benchmarks measure the API's own overhead instead of the network
+    /// </summary>
+    public static class BenchmarkDatabase
+    {
+        public static DbContextOptions<WireguardDbContext> Create(string name, int users, int peersPerUser)
+        {
+            var options = new DbContextOptionsBuilder<WireguardDbContext>()
+                .UseInMemoryDatabase(name)
+                .Options;
+
+            using var context = new WireguardDbContext(options);
+            context.Database.EnsureDeleted();
+            for (int i = 1; i <= users; i++)
+            {
+                var user = new User()
+                {
+                    Username = "user" + i,
+                    Password = "not a real hash",
+                    Name = "User " + i,
+                    Role = UserRoles.User,
+                };
+                context.Users.Add(user);
+                for (int j = 0; j < peersPerUser; j++)
+                {
+                    context.Peers.Add(new Peer()
+                    {
+                        PublicKey = $"{i:D20}{j:D23}=",
+                        AllowedIPs = $"10.{i / 256 % 256}.{i % 256}.{j + 2}/32",
+                        Owner = user,
+                        DeviceType = DeviceTypes.Laptop,
+                        Slot = j,
+                    });
+                }
+            }
+            context.SaveChanges();
+
+            return options;
+        }
+    }
+}
@@ -0,0 +1,88 @@
+﻿using BenchmarkDotNet.Attributes;
+using Microsoft.AspNetCore.Http;
+using System.Security.Claims;
+using WgDashboard.Api.Models;
+using WgDashboard.Api.Services;
+
+namespace WgDashboard.Benchmarks
+{
+    /// <summary>
+    /// Compares the per-request cost of reading the user from the JWT's claims in a typical peer controller action:
+    /// the separate claim lookups and string role check that the controllers used to make, against the CurrentUser read once
+    /// </summary>
+    [MemoryDiagnoser]
+    public class CurrentUserBenchmarks
+    {
+        private HttpContext _httpContext = null!;
+        private SecurityService _security = null!;
+
+        [GlobalSetup]
+        public void Setup()
+        {
+            // same claims as TokenIssuer.IssueAccessToken, plus the standard ones the JWT handler adds
+            var identity = new ClaimsIdentity(new Claim[]
+            {
+                new Claim("nbf", "1700000000"),
+                new Claim("exp", "1700000900"),
+                new Claim("iss", "api.example.com"),
+                new Claim("aud", "mywebsite.example.com"),
+                new Claim(ClaimTypes.Sid, "42"),
+                new Claim(ClaimTypes.NameIdentifier, "myuser"),
+                new Claim(ClaimTypes.Name, "Test User"),
+                new Claim(ClaimTypes.Role, UserRoles.User),
+            }, "Bearer");
+            _httpContext = new DefaultHttpContext() { User = new ClaimsPrincipal(identity) };
+
+            // the role check doesn't touch the database or the hasher
+            _security = new SecurityService(null!, null!, null!, null!);
+        }
+
+        [Benchmark(Baseline = true)]
+        public bool IdentityServiceLookups()
+        {
+            int userId = GetUserIdFromJwt(_httpContext);
+            string userRole = GetUserRoleFromJwt(_httpContext);
+            bool authorized = CheckUserAuthorized(42, userId, userRole);
+            return authorized && CheckUserAuthorized(7, userId, userRole) == false;
+        }
+
+        [Benchmark]
+        public bool CurrentUserReadOnce()
+        {
+            var accessor = new CurrentUserAccessor(new HttpContextAccessor() { HttpContext = _httpContext }); // one per request, like the scoped service
+            bool authorized = _security.CheckUserAuthorized(42, accessor.User);
+            return authorized && _security.CheckUserAuthorized(7, accessor.User) == false;
+        }
+
+        /*
+         * The lookups that IdentityService and SecurityService used to make on every request, kept here as the baseline
+         */
+        private static int GetUserIdFromJwt(HttpContext httpContext)
+        {
+            var identity = httpContext.User.Identity as ClaimsIdentity;
+            if (identity is null)
+                return 0;
+
+            IEnumerable<Claim> identityClaims = identity.Claims;
+
+            int userId;
+            if (!int.TryParse(identityClaims.FirstOrDefault((claim) => claim.Type == ClaimTypes.Sid)?.Value, out userId))
+                return 0;
+            else
+                return userId;
+        }
+
+        private static string GetUserRoleFromJwt(HttpContext httpContext)
+        {
+            var identity = httpContext.User.Identity as ClaimsIdentity;
+            if (identity is null)
+                return UserRoles.Anonymous;
+
+            IEnumerable<Claim> identityClaims = identity.Claims;
+            return identityClaims.FirstOrDefault((claim) => claim.Type == ClaimTypes.Role)?.Value ?? UserRoles.Anonymous;
+        }
+
+        private static bool CheckUserAuthorized(int idToCheckAgainst, int usersActualId, string usersActualRole) =>
+            usersActualRole == UserRoles.Admin || usersActualId == idToCheckAgainst;
+    }
+}
@@ -0,0 +1,4 @@
+﻿using BenchmarkDotNet.Running;
+
+// run with: dotnet run -c Release -- --filter *
+BenchmarkSwitcher.FromAssembly(typeof(Program).Assembly).Run(args);
@@ -0,0 +1,67 @@
+﻿using BenchmarkDotNet.Attributes;
+using Microsoft.EntityFrameworkCore;
+using WgDashboard.Api.Data;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Benchmarks
+{
+    /// <summary>
+    /// Compares the per-request cost of the LINQ queries the services used to build on every call against the compiled, no-tracking queries
+    /// </summary>
+    [MemoryDiagnoser]
+    public class QueryBenchmarks
+    {
+        private DbContextOptions<WireguardDbContext> _options = null!;
+        private int _id;
+
+        [GlobalSetup]
+        public void Setup()
+        {
+            _options = BenchmarkDatabase.Create(nameof(QueryBenchmarks), users: 1000, peersPerUser: 5);
+        }
+
+        // cycle through the users so every call looks up a different row
+        private int NextId() => _id = _id % 1000 + 1;
+
+        [Benchmark(Baseline = true)]
+        public async Task<UserProfile?> UserProfileById_Linq()
+        {
+            using var context = new WireguardDbContext(_options); // a new context per request, like the scoped DbContext
+            int id = NextId();
+            User? user = await context.Users.Where((user) => user.Id == id).FirstOrDefaultAsync();
+            if (user is null)
+                return null;
+            return new UserProfile() { Id = user.Id, Username = user.Username, Name = user.Name, Role = user.Role };
+        }
+
+        [Benchmark]
+        public async Task<UserProfile?> UserProfileById_Compiled()
+        {
+            using var context = new WireguardDbContext(_options);
+            return await CompiledQueries.UserProfileById(context, NextId());
+        }
+
+        [Benchmark]
+        public async Task<int> PeerProfilesByOwnerId_Linq()
+        {
+            using var context = new WireguardDbContext(_options);
+            User? owner = await context.Users.FindAsync(NextId());
+            if (owner is null)
+                return 0;
+            return await context.Users.Join(context.Peers, (user) => user.Id, (peer) => peer.OwnerId,
+                    (user, peer) => new PeerProfile() { Id = peer.Id, PublicKey = peer.PublicKey, OwnerUsername = user.Username })
+                .Where((profile) => profile.OwnerUsername == owner.Username)
+                .CountAsync();
+        }
+
+        [Benchmark]
+        public async Task<int> PeerProfilesByOwnerId_Compiled()
+        {
+            using var context = new WireguardDbContext(_options);
+            int count = 0;
+            await foreach (PeerProfile _ in CompiledQueries.PeerProfilesByOwnerId(context, NextId()))
+                count++;
+            return count;
+        }
+    }
+}
@@ -0,0 +1,106 @@
+﻿using BenchmarkDotNet.Attributes;
+using BenchmarkDotNet.Columns;
+using BenchmarkDotNet.Configs;
+using BenchmarkDotNet.Reports;
+using BenchmarkDotNet.Running;
+using System.Collections.Concurrent;
+using System.IO.Compression;
+using System.Text.Json;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+
+namespace WgDashboard.Benchmarks
+{
+    /// <summary>
+    /// Serializes a 50,000 peer listing the way the API used to (reflection, uncompressed) and the way it does now
+    /// (source-generated, then Brotli or gzip at the configured level). The "Wire bytes" column is the size of the response body sent.
+    /// </summary>
+    [MemoryDiagnoser]
+    [Config(typeof(WireBytesConfig))]
+    public class SerializationBenchmarks
+    {
+        private const int PEERS = 50_000;
+
+        private List<PeerProfile> _peers = null!;
+        private JsonSerializerOptions _reflectionOptions = null!;
+
+        [GlobalSetup]
+        public void Setup()
+        {
+            _peers = new List<PeerProfile>(PEERS);
+            for (int i = 1; i <= PEERS; i++)
+            {
+                int owner = (i - 1) / 5 + 1;
+                _peers.Add(new PeerProfile()
+                {
+                    Id = i,
+                    PublicKey = $"{owner:D20}{i % 5:D23}=",
+                    AllowedIPs = $"10.{owner / 256 % 256}.{owner % 256}.{i % 5 + 2}/32",
+                    DeviceDescription = i % 3 == 0 ? null : "Device " + i,
+                    OwnerName = "User " + owner,
+                    OwnerUsername = "user" + owner,
+                    DeviceType = DeviceTypes.Laptop,
+                });
+            }
+
+            // the controllers' settings before the source-generated context was added
+            _reflectionOptions = new JsonSerializerOptions(JsonSerializerDefaults.Web);
+        }
+
+        [Benchmark(Baseline = true)]
+        public int Reflection_Uncompressed() => JsonSerializer.SerializeToUtf8Bytes(_peers, _reflectionOptions).Length;
+
+        [Benchmark]
+        public int SourceGenerated_Uncompressed() => JsonSerializer.SerializeToUtf8Bytes(_peers, ApiJsonContext.Default.ListPeerProfile).Length;
+
+        [Benchmark]
+        public int SourceGenerated_Brotli()
+        {
+            using var body = new MemoryStream();
+            using (var brotli = new BrotliStream(body, CompressionLevel.Fastest, leaveOpen: true))
+                JsonSerializer.Serialize(brotli, _peers, ApiJsonContext.Default.ListPeerProfile);
+            return (int)body.Length;
+        }
+
+        [Benchmark]
+        public int SourceGenerated_Gzip()
+        {
+            using var body = new MemoryStream();
+            using (var gzip = new GZipStream(body, CompressionLevel.Fastest, leaveOpen: true))
+                JsonSerializer.Serialize(gzip, _peers, ApiJsonContext.Default.ListPeerProfile);
+            return (int)body.Length;
+        }
+
+        // each benchmark returns the size of its body. the benchmarks run in a separate process, so run each once more here to report it
+        private static readonly ConcurrentDictionary<string, int> wireBytes = new();
+
+        private static int WireBytes(string benchmark) => wireBytes.GetOrAdd(benchmark, (name) =>
+        {
+            var benchmarks = new SerializationBenchmarks();
+            benchmarks.Setup();
+            return (int)typeof(SerializationBenchmarks).GetMethod(name)!.Invoke(benchmarks, null)!;
+        });
+
+        private sealed class WireBytesConfig : ManualConfig
+        {
+            public WireBytesConfig() => AddColumn(new WireBytesColumn());
+        }
+
+        private sealed class WireBytesColumn : IColumn
+        {
+            public string Id => nameof(WireBytesColumn);
+            public string ColumnName => "Wire bytes";
+            public bool AlwaysShow => true;
+            public ColumnCategory Category => ColumnCategory.Custom;
+            public int PriorityInCategory => 0;
+            public bool IsNumeric => true;
+            public UnitType UnitType => UnitType.Dimensionless;
+            public string Legend => "Size of the response body sent to the client";
+
+            public string GetValue(Summary summary, BenchmarkCase benchmarkCase) => WireBytes(benchmarkCase.Descriptor.WorkloadMethod.Name).ToString("N0");
+            public string GetValue(Summary summary, BenchmarkCase benchmarkCase, SummaryStyle style) => GetValue(summary, benchmarkCase);
+            public bool IsDefault(Summary summary, BenchmarkCase benchmarkCase) => false;
+            public bool IsAvailable(Summary summary) => true;
+        }
+    }
+}
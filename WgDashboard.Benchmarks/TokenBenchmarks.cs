@@ -0,0 +1,60 @@
+﻿using BenchmarkDotNet.Attributes;
+using Microsoft.Extensions.Configuration;
+using Microsoft.IdentityModel.Tokens;
+using System.IdentityModel.Tokens.Jwt;
+using System.Security.Claims;
+using System.Text;
+using WgDashboard.Api.Helpers;
+using WgDashboard.Api.Models;
+using WgDashboard.Api.Services;
+
+namespace WgDashboard.Benchmarks
+{
+    /// <summary>
+    /// Compares issuing an access token the old way, building the key, credentials, and JwtSecurityTokenHandler for every token,
+    /// against the TokenIssuer that builds them once and uses JsonWebTokenHandler
+    /// </summary>
+    [MemoryDiagnoser]
+    public class TokenBenchmarks
+    {
+        private const string Key = "MySecret256BitKeyaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa";
+        private const string Issuer = "api.example.com";
+        private const string Audience = "mywebsite.example.com";
+
+        private readonly UserProfile _profile = new UserProfile() { Id = 42, Username = "myuser", Name = "Test User", Role = UserRoles.User };
+        private TokenIssuer _issuer = null!;
+
+        [GlobalSetup]
+        public void Setup()
+        {
+            var config = new ConfigurationBuilder()
+                .AddInMemoryCollection(new Dictionary<string, string?>()
+                {
+                    ["JwtSettings:Issuer"] = Issuer,
+                    ["JwtSettings:Audience"] = Audience,
+                    ["JwtSettings:Key"] = Key,
+                })
+                .Build();
+            _issuer = new TokenIssuer(new JwtSettings(config));
+        }
+
+        [Benchmark(Baseline = true)]
+        public string PerCallKeyAndJwtSecurityTokenHandler()
+        {
+            var securityKey = new SymmetricSecurityKey(Encoding.UTF8.GetBytes(Key));
+            var credentials = new SigningCredentials(securityKey, SecurityAlgorithms.HmacSha256);
+            var claims = new Claim[]
+            {
+                new Claim(ClaimTypes.Sid, _profile.Id.ToString()),
+                new Claim(ClaimTypes.NameIdentifier, _profile.Username),
+                new Claim(ClaimTypes.Name, _profile.Name ?? ""),
+                new Claim(ClaimTypes.Role, _profile.Role),
+            };
+            var token = new JwtSecurityToken(Issuer, Audience, claims, expires: DateTime.Now.AddMinutes(15), signingCredentials: credentials);
+            return new JwtSecurityTokenHandler().WriteToken(token);
+        }
+
+        [Benchmark]
+        public string CachedTokenIssuer() => _issuer.IssueAccessToken(_profile);
+    }
+}
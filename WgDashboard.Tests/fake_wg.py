@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Stands in for the wg executable so the sync can be tested without a WireGuard interface. Point WireguardSync:WgPath at this file
+# and FAKE_WG_STATE at a JSON file, which holds the interface's peers and a log of the commands run against it
+import json
+import os
+import sys
+
+STATE_PATH = os.getenv("FAKE_WG_STATE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_wg_state.json"))
+
+
+def load_state() -> dict:
+    try:
+        with open(STATE_PATH) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"peers": {}, "commands": []}
+
+
+def save_state(state: dict):
+    temp_path = STATE_PATH + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file)
+    os.replace(temp_path, STATE_PATH)
+
+
+def show_dump(state: dict):
+    print("privatekey\tpublickey\t51820\toff")
+    for public_key, allowed_ips in state["peers"].items():
+        print("\t".join([public_key, "(none)", "(none)", allowed_ips or "(none)", "0", "0", "0", "off"]))
+
+
+def set_peers(state: dict, args: list[str]):
+    i = 0
+    while i < len(args):
+        if args[i] != "peer" or i + 2 >= len(args):
+            print("Invalid argument: " + args[i], file=sys.stderr)
+            sys.exit(1)
+        public_key = args[i + 1]
+        if args[i + 2] == "remove":
+            state["peers"].pop(public_key, None)
+            i += 3
+        elif args[i + 2] == "allowed-ips" and i + 3 < len(args):
+            state["peers"][public_key] = args[i + 3]
+            i += 4
+        else:
+            print("Invalid argument: " + args[i + 2], file=sys.stderr)
+            sys.exit(1)
+
+
+def main(args: list[str]):
+    state = load_state()
+    if len(args) == 3 and args[0] == "show" and args[2] == "dump":
+        show_dump(state)
+        return
+
+    if len(args) >= 2 and args[0] == "set":
+        state["commands"].append(args)
+        set_peers(state, args[2:])
+        save_state(state)
+        return
+
+    print("Unsupported command: " + " ".join(args), file=sys.stderr)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# Drives a mix of auth and peer calls against a running API from many threads at once and reports latency, throughput, and errors
+# per endpoint as JSON. Works against the Development in-memory database: every worker signs up its own user, and the list calls
+# log in as admin/admin. Pass --baseline to compare against an earlier report and exit with 1 if any endpoint regressed, e.g.
+#   python load_test.py --workers 16 --duration 60 --output results.json --baseline baseline.json
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import dotenv
+import requests
+import requests.adapters
+import urllib3
+from signup_login import *
+
+MAX_PEERS_PER_USER = 5
+DEFAULT_MIX = "login=1,refresh=1,create=2,read=4,update=1,delete=2,list=1"
+OPERATIONS = ("login", "refresh", "create", "read", "update", "delete", "list")
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+        self.errors: dict[str, int] = {operation: 0 for operation in OPERATIONS}
+        self.statuses: dict[str, dict[str, int]] = {operation: {} for operation in OPERATIONS}
+
+
+    def record(self, operation: str, milliseconds: float, status: int | None, ok: bool):
+        with self._lock:
+            self.latencies[operation].append(milliseconds)
+            if not ok:
+                self.errors[operation] += 1
+            status_name = str(status) if status is not None else "exception"
+            self.statuses[operation][status_name] = self.statuses[operation].get(status_name, 0) + 1
+
+
+class Worker:
+    def __init__(self, base_url: str, admin_jwt: str, allocate: bool):
+        self.base_url = base_url
+        self.admin_jwt = admin_jwt
+        self.allocate = allocate
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)) # one kept-alive connection per worker
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.jwt, self.user = signup_and_login(base_url)
+        self.credentials = {"username": self.user["nameidentifier"], "password": "mypassword"}
+        self.peers: dict[int, dict] = {}
+        self.calls = {"login": self.login, "refresh": self.refresh, "create": self.create_peer, "read": self.read_peer,
+                      "update": self.update_peer, "delete": self.delete_peer, "list": self.list_peers}
+
+
+    def run(self, mix: list[tuple[str, int]], until: float, warmup_until: float, stats: Stats):
+        operations = [operation for operation, _ in mix]
+        weights = [weight for _, weight in mix]
+        self.login() # a refresh needs the refresh token cookie from a login
+        while time.monotonic() < until:
+            operation = self.feasible(random.choices(operations, weights)[0])
+            started = time.perf_counter()
+            try:
+                response = self.calls[operation]()
+                status = response.status_code
+                ok = 200 <= status <= 299
+            except requests.RequestException:
+                status = None
+                ok = False
+            milliseconds = (time.perf_counter() - started) * 1000
+            if time.monotonic() >= warmup_until:
+                stats.record(operation, milliseconds, status, ok)
+
+
+    def feasible(self, operation: str) -> str:
+        # a user can only have so many peers, so swap in a call that keeps the mix going instead of one that is bound to fail
+        if operation == "create" and len(self.peers) >= MAX_PEERS_PER_USER:
+            return "delete"
+        if operation in ("read", "update", "delete") and len(self.peers) == 0:
+            return "create"
+        return operation
+
+
+    def headers(self, encoded_jwt: str | None = None) -> dict[str, str]:
+        return {"Authorization": "Bearer " + (encoded_jwt or self.jwt)}
+
+
+    def login(self) -> requests.Response:
+        response = self.session.post(self.base_url + "/api/auth/login", json=self.credentials)
+        if response.ok:
+            self.jwt = response.content.decode().replace("\"", "")
+        return response
+
+
+    def refresh(self) -> requests.Response:
+        response = self.session.post(self.base_url + "/api/auth/refresh") # the rotated cookie replaces the old one in the session
+        if response.ok:
+            self.jwt = response.content.decode().replace("\"", "")
+        return response
+
+
+    def create_peer(self) -> requests.Response:
+        peer = {"publickey": base64.b64encode(os.urandom(32)).decode(), "ownerid": self.user["sid"], "devicetype": "Phone"}
+        if not self.allocate:
+            peer["allowedips"] = f"100.{random.randint(64, 127)}.{random.randint(0, 255)}.{random.randint(1, 254)}/32"
+        response = self.session.post(self.base_url + "/api/peers", json=peer, headers=self.headers())
+        if response.ok:
+            created = response.json()
+            peer["allowedips"] = created["allowedIPs"]
+            self.peers[created["id"]] = peer
+        return response
+
+
+    def read_peer(self) -> requests.Response:
+        return self.session.get(self.base_url + f"/api/peers/{random.choice(list(self.peers))}", headers=self.headers())
+
+
+    def update_peer(self) -> requests.Response:
+        peer_id = random.choice(list(self.peers))
+        peer = self.peers[peer_id]
+        body = {"id": peer_id, "publickey": peer["publickey"], "allowedips": peer["allowedips"], "ownerid": self.user["sid"],
+                "devicetype": "Laptop", "devicedescription": "load test " + str(random.randint(0, 10**6))}
+        return self.session.put(self.base_url + f"/api/peers/{peer_id}", json=body, headers=self.headers())
+
+
+    def delete_peer(self) -> requests.Response:
+        peer_id = random.choice(list(self.peers))
+        response = self.session.delete(self.base_url + f"/api/peers/{peer_id}", headers=self.headers())
+        if response.ok or response.status_code == 404:
+            del self.peers[peer_id]
+        return response
+
+
+    def list_peers(self) -> requests.Response:
+        return self.session.get(self.base_url + "/api/peers", params={"limit": 100}, headers=self.headers(self.admin_jwt))
+
+
+def parse_mix(mix: str) -> list[tuple[str, int]]:
+    parsed = []
+    for part in mix.split(","):
+        operation, _, weight = part.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{operation}', expected one of {', '.join(OPERATIONS)}")
+        if not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"weight of '{operation}' must be a whole number")
+        if int(weight) > 0:
+            parsed.append((operation, int(weight)))
+    if len(parsed) == 0:
+        raise argparse.ArgumentTypeError("at least one operation needs a weight above 0")
+    return parsed
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    # nearest-rank, so every reported latency is one that was actually measured
+    rank = max(1, math.ceil(len(sorted_values) * percent / 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], errors: int, statuses: dict[str, int], seconds: float) -> dict:
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "throughput": len(latencies) / seconds if seconds > 0 else 0.0,
+        "statuses": statuses,
+    }
+    if latencies:
+        values = sorted(latencies)
+        summary["latency_ms"] = {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": sum(values) / len(values),
+            "max": values[-1],
+        }
+    return summary
+
+
+def report(stats: Stats, seconds: float, config: dict) -> dict:
+    endpoints = {}
+    all_latencies = []
+    all_statuses: dict[str, int] = {}
+    for operation in OPERATIONS:
+        if not stats.latencies[operation]:
+            continue
+        endpoints[operation] = summarize(stats.latencies[operation], stats.errors[operation], stats.statuses[operation], seconds)
+        all_latencies += stats.latencies[operation]
+        for status, count in stats.statuses[operation].items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+
+    return {
+        "config": config,
+        "measured_seconds": seconds,
+        "endpoints": endpoints,
+        "total": summarize(all_latencies, sum(stats.errors.values()), all_statuses, seconds),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, error_rate_tolerance: float) -> list[dict]:
+    regressions = []
+    for operation, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(operation)
+        if previous is None or "latency_ms" not in previous or "latency_ms" not in current:
+            continue
+
+        for metric in ("p50", "p95", "p99"):
+            if current["latency_ms"][metric] > previous["latency_ms"][metric] * (1 + tolerance):
+                regressions.append({"endpoint": operation, "metric": metric, "baseline": previous["latency_ms"][metric], "current": current["latency_ms"][metric]})
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append({"endpoint": operation, "metric": "throughput", "baseline": previous["throughput"], "current": current["throughput"]})
+        if current["error_rate"] > previous["error_rate"] + error_rate_tolerance:
+            regressions.append({"endpoint": operation, "metric": "error_rate", "baseline": previous["error_rate"], "current": current["error_rate"]})
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the API and report per-endpoint latency, throughput, and errors as JSON")
+    parser.add_argument("--url", default=None, help="base URL of the API. defaults to API_URL from the environment or .env")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent workers, each with its own user and connection")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure for, after the warmup")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds to run before measuring, so that JIT and caches settle")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"weighted operations (default: {DEFAULT_MIX})")
+    parser.add_argument("--allocate", action="store_true", help="leave allowed IPs out of new peers, for an API with IpAllocation:Subnets set")
+    parser.add_argument("--output", default=None, help="file to write the JSON report to. it is always printed")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against. exits with 1 if an endpoint regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction that latency may rise or throughput may fall before it counts as a regression")
+    parser.add_argument("--error-rate-tolerance", type=float, default=0.01, help="amount that an endpoint's error rate may rise before it counts as a regression")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    dotenv.load_dotenv()
+    base_url = args.url or os.getenv("API_URL")
+    if not base_url:
+        parser.error("no API URL: pass --url or set API_URL")
+
+    admin_jwt, _ = login(base_url, "admin", "admin")
+    workers = [Worker(base_url, admin_jwt, args.allocate) for _ in range(args.workers)]
+
+    stats = Stats()
+    warmup_until = time.monotonic() + args.warmup
+    until = warmup_until + args.duration
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(worker.run, args.mix, until, warmup_until, stats) for worker in workers]
+        for future in futures:
+            future.result()
+    measured_seconds = max(0.0, time.monotonic() - warmup_until)
+
+    config = {"url": base_url, "workers": args.workers, "duration": args.duration, "warmup": args.warmup, "mix": dict(args.mix), "allocate": args.allocate}
+    results = report(stats, measured_seconds, config)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance, args.error_rate_tolerance)
+        results["baseline"] = {"file": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+    for regression in regressions:
+        print(f"regression: {regression['endpoint']} {regression['metric']} {regression['baseline']:.4g} -> {regression['current']:.4g}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
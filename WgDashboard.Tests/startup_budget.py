@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Measures how much the website downloads before first paint and, given a URL, how long it takes to become interactive. Compares
+# both against startup_budget.json and exits with 1 if either is over budget. Publish the website first:
+#   dotnet publish ../WgDashboard.Website -c Release
+#   python startup_budget.py --publish-dir ../WgDashboard.Website/bin/Release/net8.0/publish/wwwroot
+# Measuring time to interactive needs a running copy of the published site and Playwright:
+#   pip install playwright && playwright install chromium
+#   python startup_budget.py --url http://localhost:8080 --latency-ms 150 --download-kbps 2000
+import argparse
+import json
+import os
+import re
+import sys
+
+DEFAULT_PUBLISH_DIR = os.path.join("..", "WgDashboard.Website", "bin", "Release", "net8.0", "publish", "wwwroot")
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+# what blazor.boot.json lists that the runtime fetches before the first render. lazy assemblies, symbols, and satellite assemblies come later
+STARTUP_RESOURCES = ("jsModuleNative", "jsModuleRuntime", "wasmNative", "icu", "coreAssembly", "assembly")
+
+
+def encoded_size(path: str, encoding: str) -> tuple[int, str]:
+    # the size the server sends, given precompressed files next to the original
+    suffix = {"br": ".br", "gzip": ".gz"}.get(encoding)
+    if suffix is not None and os.path.exists(path + suffix):
+        return os.path.getsize(path + suffix), encoding
+    return os.path.getsize(path), "identity"
+
+
+def startup_files(publish_dir: str) -> list[str]:
+    with open(os.path.join(publish_dir, "index.html"), encoding="utf-8") as file:
+        index = file.read()
+
+    # the stylesheets and scripts that index.html links to, then what blazor.webassembly.js loads
+    files = ["index.html"]
+    for reference in re.findall(r'(?:href|src)="([^"]+)"', index):
+        if "://" in reference or not os.path.isfile(os.path.join(publish_dir, reference.lstrip("/"))):
+            continue
+        files.append(reference.lstrip("/"))
+    files += ["_framework/blazor.boot.json", "_framework/dotnet.js", "appsettings.json"]
+
+    with open(os.path.join(publish_dir, "_framework", "blazor.boot.json"), encoding="utf-8") as file:
+        resources = json.load(file).get("resources", {})
+    for category in STARTUP_RESOURCES:
+        files += ["_framework/" + name for name in resources.get(category) or {}]
+
+    # keep the order, drop duplicates and anything the build didn't produce
+    return [name for name in dict.fromkeys(files) if os.path.isfile(os.path.join(publish_dir, name))]
+
+
+def measure_publish_dir(publish_dir: str, encoding: str) -> dict:
+    sizes = {}
+    encodings = {}
+    for name in startup_files(publish_dir):
+        sizes[name], encodings[name] = encoded_size(os.path.join(publish_dir, name), encoding)
+
+    largest = sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "publish_dir": publish_dir,
+        "encoding": encoding,
+        "files": len(sizes),
+        "download_bytes": sum(sizes.values()),
+        "uncompressed_files": [name for name, used in encodings.items() if used == "identity" and encoding != "identity"],
+        "largest_files": dict(largest),
+    }
+
+
+def measure_browser(url: str, runs: int, latency_ms: float, download_kbps: float, timeout_ms: float) -> dict:
+    from playwright.sync_api import sync_playwright # only needed for this part
+
+    times = []
+    transferred = []
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for _ in range(runs):
+            context = browser.new_context() # a cold cache every run, like a first visit
+            page = context.new_page()
+            if latency_ms > 0 or download_kbps > 0:
+                cdp = context.new_cdp_session(page)
+                cdp.send("Network.enable")
+                cdp.send("Network.emulateNetworkConditions", {
+                    "offline": False,
+                    "latency": latency_ms,
+                    "downloadThroughput": download_kbps * 1000 / 8 if download_kbps > 0 else -1,
+                    "uploadThroughput": -1,
+                })
+
+            page.goto(url, wait_until="commit", timeout=timeout_ms)
+            # Blazor replaces the loading indicator in #app with the first render of the app
+            page.wait_for_function("document.querySelector('#app') !== null && document.querySelector('#app .loading-progress') === null",
+                                   timeout=timeout_ms)
+            times.append(page.evaluate("performance.now()"))
+            transferred.append(page.evaluate(
+                "performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))"
+                ".reduce((total, entry) => total + (entry.transferSize || 0), 0)"))
+            context.close()
+        browser.close()
+
+    times.sort()
+    return {
+        "url": url,
+        "runs": runs,
+        "latency_ms": latency_ms,
+        "download_kbps": download_kbps,
+        "time_to_interactive_ms": times[len(times) // 2], # median, so one slow run doesn't fail the budget
+        "time_to_interactive_ms_runs": times,
+        "transferred_bytes": max(transferred),
+    }
+
+
+def check(results: dict, budget: dict) -> list[dict]:
+    over = []
+    download_bytes = results.get("browser", {}).get("transferred_bytes", results.get("publish", {}).get("download_bytes"))
+    if download_bytes is not None and "download_bytes" in budget and download_bytes > budget["download_bytes"]:
+        over.append({"metric": "download_bytes", "budget": budget["download_bytes"], "current": download_bytes})
+
+    time_to_interactive = results.get("browser", {}).get("time_to_interactive_ms")
+    if time_to_interactive is not None and "time_to_interactive_ms" in budget and time_to_interactive > budget["time_to_interactive_ms"]:
+        over.append({"metric": "time_to_interactive_ms", "budget": budget["time_to_interactive_ms"], "current": time_to_interactive})
+    return over
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the website's startup download size and time to interactive against a budget")
+    parser.add_argument("--publish-dir", default=DEFAULT_PUBLISH_DIR, help="wwwroot of a Release publish of the website")
+    parser.add_argument("--encoding", choices=("br", "gzip", "identity"), default="br", help="content encoding the web server sends")
+    parser.add_argument("--url", default=None, help="URL of the published website, to measure time to interactive in a headless browser")
+    parser.add_argument("--runs", type=int, default=3, help="page loads to take the median time to interactive of")
+    parser.add_argument("--latency-ms", type=float, default=0, help="round trip latency to add, e.g. to emulate a VPN link")
+    parser.add_argument("--download-kbps", type=float, default=0, help="download bandwidth to limit the browser to, in kilobits per second")
+    parser.add_argument("--timeout-ms", type=float, default=60000, help="give up on a page load after this long")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="JSON file with the download_bytes and time_to_interactive_ms budgets")
+    parser.add_argument("--output", default=None, help="file to write the JSON report to. it is always printed")
+    args = parser.parse_args()
+
+    results = {}
+    if os.path.isdir(args.publish_dir):
+        results["publish"] = measure_publish_dir(args.publish_dir, args.encoding)
+    elif args.url is None:
+        parser.error(f"no published website at {args.publish_dir}. run dotnet publish -c Release or pass --publish-dir")
+    if args.url is not None:
+        results["browser"] = measure_browser(args.url, args.runs, args.latency_ms, args.download_kbps, args.timeout_ms)
+
+    with open(args.budget) as file:
+        budget = json.load(file)
+    over = check(results, budget)
+    results["budget"] = {"file": args.budget, **budget, "over": over}
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+    for item in over:
+        print(f"over budget: {item['metric']} {item['current']:.6g} > {item['budget']:.6g}", file=sys.stderr)
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -39,6 +39,25 @@ class TestApiAuth(unittest.TestCase):
         self.assertIsNotNone(encoded_jwt)
 
 
+    def test_token_has_key_id(self):
+        credentials = {
+            "username": self.rand_username(),
+            "password": "mypassword"
+        }
+        self.session.post(self.url + "/signup", json=credentials)
+        response = self.session.post(self.url + "/login", json=credentials)
+        encoded_jwt = response.content.decode().replace("\"", "")
+
+        # the API picks the validation key by the token's key ID
+        header = jwt.get_unverified_header(encoded_jwt)
+        self.assertEqual(header["alg"], "HS256")
+        self.assertIsInstance(header["kid"], str)
+
+        userid = int(jwt.decode(encoded_jwt, algorithms=["HS256"], options={"verify_signature": False})[self.claims_names[0]])
+        response = self.session.get(os.getenv("API_URL") + "/api/users/" + str(userid), headers={"Authorization": "Bearer " + encoded_jwt})
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+
+
     def test_signup_with_name(self):
         credentials = {
             "username": self.rand_username(),
@@ -0,0 +1,166 @@
+import base64
+import json
+import os
+import queue
+import threading
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+class EventStream:
+    # reads server-sent events on a background thread. the stream is open, and so subscribed, once the constructor returns
+    def __init__(self, url: str, encoded_jwt: str, last_event_id: str | None = None):
+        headers = {"Authorization": "Bearer " + encoded_jwt}
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = last_event_id
+        self.response = requests.get(url, headers=headers, stream=True, verify=False, timeout=(5, 60))
+        self.events: queue.Queue[dict] = queue.Queue()
+        if self.response.status_code == 200:
+            threading.Thread(target=self._read, daemon=True).start()
+
+
+    def _read(self):
+        buffer = ""
+        try:
+            for chunk in self.response.iter_content(chunk_size=None):
+                buffer += chunk.decode()
+                while "\n\n" in buffer:
+                    frame, buffer = buffer.split("\n\n", 1)
+                    event = {}
+                    for line in frame.split("\n"):
+                        if line.startswith(":"):
+                            continue # heartbeat
+                        field, _, value = line.partition(": ")
+                        event[field] = value
+                    if event:
+                        self.events.put(event)
+        except (requests.RequestException, AttributeError):
+            pass # closed by the test
+
+
+    def next_change(self, matches, timeout: float = 5) -> dict | None:
+        # returns the first change for which matches(change) is true, skipping the others
+        while True:
+            try:
+                event = self.events.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if event.get("event") != "change":
+                continue
+            change = json.loads(event["data"])
+            change["eventId"] = event.get("id")
+            if matches(change):
+                return change
+
+
+    def close(self):
+        self.response.close()
+
+
+class TestApiEvents(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.events_url = cls.base_url + "/api/events"
+        cls.jwt1, cls.user1 = signup_and_login(cls.base_url)
+        cls.jwt2, cls.user2 = signup_and_login(cls.base_url)
+        cls.admin_jwt, cls.admin = login(cls.base_url, "admin", "admin")
+
+
+    def setUp(self):
+        self.streams = []
+
+
+    def tearDown(self):
+        for stream in self.streams:
+            stream.close()
+
+
+    def open_stream(self, encoded_jwt: str, last_event_id: str | None = None) -> EventStream:
+        stream = EventStream(self.events_url, encoded_jwt, last_event_id)
+        self.streams.append(stream)
+        return stream
+
+
+    def add_peer(self) -> int:
+        response = requests.post(self.base_url + "/api/peers", verify=False,
+            headers={"Authorization": "Bearer " + self.jwt1},
+            json={"publickey": base64.b64encode(os.urandom(32)).decode(), "ownerid": self.user1["sid"],
+                  "allowedips": f"100.{os.urandom(1)[0] % 64 + 64}.{os.urandom(1)[0]}.{os.urandom(1)[0] % 254 + 1}/32"}
+        )
+        self.assertEqual(response.status_code, 201, response.text)
+        return response.json()["id"]
+
+
+    def delete_peer(self, peer_id: int):
+        response = requests.delete(self.base_url + f"/api/peers/{peer_id}", verify=False, headers={"Authorization": "Bearer " + self.jwt1})
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299, response.text)
+
+
+    def test_stream_without_token(self):
+        response = requests.get(self.events_url, verify=False, timeout=5)
+        self.assertEqual(response.status_code, 401)
+
+
+    def test_stream_content_type(self):
+        stream = self.open_stream(self.jwt1)
+        self.assertEqual(stream.response.status_code, 200)
+        self.assertTrue(stream.response.headers["Content-Type"].startswith("text/event-stream"))
+
+
+    def test_admin_receives_peer_changes(self):
+        stream = self.open_stream(self.admin_jwt)
+        peer_id = self.add_peer()
+
+        created = stream.next_change(lambda change: change["entity"] == "peer" and change["id"] == peer_id)
+        self.assertIsNotNone(created)
+        self.assertEqual(created["action"], "created")
+        self.assertEqual(created["peer"]["id"], peer_id)
+        self.assertEqual(created["peer"]["ownerUsername"], self.user1["nameidentifier"])
+
+        self.delete_peer(peer_id)
+        deleted = stream.next_change(lambda change: change["entity"] == "peer" and change["id"] == peer_id)
+        self.assertIsNotNone(deleted)
+        self.assertEqual(deleted["action"], "deleted")
+        self.assertIsNone(deleted["peer"])
+
+
+    def test_user_receives_own_changes_only(self):
+        stream1 = self.open_stream(self.jwt1)
+        stream2 = self.open_stream(self.jwt2)
+        peer_id = self.add_peer()
+
+        created = stream1.next_change(lambda change: change["id"] == peer_id)
+        self.assertIsNotNone(created)
+        self.assertEqual(created["action"], "created")
+        self.assertIsNone(stream2.next_change(lambda change: change["entity"] == "peer" and change["id"] == peer_id, timeout=2))
+        self.delete_peer(peer_id)
+
+
+    def test_reconnect_replays_missed_changes(self):
+        stream = self.open_stream(self.jwt1)
+        first_peer = self.add_peer()
+        first = stream.next_change(lambda change: change["id"] == first_peer)
+        self.assertIsNotNone(first)
+        stream.close()
+
+        # made while disconnected
+        second_peer = self.add_peer()
+
+        stream = self.open_stream(self.jwt1, first["eventId"])
+        replayed = stream.next_change(lambda change: change["entity"] == "peer" and change["id"] in (first_peer, second_peer))
+        self.assertIsNotNone(replayed)
+        self.assertEqual(replayed["id"], second_peer)
+        self.assertEqual(replayed["action"], "created")
+
+        self.delete_peer(first_peer)
+        self.delete_peer(second_peer)
+
+
+if __name__ == "__main__":
+    unittest.main()
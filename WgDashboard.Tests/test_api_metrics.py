@@ -0,0 +1,77 @@
+import os
+import time
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+# run the API with Telemetry:Enabled set to true and Telemetry:MetricsPath left at /metrics. without Telemetry:MetricsPort, the metrics
+# are served on the API's port to admins only. with it, set METRICS_URL to the API's URL on that port, e.g. http://localhost:9464
+class TestApiMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.metrics_url = os.getenv("METRICS_URL")
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.jwt, cls.user = signup_and_login(cls.base_url)
+        cls.admin_jwt, cls.admin = login(cls.base_url, "admin", "admin")
+
+
+    def get_metrics(self) -> requests.Response:
+        if self.metrics_url:
+            return self.session.get(self.metrics_url + "/metrics")
+        return self.session.get(self.base_url + "/metrics", headers={"Authorization": "Bearer " + self.admin_jwt})
+
+
+    def scrape(self, expected: list[str], timeout_seconds: float = 5) -> str:
+        # the exporter caches its response briefly, so metrics recorded just now may take a moment to show up
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            response = self.get_metrics()
+            self.assertEqual(response.status_code, 200)
+            if all(name in response.text for name in expected) or time.monotonic() > deadline:
+                return response.text
+            time.sleep(0.5)
+
+
+    def test_metrics_cover_requests_hashing_and_tokens(self):
+        self.session.get(self.base_url + f"/api/users/{self.user['sid']}", headers={"Authorization": "Bearer " + self.jwt})
+        expected = [
+            "http_server_request_duration",
+            "wgdashboard_password_hashing_duration",
+            "wgdashboard_password_hashing_queue_time",
+            "wgdashboard_jwt_issued",
+        ]
+
+        body = self.scrape(expected)
+
+        for name in expected:
+            self.assertIn(name, body)
+
+
+    def test_metrics_are_restricted(self):
+        if self.metrics_url:
+            # only on the metrics port, which serves nothing else
+            response = self.session.get(self.base_url + "/metrics")
+            self.assertEqual(response.status_code, 404)
+            response = self.session.get(self.metrics_url + "/api/users", headers={"Authorization": "Bearer " + self.admin_jwt})
+            self.assertEqual(response.status_code, 404)
+        else:
+            # only to admins
+            response = self.session.get(self.base_url + "/metrics")
+            self.assertEqual(response.status_code, 401)
+            response = self.session.get(self.base_url + "/metrics", headers={"Authorization": "Bearer " + self.jwt})
+            self.assertEqual(response.status_code, 403)
+
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain") or "openmetrics" in response.headers["Content-Type"])
+
+
+if __name__ == "__main__":
+    unittest.main()
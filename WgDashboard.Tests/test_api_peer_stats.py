@@ -0,0 +1,92 @@
+import base64
+import os
+import time
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+# run the API with PeerTelemetry:Enabled set to true, PeerTelemetry:DumpFile set to the same file as PEER_TELEMETRY_DUMP_FILE,
+# and PeerTelemetry:PollSeconds and PeerTelemetry:PeerMapRefreshSeconds set low (e.g. 1) so the test doesn't wait long
+@unittest.skipUnless(os.getenv("PEER_TELEMETRY_DUMP_FILE"), "PEER_TELEMETRY_DUMP_FILE is not set")
+class TestApiPeerStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.dump_path = os.getenv("PEER_TELEMETRY_DUMP_FILE")
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.jwt1, cls.user1 = signup_and_login(cls.base_url)
+        cls.jwt2, cls.user2 = signup_and_login(cls.base_url)
+
+
+    def write_dump(self, peers: list[tuple[str, int, int, int]]):
+        lines = ["privatekey\tpublickey\t51820\toff"]
+        for public_key, handshake, received, sent in peers:
+            lines.append("\t".join([public_key, "(none)", "192.0.2.1:51820", "10.8.0.2/32", str(handshake), str(received), str(sent), "off"]))
+        with open(self.dump_path + ".tmp", "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(self.dump_path + ".tmp", self.dump_path)
+
+
+    def get_stats(self, peer_id: int, encoded_jwt: str, timeout_seconds: float = 15) -> requests.Response:
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            response = self.session.get(self.base_url + f"/api/peers/{peer_id}/stats", headers={"Authorization": "Bearer " + encoded_jwt})
+            if response.status_code != 404 or time.monotonic() > deadline:
+                return response
+            time.sleep(0.5)
+
+
+    def add_peer(self) -> tuple[int, str]:
+        public_key = base64.b64encode(os.urandom(32)).decode()
+        response = self.session.post(self.base_url + "/api/peers",
+            headers={"Authorization": "Bearer " + self.jwt1},
+            json={"publickey": public_key, "allowedips": "10.8.0.2/32", "ownerid": self.user1["sid"]}
+        )
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        return (response.json()["id"], public_key)
+
+
+    def test_stats_follow_the_interface(self):
+        peer_id, public_key = self.add_peer()
+        handshake = int(time.time())
+        self.write_dump([(public_key, handshake, 1000, 2000)])
+
+        response = self.get_stats(peer_id, self.jwt1)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual(stats["peerId"], peer_id)
+        self.assertEqual(stats["receivedBytes"], 1000)
+        self.assertEqual(stats["sentBytes"], 2000)
+        self.assertIsNotNone(stats["latestHandshake"])
+        self.assertGreaterEqual(len(stats["samples"]), 1)
+
+        # the bulk endpoint has the latest counters but no history
+        response = self.session.get(self.base_url + "/api/peers/stats", headers={"Authorization": "Bearer " + self.jwt1})
+        self.assertEqual(response.status_code, 200)
+        bulk = [peer for peer in response.json() if peer["peerId"] == peer_id]
+        self.assertEqual(len(bulk), 1)
+        self.assertNotIn("samples", bulk[0])
+
+
+    def test_cannot_read_someone_elses_stats(self):
+        peer_id, public_key = self.add_peer()
+        self.write_dump([(public_key, 0, 10, 20)])
+        self.assertEqual(self.get_stats(peer_id, self.jwt1).status_code, 200)
+
+        response = self.session.get(self.base_url + f"/api/peers/{peer_id}/stats", headers={"Authorization": "Bearer " + self.jwt2})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.session.get(self.base_url + "/api/peers/stats", params={"ids": peer_id}, headers={"Authorization": "Bearer " + self.jwt2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
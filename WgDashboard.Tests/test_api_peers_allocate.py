@@ -0,0 +1,106 @@
+import base64
+import ipaddress
+import os
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+# run the API with IpAllocation:Subnets set to the same subnet as IP_ALLOCATION_SUBNET, e.g. 10.8.0.0/24
+@unittest.skipUnless(os.getenv("IP_ALLOCATION_SUBNET"), "IP_ALLOCATION_SUBNET is not set")
+class TestApiPeersAllocate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.subnet = ipaddress.ip_network(os.getenv("IP_ALLOCATION_SUBNET"))
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.jwt1, cls.user1 = signup_and_login(cls.base_url)
+        cls.jwt2, cls.user2 = signup_and_login(cls.base_url)
+
+
+    def add_peer(self, encoded_jwt: str, owner_id, allowed_ips: str | None = None) -> requests.Response:
+        body = {"publickey": base64.b64encode(os.urandom(32)).decode(), "ownerid": owner_id}
+        if allowed_ips is not None:
+            body["allowedips"] = allowed_ips
+        return self.session.post(self.base_url + "/api/peers", headers={"Authorization": "Bearer " + encoded_jwt}, json=body)
+
+
+    def lease_address(self, encoded_jwt: str, owner_id) -> requests.Response:
+        return self.session.post(self.base_url + f"/api/peers/addresses?ownerid={owner_id}", headers={"Authorization": "Bearer " + encoded_jwt})
+
+
+    def address_of(self, response: requests.Response) -> ipaddress.IPv4Address:
+        allowed_ips = ipaddress.ip_network(response.json()["allowedIPs"])
+        self.assertEqual(allowed_ips.prefixlen, 32)
+        return allowed_ips.network_address
+
+
+    def test_allocated_addresses_are_unique_and_in_subnet(self):
+        addresses = []
+        for _ in range(3):
+            response = self.add_peer(self.jwt1, self.user1["sid"])
+            self.assertEqual(response.status_code, 201)
+            addresses.append(self.address_of(response))
+
+        for address in addresses:
+            self.assertIn(address, self.subnet)
+            self.assertNotEqual(address, self.subnet.network_address)
+            self.assertNotEqual(address, self.subnet.broadcast_address)
+        self.assertEqual(len(set(addresses)), len(addresses))
+
+
+    def test_address_outside_subnet_rejected(self):
+        outside = next(network for network in [ipaddress.ip_network("192.0.2.0/24"), ipaddress.ip_network("198.51.100.0/24")] if not network.overlaps(self.subnet))
+        response = self.add_peer(self.jwt1, self.user1["sid"], str(outside.network_address + 5) + "/32")
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_taken_address_rejected(self):
+        response = self.add_peer(self.jwt1, self.user1["sid"])
+        self.assertEqual(response.status_code, 201)
+
+        response = self.add_peer(self.jwt2, self.user2["sid"], str(self.address_of(response)) + "/32")
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_deleted_peer_frees_address(self):
+        response = self.add_peer(self.jwt1, self.user1["sid"])
+        self.assertEqual(response.status_code, 201)
+        peer_id = response.json()["id"]
+        address = self.address_of(response)
+
+        response = self.session.delete(self.base_url + f"/api/peers/{peer_id}", headers={"Authorization": "Bearer " + self.jwt1})
+        self.assertEqual(response.status_code, 204)
+
+        response = self.add_peer(self.jwt2, self.user2["sid"], str(address) + "/32")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.address_of(response), address)
+
+
+    def test_lease_claimed_by_owner_only(self):
+        response = self.lease_address(self.jwt1, self.user1["sid"])
+        self.assertEqual(response.status_code, 200)
+        address = ipaddress.ip_network(response.json()["allowedIPs"]).network_address
+        self.assertIn(address, self.subnet)
+
+        # another user can't take the leased address
+        response = self.add_peer(self.jwt2, self.user2["sid"], str(address) + "/32")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.add_peer(self.jwt1, self.user1["sid"], str(address) + "/32")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.address_of(response), address)
+
+
+    def test_lease_for_other_user_rejected(self):
+        response = self.lease_address(self.jwt2, self.user1["sid"])
+        self.assertIn(response.status_code, [400, 401])
+
+
+if __name__ == '__main__':
+    unittest.main()
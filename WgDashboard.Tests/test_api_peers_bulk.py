@@ -0,0 +1,136 @@
+import os
+import json
+import random
+import unittest
+import dotenv
+import string
+import requests
+import urllib3
+from signup_login import *
+
+class test_api_bulk_peers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        dotenv.load_dotenv()
+        cls.base_url = os.getenv("API_URL")
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.admin_jwt, cls.admin = login(cls.base_url, "admin", "admin")
+        # each test signs up its own users, so no test uses up another's peer limit (MAX_PEERS_PER_USER)
+        cls.KEY_LENGTH = 44
+
+
+    def random_key(self) -> str:
+        return "".join(random.choices(string.ascii_letters + string.digits, k=self.KEY_LENGTH-1)) + "="
+
+
+    def test_bulk_add_json(self):
+        jwt1, user1 = signup_and_login(self.base_url)
+        reqs = [{"publickey": self.random_key(), "allowedips": "10.8.1." + str(i) + "/32", "ownerid": user1["sid"]} for i in range(3)]
+
+        response = self.session.post(self.base_url + "/api/peers/bulk",
+            headers={"Authorization": "Bearer " + jwt1},
+            json=reqs
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual(len(results), 3)
+        for i, result in enumerate(results):
+            self.assertEqual(result["index"], i)
+            self.assertTrue(result["succeeded"])
+            self.assertIsNotNone(result["id"])
+
+
+    def test_bulk_add_ndjson_per_item_errors(self):
+        _, user1 = signup_and_login(self.base_url)
+        jwt2, user2 = signup_and_login(self.base_url)
+        public_key = self.random_key()
+        reqs = [
+            {"publickey": public_key, "allowedips": "10.8.2.1/32", "ownerid": user2["sid"]},
+            {"publickey": public_key, "allowedips": "10.8.2.2/32", "ownerid": user2["sid"]}, # duplicate key
+            {"publickey": self.random_key(), "allowedips": "10.8.2.3/32", "ownerid": user1["sid"]}, # other user
+        ]
+        body = "\n".join(json.dumps(req) for req in reqs) + "\nnot json\n"
+
+        response = self.session.post(self.base_url + "/api/peers/bulk",
+            headers={"Authorization": "Bearer " + jwt2, "Content-Type": "application/x-ndjson"},
+            data=body
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([result["succeeded"] for result in results], [True, False, False, False])
+
+
+    def test_bulk_add_json_per_item_errors(self):
+        jwt1, user1 = signup_and_login(self.base_url)
+        reqs = [
+            {"publickey": self.random_key(), "allowedips": "10.8.4.1/32", "ownerid": user1["sid"]},
+            {"publickey": self.random_key(), "allowedips": "10.8.4.2/32", "ownerid": "abc"}, # wrong type
+            {"publickey": self.random_key(), "allowedips": "10.8.4.3/32", "ownerid": user1["sid"]},
+        ]
+
+        response = self.session.post(self.base_url + "/api/peers/bulk",
+            headers={"Authorization": "Bearer " + jwt1},
+            json=reqs
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([result["succeeded"] for result in results], [True, False, True])
+        self.assertIsNotNone(results[0]["id"])
+        self.assertIsNotNone(results[2]["id"])
+
+
+    def test_bulk_add_json_truncated(self):
+        jwt1, user1 = signup_and_login(self.base_url)
+        body = json.dumps([{"publickey": self.random_key(), "allowedips": "10.8.5.1/32", "ownerid": user1["sid"]}])
+        body = body[:-1] + ', {"publickey": "' # cut off in the middle of the second peer
+
+        response = self.session.post(self.base_url + "/api/peers/bulk",
+            headers={"Authorization": "Bearer " + jwt1, "Content-Type": "application/json"},
+            data=body
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json() # still a whole array, ending with the part that could not be read
+        self.assertGreater(len(results), 0)
+        self.assertFalse(results[-1]["succeeded"])
+        for result in results:
+            if result["succeeded"]:
+                self.assertIsNotNone(result["id"])
+
+
+    def test_export(self):
+        _, user1 = signup_and_login(self.base_url)
+        public_key = self.random_key()
+        response = self.session.post(self.base_url + "/api/peers/bulk",
+            headers={"Authorization": "Bearer " + self.admin_jwt},
+            json=[{"publickey": public_key, "allowedips": "10.8.3.1/32", "ownerid": user1["sid"]}]
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.session.get(self.base_url + "/api/peers/export?format=ndjson",
+            headers={"Authorization": "Bearer " + self.admin_jwt}
+        )
+        self.assertEqual(response.status_code, 200)
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        self.assertIn(public_key, [peer["publicKey"] for peer in exported])
+
+        response = self.session.get(self.base_url + "/api/peers/export?format=csv",
+            headers={"Authorization": "Bearer " + self.admin_jwt}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.text.startswith("Id,PublicKey,AllowedIPs"))
+        self.assertIn(public_key, response.text)
+
+
+    def test_export_as_user(self):
+        jwt1, _ = signup_and_login(self.base_url)
+        response = self.session.get(self.base_url + "/api/peers/export",
+            headers={"Authorization": "Bearer " + jwt1}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -58,6 +58,36 @@ class Test_test_api_peers_read(unittest.TestCase):
             self.assertIsInstance(peer, dict)
             
 
+    def test_admin_get_all_paginated(self):
+        response = self.session.get(self.peers_url, params={"limit": 2}, headers={"Authorization": "Bearer " + self.admin_jwt})
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        first_page = json.loads(response.content.decode())
+        self.assertLessEqual(len(first_page), 2)
+        self.assertGreater(len(first_page), 0)
+
+        last_id = first_page[-1]["id"]
+        response = self.session.get(self.peers_url, params={"limit": 2, "after": last_id}, headers={"Authorization": "Bearer " + self.admin_jwt})
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        second_page = json.loads(response.content.decode())
+        for peer in second_page:
+            self.assertGreater(peer["id"], last_id)
+
+
+    def test_admin_get_all_filtered_by_owner(self):
+        response = self.session.get(self.peers_url, 
+            params={"ownerusername": self.user1["nameidentifier"]},
+            headers={"Authorization": "Bearer " + self.admin_jwt}
+        )
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        body = json.loads(response.content.decode())
+        self.assertEqual(sorted(peer["id"] for peer in body), sorted(self.peers1))
+
+
+    def test_admin_get_all_bad_limit(self):
+        response = self.session.get(self.peers_url, params={"limit": 0}, headers={"Authorization": "Bearer " + self.admin_jwt})
+        self.assertEqual(response.status_code, 400)
+
+
     def test_unauthorized_get_all(self):
         response = self.session.get(self.peers_url, headers={"Authorization": "Bearer " + self.jwt1})
         self.assertTrue(400 <= response.status_code and response.status_code <= 499)
@@ -73,7 +103,59 @@ class Test_test_api_peers_read(unittest.TestCase):
             self.assertTrue(200 <= response.status_code and response.status_code <= 299)
             body = json.loads(response.content.decode())
             self.assertIsInstance(body, dict)
-        
+
+
+    def test_read_after_update(self):
+        # read once so the owner's peers are cached, then make sure an update is visible right away
+        owner_url = self.peers_url + "/owner/" + self.user1["sid"]
+        response = self.session.get(owner_url, headers={"Authorization": "Bearer " + self.jwt1})
+        self.assertEqual(response.status_code, 200)
+        peer = {key.lower(): value for key, value in response.json()[0].items()}
+
+        response = self.session.put(self.peers_url + "/" + str(peer["id"]),
+            headers={"Authorization": "Bearer " + self.jwt1},
+            json={"id": peer["id"], "publickey": peer["publickey"], "allowedips": peer["allowedips"],
+                "ownerid": int(self.user1["sid"]), "devicedescription": "updated description"}
+        )
+        self.assertEqual(response.status_code, 204)
+
+        response = self.session.get(owner_url, headers={"Authorization": "Bearer " + self.jwt1})
+        self.assertEqual(response.status_code, 200)
+        descriptions = {updated["id"]: updated["deviceDescription"] for updated in response.json()}
+        self.assertEqual(descriptions[peer["id"]], "updated description")
+
+
+    def test_conditional_get(self):
+        peer_url = self.peers_url + "/" + str(self.peers2[0])
+        response = self.session.get(peer_url, headers={"Authorization": "Bearer " + self.jwt2})
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.session.get(peer_url, headers={"Authorization": "Bearer " + self.jwt2, "If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+
+    def test_update_with_stale_etag(self):
+        peer_url = self.peers_url + "/" + str(self.peers2[1])
+        response = self.session.get(peer_url, headers={"Authorization": "Bearer " + self.jwt2})
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        peer = {key.lower(): value for key, value in response.json().items()}
+        update = {"id": peer["id"], "publickey": peer["publickey"], "allowedips": peer["allowedips"], "ownerid": int(self.user2["sid"])}
+
+        # the first update matches and changes the peer, so the same tag no longer matches
+        response = self.session.put(peer_url, headers={"Authorization": "Bearer " + self.jwt2, "If-Match": etag},
+            json=update | {"devicedescription": "first"})
+        self.assertEqual(response.status_code, 204)
+        response = self.session.put(peer_url, headers={"Authorization": "Bearer " + self.jwt2, "If-Match": etag},
+            json=update | {"devicedescription": "second"})
+        self.assertEqual(response.status_code, 412)
+
+        response = self.session.get(peer_url, headers={"Authorization": "Bearer " + self.jwt2, "If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deviceDescription"], "first")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+import base64
+import os
+import random
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+# the peers use explicit addresses in 100.64.0.0/10, so run the API without IpAllocation:Subnets
+class TestApiPeersSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.search_url = cls.base_url + "/api/peers/search"
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.jwt1, cls.user1 = signup_and_login(cls.base_url)
+        cls.admin_jwt, cls.admin = login(cls.base_url, "admin", "admin")
+
+        # a /24 that no other run is likely to use
+        cls.prefix = f"100.{random.randint(64, 127)}.{random.randint(0, 255)}."
+        cls.host_peer = cls.add_peer(cls.prefix + "17/32")
+        cls.network_peer = cls.add_peer(cls.prefix + "16/28")
+        cls.other_peer = cls.add_peer(cls.prefix + "200/32")
+
+
+    @classmethod
+    def add_peer(cls, allowed_ips: str) -> int:
+        response = cls.session.post(cls.base_url + "/api/peers",
+            headers={"Authorization": "Bearer " + cls.jwt1},
+            json={"publickey": base64.b64encode(os.urandom(32)).decode(), "allowedips": allowed_ips, "ownerid": cls.user1["sid"]}
+        )
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+
+
+    def search(self, params: dict, encoded_jwt: str | None = None) -> requests.Response:
+        return self.session.get(self.search_url, params=params, headers={"Authorization": "Bearer " + (encoded_jwt or self.admin_jwt)})
+
+
+    def test_search_by_ip(self):
+        response = self.search({"ip": self.prefix + "17"})
+        self.assertEqual(response.status_code, 200)
+        ids = [peer["id"] for peer in response.json()]
+        self.assertIn(self.host_peer, ids)
+        self.assertIn(self.network_peer, ids) # 100.x.y.16/28 contains .17
+        self.assertNotIn(self.other_peer, ids)
+        self.assertEqual(ids, sorted(ids))
+
+
+    def test_search_by_ip_outside_network(self):
+        response = self.search({"ip": self.prefix + "40"})
+        self.assertEqual(response.status_code, 200)
+        ids = [peer["id"] for peer in response.json()]
+        self.assertNotIn(self.network_peer, ids)
+        self.assertNotIn(self.host_peer, ids)
+
+
+    def test_search_by_cidr(self):
+        response = self.search({"cidr": self.prefix + "0/24"})
+        self.assertEqual(response.status_code, 200)
+        ids = [peer["id"] for peer in response.json()]
+        self.assertEqual(sorted(ids), sorted([self.host_peer, self.network_peer, self.other_peer]))
+
+        # the /28 peer doesn't fall entirely within a /30
+        response = self.search({"cidr": self.prefix + "16/30"})
+        ids = [peer["id"] for peer in response.json()]
+        self.assertEqual(ids, [self.host_peer])
+
+
+    def test_search_by_cidr_paginated(self):
+        response = self.search({"cidr": self.prefix + "0/24", "limit": 2})
+        first_page = [peer["id"] for peer in response.json()]
+        self.assertEqual(len(first_page), 2)
+
+        response = self.search({"cidr": self.prefix + "0/24", "limit": 2, "after": first_page[-1]})
+        second_page = [peer["id"] for peer in response.json()]
+        self.assertEqual(sorted(first_page + second_page), sorted([self.host_peer, self.network_peer, self.other_peer]))
+
+
+    def test_list_filtered_by_cidr(self):
+        response = self.session.get(self.base_url + "/api/peers", params={"allowedips": self.prefix + "0/25"},
+            headers={"Authorization": "Bearer " + self.admin_jwt})
+        self.assertEqual(response.status_code, 200)
+        ids = [peer["id"] for peer in response.json()]
+        self.assertEqual(sorted(ids), sorted([self.host_peer, self.network_peer]))
+
+
+    def test_bad_search(self):
+        for params in [{}, {"ip": self.prefix + "17", "cidr": self.prefix + "0/24"}, {"ip": "not an address"}, {"ip": self.prefix + "17/32"},
+                       {"cidr": "fd00::/64"}, {"cidr": self.prefix + "0/33"}]:
+            response = self.search(params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+    def test_unauthorized_search(self):
+        response = self.search({"ip": self.prefix + "17"}, self.jwt1)
+        self.assertTrue(400 <= response.status_code and response.status_code <= 499)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -80,6 +80,30 @@ class TestApiRefresh(unittest.TestCase):
         self.assertTrue(400 <= response.status_code and response.status_code <= 499)
 
 
+    def test_reuse_revokes_family(self):
+        response = self.session.post(self.url + "/login", json=self.credentials)
+        old_refresh_token = response.cookies.get_dict()["RefreshToken"]
+        response = self.session.post(self.url + "/refresh", cookies={"RefreshToken": old_refresh_token})
+        self.assertEqual(response.status_code, 200)
+        new_refresh_token = response.cookies.get_dict()["RefreshToken"]
+
+        # replaying the rotated token logs out the token it was rotated into as well
+        response = self.session.post(self.url + "/refresh", cookies={"RefreshToken": old_refresh_token})
+        self.assertEqual(response.status_code, 401)
+        response = self.session.post(self.url + "/refresh", cookies={"RefreshToken": new_refresh_token})
+        self.assertEqual(response.status_code, 401)
+
+
+    def test_logins_on_two_devices(self):
+        first_device = self.session.post(self.url + "/login", json=self.credentials).cookies.get_dict()["RefreshToken"]
+        second_device = self.session.post(self.url + "/login", json=self.credentials).cookies.get_dict()["RefreshToken"]
+
+        response = self.session.post(self.url + "/refresh", cookies={"RefreshToken": first_device})
+        self.assertEqual(response.status_code, 200)
+        response = self.session.post(self.url + "/refresh", cookies={"RefreshToken": second_device})
+        self.assertEqual(response.status_code, 200)
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -284,7 +284,41 @@ class TestApiUsers(unittest.TestCase):
         self.assertEqual(body["id"], int(self.user1["sid"]))
         self.assertEqual(body["username"], self.user1["nameidentifier"])
         self.assertEqual(body["role"], self.user1["role"])
-    
+
+
+    def test_admin_delete_users(self):
+        jwt4, user4 = signup_and_login(os.getenv("API_URL"))
+        jwt5, user5 = signup_and_login(os.getenv("API_URL"))
+
+        response = self.session.post(self.url + "/delete",
+            headers={"Authorization": "Bearer " + self.admin_jwt},
+            json={"ids": [int(user4["sid"]), int(user5["sid"]), int(self.admin["sid"])]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deleted"], 2) # the admin never deletes itself
+
+        for user in (user4, user5):
+            response = self.session.get(self.url + "/" + user["sid"],
+                headers={"Authorization": "Bearer " + self.admin_jwt}
+            )
+            self.assertEqual(response.status_code, 404)
+
+
+    def test_delete_users_without_admin(self):
+        response = self.session.post(self.url + "/delete",
+            headers={"Authorization": "Bearer " + self.jwt3},
+            json={"ids": [int(self.user2["sid"])]}
+        )
+        self.assertGreaterEqual(response.status_code, 400)
+        self.assertLessEqual(response.status_code, 499)
+
+
+    def test_delete_users_without_filter(self):
+        response = self.session.post(self.url + "/delete",
+            headers={"Authorization": "Bearer " + self.admin_jwt},
+            json={}
+        )
+        self.assertEqual(response.status_code, 400)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,84 @@
+import base64
+import json
+import os
+import random
+import time
+import unittest
+import dotenv
+import requests
+import urllib3
+from signup_login import *
+
+dotenv.load_dotenv()
+
+# run the API with WireguardSync:Enabled set to true and WireguardSync:WgPath pointing at fake_wg.py,
+# and set FAKE_WG_STATE to the same state file for both the API and the tests
+@unittest.skipUnless(os.getenv("FAKE_WG_STATE"), "FAKE_WG_STATE is not set")
+class TestApiWireguardSync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        cls.base_url = os.getenv("API_URL")
+        cls.state_path = os.getenv("FAKE_WG_STATE")
+        cls.session = requests.Session()
+        cls.session.verify = False
+        cls.jwt, cls.user = signup_and_login(cls.base_url)
+
+
+    def read_interface_peers(self) -> dict[str, str]:
+        try:
+            with open(self.state_path) as file:
+                return json.load(file)["peers"]
+        except FileNotFoundError:
+            return {}
+
+
+    def wait_for(self, condition, timeout_seconds: float = 10) -> bool:
+        deadline = time.monotonic() + timeout_seconds
+        while time.monotonic() < deadline:
+            if condition(self.read_interface_peers()):
+                return True
+            time.sleep(0.2)
+        return False
+
+
+    def new_peer(self) -> dict[str, str]:
+        return {
+            "publickey": base64.b64encode(os.urandom(32)).decode(),
+            "allowedips": f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}/32",
+            "ownerid": self.user["sid"],
+        }
+
+
+    def test_added_and_deleted_peers_reach_interface(self):
+        peer = self.new_peer()
+        response = self.session.post(self.base_url + "/api/peers", headers={"Authorization": "Bearer " + self.jwt}, json=peer)
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        peer_id = response.json()["id"]
+
+        self.assertTrue(self.wait_for(lambda peers: peers.get(peer["publickey"]) == peer["allowedips"]))
+
+        response = self.session.delete(self.base_url + "/api/peers/" + str(peer_id), headers={"Authorization": "Bearer " + self.jwt})
+        self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+        self.assertTrue(self.wait_for(lambda peers: peer["publickey"] not in peers))
+
+
+    def test_burst_is_applied_in_one_command(self):
+        with open(self.state_path) as file:
+            commands_before = len(json.load(file)["commands"])
+
+        # a burst of writes inside the debounce window
+        peers = [self.new_peer() for _ in range(3)]
+        for peer in peers:
+            response = self.session.post(self.base_url + "/api/peers", headers={"Authorization": "Bearer " + self.jwt}, json=peer)
+            self.assertTrue(200 <= response.status_code and response.status_code <= 299)
+
+        self.assertTrue(self.wait_for(lambda interface_peers: all(peer["publickey"] in interface_peers for peer in peers)))
+        with open(self.state_path) as file:
+            commands = json.load(file)["commands"][commands_before:]
+        self.assertLessEqual(len(commands), 2) # the first write may start a sync before the rest arrive
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+﻿using Blazored.LocalStorage;
+using Microsoft.AspNetCore.Components;
+using Microsoft.AspNetCore.Components.Authorization;
+using Microsoft.AspNetCore.Components.WebAssembly.Http;
+using Microsoft.Extensions.Configuration;
+using Microsoft.JSInterop;
+using System.Diagnostics.CodeAnalysis;
+using System.Net;
+using System.Net.Http.Headers;
+using System.Net.Http.Json;
+using System.Net.Mime;
+using System.Text;
+using System.Text.Json;
+using WgDashboard.Website.Models;
+using WgDashboard.Website.Services;
+
+namespace WgDashboard.Website.Helpers
+{
+    public class BasePageFunctionality : ComponentBase, IDisposable
+    {
+        protected bool ok = true;
+        protected string notOkReason = "";
+
+        // AllowNull is just to prevent warnings. these shouldn't ever be null
+        [Inject, AllowNull]
+        protected IJSRuntime JSRuntime { get; init; }
+        [Inject, AllowNull]
+        protected NavigationManager NavigationManager { get; init; }
+        [Inject, AllowNull]
+        protected ILocalStorageService LocalStorage { get; init; }
+        [Inject, AllowNull]
+        protected AuthenticationStateProvider AuthStateProvider { get; init; }
+        [Inject, AllowNull]
+        protected IConfiguration WebsiteConfig { get; init; }
+        [Inject, AllowNull]
+        protected HttpClient client { get; init; }
+
+        private record CachedResponse(string ETag, byte[] Body);
+
+        // the last body of each GET route with its entity tag. shared by every page, so navigating back to a page only revalidates its data
+        private static readonly Dictionary<string, CachedResponse> etagCache = new();
+
+        // stops reading the API's change events when the page is left
+        private CancellationTokenSource? changeEvents;
+
+        // cancels the pending debounced action when another one comes in
+        private CancellationTokenSource? debounce;
+        private static readonly TimeSpan DEBOUNCE_DELAY = TimeSpan.FromMilliseconds(250);
+
+        protected ValueTask ScrollToTop()
+        {
+            string js = "window.scrollToId";
+            string id = "top";
+            return JSRuntime.InvokeVoidAsync(js, id);
+        }
+
+        protected async Task SetErrorMessage(string message)
+        {
+            ok = false;
+            notOkReason = message;
+            await InvokeAsync(StateHasChanged);
+            await ScrollToTop();
+        }
+
+        protected Task ClearErrorMessage()
+        {
+            ok = true;
+            notOkReason = "";
+            return InvokeAsync(StateHasChanged);
+        }
+
+        protected async Task LogoutUser()
+        {
+            await LocalStorage.RemoveItemAsync("WireguardApiToken");
+            await AuthStateProvider.GetAuthenticationStateAsync();
+
+            string BASE_URL = WebsiteConfig.GetSection("WireguardApiConfig").GetValue<string>("BaseUrl") ?? "http://localhost:3000";
+            const string PATH = "/api/auth/revoke";
+            string revokePath = BASE_URL + PATH;
+
+            int statusCode = await JSRuntime.InvokeAsync<int>("window.revokeRefreshToken", revokePath);
+            if(statusCode < 200 || 299 < statusCode)
+            {
+                await SetErrorMessage("Could not logout! Maybe the server is offline?");
+            }
+            else
+                NavigationManager.NavigateTo("/login", true);
+        }
+
+        protected async Task<HttpResponseMessage> SendHttpRequest<DtoType>(string route, HttpMethod httpMethod, DtoType requestDto)
+        {
+            var json = JsonSerializer.Serialize(requestDto, WebsiteJsonContext.Default.Options);
+            HttpContent content = new StringContent(json, Encoding.UTF8, "application/json");
+            HttpRequestMessage request = new HttpRequestMessage(httpMethod, route) {
+                Content = content,
+            };
+            HttpResponseMessage response = await client.SendAsync(request);
+
+            // JwtRefreshHandler already refreshed and tried again, so the session is over
+            if (response.StatusCode == HttpStatusCode.Unauthorized)
+                await LogoutUser();
+
+            return response;
+        }
+
+        protected async Task<HttpResponseMessage> SendHttpRequest(string route, HttpMethod httpMethod)
+        {
+            HttpRequestMessage request = CreateConditionalRequest(route, httpMethod);
+            HttpResponseMessage response = await client.SendAsync(request);
+
+            // JwtRefreshHandler already refreshed and tried again, so the session is over
+            if (response.StatusCode == HttpStatusCode.Unauthorized)
+                await LogoutUser();
+
+            if (httpMethod == HttpMethod.Get)
+                response = await UseETagCache(route, response);
+            return response;
+        }
+
+        /*
+         * Creates the request, asking the API to only send the body of a GET if it changed since it was cached
+         */
+        private static HttpRequestMessage CreateConditionalRequest(string route, HttpMethod httpMethod)
+        {
+            var request = new HttpRequestMessage(httpMethod, route);
+            if (httpMethod == HttpMethod.Get && etagCache.TryGetValue(route, out CachedResponse? cached))
+                request.Headers.TryAddWithoutValidation("If-None-Match", cached.ETag);
+            return request;
+        }
+
+        /*
+         * Turns a 304 into the cached 200, and caches a 200 that has an entity tag
+         */
+        private static async Task<HttpResponseMessage> UseETagCache(string route, HttpResponseMessage response)
+        {
+            if (response.StatusCode == HttpStatusCode.NotModified && etagCache.TryGetValue(route, out CachedResponse? cached))
+            {
+                var content = new ByteArrayContent(cached.Body);
+                content.Headers.ContentType = new MediaTypeHeaderValue(MediaTypeNames.Application.Json);
+                var cachedResponse = new HttpResponseMessage(HttpStatusCode.OK) { Content = content, RequestMessage = response.RequestMessage };
+                cachedResponse.Headers.TryAddWithoutValidation("ETag", cached.ETag);
+                return cachedResponse;
+            }
+
+            if (response.IsSuccessStatusCode && response.Headers.ETag is not null)
+            {
+                // buffers the body, so the caller can still read it
+                byte[] body = await response.Content.ReadAsByteArrayAsync();
+                etagCache[route] = new CachedResponse(response.Headers.ETag.Tag, body);
+            }
+            else
+                etagCache.Remove(route);
+
+            return response;
+        }
+
+        /// <summary>
+        /// Gets every page of a list from the API. Pages are requested with the ID of the last item of the previous page until a short page is returned.
+        /// </summary>
+        /// <typeparam name="ItemType">The type of the items in the list</typeparam>
+        /// <param name="route">The route of the list, without a query string</param>
+        /// <param name="items">The list that the items are added to</param>
+        /// <param name="getId">Gets the ID of an item</param>
+        /// <returns>The last response. If it is unsuccessful, the items may be incomplete</returns>
+        protected async Task<HttpResponseMessage> SendPagedHttpRequest<ItemType>(string route, List<ItemType> items, Func<ItemType, int> getId)
+        {
+            const int PAGE_SIZE = 1000; // the largest page the API allows
+            int after = 0;
+            while (true)
+            {
+                HttpResponseMessage response = await SendHttpRequest($"{route}?limit={PAGE_SIZE}&after={after}", HttpMethod.Get);
+                if (!response.IsSuccessStatusCode)
+                    return response;
+
+                List<ItemType> page = await response.Content.ReadFromJsonAsync<List<ItemType>>(WebsiteJsonContext.Default.Options) ?? new List<ItemType>();
+                items.AddRange(page);
+
+                if (page.Count < PAGE_SIZE)
+                    return response;
+                after = getId(page[page.Count - 1]);
+            }
+        }
+
+        /// <summary>
+        /// Applies the changes pushed by the API to this page until it is left, so the page doesn't have to read the whole list again.
+        /// Reconnects after the stream ends or fails, and asks the API for the changes made while it was disconnected.
+        /// </summary>
+        /// <param name="onChange">Applies one change to the page's data. The page is re-rendered afterwards</param>
+        /// <param name="onReset">Reads the page's data again, when changes were missed and can't be replayed</param>
+        protected void SubscribeToChanges(Func<ChangeEvent, Task> onChange, Func<Task> onReset)
+        {
+            changeEvents?.Cancel();
+            changeEvents = new CancellationTokenSource();
+            _ = ReadChangeEvents(onChange, onReset, changeEvents.Token);
+        }
+
+        private async Task ReadChangeEvents(Func<ChangeEvent, Task> onChange, Func<Task> onReset, CancellationToken cancellationToken)
+        {
+            const string PATH = "/api/events";
+            const int MIN_BACKOFF_MILLISECONDS = 1000;
+            const int MAX_BACKOFF_MILLISECONDS = 30000;
+
+            int backoffMilliseconds = MIN_BACKOFF_MILLISECONDS;
+            string? lastEventId = null;
+            while (!cancellationToken.IsCancellationRequested)
+            {
+                try
+                {
+                    // the API ends the stream when the token expires. JwtRefreshHandler sends a fresh one when reconnecting
+                    var request = new HttpRequestMessage(HttpMethod.Get, PATH);
+                    request.SetBrowserResponseStreamingEnabled(true); // hand over each event as it arrives instead of when the stream ends
+                    if (lastEventId is not null)
+                        request.Headers.TryAddWithoutValidation("Last-Event-ID", lastEventId);
+
+                    using HttpResponseMessage response = await client.SendAsync(request, HttpCompletionOption.ResponseHeadersRead, cancellationToken);
+                    if (response.StatusCode == HttpStatusCode.Unauthorized)
+                        return; // the session is over. the page logs the user out on its next request
+                    if (response.IsSuccessStatusCode)
+                    {
+                        backoffMilliseconds = MIN_BACKOFF_MILLISECONDS;
+                        using var reader = new StreamReader(await response.Content.ReadAsStreamAsync(cancellationToken));
+                        lastEventId = await ReadServerSentEvents(reader, lastEventId, onChange, onReset, cancellationToken);
+                    }
+
+                    await Task.Delay(backoffMilliseconds, cancellationToken);
+                }
+                catch (OperationCanceledException) when (cancellationToken.IsCancellationRequested)
+                    { return; }
+                catch (Exception e) when (e is HttpRequestException or IOException or OperationCanceledException or JsonException)
+                    { Console.WriteLine(e.Message); } // the API is unreachable or the stream broke. try again after the backoff
+
+                backoffMilliseconds = Math.Min(backoffMilliseconds * 2, MAX_BACKOFF_MILLISECONDS);
+            }
+        }
+
+        /*
+         * Reads "change" and "reset" events until the stream ends. Returns the ID of the last event read, to resume from when reconnecting
+         */
+        private async Task<string?> ReadServerSentEvents(StreamReader reader, string? lastEventId, Func<ChangeEvent, Task> onChange, Func<Task> onReset,
+            CancellationToken cancellationToken)
+        {
+            string? eventId = null;
+            string eventName = "message";
+            var data = new StringBuilder();
+            string? line;
+            while ((line = await reader.ReadLineAsync(cancellationToken)) is not null)
+            {
+                // a blank line ends the event. lines starting with ':' are heartbeats
+                if (line.Length == 0)
+                {
+                    if (eventName == "change" && data.Length > 0)
+                    {
+                        ChangeEvent? change = JsonSerializer.Deserialize(data.ToString(), WebsiteJsonContext.Default.ChangeEvent);
+                        if (change is not null)
+                            await onChange(change);
+                        await InvokeAsync(StateHasChanged);
+                    }
+                    else if (eventName == "reset")
+                        await onReset();
+
+                    lastEventId = eventName == "reset" ? null : eventId ?? lastEventId;
+                    eventId = null;
+                    eventName = "message";
+                    data.Clear();
+                }
+                else if (!line.StartsWith(':'))
+                {
+                    int colon = line.IndexOf(':');
+                    string field = colon < 0 ? line : line[..colon];
+                    string value = colon < 0 ? "" : line[(colon + 1)..].TrimStart(' ');
+                    if (field == "id")
+                        eventId = value;
+                    else if (field == "event")
+                        eventName = value;
+                    else if (field == "data")
+                        data.Append(value);
+                }
+            }
+
+            return lastEventId;
+        }
+
+        /// <summary>
+        /// Runs an action once input has been quiet for a moment, e.g. a search while the user is still typing. An action that is still
+        /// waiting when the next one comes in is dropped
+        /// </summary>
+        /// <param name="action">The action to run</param>
+        protected async Task Debounce(Func<Task> action)
+        {
+            debounce?.Cancel();
+            debounce?.Dispose();
+            debounce = new CancellationTokenSource();
+            try
+            {
+                await Task.Delay(DEBOUNCE_DELAY, debounce.Token);
+            }
+            catch (OperationCanceledException)
+                { return; } // more input came in
+
+            await action();
+        }
+
+        public virtual void Dispose()
+        {
+            changeEvents?.Cancel();
+            changeEvents?.Dispose();
+            changeEvents = null;
+            debounce?.Cancel();
+            debounce?.Dispose();
+            debounce = null;
+        }
+    }
+}
@@ -0,0 +1,136 @@
+﻿namespace WgDashboard.Website.Helpers
+{
+    /// <summary>
+    /// <para>Searches a list by the prefixes of several of its items' fields, e.g. a peer's ID, public key, allowed IPs, and owner's username</para>
+    ///
+    /// <para>Each field is kept sorted in ordinal order, where every key starting with a prefix sits in one contiguous range that two binary
+    /// searches find. A search walks the narrowest of the ranges and checks the other fields directly, so a keystroke costs
+    /// O(log n + matches) instead of a scan of every item</para>
+    /// </summary>
+    public sealed class PrefixIndex<T>
+    {
+        private readonly List<T> items;
+        private readonly Func<T, string?>[] keySelectors;
+        private SortedField[]? fields; // built on the first search after a change
+
+        private sealed class SortedField
+        {
+            public string[] Keys { get; init; } = Array.Empty<string>();
+            public int[] Positions { get; init; } = Array.Empty<int>(); // position in items of each key
+
+            /*
+             * Finds the range of keys that start with the prefix. [start, end)
+             */
+            public (int start, int end) Range(string prefix)
+            {
+                int start = LowerBound(0, (key) => string.CompareOrdinal(key, prefix) < 0);
+                int end = LowerBound(start, (key) => key.StartsWith(prefix, StringComparison.Ordinal));
+                return (start, end);
+            }
+
+            /*
+             * Finds the first index from start on where before(key) is false. before(key) must be true for a leading run of keys only
+             */
+            private int LowerBound(int start, Func<string, bool> before)
+            {
+                int low = start;
+                int high = Keys.Length;
+                while (low < high)
+                {
+                    int middle = low + (high - low) / 2;
+                    if (before(Keys[middle]))
+                        low = middle + 1;
+                    else
+                        high = middle;
+                }
+                return low;
+            }
+        }
+
+        /// <summary>
+        /// Creates an index over a list. The list is not copied, so call Invalidate() after changing it
+        /// </summary>
+        /// <param name="items">The items to search</param>
+        /// <param name="keySelectors">The fields to search by, in the order that Search() takes their prefixes</param>
+        public PrefixIndex(List<T> items, params Func<T, string?>[] keySelectors)
+        {
+            this.items = items;
+            this.keySelectors = keySelectors;
+        }
+
+        /// <summary>
+        /// Marks the index as out of date after the list changed. It is rebuilt on the next search
+        /// </summary>
+        public void Invalidate() => fields = null;
+
+        /// <summary>
+        /// Finds the items whose fields start with every given prefix. A null or empty prefix matches anything
+        /// </summary>
+        /// <param name="prefixes">One prefix per field, in the order of the key selectors</param>
+        /// <returns>The matching items in the list's order. The list itself if no prefix was given</returns>
+        public List<T> Search(params string?[] prefixes)
+        {
+            if (prefixes.All(string.IsNullOrEmpty))
+                return items;
+
+            fields ??= Build();
+
+            // walk the field with the fewest matches, and check the others on each of its items
+            int narrowest = -1;
+            (int start, int end) narrowestRange = (0, 0);
+            for (int i = 0; i < fields.Length && i < prefixes.Length; i++)
+            {
+                if (string.IsNullOrEmpty(prefixes[i]))
+                    continue;
+
+                (int start, int end) range = fields[i].Range(prefixes[i]!);
+                if (narrowest < 0 || range.end - range.start < narrowestRange.end - narrowestRange.start)
+                {
+                    narrowest = i;
+                    narrowestRange = range;
+                }
+            }
+
+            var positions = new List<int>(narrowestRange.end - narrowestRange.start);
+            for (int k = narrowestRange.start; k < narrowestRange.end; k++)
+            {
+                int position = fields[narrowest].Positions[k];
+                if (MatchesAll(items[position], prefixes, narrowest))
+                    positions.Add(position);
+            }
+            positions.Sort(); // back to the list's order
+
+            return positions.Select((position) => items[position]).ToList();
+        }
+
+        private bool MatchesAll(T item, string?[] prefixes, int skip)
+        {
+            for (int i = 0; i < keySelectors.Length && i < prefixes.Length; i++)
+            {
+                if (i == skip || string.IsNullOrEmpty(prefixes[i]))
+                    continue;
+                if (!(keySelectors[i](item) ?? "").StartsWith(prefixes[i]!, StringComparison.Ordinal))
+                    return false;
+            }
+            return true;
+        }
+
+        private SortedField[] Build()
+        {
+            var built = new SortedField[keySelectors.Length];
+            for (int i = 0; i < keySelectors.Length; i++)
+            {
+                string[] keys = new string[items.Count];
+                int[] positions = new int[items.Count];
+                for (int position = 0; position < items.Count; position++)
+                {
+                    keys[position] = keySelectors[i](items[position]) ?? "";
+                    positions[position] = position;
+                }
+                Array.Sort(keys, positions, StringComparer.Ordinal);
+                built[i] = new SortedField() { Keys = keys, Positions = positions };
+            }
+            return built;
+        }
+    }
+}
@@ -0,0 +1,25 @@
+﻿using System.Text.Json;
+using System.Text.Json.Serialization;
+using WgDashboard.Website.Models;
+
+namespace WgDashboard.Website.Helpers
+{
+    /// <summary>
+    /// Serializers for the models sent to and read from the API, generated at compile time so the browser doesn't build them with reflection.
+    /// Uses the API's naming and casing rules.
+    /// </summary>
+    [JsonSourceGenerationOptions(JsonSerializerDefaults.Web)]
+    [JsonSerializable(typeof(PeerProfile))]
+    [JsonSerializable(typeof(List<PeerProfile>))]
+    [JsonSerializable(typeof(UserProfile))]
+    [JsonSerializable(typeof(List<UserProfile>))]
+    [JsonSerializable(typeof(ChangeEvent))]
+    [JsonSerializable(typeof(UpdateUserRequest))]
+    [JsonSerializable(typeof(ChangePasswordRequest))]
+    [JsonSerializable(typeof(SignupRequest))]
+    [JsonSerializable(typeof(LoginRequest))]
+    [JsonSerializable(typeof(Dictionary<string, object>))] // a JWT's claims
+    public partial class WebsiteJsonContext : JsonSerializerContext
+    {
+    }
+}
@@ -0,0 +1,19 @@
+﻿namespace WgDashboard.Website.Models
+{
+    /// <summary>
+    /// A peer or user that was created, updated, or deleted, as pushed by the API's /api/events stream
+    /// </summary>
+    public class ChangeEvent
+    {
+        public string Entity { get; set; } = ""; // "peer" or "user"
+        public string Action { get; set; } = ""; // "created", "updated", or "deleted"
+        public int Id { get; set; } = 0;
+        public int OwnerId { get; set; } = 0;
+        public PeerProfile? Peer { get; set; } // null when deleted
+        public UserProfile? User { get; set; } // null when deleted
+
+        public bool IsPeer { get => Entity == "peer"; }
+        public bool IsUser { get => Entity == "user"; }
+        public bool IsDeleted { get => Action == "deleted"; }
+    }
+}
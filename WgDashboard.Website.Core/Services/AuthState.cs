@@ -8,15 +8,15 @@ namespace WgDashboard.Website.Services
         public static string Username { get; private set; } = "";
         public static string Role { get; private set; } = UserRoles.Anonymous;
         public static string? Name { get; private set; }
+        public static string? Jwt { get; private set; } // sent with every request by JwtRefreshHandler
         private static long AuthExpiration { get; set; } = -1;
-        public static bool Expired { get {
-                DateTime currentTime = DateTime.Now;
-                DateTimeOffset currentTimeOffset = new DateTimeOffset(currentTime);
-                return currentTimeOffset.ToUnixTimeSeconds() >= AuthExpiration;
-            } }
+        public static bool Expired { get => ExpiresWithin(TimeSpan.Zero); }
 
-        public static void SetAuthenticatedUser(int id, string username, string role, string? name, long authExpiration)
+        public static bool ExpiresWithin(TimeSpan time) => DateTimeOffset.UtcNow.Add(time).ToUnixTimeSeconds() >= AuthExpiration; // UTC, so the time zone data isn't needed
+
+        public static void SetAuthenticatedUser(string jwt, int id, string username, string role, string? name, long authExpiration)
         {
+            Jwt = jwt;
             Id = id;
             Username = username;
             Role = role;
@@ -26,6 +26,7 @@ namespace WgDashboard.Website.Services
 
         public static void LogoutUser()
         {
+            Jwt = null;
             Id = 0;
             Username = "";
             Role = UserRoles.Anonymous;
@@ -1,6 +1,5 @@
 ﻿using Blazored.LocalStorage;
 using Microsoft.AspNetCore.Components.Authorization;
-using System.Net.Http.Headers;
 using System.Security.Claims;
 using System.Text.Json;
 using WgDashboard.Website.Helpers;
@@ -9,12 +8,10 @@ namespace WgDashboard.Website.Services
 {
     public class AuthStateProvider : AuthenticationStateProvider
     {
-        private readonly HttpClient _httpClient;
         private readonly ILocalStorageService _localStorage;
 
-        public AuthStateProvider(HttpClient httpClient, ILocalStorageService localStorage)
+        public AuthStateProvider(ILocalStorageService localStorage)
         {
-            this._httpClient = httpClient;
             this._localStorage = localStorage;
         }
 
@@ -23,18 +20,16 @@ namespace WgDashboard.Website.Services
             string? token = await _localStorage.GetItemAsStringAsync("WireguardApiToken");
 
             var identity = new ClaimsIdentity();
-            _httpClient.DefaultRequestHeaders.Authorization = null;
             IEnumerable<Claim>? claims = null;
             Dictionary<string, string>? claimsDict = null;
 
             // parse the JWT token and set authentication state
             if(!string.IsNullOrEmpty(token))
             {
-                _httpClient.DefaultRequestHeaders.Authorization = new AuthenticationHeaderValue("Bearer", token.Replace("\"", ""));
                 claims = ParseClaimsFromJwt(token) ?? new Claim[] { new Claim(ClaimTypes.Role, UserRoles.Anonymous) };
                 claimsDict = ParseClaimsFromJwtAsDict(token) ?? new Dictionary<string, string>(); // just for readibility later
                 identity = new ClaimsIdentity(claims, "jwt");
-                SetAuthState(claimsDict);
+                SetAuthState(token.Replace("\"", ""), claimsDict);
             }
             else
             {
@@ -59,7 +54,7 @@ namespace WgDashboard.Website.Services
 
             var payload = jwtSections[1];
             var jsonBytes = ParseBase64WithoutPadding(payload);
-            var claims = JsonSerializer.Deserialize<Dictionary<string, object>>(jsonBytes);
+            var claims = JsonSerializer.Deserialize(jsonBytes, WebsiteJsonContext.Default.DictionaryStringObject);
             var result = new Dictionary<string, string>();
             return claims?.Select((jwtClaim) => new Claim(jwtClaim.Key ?? "", jwtClaim.Value?.ToString() ?? ""));
         }
@@ -74,7 +69,7 @@ namespace WgDashboard.Website.Services
 
             var payload = jwtSections[1];
             var jsonBytes = ParseBase64WithoutPadding(payload);
-            var claims = JsonSerializer.Deserialize<Dictionary<string, object>>(jsonBytes);
+            var claims = JsonSerializer.Deserialize(jsonBytes, WebsiteJsonContext.Default.DictionaryStringObject);
             var result = new Dictionary<string, string>();
             if (claims is null)
                 return null;
@@ -101,7 +96,7 @@ namespace WgDashboard.Website.Services
             return Convert.FromBase64String(result);
         }
 
-        private void SetAuthState(Dictionary<string, string> claims) 
+        private void SetAuthState(string jwt, Dictionary<string, string> claims) 
         {
             int id;
             if (!int.TryParse(claims.GetValueOrDefault(ClaimTypes.Sid, "0"), out id))
@@ -115,7 +110,7 @@ namespace WgDashboard.Website.Services
             if (!long.TryParse(claims.GetValueOrDefault("exp", "-1"), out expiration))
                 expiration = -1;
 
-            AuthState.SetAuthenticatedUser(id, username, userRole, name, expiration);
+            AuthState.SetAuthenticatedUser(jwt, id, username, userRole, name, expiration);
         
         }
 
@@ -0,0 +1,145 @@
+﻿using Blazored.LocalStorage;
+using Microsoft.AspNetCore.Components.Authorization;
+using Microsoft.JSInterop;
+using System.Net;
+using System.Net.Http.Headers;
+
+namespace WgDashboard.Website.Services
+{
+    /// <summary>
+    /// <para>Sends the logged in user's JWT with every request to the API, and keeps it fresh: it is refreshed shortly before it expires,
+    /// and again if the API answers 401, after which the request is sent once more with the new JWT</para>
+    ///
+    /// <para>The refresh token rotates on every refresh, so only one refresh may be in flight at a time. Every request that needs a
+    /// new JWT while one is in flight waits for that refresh instead of starting its own, which would fail with the old refresh token
+    /// and log the user out</para>
+    /// </summary>
+    public class JwtRefreshHandler : DelegatingHandler
+    {
+        private const string TOKEN_KEY = "WireguardApiToken";
+        private const string REFRESH_PATH = "/api/auth/refresh";
+        private static readonly TimeSpan REFRESH_BEFORE_EXPIRY = TimeSpan.FromSeconds(60);
+
+        private readonly IJSRuntime _jsRuntime;
+        private readonly ILocalStorageService _localStorage;
+        private readonly AuthenticationStateProvider _authStateProvider;
+        private readonly Uri _apiBaseUri;
+
+        private readonly object _refreshLock = new object();
+        private Task<bool>? _refreshing; // the refresh in flight, shared by everyone waiting on it
+
+        private class FetchResults
+        {
+            public int StatusCode { get; set; }
+            public string ResponseBody { get; set; } = "";
+            public bool IsSuccessStatusCode { get => 200 <= StatusCode && StatusCode <= 299; }
+        }
+
+        public JwtRefreshHandler(IJSRuntime jsRuntime, ILocalStorageService localStorage, AuthenticationStateProvider authStateProvider, Uri apiBaseUri)
+        {
+            this._jsRuntime = jsRuntime;
+            this._localStorage = localStorage;
+            this._authStateProvider = authStateProvider;
+            this._apiBaseUri = apiBaseUri;
+        }
+
+        protected override async Task<HttpResponseMessage> SendAsync(HttpRequestMessage request, CancellationToken cancellationToken)
+        {
+            // never send the JWT anywhere but the API
+            if (request.RequestUri is null || !_apiBaseUri.IsBaseOf(request.RequestUri))
+                return await base.SendAsync(request, cancellationToken);
+
+            if (AuthState.Jwt is not null && AuthState.ExpiresWithin(REFRESH_BEFORE_EXPIRY))
+                await Refresh();
+
+            string? sentJwt = Authorize(request);
+            HttpResponseMessage response = await base.SendAsync(request, cancellationToken);
+            if (response.StatusCode != HttpStatusCode.Unauthorized || sentJwt is null)
+                return response;
+
+            // someone else may have refreshed while this request was in flight. only refresh if the rejected JWT is still the current one
+            if (AuthState.Jwt == sentJwt && !await Refresh())
+                return response;
+            if (AuthState.Jwt is null)
+                return response; // the refresh token was rejected too. the caller logs the user out
+
+            // don't retry more than once. might result in infinite loop
+            response.Dispose();
+            HttpRequestMessage retry = Copy(request);
+            Authorize(retry);
+            return await base.SendAsync(retry, cancellationToken);
+        }
+
+        /*
+         * Sets the request's Authorization header to the current JWT. Returns the JWT, or null if no user is logged in
+         */
+        private static string? Authorize(HttpRequestMessage request)
+        {
+            string? jwt = AuthState.Jwt;
+            request.Headers.Authorization = jwt is null ? null : new AuthenticationHeaderValue("Bearer", jwt);
+            return jwt;
+        }
+
+        /*
+         * Joins the refresh in flight, or starts one. Returns whether the JWT was refreshed
+         */
+        private Task<bool> Refresh()
+        {
+            lock (_refreshLock)
+            {
+                _refreshing ??= RefreshOnce();
+                return _refreshing;
+            }
+        }
+
+        private async Task<bool> RefreshOnce()
+        {
+            await Task.Yield(); // so the task is stored in _refreshing before the finally below clears it
+            try
+            {
+                // the refresh token is an HttpOnly cookie, which only the browser's fetch can send
+                string refreshPath = new Uri(_apiBaseUri, REFRESH_PATH).ToString();
+                FetchResults response = await _jsRuntime.InvokeAsync<FetchResults>("window.refreshToken", refreshPath);
+
+                if (response.IsSuccessStatusCode)
+                {
+                    await _localStorage.SetItemAsync(TOKEN_KEY, response.ResponseBody.Replace("\"", ""));
+                    await _authStateProvider.GetAuthenticationStateAsync();
+                    return true;
+                }
+                if (response.StatusCode == (int)HttpStatusCode.Unauthorized)
+                {
+                    // the session is over. forget the JWT so no one else tries it
+                    await _localStorage.RemoveItemAsync(TOKEN_KEY);
+                    await _authStateProvider.GetAuthenticationStateAsync();
+                }
+                else
+                    Console.WriteLine(response.ResponseBody);
+                return false;
+            }
+            finally
+            {
+                lock (_refreshLock)
+                    _refreshing = null;
+            }
+        }
+
+        /*
+         * Copies a request that was already sent, so it can be sent again. The content is shared, which the content types used here allow
+         */
+        private static HttpRequestMessage Copy(HttpRequestMessage request)
+        {
+            var copy = new HttpRequestMessage(request.Method, request.RequestUri)
+            {
+                Content = request.Content,
+                Version = request.Version,
+                VersionPolicy = request.VersionPolicy,
+            };
+            foreach (var header in request.Headers)
+                copy.Headers.TryAddWithoutValidation(header.Key, header.Value);
+            foreach (var option in request.Options) // e.g. the browser's response streaming
+                ((IDictionary<string, object?>)copy.Options)[option.Key] = option.Value;
+            return copy;
+        }
+    }
+}
@@ -2,6 +2,8 @@ using Blazored.LocalStorage;
 using Microsoft.AspNetCore.Components.Authorization;
 using Microsoft.AspNetCore.Components.Web;
 using Microsoft.AspNetCore.Components.WebAssembly.Hosting;
+using Microsoft.AspNetCore.Components.WebAssembly.Services;
+using Microsoft.JSInterop;
 using WgDashboard.Website;
 using WgDashboard.Website.Services;
 
@@ -11,11 +13,17 @@ builder.RootComponents.Add<HeadOutlet>("head::after");
 
 string baseUrl = builder.Configuration.GetSection("WireguardApiConfig").GetValue<string>("BaseUrl") ?? "http://localhost:3000";
 
-builder.Services.AddScoped(sp => new HttpClient() { BaseAddress = new Uri(baseUrl) });
+// every request to the API goes through the handler, which sends the JWT and refreshes it
+builder.Services.AddScoped(sp => new HttpClient(new JwtRefreshHandler(sp.GetRequiredService<IJSRuntime>(), sp.GetRequiredService<ILocalStorageService>(),
+        sp.GetRequiredService<AuthenticationStateProvider>(), new Uri(baseUrl)) { InnerHandler = new HttpClientHandler() })
+    { BaseAddress = new Uri(baseUrl) });
 builder.Services.AddScoped<AuthenticationStateProvider, AuthStateProvider>();
 
 builder.Services.AddAuthorizationCore();
 
 builder.Services.AddBlazoredLocalStorage();
 
+// loads WgDashboard.Website.Admin when one of its pages is first opened. see App.razor
+builder.Services.AddScoped<LazyAssemblyLoader>();
+
 await builder.Build().RunAsync();